@@ -52,13 +52,13 @@ import shutil
 import time
 import stat
 import errno
-import re
 import random
 import logging
 import tempfile
 import zlib
 import base64
 import signal
+import threading
 
 from ganeti import errors
 from ganeti import utils
@@ -69,6 +69,7 @@ from ganeti.storage import bdev
 from ganeti.storage import drbd
 from ganeti.storage import extstorage
 from ganeti.storage import filestorage
+from ganeti.storage import lvm_state
 from ganeti import objects
 from ganeti import ssconf
 from ganeti import serializer
@@ -78,9 +79,11 @@ from ganeti import compat
 from ganeti import pathutils
 from ganeti import vcluster
 from ganeti import ht
+from ganeti import workerpool
 from ganeti.storage.base import BlockDev
 from ganeti.storage.drbd import DRBD8
 from ganeti import hooksmaster
+from ganeti import config_delta
 
 
 _BOOT_ID_PATH = "/proc/sys/kernel/random/boot_id"
@@ -96,9 +99,9 @@ _X509_CERT_FILE = "cert"
 _IES_STATUS_FILE = "status"
 _IES_PID_FILE = "pid"
 _IES_CA_FILE = "ca"
-
-#: Valid LVS output line regex
-_LVSLINE_REGEX = re.compile(r"^ *([^|]+)\|([^|]+)\|([0-9.]+)\|([^|]{6,})\|?$")
+_DWS_STATUS_FILE = "status"
+_DWS_PID_FILE = "pid"
+_DWS_LOG_FILE = "log"
 
 # Actions for the master setup script
 _MASTER_START = "start"
@@ -1073,7 +1076,7 @@ def VerifyNode(what, cluster_name, all_hvparams):
   _VerifyInstanceList(what, vm_capable, result, all_hvparams)
 
   if constants.NV_VGLIST in what and vm_capable:
-    result[constants.NV_VGLIST] = utils.ListVolumeGroups()
+    result[constants.NV_VGLIST] = ListVolumeGroups()
 
   if constants.NV_PVLIST in what and vm_capable:
     check_exclusive_pvs = constants.NV_EXCLUSIVEPVS in what
@@ -1217,22 +1220,17 @@ def GetVolumeList(vg_names):
 
   """
   lvs = {}
-  sep = "|"
-  if not vg_names:
-    vg_names = []
-  result = utils.RunCmd(["lvs", "--noheadings", "--units=m", "--nosuffix",
-                         "--separator=%s" % sep,
-                         "-ovg_name,lv_name,lv_size,lv_attr"] + vg_names)
-  if result.failed:
-    _Fail("Failed to list logical volumes, lvs output: %s", result.output)
-
-  for line in result.stdout.splitlines():
-    line = line.strip()
-    match = _LVSLINE_REGEX.match(line)
-    if not match:
-      logging.error("Invalid line returned from lvs output: '%s'", line)
+  try:
+    rows = lvm_state.GetRows("lvs", ["vg_name", "lv_name", "lv_size",
+                                     "lv_attr"], names=vg_names)
+  except errors.CommandError, err:
+    _Fail("Failed to list logical volumes: %s", err)
+
+  for (vg_name, name, size, attr) in rows:
+    if len(attr) < 6:
+      logging.error("Invalid attributes of logical volume %s/%s: '%s'",
+                    vg_name, name, attr)
       continue
-    vg_name, name, size, attr = match.groups()
     inactive = attr[4] == "-"
     online = attr[5] == "o"
     virtual = attr[0] == "v"
@@ -1253,7 +1251,13 @@ def ListVolumeGroups():
       size of the volume
 
   """
-  return utils.ListVolumeGroups()
+  try:
+    rows = lvm_state.GetRows("vgs", ["vg_name", "vg_size"])
+  except errors.CommandError, err:
+    logging.error("Can't list volume groups: %s", err)
+    return {}
+
+  return dict((name, int(float(size))) for (name, size) in rows)
 
 
 def NodeVolumes():
@@ -1275,12 +1279,11 @@ def NodeVolumes():
     multiple times.
 
   """
-  result = utils.RunCmd(["lvs", "--noheadings", "--units=m", "--nosuffix",
-                         "--separator=|",
-                         "--options=lv_name,lv_size,devices,vg_name"])
-  if result.failed:
-    _Fail("Failed to list logical volumes, lvs output: %s",
-          result.output)
+  try:
+    rows = lvm_state.GetRows("lvs", ["lv_name", "lv_size", "devices",
+                                     "vg_name"])
+  except errors.CommandError, err:
+    _Fail("Failed to list logical volumes: %s", err)
 
   def parse_dev(dev):
     return dev.split("(")[0]
@@ -1288,17 +1291,10 @@ def NodeVolumes():
   def handle_dev(dev):
     return [parse_dev(x) for x in dev.split(",")]
 
-  def map_line(line):
-    line = [v.strip() for v in line]
-    return [{"name": line[0], "size": line[1],
-             "dev": dev, "vg": line[3]} for dev in handle_dev(line[2])]
-
   all_devs = []
-  for line in result.stdout.splitlines():
-    if line.count("|") >= 3:
-      all_devs.extend(map_line(line.split("|")))
-    else:
-      logging.warning("Strange line in the output from lvs: '%s'", line)
+  for (name, size, devices, vg_name) in rows:
+    all_devs.extend({"name": name, "size": size, "dev": dev, "vg": vg_name}
+                    for dev in handle_dev(devices))
   return all_devs
 
 
@@ -1643,11 +1639,27 @@ def _CalculateDeviceURI(instance, disk, device):
     return None
 
 
+def _FindAndOpenBlockDev(disk):
+  """Finds an assembled block device and makes it read/write.
+
+  @type disk: L{objects.Disk}
+  @rtype: L{bdev.BlockDev}
+
+  """
+  device = _RecursiveFindBD(disk)
+  if device is None:
+    raise errors.BlockDeviceError("Block device '%s' is not set up." %
+                                  str(disk))
+  device.Open()
+
+  return device
+
+
 def _GatherAndLinkBlockDevs(instance):
   """Set up an instance's block device(s).
 
   This is run on the primary node at instance startup. The block
-  devices must be already assembled.
+  devices must be already assembled; they are opened in parallel.
 
   @type instance: L{objects.Instance}
   @param instance: the instance whose disks we should assemble
@@ -1655,13 +1667,11 @@ def _GatherAndLinkBlockDevs(instance):
   @return: list of (disk_object, link_name, drive_uri)
 
   """
+  devices = _RunInParallel(_FindAndOpenBlockDev,
+                           [(disk,) for disk in instance.disks])
+
   block_devices = []
-  for idx, disk in enumerate(instance.disks):
-    device = _RecursiveFindBD(disk)
-    if device is None:
-      raise errors.BlockDeviceError("Block device '%s' is not set up." %
-                                    str(disk))
-    device.Open()
+  for (idx, (disk, device)) in enumerate(zip(instance.disks, devices)):
     try:
       link_name = _SymlinkBlockDev(instance.name, device.dev_path, idx)
     except OSError, e:
@@ -2112,8 +2122,8 @@ def _WipeDevice(path, offset, size):
           result.fail_reason, result.output)
 
 
-def BlockdevWipe(disk, offset, size):
-  """Wipes a block device.
+def _FindDeviceForWipe(disk, offset, size):
+  """Finds a block device and checks the range to be wiped.
 
   @type disk: L{objects.Disk}
   @param disk: the disk object we want to wipe
@@ -2121,6 +2131,7 @@ def BlockdevWipe(disk, offset, size):
   @param offset: The offset in MiB in the file
   @type size: int
   @param size: The size in MiB to write
+  @rtype: L{bdev.BlockDev}
 
   """
   try:
@@ -2141,9 +2152,152 @@ def BlockdevWipe(disk, offset, size):
   if (offset + size) > rdev.size:
     _Fail("The provided offset and size to wipe is bigger than device size")
 
+  return rdev
+
+
+def BlockdevWipe(disk, offset, size):
+  """Wipes a block device.
+
+  @type disk: L{objects.Disk}
+  @param disk: the disk object we want to wipe
+  @type offset: int
+  @param offset: The offset in MiB in the file
+  @type size: int
+  @param size: The size in MiB to write
+
+  """
+  rdev = _FindDeviceForWipe(disk, offset, size)
+
   _WipeDevice(rdev.dev_path, offset, size)
 
 
+def _CleanupDiskWipe(name):
+  """Kills a disk wipe if it's still running and removes its status.
+
+  """
+  status_dir = utils.PathJoin(pathutils.DISK_WIPE_DIR, name)
+
+  pid = utils.ReadLockedPidFile(utils.PathJoin(status_dir, _DWS_PID_FILE))
+
+  if pid:
+    logging.info("Disk wipe %s is still running with PID %s", name, pid)
+    utils.KillProcess(pid, waitpid=False)
+
+  shutil.rmtree(status_dir, ignore_errors=True)
+
+
+def StartDiskWipes(disks, offsets):
+  """Starts wiping block devices in the background.
+
+  Every device is wiped by a separate process, all of them running in
+  parallel. Their progress can be retrieved using L{GetDiskWipeStatus}.
+
+  @type disks: list of L{objects.Disk}
+  @param disks: the disk objects we want to wipe
+  @type offsets: list of int
+  @param offsets: The offsets in MiB from which to wipe the disks up to
+      their end
+  @rtype: list of string
+  @return: The names of the disk wipes, in the same order as the disks
+
+  """
+  if len(disks) != len(offsets):
+    _Fail("Number of disks and offsets doesn't match")
+
+  # Check all devices before starting any wipe
+  wipes = []
+  for (disk, offset) in zip(disks, offsets):
+    rdev = _FindDeviceForWipe(disk, offset, disk.size - offset)
+    wipes.append((disk, rdev.dev_path, offset, disk.size - offset))
+
+  names = []
+  try:
+    for (disk, dev_path, offset, size) in wipes:
+      status_dir = tempfile.mkdtemp(dir=pathutils.DISK_WIPE_DIR,
+                                    prefix=("wipe-%s-" %
+                                            utils.TimestampForFilename()))
+      names.append(os.path.basename(status_dir))
+
+      cmd = [
+        pathutils.WIPE_DISK,
+        utils.PathJoin(status_dir, _DWS_STATUS_FILE),
+        dev_path, str(offset), str(size),
+        ]
+
+      logging.info("Wiping %s MiB of device %s (%s) at offset %s MiB",
+                   size, disk.iv_name, dev_path, offset)
+
+      utils.StartDaemon(cmd,
+                        pidfile=utils.PathJoin(status_dir, _DWS_PID_FILE),
+                        output=utils.PathJoin(status_dir, _DWS_LOG_FILE))
+  except Exception:
+    for name in names:
+      _CleanupDiskWipe(name)
+    raise
+
+  return names
+
+
+def GetDiskWipeStatus(names, _wipe_dir=pathutils.DISK_WIPE_DIR):
+  """Returns the status of disk wipes.
+
+  Wipes whose process is gone without having reported a final status (e.g.
+  because it was killed) are reported as failed.
+
+  @type names: sequence
+  @param names: List of names
+  @rtype: List of dicts
+  @return: Returns a list of the state of each named disk wipe or None if a
+           status couldn't be read
+
+  """
+  result = []
+
+  for name in names:
+    status_dir = utils.PathJoin(_wipe_dir, name)
+    status_file = utils.PathJoin(status_dir, _DWS_STATUS_FILE)
+
+    # Check whether the process is running before reading the status; it
+    # writes its final status before exiting
+    running = bool(utils.ReadLockedPidFile(utils.PathJoin(status_dir,
+                                                          _DWS_PID_FILE)))
+
+    try:
+      data = utils.ReadFile(status_file)
+    except EnvironmentError, err:
+      if err.errno != errno.ENOENT:
+        raise
+      data = None
+
+    if not data:
+      result.append(None)
+      continue
+
+    status = serializer.LoadJson(data)
+
+    if status.get("exit_status") is None and not running:
+      logging.error("Disk wipe %s terminated without reporting its result",
+                    name)
+      status["exit_status"] = constants.EXIT_FAILURE
+      status["error_message"] = "Wiping process terminated unexpectedly"
+
+    result.append(status)
+
+  return result
+
+
+def CleanupDiskWipes(names):
+  """Cleanup after disk wipes.
+
+  Wipes which are still running are killed. Afterwards their status
+  directories are removed.
+
+  """
+  for name in names:
+    logging.info("Finalizing disk wipe %s", name)
+    _CleanupDiskWipe(name)
+
+
 def BlockdevPauseResumeSync(disks, pause):
   """Pause or resume the sync of the block device.
 
@@ -2278,36 +2432,361 @@ def _RecursiveAssembleBD(disk, owner, as_primary):
   return result
 
 
+class _ParallelWorker(workerpool.BaseWorker):
+  """Worker running functions for L{_RunInParallel} and L{_AssembleDisks}.
+
+  """
+  def RunTask(self, fn, *args): # pylint: disable=W0221
+    """Calls the given function.
+
+    """
+    fn(*args)
+
+
+def _RunInParallel(fn, args_list,
+                   _num_workers=constants.BLOCKDEV_ASSEMBLE_WORKERS):
+  """Calls a function for every set of arguments using a pool of threads.
+
+  @type fn: callable
+  @param fn: the function to call
+  @type args_list: list of tuples
+  @param args_list: the arguments for every call
+  @rtype: list
+  @return: the results of the calls in the order of C{args_list}
+  @raise Exception: the exception raised by the first failing call
+
+  """
+  results = [None] * len(args_list)
+  failures = [None] * len(args_list)
+
+  def _Call(idx, args):
+    try:
+      results[idx] = fn(*args) # pylint: disable=W0142
+    except Exception, err: # pylint: disable=W0703
+      failures[idx] = err
+
+  if len(args_list) < 2:
+    for (idx, args) in enumerate(args_list):
+      _Call(idx, args)
+  else:
+    pool = workerpool.WorkerPool("Parallel",
+                                 min(_num_workers, len(args_list)),
+                                 _ParallelWorker)
+    try:
+      pool.AddManyTasks([(_Call, idx, args)
+                         for (idx, args) in enumerate(args_list)])
+      pool.Quiesce()
+    finally:
+      pool.TerminateWorkers()
+
+  for err in failures:
+    if err is not None:
+      raise err
+
+  return results
+
+
+class _AssembleNode(object):
+  """Block device in the tree of devices assembled by L{_DiskAssembler}.
+
+  @ivar disk: the disk to assemble
+  @ivar owner: the name of the instance which owns the disk
+  @ivar parent: the node of the device using this one, C{None} for disks
+  @ivar children: the nodes of the children of the device
+  @ivar pending: the number of children which haven't been assembled yet
+  @ivar result: the assembled device, or C{True} if the device doesn't need
+    to be assembled on this node
+  @ivar error: the exception raised while assembling the device or one of
+    its children
+  @ivar duration: the number of seconds spent on assembling the device
+    itself, excluding its children
+
+  """
+  def __init__(self, disk, owner, parent):
+    """Initializes this class.
+
+    """
+    self.disk = disk
+    self.owner = owner
+    self.parent = parent
+    self.children = [_AssembleNode(child, owner, self)
+                     for child in (disk.children or [])]
+    self.pending = len(self.children)
+    self.result = None
+    self.error = None
+    self.duration = None
+
+  def GetLeaves(self):
+    """Returns the nodes of all devices without children.
+
+    """
+    if not self.children:
+      return [self]
+
+    return [leaf for child in self.children for leaf in child.GetLeaves()]
+
+  def GetTimings(self):
+    """Returns how long assembling this device and its children took.
+
+    @rtype: list of tuples; (string, string or None, float)
+    @return: for every device its type, its path if it has been assembled and
+      the number of seconds spent on it; children come before their parents
+
+    """
+    timings = [timing for child in self.children
+               for timing in child.GetTimings()]
+
+    if isinstance(self.result, BlockDev):
+      dev_path = self.result.dev_path
+    else:
+      dev_path = None
+
+    if self.duration is not None:
+      timings.append((self.disk.dev_type, dev_path, self.duration))
+
+    return timings
+
+
+class _DiskAssembler(object):
+  """Assembles the block devices of several disks in parallel.
+
+  A device is only assembled after all its children have been assembled,
+  independent devices (e.g. the data and metadata volumes of a DRBD disk or
+  the devices of different disks and instances) are assembled concurrently.
+
+  """
+  def __init__(self, as_primary,
+               _num_workers=constants.BLOCKDEV_ASSEMBLE_WORKERS,
+               _assemble_fn=bdev.Assemble):
+    """Initializes this class.
+
+    @type as_primary: boolean
+    @param as_primary: if we should make the block devices read/write
+
+    """
+    self._as_primary = as_primary
+    self._num_workers = _num_workers
+    self._assemble_fn = _assemble_fn
+
+    self._lock = threading.Lock()
+    self._cond = threading.Condition(self._lock)
+    self._pool = None
+    self._unfinished = 0
+
+  def _Assemble(self, node):
+    """Assembles a single device once its children are assembled.
+
+    This mirrors L{_RecursiveAssembleBD}.
+
+    """
+    disk = node.disk
+
+    children = []
+    if node.children:
+      mcn = disk.ChildrenNeeded()
+      if mcn == -1:
+        mcn = 0 # max number of Nones allowed
+      else:
+        mcn = len(disk.children) - mcn # max number of Nones
+      for child in node.children:
+        if child.error is None:
+          children.append(child.result)
+        elif (isinstance(child.error, errors.BlockDeviceError) and
+              children.count(None) < mcn):
+          logging.error("Error in child activation (but continuing): %s",
+                        str(child.error))
+          children.append(None)
+        else:
+          raise child.error
+
+    if self._as_primary or disk.AssembleOnSecondary():
+      r_dev = self._assemble_fn(disk, children)
+      if self._as_primary or disk.OpenOnSecondary():
+        r_dev.Open()
+      DevCacheManager.UpdateCache(r_dev.dev_path, node.owner,
+                                  self._as_primary, disk.iv_name)
+      return r_dev
+
+    return True
+
+  def _Run(self, node):
+    """Assembles a device and schedules its parent if it is ready.
+
+    """
+    start = time.time()
+    try:
+      node.result = self._Assemble(node)
+    except Exception, err: # pylint: disable=W0703
+      node.error = err
+    node.duration = time.time() - start
+
+    parent = node.parent
+
+    self._lock.acquire()
+    try:
+      if parent is None:
+        self._unfinished -= 1
+        self._cond.notifyAll()
+      else:
+        parent.pending -= 1
+        if parent.pending > 0:
+          parent = None
+    finally:
+      self._lock.release()
+
+    if parent is not None:
+      self._pool.AddTask((self._Run, parent))
+
+  def __call__(self, disks):
+    """Assembles the given disks.
+
+    @type disks: list of tuples; (L{objects.Disk}, string)
+    @param disks: the disks to assemble and the names of the instances
+      owning them
+    @rtype: list of L{_AssembleNode}
+    @return: the nodes of the given disks, containing the assembled devices
+      or the errors
+
+    """
+    roots = [_AssembleNode(disk, owner, None) for (disk, owner) in disks]
+    leaves = [leaf for root in roots for leaf in root.GetLeaves()]
+
+    if not leaves:
+      return roots
+
+    self._unfinished = len(roots)
+    self._pool = workerpool.WorkerPool("BlockDevAssemble",
+                                       min(self._num_workers, len(leaves)),
+                                       _ParallelWorker)
+    try:
+      # Parents are added by the workers, hence the pool can't be quiesced
+      self._pool.AddManyTasks([(self._Run, leaf) for leaf in leaves])
+
+      self._lock.acquire()
+      try:
+        while self._unfinished:
+          self._cond.wait()
+      finally:
+        self._lock.release()
+    finally:
+      self._pool.TerminateWorkers()
+      self._pool = None
+
+    return roots
+
+
+def _LinkAssembledDisk(instance, disk, idx, node, as_primary):
+  """Returns the RPC result for a disk assembled by L{_DiskAssembler}.
+
+  @rtype: tuple
+  @return: a tuple with the C{/dev/...} path, the created symlink and the
+      URI for primary nodes, and (C{True}, C{True}) for secondary nodes
+
+  """
+  if node.error is not None:
+    raise node.error # pylint: disable=E0702
+
+  result = node.result
+  if isinstance(result, BlockDev):
+    # pylint: disable=E1103
+    dev_path = result.dev_path
+    link_name = None
+    uri = None
+    if as_primary:
+      link_name = _SymlinkBlockDev(instance.name, dev_path, idx)
+      uri = _CalculateDeviceURI(instance, disk, result)
+  elif result:
+    return result, result
+  else:
+    _Fail("Unexpected result from disk assembly")
+
+  return dev_path, link_name, uri
+
+
 def BlockdevAssemble(disk, instance, as_primary, idx):
   """Activate a block device for an instance.
 
-  This is a wrapper over _RecursiveAssembleBD.
+  The children of the device are assembled in parallel.
 
   @rtype: str or boolean
   @return: a tuple with the C{/dev/...} path and the created symlink
       for primary nodes, and (C{True}, C{True}) for secondary nodes
 
   """
+  (node,) = _DiskAssembler(as_primary)([(disk, instance.name)])
+
   try:
-    result = _RecursiveAssembleBD(disk, instance.name, as_primary)
-    if isinstance(result, BlockDev):
-      # pylint: disable=E1103
-      dev_path = result.dev_path
-      link_name = None
-      uri = None
-      if as_primary:
-        link_name = _SymlinkBlockDev(instance.name, dev_path, idx)
-        uri = _CalculateDeviceURI(instance, disk, result)
-    elif result:
-      return result, result
-    else:
-      _Fail("Unexpected result from _RecursiveAssembleBD")
+    return _LinkAssembledDisk(instance, disk, idx, node, as_primary)
   except errors.BlockDeviceError, err:
     _Fail("Error while assembling disk: %s", err, exc=True)
   except OSError, err:
     _Fail("Error while symlinking disk: %s", err, exc=True)
 
-  return dev_path, link_name, uri
+
+def BlockdevAssembleMulti(instance_disks, as_primary,
+                          _assemble_fn=bdev.Assemble):
+  """Activate the block devices of several instances in parallel.
+
+  Independent devices, e.g. the volumes backing DRBD devices and the DRBD
+  devices of different disks and instances, are assembled concurrently.
+
+  @type instance_disks: list of tuples;
+      (L{objects.Instance}, list of L{objects.Disk}, list of int)
+  @param instance_disks: the instances, the disks to assemble for each of
+      them and the indices of those disks in the instance
+  @type as_primary: boolean
+  @param as_primary: if we should make the block devices read/write
+  @rtype: list of lists of tuples; (bool, tuple or string, list)
+  @return: for every instance and every of its disks whether it has been
+      assembled, the result of L{BlockdevAssemble} or an error message, and
+      the timings of its devices as returned by L{_AssembleNode.GetTimings}
+
+  """
+  for (instance, disks, indices) in instance_disks:
+    if len(disks) != len(indices):
+      _Fail("Got %s disks but %s indices for instance %s", len(disks),
+            len(indices), instance.name)
+
+  assembler = _DiskAssembler(as_primary, _assemble_fn=_assemble_fn)
+  nodes = assembler([(disk, instance.name)
+                     for (instance, disks, _) in instance_disks
+                     for disk in disks])
+  nodes.reverse()
+
+  result = []
+  for (instance, disks, indices) in instance_disks:
+    inst_result = []
+    for (disk, idx) in zip(disks, indices):
+      node = nodes.pop()
+      try:
+        payload = _LinkAssembledDisk(instance, disk, idx, node, as_primary)
+        status = True
+      except errors.BlockDeviceError, err:
+        logging.exception("Error while assembling disk %s of instance %s",
+                          disk.iv_name, instance.name)
+        payload = "Error while assembling disk: %s" % err
+        status = False
+      except OSError, err:
+        logging.exception("Error while symlinking disk %s of instance %s",
+                          disk.iv_name, instance.name)
+        payload = "Error while symlinking disk: %s" % err
+        status = False
+      except Exception, err: # pylint: disable=W0703
+        # Any error must only affect this disk
+        logging.exception("Error while activating disk %s of instance %s",
+                          disk.iv_name, instance.name)
+        payload = "Error while activating disk: %s" % err
+        status = False
+
+      timings = node.GetTimings()
+      logging.debug("Time spent on the devices of disk %s of instance %s: %s",
+                    disk.iv_name, instance.name, timings)
+
+      inst_result.append((status, payload, timings))
+
+    result.append(inst_result)
+
+  return result
 
 
 def BlockdevShutdown(disk):
@@ -2551,19 +3030,15 @@ def BlockdevExport(disk, dest_node_ip, dest_path, cluster_name):
   """
   real_disk = _OpenRealBD(disk)
 
-  # the block size on the read dd is 1MiB to match our units
-  expcmd = utils.BuildShellCmd("set -e; set -o pipefail; "
-                               "dd if=%s bs=1048576 count=%s",
-                               real_disk.dev_path, str(disk.size))
+  # only regions containing data are sent, the receiving side makes sure the
+  # rest of the destination reads back as zeroes and syncs the device once
+  # all data has been written; it fails if the device doesn't exist
+  expcmd = utils.BuildShellCmd("set -e; set -o pipefail; %s send %s %s",
+                               pathutils.SPARSE_COPY, real_disk.dev_path,
+                               str(disk.size * 1024 * 1024))
 
-  # we set here a smaller block size as, due to ssh buffering, more
-  # than 64-128k will mostly ignored; we use nocreat to fail if the
-  # device is not already there or we pass a wrong path; we use
-  # notrunc to no attempt truncate on an LV device; we use oflag=dsync
-  # to not buffer too much memory; this means that at best, we flush
-  # every 64k, which will not be very fast
-  destcmd = utils.BuildShellCmd("dd of=%s conv=nocreat,notrunc bs=65536"
-                                " oflag=dsync", dest_path)
+  destcmd = utils.BuildShellCmd("%s receive %s", pathutils.SPARSE_COPY,
+                                dest_path)
 
   remotecmd = _GetSshRunner(cluster_name).BuildCmd(dest_node_ip,
                                                    constants.SSH_LOGIN_USER,
@@ -2625,6 +3100,36 @@ def UploadFile(file_name, data, mode, uid, gid, atime, mtime):
                       atime=atime, mtime=mtime)
 
 
+def UploadConfigDelta(data, _cfg_file=pathutils.CLUSTER_CONF_FILE):
+  """Applies a delta to the local copy of the cluster configuration.
+
+  The delta is only applied if the local configuration is the one the delta
+  is based on, otherwise the master has to upload the whole file.
+
+  @type data: str
+  @param data: the compressed, serialized delta as computed by
+    L{config_delta.ComputeDelta}
+  @rtype: None
+
+  """
+  delta = serializer.LoadJson(_Decompress(data))
+
+  try:
+    st = os.stat(_cfg_file)
+    cfg = serializer.LoadJson(utils.ReadFile(_cfg_file))
+  except EnvironmentError, err:
+    _Fail("Can't read configuration file: %s", err)
+
+  try:
+    config_delta.ApplyDelta(cfg, delta)
+  except errors.ConfigurationError, err:
+    _Fail("Can't apply configuration delta: %s", err)
+
+  utils.SafeWriteFile(_cfg_file, None, data=serializer.DumpJson(cfg),
+                      mode=stat.S_IMODE(st.st_mode), uid=st.st_uid,
+                      gid=st.st_gid)
+
+
 def RunOob(oob_program, command, node, timeout):
   """Executes oob_program with given command on given node.
 
@@ -3436,6 +3941,33 @@ def JobQueueUpdate(file_name, content):
                   gid=getents.daemons_gid, mode=constants.JOB_QUEUE_FILES_PERMS)
 
 
+def JobQueueUpdateMulti(files):
+  """Updates multiple files in the queue directory.
+
+  All file names are checked before any file is written. Files are written
+  in the order given.
+
+  @type files: str
+  @param files: compressed and serialized list of (file name, content) pairs
+  @rtype: None
+  @raises RPCFail: if one of the files is not valid
+
+  """
+  getents = runtime.GetEnts()
+
+  files = [(vcluster.LocalizeVirtualPath(file_name), content)
+           for (file_name, content) in serializer.LoadJson(_Decompress(files))]
+
+  for (file_name, _) in files:
+    _EnsureJobQueueFile(file_name)
+
+  for (file_name, content) in files:
+    # Write and replace the file atomically
+    utils.WriteFile(file_name, data=content, uid=getents.masterd_uid,
+                    gid=getents.daemons_gid,
+                    mode=constants.JOB_QUEUE_FILES_PERMS)
+
+
 def JobQueueRename(old, new):
   """Renames a job queue file.
 
@@ -3714,24 +4246,16 @@ def _GetImportExportIoCommand(instance, mode, ieio, ieargs):
 
     real_disk = _OpenRealBD(disk)
 
+    # only regions containing data are transferred, see BlockdevExport
     if mode == constants.IEM_IMPORT:
-      # we set here a smaller block size as, due to transport buffering, more
-      # than 64-128k will mostly ignored; we use nocreat to fail if the device
-      # is not already there or we pass a wrong path; we use notrunc to no
-      # attempt truncate on an LV device; we use oflag=dsync to not buffer too
-      # much memory; this means that at best, we flush every 64k, which will
-      # not be very fast
-      suffix = utils.BuildShellCmd(("| dd of=%s conv=nocreat,notrunc"
-                                    " bs=%s oflag=dsync"),
-                                    real_disk.dev_path,
-                                    str(64 * 1024))
+      suffix = utils.BuildShellCmd("| %s receive %s", pathutils.SPARSE_COPY,
+                                   real_disk.dev_path)
 
     elif mode == constants.IEM_EXPORT:
-      # the block size on the read dd is 1MiB to match our units
-      prefix = utils.BuildShellCmd("dd if=%s bs=%s count=%s |",
+      prefix = utils.BuildShellCmd("%s send %s %s |", pathutils.SPARSE_COPY,
                                    real_disk.dev_path,
-                                   str(1024 * 1024), # 1 MB
-                                   str(disk.size))
+                                   str(disk.size * 1024 * 1024))
+      # upper limit, zeroed regions aren't transferred
       exp_size = disk.size
 
   elif ieio == constants.IEIO_SCRIPT:
@@ -3872,6 +4396,12 @@ def StartImportExportDaemon(mode, opts, host, port, instance, component,
     if opts.compress:
       cmd.append("--compress=%s" % opts.compress)
 
+    if opts.buffer_size:
+      cmd.append("--buffer-size=%s" % opts.buffer_size)
+
+    if opts.sparse:
+      cmd.append("--sparse")
+
     if opts.magic:
       cmd.append("--magic=%s" % opts.magic)
 
@@ -4038,6 +4568,7 @@ def DrbdAttachNet(disks, instance_name, multimaster):
   # decide it has wrong configuration and switch to standalone
 
   def _Attach():
+    drbd.Invalidate()
     all_connected = True
 
     for rd in bdevs:
@@ -4090,6 +4621,7 @@ def DrbdWaitSync(disks):
 
   """
   def _helper(rd):
+    drbd.Invalidate()
     stats = rd.GetProcStatus()
     if not (stats.is_connected or stats.is_in_resync):
       raise utils.RetryAgain()
@@ -4104,6 +4636,7 @@ def DrbdWaitSync(disks):
       # poll each second for 15 seconds
       stats = utils.Retry(_helper, 1, 15, args=[rd])
     except utils.RetryTimeout:
+      drbd.Invalidate()
       stats = rd.GetProcStatus()
       # last check
       if not (stats.is_connected or stats.is_in_resync):
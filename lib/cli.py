@@ -76,7 +76,9 @@ __all__ = [
   "CAPAB_VM_OPT",
   "CLEANUP_OPT",
   "CLUSTER_DOMAIN_SECRET_OPT",
+  "COMPRESS_OPT",
   "CONFIRM_OPT",
+  "COUNT_ONLY_OPT",
   "CP_SIZE_OPT",
   "DEBUG_OPT",
   "DEBUG_SIMERR_OPT",
@@ -123,10 +125,12 @@ __all__ = [
   "IGNORE_SIZE_OPT",
   "INCLUDEDEFAULTS_OPT",
   "INTERVAL_OPT",
+  "LIMIT_OPT",
   "MAC_PREFIX_OPT",
   "MAINTAIN_NODE_HEALTH_OPT",
   "MASTER_NETDEV_OPT",
   "MASTER_NETMASK_OPT",
+  "MAX_AGE_OPT",
   "MC_OPT",
   "MIGRATION_MODE_OPT",
   "MODIFY_ETCHOSTS_OPT",
@@ -170,6 +174,7 @@ __all__ = [
   "ON_PRIMARY_OPT",
   "ON_SECONDARY_OPT",
   "OFFLINE_OPT",
+  "OFFSET_OPT",
   "OSPARAMS_OPT",
   "OS_OPT",
   "OS_SIZE_OPT",
@@ -198,6 +203,7 @@ __all__ = [
   "SHOW_MACHINE_OPT",
   "SHUTDOWN_TIMEOUT_OPT",
   "SINGLE_NODE_OPT",
+  "SORT_BY_OPT",
   "SPECS_CPU_COUNT_OPT",
   "SPECS_DISK_COUNT_OPT",
   "SPECS_DISK_SIZE_OPT",
@@ -214,6 +220,7 @@ __all__ = [
   "SRC_NODE_OPT",
   "SUBMIT_OPT",
   "SUBMIT_OPTS",
+  "QUERY_LIST_OPTS",
   "STARTUP_PAUSED_OPT",
   "STATIC_OPT",
   "SYNC_OPT",
@@ -221,6 +228,7 @@ __all__ = [
   "TAG_SRC_OPT",
   "TIMEOUT_OPT",
   "TO_GROUP_OPT",
+  "TRANSFER_BUFFER_SIZE_OPT",
   "UIDPOOL_OPT",
   "USEUNITS_OPT",
   "USE_EXTERNAL_MIP_SCRIPT",
@@ -241,6 +249,7 @@ __all__ = [
   "GenericList",
   "GenericListFields",
   "GetClient",
+  "GetListClient",
   "GetOnlineNodes",
   "JobExecutor",
   "JobSubmittedException",
@@ -1213,6 +1222,20 @@ SRC_NODE_OPT = cli_option("--src-node", dest="src_node", help="Source node",
 SRC_DIR_OPT = cli_option("--src-dir", dest="src_dir", help="Source directory",
                          metavar="<dir>")
 
+COMPRESS_OPT = cli_option("--compress", dest="compress",
+                          help=("Compression method for the disk data"
+                                " transfers (%s)" %
+                                utils.CommaJoin(constants.IEC_ALL)),
+                          default=None, metavar="<METHOD>",
+                          choices=list(constants.IEC_ALL))
+
+TRANSFER_BUFFER_SIZE_OPT = cli_option("--transfer-buffer-size",
+                                      dest="transfer_buffer_size",
+                                      type="int", default=None,
+                                      metavar="<BYTES>",
+                                      help="Size of the disk data transfer"
+                                      " buffers in bytes")
+
 SECONDARY_IP_OPT = cli_option("-s", "--secondary-ip", dest="secondary_ip",
                               help="Specify the secondary ip for the node",
                               metavar="ADDRESS", default=None)
@@ -1568,6 +1591,29 @@ FORCE_FILTER_OPT = cli_option("-F", "--filter", dest="force_filter",
                               help=("Whether command argument should be treated"
                                     " as filter"))
 
+SORT_BY_OPT = cli_option("--sort", dest="sort_by", type="list",
+                         default=None, metavar="[-]FIELD,...",
+                         help=("Comma-separated list of fields to sort by;"
+                               " prefix a field with \"-\" to sort in"
+                               " descending order"))
+
+LIMIT_OPT = cli_option("--limit", dest="limit", type="int", default=None,
+                       metavar="<N>",
+                       help="Maximum number of items to list")
+
+OFFSET_OPT = cli_option("--offset", dest="offset", type="int", default=0,
+                        metavar="<N>",
+                        help="Number of leading items to skip")
+
+COUNT_ONLY_OPT = cli_option("--count", dest="count_only",
+                            action="store_true", default=False,
+                            help="Only print the number of matching items")
+
+MAX_AGE_OPT = cli_option("--max-age", dest="max_age", type="int",
+                         default=None, metavar="<SECONDS>",
+                         help=("Maximum age of cached live data to use"
+                               " instead of querying nodes"))
+
 NO_REMEMBER_OPT = cli_option("--no-remember",
                              dest="no_remember",
                              action="store_true", default=False,
@@ -1690,6 +1736,15 @@ SUBMIT_OPTS = [
   PRINT_JOBID_OPT,
   ]
 
+# options for paging and sorting the output of list commands
+
+QUERY_LIST_OPTS = [
+  SORT_BY_OPT,
+  LIMIT_OPT,
+  OFFSET_OPT,
+  COUNT_ONLY_OPT,
+  ]
+
 # common options for creating instances. add and import then add their own
 # specific ones.
 COMMON_CREATE_OPTS = [
@@ -2439,6 +2494,21 @@ def GetClient(query=False):
   return client
 
 
+def GetListClient(opts):
+  """Returns a client for listing resources.
+
+  Paging and sorting options (see L{QUERY_LIST_OPTS}) and L{MAX_AGE_OPT} are
+  only supported by the master daemon, which is therefore used instead of the
+  query socket if any of them were given.
+
+  """
+  masterd_only = (opts.sort_by or opts.limit is not None or opts.offset or
+                  opts.count_only or
+                  getattr(opts, "max_age", None) is not None)
+
+  return GetClient(query=not masterd_only)
+
+
 def FormatError(err):
   """Return a formatted error message for a given error.
 
@@ -2762,6 +2832,8 @@ def GenericInstanceCreate(mode, opts, args):
     src_path = None
     no_install = opts.no_install
     identify_defaults = False
+    compress = None
+    transfer_buffer_size = None
   elif mode == constants.INSTANCE_IMPORT:
     start = False
     os_type = None
@@ -2770,6 +2842,8 @@ def GenericInstanceCreate(mode, opts, args):
     src_path = opts.src_dir
     no_install = None
     identify_defaults = opts.identify_defaults
+    compress = opts.compress
+    transfer_buffer_size = opts.transfer_buffer_size
   else:
     raise errors.ProgrammerError("Invalid creation mode %s" % mode)
 
@@ -2798,7 +2872,9 @@ def GenericInstanceCreate(mode, opts, args):
                                 tags=tags,
                                 no_install=no_install,
                                 identify_defaults=identify_defaults,
-                                ignore_ipolicy=opts.ignore_ipolicy)
+                                ignore_ipolicy=opts.ignore_ipolicy,
+                                compress=compress,
+                                transfer_buffer_size=transfer_buffer_size)
 
   SubmitOrSend(op, opts)
   return 0
@@ -3236,7 +3312,8 @@ def _WarnUnknownFields(fdefs):
 
 def GenericList(resource, fields, names, unit, separator, header, cl=None,
                 format_override=None, verbose=False, force_filter=False,
-                namefield=None, qfilter=None, isnumeric=False):
+                namefield=None, qfilter=None, isnumeric=False, sort_by=None,
+                limit=None, offset=0, count_only=False, max_age=None):
   """Generic implementation for listing all items of a resource.
 
   @param resource: One of L{constants.QR_VIA_LUXI}
@@ -3268,6 +3345,16 @@ def GenericList(resource, fields, names, unit, separator, header, cl=None,
   @param isnumeric: Whether the namefield's type is numeric, and therefore
     any simple filters built by namefield should use integer values to
     reflect that
+  @type sort_by: list of strings or None
+  @param sort_by: Fields to sort by, see L{SORT_BY_OPT}
+  @type limit: int or None
+  @param limit: Maximum number of items to list
+  @type offset: int
+  @param offset: Number of leading items to skip
+  @type count_only: bool
+  @param count_only: Whether to only print the number of matching items
+  @type max_age: int or None
+  @param max_age: Maximum age of cached live data to use, see L{MAX_AGE_OPT}
 
   """
   if not names:
@@ -3284,10 +3371,19 @@ def GenericList(resource, fields, names, unit, separator, header, cl=None,
   if cl is None:
     cl = GetClient()
 
-  response = cl.Query(resource, fields, qfilter)
+  response = cl.Query(resource, fields, qfilter, sort_by=sort_by, limit=limit,
+                      offset=offset, count_only=count_only, max_age=max_age)
 
   found_unknown = _WarnUnknownFields(response.fields)
 
+  if count_only:
+    ToStdout("%s", response.count)
+
+    if found_unknown:
+      return constants.EXIT_UNKNOWN_FIELD
+
+    return constants.EXIT_SUCCESS
+
   (status, data) = FormatQueryResult(response, unit=unit, separator=separator,
                                      header=header,
                                      format_override=format_override,
@@ -59,11 +59,13 @@ def PrintExportList(opts, args):
 
   qfilter = qlang.MakeSimpleFilter("node", opts.nodes)
 
-  cl = GetClient(query=True)
+  cl = GetListClient(opts)
 
   return GenericList(constants.QR_EXPORT, selected_fields, None, opts.units,
                      opts.separator, not opts.no_headers,
-                     verbose=opts.verbose, qfilter=qfilter, cl=cl)
+                     verbose=opts.verbose, qfilter=qfilter, cl=cl,
+                     sort_by=opts.sort_by, limit=opts.limit, offset=opts.offset,
+                     count_only=opts.count_only)
 
 
 def ListExportFields(opts, args):
@@ -104,7 +106,9 @@ def ExportInstance(opts, args):
                               shutdown=opts.shutdown,
                               shutdown_timeout=opts.shutdown_timeout,
                               remove_instance=opts.remove_instance,
-                              ignore_remove_failures=ignore_remove_failures)
+                              ignore_remove_failures=ignore_remove_failures,
+                              compress=opts.compress,
+                              transfer_buffer_size=opts.transfer_buffer_size)
 
   SubmitOrSend(op, opts)
   return 0
@@ -142,13 +146,16 @@ import_opts = [
   SRC_DIR_OPT,
   SRC_NODE_OPT,
   IGNORE_IPOLICY_OPT,
+  COMPRESS_OPT,
+  TRANSFER_BUFFER_SIZE_OPT,
   ]
 
 
 commands = {
   "list": (
     PrintExportList, ARGS_NONE,
-    [NODE_LIST_OPT, NOHDR_OPT, SEP_OPT, USEUNITS_OPT, FIELDS_OPT, VERBOSE_OPT],
+    [NODE_LIST_OPT, NOHDR_OPT, SEP_OPT, USEUNITS_OPT, FIELDS_OPT, VERBOSE_OPT] +
+    QUERY_LIST_OPTS,
     "", "Lists instance exports available in the ganeti cluster"),
   "list-fields": (
     ListExportFields, [ArgUnknown()],
@@ -159,7 +166,7 @@ commands = {
     ExportInstance, ARGS_ONE_INSTANCE,
     [FORCE_OPT, SINGLE_NODE_OPT, NOSHUTDOWN_OPT, SHUTDOWN_TIMEOUT_OPT,
      REMOVE_INSTANCE_OPT, IGNORE_REMOVE_FAILURES_OPT, DRY_RUN_OPT,
-     PRIORITY_OPT] + SUBMIT_OPTS,
+     PRIORITY_OPT, COMPRESS_OPT, TRANSFER_BUFFER_SIZE_OPT] + SUBMIT_OPTS,
     "-n <target_node> [opts...] <name>",
     "Exports an instance to an image"),
   "import": (
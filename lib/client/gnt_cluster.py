@@ -711,6 +711,54 @@ def VerifyCluster(opts, args):
   return rcode
 
 
+def _ActivateDisksByNode(opts, cl, instance_names):
+  """Activates the disks of instances, with one opcode per primary node.
+
+  @type instance_names: list of strings
+  @param instance_names: the names of the instances
+  @rtype: int
+  @return: the desired exit code
+
+  """
+  retcode = constants.EXIT_SUCCESS
+
+  if not instance_names:
+    return retcode
+
+  try:
+    result = cl.QueryInstances(instance_names, ["name", "pnode"], False)
+  except errors.GenericError, err:
+    (retcode, msg) = FormatError(err)
+    ToStderr("Error querying the primary nodes of instance(s) %s: %s",
+             utils.CommaJoin(instance_names), msg)
+    return retcode
+
+  node_instances = {}
+  for (iname, pnode) in result:
+    node_instances.setdefault(pnode, []).append(iname)
+
+  for pnode in utils.NiceSort(node_instances.keys()):
+    inames = utils.NiceSort(node_instances[pnode])
+    op = opcodes.OpNodeActivateDisks(node_name=pnode, instances=inames)
+    try:
+      ToStdout("Activating disks for instance(s) %s on node '%s'",
+               utils.CommaJoin(inames), pnode)
+      op_result = SubmitOpCode(op, opts=opts, cl=cl)
+    except errors.GenericError, err:
+      nret, msg = FormatError(err)
+      retcode |= nret
+      ToStderr("Error activating disks for instance(s) %s: %s",
+               utils.CommaJoin(inames), msg)
+      continue
+
+    for (iname, success, msg) in op_result:
+      if not success:
+        retcode = constants.EXIT_FAILURE
+        ToStderr("Error activating disks for instance %s: %s", iname, msg)
+
+  return retcode
+
+
 def VerifyDisks(opts, args):
   """Verify integrity of cluster disks.
 
@@ -748,17 +796,8 @@ def VerifyDisks(opts, args):
       retcode = constants.EXIT_FAILURE
       ToStdout("You need to fix these nodes first before fixing instances")
 
-    for iname in instances:
-      if iname in missing:
-        continue
-      op = opcodes.OpInstanceActivateDisks(instance_name=iname)
-      try:
-        ToStdout("Activating disks for instance '%s'", iname)
-        SubmitOpCode(op, opts=opts, cl=cl)
-      except errors.GenericError, err:
-        nret, msg = FormatError(err)
-        retcode |= nret
-        ToStderr("Error activating disks for instance %s: %s", iname, msg)
+    retcode |= _ActivateDisksByNode(opts, cl, [iname for iname in instances
+                                               if iname not in missing])
 
     if missing:
       for iname, ival in missing.iteritems():
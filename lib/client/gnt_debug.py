@@ -632,6 +632,54 @@ def ListLocks(opts, args): # pylint: disable=W0613
   return 0
 
 
+def DumpLockProfile(opts, args): # pylint: disable=W0613
+  """Writes lock profiling data as folded stacks.
+
+  Each line consists of the owner, the components of the lock name and the
+  time in microseconds, which is the format used by flame graph tools.
+
+  @param opts: the command line options selected by the user
+  @type args: list
+  @param args: should be an empty list
+  @rtype: int
+  @return: the desired exit code
+
+  """
+  if opts.hold:
+    column = 4
+  else:
+    column = 3
+
+  cl = GetClient()
+  response = cl.Query(constants.QR_LOCK, ["name", "owner_profile"], None)
+
+  profiling = False
+  stacks = {}
+
+  for ((_, name), (status, owners)) in response.data:
+    if status == constants.RS_UNAVAIL:
+      continue
+
+    profiling = True
+
+    if status != constants.RS_NORMAL:
+      continue
+
+    for owner in owners:
+      key = ";".join([owner[0]] + name.split("/"))
+      stacks[key] = stacks.get(key, 0) + int(owner[column] * 1000000)
+
+  if not profiling:
+    ToStderr("Lock profiling is not enabled in the master daemon")
+    return constants.EXIT_FAILURE
+
+  for key in utils.NiceSort(stacks.keys()):
+    if stacks[key]:
+      ToStdout("%s %s", key, stacks[key])
+
+  return constants.EXIT_SUCCESS
+
+
 commands = {
   "delay": (
     Delay, [ArgUnknown(min=1, max=1)],
@@ -706,6 +754,11 @@ commands = {
     ListLocks, ARGS_NONE,
     [NOHDR_OPT, SEP_OPT, FIELDS_OPT, INTERVAL_OPT, VERBOSE_OPT],
     "[--interval N]", "Show a list of locks in the master daemon"),
+  "lock-profile": (
+    DumpLockProfile, ARGS_NONE,
+    [cli_option("--hold", dest="hold", default=False, action="store_true",
+                help="Use the time locks were held instead of waited for")],
+    "[--hold]", "Write lock profiling data as folded stacks"),
   }
 
 #: dictionary with aliases for commands
@@ -131,12 +131,14 @@ def ListGroups(opts, args):
     "ndparams": (_FmtDict, False),
     }
 
-  cl = GetClient(query=True)
+  cl = GetListClient(opts)
 
   return GenericList(constants.QR_GROUP, desired_fields, args, None,
                      opts.separator, not opts.no_headers,
                      format_override=fmtoverride, verbose=opts.verbose,
-                     force_filter=opts.force_filter, cl=cl)
+                     force_filter=opts.force_filter, cl=cl,
+                     sort_by=opts.sort_by, limit=opts.limit, offset=opts.offset,
+                     count_only=opts.count_only)
 
 
 def ListGroupFields(opts, args):
@@ -344,7 +346,8 @@ commands = {
     "<group_name> <node>...", "Assign nodes to a group"),
   "list": (
     ListGroups, ARGS_MANY_GROUPS,
-    [NOHDR_OPT, SEP_OPT, FIELDS_OPT, VERBOSE_OPT, FORCE_FILTER_OPT],
+    [NOHDR_OPT, SEP_OPT, FIELDS_OPT, VERBOSE_OPT, FORCE_FILTER_OPT] +
+    QUERY_LIST_OPTS,
     "[<group_name>...]",
     "Lists the node groups in the cluster. The available fields can be shown"
     " using the \"list-fields\" command (see the man page for details)."
@@ -235,7 +235,9 @@ def ListInstances(opts, args):
   return GenericList(constants.QR_INSTANCE, selected_fields, args, opts.units,
                      opts.separator, not opts.no_headers,
                      format_override=fmtoverride, verbose=opts.verbose,
-                     force_filter=opts.force_filter)
+                     force_filter=opts.force_filter,
+                     sort_by=opts.sort_by, limit=opts.limit, offset=opts.offset,
+                     count_only=opts.count_only, max_age=opts.max_age)
 
 
 def ListInstanceFields(opts, args):
@@ -1553,7 +1555,7 @@ commands = {
   "list": (
     ListInstances, ARGS_MANY_INSTANCES,
     [NOHDR_OPT, SEP_OPT, USEUNITS_OPT, FIELDS_OPT, VERBOSE_OPT,
-     FORCE_FILTER_OPT],
+     FORCE_FILTER_OPT, MAX_AGE_OPT] + QUERY_LIST_OPTS,
     "[<instance>...]",
     "Lists the instances and their status. The available fields can be shown"
     " using the \"list-fields\" command (see the man page for details)."
@@ -40,12 +40,23 @@ from ganeti import constants
 from ganeti import errors
 from ganeti import utils
 from ganeti import cli
+from ganeti import compat
 from ganeti import qlang
 
 
 #: default list of fields for L{ListJobs}
 _LIST_DEF_FIELDS = ["id", "status", "summary"]
 
+#: fields only known to the job queue in the master daemon
+_JQUEUE_ONLY_FIELDS = compat.UniqueFrozenset([
+  "class",
+  "class_latency",
+  "class_lockwait",
+  "class_queued",
+  "class_running",
+  "class_workers",
+  ])
+
 #: map converting the job status contants to user-visible
 #: names
 _USER_JOB_STATUS = {
@@ -118,13 +129,18 @@ def ListJobs(opts, args):
 
   qfilter = qlang.MakeSimpleFilter("status", opts.status_filter)
 
-  cl = GetClient(query=True)
+  if _JQUEUE_ONLY_FIELDS.intersection(selected_fields):
+    cl = GetClient()
+  else:
+    cl = GetListClient(opts)
 
   return GenericList(constants.QR_JOB, selected_fields, args, None,
                      opts.separator, not opts.no_headers,
                      format_override=_JOB_LIST_FORMAT, verbose=opts.verbose,
                      force_filter=opts.force_filter, namefield="id",
-                     qfilter=qfilter, isnumeric=True, cl=cl)
+                     qfilter=qfilter, isnumeric=True, cl=cl,
+                     sort_by=opts.sort_by, limit=opts.limit, offset=opts.offset,
+                     count_only=opts.count_only)
 
 
 def ListJobFields(opts, args):
@@ -471,6 +487,121 @@ def WaitJob(opts, args):
   return retcode
 
 
+#: Execution phases shown by L{ProfileJobs}, in order
+_PROFILE_PHASES = [
+  (constants.OP_PHASE_LOCK, "Lock"),
+  (constants.OP_PHASE_PREREQ, "Prereq"),
+  (constants.OP_PHASE_HOOKS, "Hooks"),
+  (constants.OP_PHASE_EXEC, "Exec"),
+  (constants.OP_PHASE_RPC, "RPC"),
+  (constants.OP_PHASE_CONFIG, "Config"),
+  (constants.OP_PHASE_REPLICATION, "Replication"),
+  ]
+
+#: Number of jobs profiled by default
+_PROFILE_DEF_JOBS = 100
+
+
+def _AggregateProfile(rows):
+  """Aggregates the opcode timelines of jobs by opcode type.
+
+  @type rows: list
+  @param rows: Query result rows for the fields C{summary}, C{opstart},
+    C{opend} and C{optimeline}
+  @rtype: list of tuples; (string, int, float, dict)
+  @return: Opcode type, number of opcodes, total time and total time per
+    phase, sorted by total time in descending order
+
+  """
+  result = {}
+
+  for row in rows:
+    if compat.any(status != constants.RS_NORMAL for (status, _) in row):
+      continue
+
+    (summaries, starts, ends, timelines) = [value for (_, value) in row]
+
+    for (summary, start, end, timeline) in zip(summaries, starts, ends,
+                                               timelines):
+      if start is None or end is None:
+        # Opcode was never executed
+        continue
+
+      optype = summary.split("(", 1)[0]
+
+      try:
+        (count, total, phases) = result[optype]
+      except KeyError:
+        (count, total, phases) = (0, 0.0, dict.fromkeys(constants.OP_PHASES,
+                                                        0.0))
+
+      for (phase, _, duration) in timeline:
+        # Phases unknown to this version are kept, but not shown
+        phases[phase] = phases.get(phase, 0.0) + duration
+
+      result[optype] = (count + 1,
+                        total + utils.MergeTime(end) - utils.MergeTime(start),
+                        phases)
+
+  return sorted([(optype, count, total, phases)
+                 for (optype, (count, total, phases)) in result.items()],
+                key=lambda item: (-item[2], item[0]))
+
+
+def ProfileJobs(opts, args, cl=None, _stdout_fn=ToStdout):
+  """Shows where finished jobs spent their time, by opcode type.
+
+  @param opts: the command line options selected by the user
+  @type args: list
+  @param args: Job IDs, or empty for the most recent jobs
+  @rtype: int
+  @return: the desired exit code
+
+  """
+  if cl is None:
+    cl = GetClient()
+
+  qfilter = qlang.MakeSimpleFilter("status", constants.JOBS_FINALIZED)
+  if args:
+    qfilter = [qlang.OP_AND, qfilter,
+               qlang.MakeSimpleFilter("id", _ParseJobIds(args))]
+
+  if opts.limit is None:
+    limit = _PROFILE_DEF_JOBS
+  else:
+    limit = opts.limit
+
+  response = cl.Query(constants.QR_JOB,
+                      ["summary", "opstart", "opend", "optimeline"], qfilter,
+                      sort_by=["-id"], limit=limit)
+
+  fields = ["optype", "count", "total", "avg"] + \
+           [phase for (phase, _) in _PROFILE_PHASES]
+
+  if opts.no_headers:
+    headers = None
+  else:
+    headers = {
+      "optype": "OpCode",
+      "count": "Count",
+      "total": "Total",
+      "avg": "Average",
+      }
+    headers.update(_PROFILE_PHASES)
+
+  data = []
+  for (optype, count, total, phases) in _AggregateProfile(response.data):
+    data.append([optype, count, "%.3f" % total, "%.3f" % (total / count)] +
+                ["%.3f" % (phases[phase] / count)
+                 for (phase, _) in _PROFILE_PHASES])
+
+  for line in GenerateTable(separator=opts.separator, headers=headers,
+                            fields=fields, data=data, numfields=fields[1:]):
+    _stdout_fn(line)
+
+  return constants.EXIT_SUCCESS
+
+
 _PENDING_OPT = \
   cli_option("--pending", default=None,
              action="store_const", dest="status_filter",
@@ -525,7 +656,8 @@ commands = {
   "list": (
     ListJobs, [ArgJobId()],
     [NOHDR_OPT, SEP_OPT, FIELDS_OPT, VERBOSE_OPT, FORCE_FILTER_OPT,
-     _PENDING_OPT, _RUNNING_OPT, _ERROR_OPT, _FINISHED_OPT, _ARCHIVED_OPT],
+     _PENDING_OPT, _RUNNING_OPT, _ERROR_OPT, _FINISHED_OPT, _ARCHIVED_OPT] +
+    QUERY_LIST_OPTS,
     "[job_id ...]",
     "Lists the jobs and their status. The available fields can be shown"
     " using the \"list-fields\" command (see the man page for details)."
@@ -560,6 +692,12 @@ commands = {
   "watch": (
     WatchJob, [ArgJobId(min=1, max=1)], [],
     "<job-id>", "Follows a job and prints its output as it arrives"),
+  "profile": (
+    ProfileJobs, [ArgJobId()], [NOHDR_OPT, SEP_OPT, LIMIT_OPT],
+    "[--limit <N>] [<job-id> ...]",
+    "Shows the time finished jobs spent per execution phase, grouped by"
+    " opcode type (the %s most recent jobs unless limited or given)" %
+    _PROFILE_DEF_JOBS),
   "change-priority": (
     ChangePriority, [ArgJobId()],
     [PRIORITY_OPT, FORCE_OPT, _PENDING_OPT, _QUEUED_OPT, _WAITING_OPT],
@@ -180,11 +180,12 @@ def ListNetworks(opts, args):
     "tags": (",".join, False),
     }
 
-  cl = GetClient(query=True)
+  cl = GetListClient(opts)
   return GenericList(constants.QR_NETWORK, desired_fields, args, None,
                      opts.separator, not opts.no_headers,
                      verbose=opts.verbose, format_override=fmtoverride,
-                     cl=cl)
+                     cl=cl, sort_by=opts.sort_by, limit=opts.limit,
+                     offset=opts.offset, count_only=opts.count_only)
 
 
 def ListNetworkFields(opts, args):
@@ -330,7 +331,7 @@ commands = {
     "<network_name>", "Add a new IP network to the cluster"),
   "list": (
     ListNetworks, ARGS_MANY_NETWORKS,
-    [NOHDR_OPT, SEP_OPT, FIELDS_OPT, VERBOSE_OPT],
+    [NOHDR_OPT, SEP_OPT, FIELDS_OPT, VERBOSE_OPT] + QUERY_LIST_OPTS,
     "[<network_id>...]",
     "Lists the IP networks in the cluster. The available fields can be shown"
     " using the \"list-fields\" command (see the man page for details)."
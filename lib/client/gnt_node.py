@@ -311,12 +311,14 @@ def ListNodes(opts, args):
   fmtoverride = dict.fromkeys(["pinst_list", "sinst_list", "tags"],
                               (",".join, False))
 
-  cl = GetClient(query=True)
+  cl = GetListClient(opts)
 
   return GenericList(constants.QR_NODE, selected_fields, args, opts.units,
                      opts.separator, not opts.no_headers,
                      format_override=fmtoverride, verbose=opts.verbose,
-                     force_filter=opts.force_filter, cl=cl)
+                     force_filter=opts.force_filter, cl=cl,
+                     sort_by=opts.sort_by, limit=opts.limit, offset=opts.offset,
+                     count_only=opts.count_only, max_age=opts.max_age)
 
 
 def ListNodeFields(opts, args):
@@ -1115,7 +1117,7 @@ commands = {
   "list": (
     ListNodes, ARGS_MANY_NODES,
     [NOHDR_OPT, SEP_OPT, USEUNITS_OPT, FIELDS_OPT, VERBOSE_OPT,
-     FORCE_FILTER_OPT],
+     FORCE_FILTER_OPT, MAX_AGE_OPT] + QUERY_LIST_OPTS,
     "[nodes...]",
     "Lists the nodes in the cluster. The available fields can be shown using"
     " the \"list-fields\" command (see the man page for details)."
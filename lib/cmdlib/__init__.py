@@ -70,6 +70,7 @@ from ganeti.cmdlib.node import \
   LUNodePowercycle, \
   LUNodeEvacuate, \
   LUNodeMigrate, \
+  LUNodeActivateDisks, \
   LUNodeModifyStorage, \
   LUNodeQuery, \
   LUNodeQueryvols, \
@@ -44,7 +44,7 @@ from ganeti import utils
 
 from ganeti.cmdlib.base import QueryBase, NoHooksLU, LogicalUnit
 from ganeti.cmdlib.common import GetWantedNodes, ShareAll, CheckNodeOnline, \
-  ExpandNodeUuidAndName
+  ExpandNodeUuidAndName, CheckImportExportCompression
 from ganeti.cmdlib.instance_storage import StartInstanceDisks, \
   ShutdownInstanceDisks
 from ganeti.cmdlib.instance_utils import GetClusterDomainSecret, \
@@ -205,6 +205,8 @@ class LUBackupExport(LogicalUnit):
         raise errors.OpPrereqError("Missing destination X509 CA",
                                    errors.ECODE_INVAL)
 
+    CheckImportExportCompression(self.op.compress)
+
   def ExpandNames(self):
     self._ExpandAndLockInstance()
 
@@ -409,9 +411,13 @@ class LUBackupExport(LogicalUnit):
       feedback_fn("Activating disks for %s" % self.instance.name)
       StartInstanceDisks(self, self.instance, None)
 
+    bufsize = self.op.transfer_buffer_size
+
     try:
-      helper = masterd.instance.ExportInstanceHelper(self, feedback_fn,
-                                                     self.instance)
+      helper = \
+        masterd.instance.ExportInstanceHelper(self, feedback_fn, self.instance,
+                                              compress=self.op.compress,
+                                              buffer_size=bufsize)
 
       helper.CreateSnapshots()
       try:
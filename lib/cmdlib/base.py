@@ -491,14 +491,19 @@ class QueryBase(object):
   #: Field to sort by
   SORT_FIELD = "name"
 
-  def __init__(self, qfilter, fields, use_locking):
+  def __init__(self, qfilter, fields, use_locking, sort_by=None, limit=None,
+               offset=0, count_only=False, max_age=None):
     """Initializes this class.
 
     """
     self.use_locking = use_locking
+    self.max_age = max_age
+    self.limit = limit
+    self.offset = offset
+    self.count_only = count_only
 
     self.query = query.Query(self.FIELDS, fields, qfilter=qfilter,
-                             namefield=self.SORT_FIELD)
+                             namefield=self.SORT_FIELD, sort_by=sort_by)
     self.requested_data = self.query.RequestedData()
     self.names = self.query.RequestedNames()
 
@@ -563,7 +568,9 @@ class QueryBase(object):
 
     """
     return query.GetQueryResponse(self.query, self._GetQueryData(lu),
-                                  sort_by_name=self.sort_by_name)
+                                  sort_by_name=self.sort_by_name,
+                                  limit=self.limit, offset=self.offset,
+                                  count_only=self.count_only)
 
   def OldStyleQuery(self, lu):
     """Collect data and execute query.
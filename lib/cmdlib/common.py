@@ -1006,6 +1006,21 @@ def CheckInstanceState(lu, instance, req_states, msg=None):
                      " is down")
 
 
+def CheckImportExportCompression(compress):
+  """Checks the compression method requested for disk data transfers.
+
+  @type compress: string or None
+  @param compress: Compression method, C{None} for the default one
+  @raise errors.OpPrereqError: if the compression method is unknown
+
+  """
+  if compress is not None and compress not in constants.IEC_ALL:
+    raise errors.OpPrereqError("Invalid compression method '%s', must be one"
+                               " of %s" %
+                               (compress, utils.CommaJoin(constants.IEC_ALL)),
+                               errors.ECODE_INVAL)
+
+
 def CheckIAllocatorOrNode(lu, iallocator_slot, node_slot):
   """Check the sanity of iallocator and node arguments and use the
   cluster-wide iallocator if appropriate.
@@ -58,7 +58,8 @@ from ganeti.cmdlib.common import INSTANCE_DOWN, \
   IsExclusiveStorageEnabledNode, CheckHVParams, CheckOSParams, \
   AnnotateDiskParams, GetUpdatedParams, ExpandInstanceUuidAndName, \
   ComputeIPolicySpecViolation, CheckInstanceState, ExpandNodeUuidAndName, \
-  CheckDiskTemplateEnabled, IsValidDiskAccessModeCombination
+  CheckDiskTemplateEnabled, IsValidDiskAccessModeCombination, \
+  CheckImportExportCompression
 from ganeti.cmdlib.instance_storage import CreateDisks, \
   CheckNodesFreeDiskPerVG, WipeDisks, WipeOrCleanupDisks, WaitForSync, \
   IsExclusiveStorageEnabledNodeUuid, CreateSingleBlockDev, ComputeDisks, \
@@ -488,6 +489,8 @@ class LUInstanceCreate(LogicalUnit):
 
     _CheckOpportunisticLocking(self.op)
 
+    CheckImportExportCompression(self.op.compress)
+
     if self.op.mode == constants.INSTANCE_IMPORT:
       # On import force_variant must be True, because if we forced it at
       # initial install, our only chance when importing it back is that it
@@ -1464,12 +1467,15 @@ class LUInstanceCreate(LogicalUnit):
                                                None)
             transfers.append(dt)
 
+          bufsize = self.op.transfer_buffer_size
           import_result = \
             masterd.instance.TransferInstanceData(self, feedback_fn,
                                                   self.op.src_node_uuid,
                                                   self.pnode.uuid,
                                                   self.pnode.secondary_ip,
-                                                  iobj, transfers)
+                                                  iobj, transfers,
+                                                  compress=self.op.compress,
+                                                  buffer_size=bufsize)
           if not compat.all(import_result):
             self.LogWarning("Some disks for instance %s on node %s were not"
                             " imported successfully" % (self.op.instance_name,
@@ -1486,12 +1492,15 @@ class LUInstanceCreate(LogicalUnit):
           connect_timeout = (constants.RIE_CONNECT_TIMEOUT +
                              self.op.source_shutdown_timeout)
           timeouts = masterd.instance.ImportExportTimeouts(connect_timeout)
+          bufsize = self.op.transfer_buffer_size
 
           assert iobj.primary_node == self.pnode.uuid
           disk_results = \
             masterd.instance.RemoteImport(self, feedback_fn, iobj, self.pnode,
                                           self.source_x509_ca,
-                                          self._cds, timeouts)
+                                          self._cds, timeouts,
+                                          compress=self.op.compress,
+                                          buffer_size=bufsize)
           if not compat.all(disk_results):
             # TODO: Should the instance still be started, even if some disks
             # failed to import (valid for local imports, too)?
@@ -44,6 +44,7 @@ from ganeti.cmdlib.common import ShareAll, GetWantedInstances, \
   CheckInstanceNodeGroups, CheckInstancesNodeGroups, AnnotateDiskParams
 from ganeti.cmdlib.instance_operation import GetInstanceConsole
 from ganeti.cmdlib.instance_utils import NICListToTuple
+from ganeti.masterd import livedata
 
 import ganeti.masterd.instance
 
@@ -131,8 +132,11 @@ class InstanceQuery(QueryBase):
     # Gather data as requested
     if self.requested_data & set([query.IQ_LIVE, query.IQ_CONSOLE]):
       live_data = {}
-      node_data = lu.rpc.call_all_instances_info(node_uuids, hv_list,
-                                                 cluster.hvparams)
+      node_data = lu.context.livedata.Call(
+        livedata.KIND_INSTANCES, tuple(sorted(hv_list)), list(node_uuids),
+        self.max_age,
+        lambda uuids: lu.rpc.call_all_instances_info(uuids, hv_list,
+                                                     cluster.hvparams))
       for node_uuid in node_uuids:
         result = node_data[node_uuid]
         if result.offline:
@@ -1023,9 +1023,129 @@ def _CalcEta(time_taken, written, total_size):
   return (total_size - written) * avg_time
 
 
-def WipeDisks(lu, instance, disks=None):
+def _WaitForDiskWipes(lu, node_uuid, wipes, _sleep_fn):
+  """Waits for disk wipes running on a node to finish.
+
+  @type wipes: list of tuple of (number, string, number)
+  @param wipes: Disk index, name of the disk wipe and the amount of data to be
+    wiped in MiB for every disk
+  @raise errors.OpExecError: if a disk wipe failed or stopped making progress
+
+  """
+  node_name = lu.cfg.GetNodeName(node_uuid)
+  names = [name for (_, name, _) in wipes]
+
+  start_time = time.time()
+  last_output = start_time
+
+  # Number of polls after which a running wipe without progress is given up
+  max_stalled_polls = \
+    max(1, constants.WIPE_PROGRESS_TIMEOUT // constants.WIPE_POLL_INTERVAL)
+
+  # Last reported progress and number of polls since it changed, per disk
+  last_progress = [(None, 0)] * len(wipes)
+
+  while True:
+    _sleep_fn(constants.WIPE_POLL_INTERVAL)
+
+    result = lu.rpc.call_blockdev_wipe_status(node_uuid, names)
+    result.Raise("Could not get status of disk wipes on node '%s'" %
+                 node_name)
+
+    now = time.time()
+    done = True
+
+    for (pos, ((idx, _, _), status)) in enumerate(zip(wipes,
+                                                      result.payload)):
+      if status is None:
+        if now - start_time > constants.WIPE_START_TIMEOUT:
+          raise errors.OpExecError("Wiping disk %d did not start within %s"
+                                   " seconds" %
+                                   (idx, constants.WIPE_START_TIMEOUT))
+        done = False
+      elif status.exit_status is None:
+        (progress, stalled_polls) = last_progress[pos]
+        if status.progress_mbytes == progress:
+          stalled_polls += 1
+          if stalled_polls >= max_stalled_polls:
+            raise errors.OpExecError("Wiping disk %d made no progress for %s"
+                                     " seconds" %
+                                     (idx, constants.WIPE_PROGRESS_TIMEOUT))
+        else:
+          stalled_polls = 0
+        last_progress[pos] = (status.progress_mbytes, stalled_polls)
+        done = False
+      elif status.exit_status != constants.EXIT_SUCCESS:
+        raise errors.OpExecError("Could not wipe disk %d: %s" %
+                                 (idx, status.error_message))
+
+    if done:
+      break
+
+    if now - last_output >= 60:
+      for ((idx, _, size), status) in zip(wipes, result.payload):
+        if status is None or not status.progress_mbytes:
+          continue
+        if status.exit_status is None:
+          eta = _CalcEta(now - start_time, status.progress_mbytes, size)
+          lu.LogInfo(" - disk %s done: %.1f%% ETA: %s", idx,
+                     status.progress_mbytes / float(size) * 100,
+                     utils.FormatSeconds(eta))
+      last_output = now
+
+
+def _WipeDisksInChunks(lu, node_uuid, instance, disks):
+  """Wipes disks one chunk at a time using the C{blockdev_wipe} RPC.
+
+  Used for nodes running a version without support for wiping disks in the
+  background.
+
+  @type disks: list of tuple of (number, L{objects.Disk}, number)
+  @param disks: Disk details; tuple contains disk index, disk object and the
+    start offset
+
+  """
+  for (idx, device, offset) in disks:
+    # The wipe size is MIN_WIPE_CHUNK_PERCENT % of the instance disk but
+    # MAX_WIPE_CHUNK at max. Truncating to integer to avoid rounding errors.
+    wipe_chunk_size = \
+      int(min(constants.MAX_WIPE_CHUNK,
+              device.size / 100.0 * constants.MIN_WIPE_CHUNK_PERCENT))
+
+    size = device.size
+    last_output = 0
+    start_time = time.time()
+
+    logging.info("Wiping disk %d for instance %s using chunk size %s",
+                 idx, instance.name, wipe_chunk_size)
+
+    while offset < size:
+      wipe_size = min(wipe_chunk_size, size - offset)
+
+      logging.debug("Wiping disk %d, offset %s, chunk %s",
+                    idx, offset, wipe_size)
+
+      result = lu.rpc.call_blockdev_wipe(node_uuid, (device, instance),
+                                         offset, wipe_size)
+      result.Raise("Could not wipe disk %d at offset %d for size %d" %
+                   (idx, offset, wipe_size))
+
+      now = time.time()
+      offset += wipe_size
+      if now - last_output >= 60:
+        eta = _CalcEta(now - start_time, offset, size)
+        lu.LogInfo(" - disk %s done: %.1f%% ETA: %s", idx,
+                   offset / float(size) * 100, utils.FormatSeconds(eta))
+        last_output = now
+
+
+def WipeDisks(lu, instance, disks=None, _sleep_fn=time.sleep):
   """Wipes instance disks.
 
+  All disks are wiped in parallel by the primary node, which is polled for
+  their progress. Nodes not supporting this wipe the disks one chunk at a
+  time.
+
   @type lu: L{LogicalUnit}
   @param lu: the logical unit on whose behalf we execute
   @type instance: L{objects.Instance}
@@ -1057,47 +1177,44 @@ def WipeDisks(lu, instance, disks=None):
 
   try:
     for (idx, device, offset) in disks:
-      # The wipe size is MIN_WIPE_CHUNK_PERCENT % of the instance disk but
-      # MAX_WIPE_CHUNK at max. Truncating to integer to avoid rounding errors.
-      wipe_chunk_size = \
-        int(min(constants.MAX_WIPE_CHUNK,
-                device.size / 100.0 * constants.MIN_WIPE_CHUNK_PERCENT))
-
-      size = device.size
-      last_output = 0
-      start_time = time.time()
-
       if offset == 0:
         info_text = ""
       else:
         info_text = (" (from %s to %s)" %
                      (utils.FormatUnit(offset, "h"),
-                      utils.FormatUnit(size, "h")))
+                      utils.FormatUnit(device.size, "h")))
 
       lu.LogInfo("* Wiping disk %s%s", idx, info_text)
 
-      logging.info("Wiping disk %d for instance %s on node %s using"
-                   " chunk size %s", idx, instance.name, node_name,
-                   wipe_chunk_size)
-
-      while offset < size:
-        wipe_size = min(wipe_chunk_size, size - offset)
-
-        logging.debug("Wiping disk %d, offset %s, chunk %s",
-                      idx, offset, wipe_size)
+    logging.info("Wiping disks %s for instance %s on node %s",
+                 utils.CommaJoin(idx for (idx, _, _) in disks), instance.name,
+                 node_name)
+
+    result = lu.rpc.call_blockdev_wipe_start(node_uuid,
+                                             (map(compat.snd, disks),
+                                              instance),
+                                             [offset
+                                              for (_, _, offset) in disks])
+    if result.unknown_call:
+      logging.info("Node '%s' can't wipe disks in the background, wiping"
+                   " them in chunks", node_name)
+      _WipeDisksInChunks(lu, node_uuid, instance, disks)
+      return
 
-        result = lu.rpc.call_blockdev_wipe(node_uuid, (device, instance),
-                                           offset, wipe_size)
-        result.Raise("Could not wipe disk %d at offset %d for size %d" %
-                     (idx, offset, wipe_size))
+    result.Raise("Could not start wiping disks on node '%s'" % node_name)
 
-        now = time.time()
-        offset += wipe_size
-        if now - last_output >= 60:
-          eta = _CalcEta(now - start_time, offset, size)
-          lu.LogInfo(" - done: %.1f%% ETA: %s",
-                     offset / float(size) * 100, utils.FormatSeconds(eta))
-          last_output = now
+    names = result.payload
+    try:
+      _WaitForDiskWipes(lu, node_uuid,
+                        [(idx, name, device.size - offset)
+                         for ((idx, device, offset), name) in zip(disks,
+                                                                  names)],
+                        _sleep_fn)
+    finally:
+      result = lu.rpc.call_blockdev_wipe_cleanup(node_uuid, names)
+      if result.fail_msg:
+        lu.LogWarning("Failed to clean up after wiping disks on node '%s': %s",
+                      node_name, result.fail_msg)
   finally:
     logging.info("Resuming synchronization of disks for instance '%s'",
                  instance.name)
@@ -1273,18 +1390,105 @@ def _SafeShutdownInstanceDisks(lu, instance, disks=None):
   ShutdownInstanceDisks(lu, instance, disks=disks)
 
 
-def AssembleInstanceDisks(lu, instance, disks=None, ignore_secondaries=False,
-                          ignore_size=False):
-  """Prepare the block devices for an instance.
+def _CallBlockdevAssembleSingle(lu, node_uuid, instance_disks, as_primary):
+  """Assembles disks of several instances on a node one disk at a time.
 
-  This sets up the block devices on all nodes.
+  Used for nodes running a version without support for assembling several
+  disks at once. Takes the same arguments and returns the same result as
+  L{_CallBlockdevAssembleMulti}.
+
+  """
+  offline = False
+  results = []
+  for (instance, disks) in instance_disks:
+    disk_results = []
+    for (idx, _, node_disk) in disks:
+      result = lu.rpc.call_blockdev_assemble(node_uuid, (node_disk, instance),
+                                             instance, as_primary, idx)
+      offline = offline or result.offline
+      msg = result.fail_msg
+      if msg:
+        disk_results.append((msg, None))
+      else:
+        disk_results.append((None, result.payload))
+    results.append(disk_results)
+
+  return (offline, results)
+
+
+def _CallBlockdevAssembleMulti(lu, node_uuid, instance_disks, as_primary):
+  """Assembles disks of several instances on a node with a single RPC call.
+
+  @type node_uuid: string
+  @param node_uuid: the node to assemble the disks on
+  @type instance_disks: list of tuples; (L{objects.Instance}, list of tuples)
+  @param instance_disks: the instances and for each of them the index,
+    instance disk and node disk of every disk to assemble
+  @type as_primary: boolean
+  @param as_primary: whether to assemble the disks in primary mode
+  @rtype: tuple; (bool, list of lists of tuples)
+  @return: whether the node is offline and for every instance and disk an
+    error message or C{None} and the payload of L{backend.BlockdevAssemble}
+
+  """
+  node_name = lu.cfg.GetNodeName(node_uuid)
+
+  result = lu.rpc.call_blockdev_assemble_multi(
+             node_uuid,
+             [(instance, [node_disk for (_, _, node_disk) in disks],
+               [idx for (idx, _, _) in disks])
+              for (instance, disks) in instance_disks],
+             as_primary)
+  if result.unknown_call:
+    logging.info("Node '%s' can't assemble several disks at once, assembling"
+                 " them one by one", node_name)
+    return _CallBlockdevAssembleSingle(lu, node_uuid, instance_disks,
+                                       as_primary)
+
+  msg = result.fail_msg
+  if not msg:
+    if len(result.payload) != len(instance_disks):
+      msg = ("Node returned results for %s instances instead of %s" %
+             (len(result.payload), len(instance_disks)))
+    else:
+      for ((instance, disks), inst_result) in zip(instance_disks,
+                                                  result.payload):
+        if len(inst_result) != len(disks):
+          msg = ("Node returned %s results for %s disks of instance %s" %
+                 (len(inst_result), len(disks), instance.name))
+          break
+  if msg:
+    return (result.offline,
+            [[(msg, None)] * len(disks) for (_, disks) in instance_disks])
+
+  results = []
+  for ((instance, disks), inst_result) in zip(instance_disks, result.payload):
+    disk_results = []
+    for ((_, inst_disk, _), (status, payload, timings)) in zip(disks,
+                                                               inst_result):
+      logging.debug("Assembling disk %s of instance %s on node %s took: %s",
+                    inst_disk.iv_name, instance.name, node_name, timings)
+      if status:
+        disk_results.append((None, payload))
+      else:
+        disk_results.append((payload, None))
+    results.append(disk_results)
+
+  return (result.offline, results)
+
+
+def AssembleDisksOfInstances(lu, instance_disks, ignore_secondaries=False,
+                             ignore_size=False):
+  """Prepare the block devices of several instances.
+
+  The disks are assembled with one RPC call per node and pass, independent
+  of the number of instances; the nodes assemble them in parallel.
 
   @type lu: L{LogicalUnit}
   @param lu: the logical unit on whose behalf we execute
-  @type instance: L{objects.Instance}
-  @param instance: the instance for whose disks we assemble
-  @type disks: list of L{objects.Disk} or None
-  @param disks: which disks to assemble (or all, if None)
+  @type instance_disks: list of tuples; (L{objects.Instance}, list)
+  @param instance_disks: the instances and the disks of each of them to
+      assemble, as returned by L{ExpandCheckDisks}
   @type ignore_secondaries: boolean
   @param ignore_secondaries: if true, errors on secondary nodes
       won't result in an error return from the function
@@ -1292,19 +1496,13 @@ def AssembleInstanceDisks(lu, instance, disks=None, ignore_secondaries=False,
   @param ignore_size: if true, the current known size of the disk
       will not be used during the disk activation, useful for cases
       when the size is wrong
-  @return: False if the operation failed, otherwise a list of
-      (host, instance_visible_name, node_visible_name)
-      with the mapping from node devices to instance devices
+  @rtype: list of tuples; (boolean, list)
+  @return: for every instance whether the operation succeeded and a list
+      of (host, instance_visible_name, node_visible_name) with the mapping
+      from node devices to instance devices
 
   """
-  device_info = []
-  disks_ok = True
-
-  if disks is None:
-    # only mark instance disks as active if all disks are affected
-    lu.cfg.MarkInstanceDisksActive(instance.uuid)
-
-  disks = ExpandCheckDisks(instance, disks)
+  disks_ok = [True] * len(instance_disks)
 
   # With the two passes mechanism we try to reduce the window of
   # opportunity for the race condition of switching DRBD to primary
@@ -1315,51 +1513,111 @@ def AssembleInstanceDisks(lu, instance, disks=None, ignore_secondaries=False,
   # into any other network-connected state (Connected, SyncTarget,
   # SyncSource, etc.)
 
+  # node UUID -> instance position -> list of (idx, inst_disk, node_disk)
+  node_disks = {}
+  for (pos, (instance, disks)) in enumerate(instance_disks):
+    for idx, inst_disk in enumerate(disks):
+      for node_uuid, node_disk in inst_disk.ComputeNodeTree(
+                                    instance.primary_node):
+        if ignore_size:
+          node_disk = node_disk.Copy()
+          node_disk.UnsetSize()
+        node_disks.setdefault(node_uuid, {}).setdefault(pos, []) \
+          .append((idx, inst_disk, node_disk))
+
+  def _Call(node_uuid, positions, as_primary):
+    (offline, results) = \
+      _CallBlockdevAssembleMulti(lu, node_uuid,
+                                 [(instance_disks[pos][0],
+                                   node_disks[node_uuid][pos])
+                                  for pos in positions],
+                                 as_primary)
+    return [(pos, offline, disk, msg, payload)
+            for (pos, disk_results) in zip(positions, results)
+            for (disk, (msg, payload)) in zip(node_disks[node_uuid][pos],
+                                              disk_results)]
+
   # 1st pass, assemble on all nodes in secondary mode
-  for idx, inst_disk in enumerate(disks):
-    for node_uuid, node_disk in inst_disk.ComputeNodeTree(
-                                  instance.primary_node):
-      if ignore_size:
-        node_disk = node_disk.Copy()
-        node_disk.UnsetSize()
-      result = lu.rpc.call_blockdev_assemble(node_uuid, (node_disk, instance),
-                                             instance, False, idx)
-      msg = result.fail_msg
+  for node_uuid in utils.NiceSort(node_disks.keys()):
+    for (pos, offline, (_, inst_disk, _), msg, _) in \
+        _Call(node_uuid, sorted(node_disks[node_uuid].keys()), False):
       if msg:
+        instance = instance_disks[pos][0]
         is_offline_secondary = (node_uuid in instance.secondary_nodes and
-                                result.offline)
-        lu.LogWarning("Could not prepare block device %s on node %s"
-                      " (is_primary=False, pass=1): %s",
-                      inst_disk.iv_name, lu.cfg.GetNodeName(node_uuid), msg)
+                                offline)
+        lu.LogWarning("Could not prepare block device %s of instance %s on"
+                      " node %s (is_primary=False, pass=1): %s",
+                      inst_disk.iv_name, instance.name,
+                      lu.cfg.GetNodeName(node_uuid), msg)
         if not (ignore_secondaries or is_offline_secondary):
-          disks_ok = False
+          disks_ok[pos] = False
 
   # FIXME: race condition on drbd migration to primary
 
-  # 2nd pass, do only the primary node
-  for idx, inst_disk in enumerate(disks):
-    dev_path = None
+  # 2nd pass, do only the primary nodes
+  primaries = {}
+  for (pos, (instance, _)) in enumerate(instance_disks):
+    if pos in node_disks.get(instance.primary_node, {}):
+      primaries.setdefault(instance.primary_node, []).append(pos)
 
-    for node_uuid, node_disk in inst_disk.ComputeNodeTree(
-                                  instance.primary_node):
-      if node_uuid != instance.primary_node:
-        continue
-      if ignore_size:
-        node_disk = node_disk.Copy()
-        node_disk.UnsetSize()
-      result = lu.rpc.call_blockdev_assemble(node_uuid, (node_disk, instance),
-                                             instance, True, idx)
-      msg = result.fail_msg
+  dev_paths = {}
+  for node_uuid in utils.NiceSort(primaries.keys()):
+    for (pos, _, (idx, inst_disk, _), msg, payload) in \
+        _Call(node_uuid, primaries[node_uuid], True):
       if msg:
-        lu.LogWarning("Could not prepare block device %s on node %s"
-                      " (is_primary=True, pass=2): %s",
-                      inst_disk.iv_name, lu.cfg.GetNodeName(node_uuid), msg)
-        disks_ok = False
+        lu.LogWarning("Could not prepare block device %s of instance %s on"
+                      " node %s (is_primary=True, pass=2): %s",
+                      inst_disk.iv_name, instance_disks[pos][0].name,
+                      lu.cfg.GetNodeName(node_uuid), msg)
+        disks_ok[pos] = False
       else:
-        dev_path, _, __ = result.payload
+        dev_paths[(pos, idx)], _, __ = payload
+
+  result = []
+  for (pos, (instance, disks)) in enumerate(instance_disks):
+    primary_name = lu.cfg.GetNodeName(instance.primary_node)
+    device_info = [(primary_name, inst_disk.iv_name,
+                    dev_paths.get((pos, idx), None))
+                   for idx, inst_disk in enumerate(disks)]
+    result.append((disks_ok[pos], device_info))
+
+  return result
+
+
+def AssembleInstanceDisks(lu, instance, disks=None, ignore_secondaries=False,
+                          ignore_size=False):
+  """Prepare the block devices for an instance.
+
+  This sets up the block devices on all nodes.
+
+  @type lu: L{LogicalUnit}
+  @param lu: the logical unit on whose behalf we execute
+  @type instance: L{objects.Instance}
+  @param instance: the instance for whose disks we assemble
+  @type disks: list of L{objects.Disk} or None
+  @param disks: which disks to assemble (or all, if None)
+  @type ignore_secondaries: boolean
+  @param ignore_secondaries: if true, errors on secondary nodes
+      won't result in an error return from the function
+  @type ignore_size: boolean
+  @param ignore_size: if true, the current known size of the disk
+      will not be used during the disk activation, useful for cases
+      when the size is wrong
+  @return: False if the operation failed, otherwise a list of
+      (host, instance_visible_name, node_visible_name)
+      with the mapping from node devices to instance devices
+
+  """
+  if disks is None:
+    # only mark instance disks as active if all disks are affected
+    lu.cfg.MarkInstanceDisksActive(instance.uuid)
+
+  disks = ExpandCheckDisks(instance, disks)
 
-    device_info.append((lu.cfg.GetNodeName(instance.primary_node),
-                        inst_disk.iv_name, dev_path))
+  ((disks_ok, device_info), ) = \
+    AssembleDisksOfInstances(lu, [(instance, disks)],
+                             ignore_secondaries=ignore_secondaries,
+                             ignore_size=ignore_size)
 
   if not disks_ok:
     lu.cfg.MarkInstanceDisksInactive(instance.uuid)
@@ -44,6 +44,7 @@ from ganeti import query
 from ganeti import rpc
 from ganeti import utils
 from ganeti.masterd import iallocator
+from ganeti.masterd import livedata
 
 from ganeti.cmdlib.base import LogicalUnit, NoHooksLU, QueryBase, \
   ResultWithJobs
@@ -54,7 +55,10 @@ from ganeti.cmdlib.common import CheckParamsNotGlobal, \
   CheckInstanceState, INSTANCE_DOWN, GetUpdatedParams, \
   AdjustCandidatePool, CheckIAllocatorOrNode, LoadNodeEvacResult, \
   GetWantedNodes, MapInstanceLvsToNodes, RunPostHook, \
-  FindFaultyInstanceDisks, CheckStorageTypeEnabled
+  FindFaultyInstanceDisks, CheckStorageTypeEnabled, CheckNodeOnline, \
+  GetWantedInstances
+from ganeti.cmdlib.instance_storage import AssembleDisksOfInstances, \
+  ExpandCheckDisks
 
 
 def _DecideSelfPromotion(lu, exceptions=None):
@@ -1128,6 +1132,120 @@ def _GetStorageTypeArgs(cfg, storage_type):
   return []
 
 
+class LUNodeActivateDisks(NoHooksLU):
+  """Activates the disks of the instances using a node.
+
+  """
+  REQ_BGL = False
+
+  def ExpandNames(self):
+    (self.op.node_uuid, self.op.node_name) = \
+      ExpandNodeUuidAndName(self.cfg, self.op.node_uuid, self.op.node_name)
+
+    if self.op.instances:
+      (_, self.wanted_names) = GetWantedInstances(self, self.op.instances)
+    else:
+      self.wanted_names = None
+
+    self.needed_locks = {
+      locking.LEVEL_INSTANCE: [],
+      locking.LEVEL_NODE: [],
+      }
+    self.recalculate_locks[locking.LEVEL_NODE] = constants.LOCKS_REPLACE
+
+  def DeclareLocks(self, level):
+    if level == locking.LEVEL_INSTANCE:
+      if self.wanted_names is None:
+        # Lock instances optimistically, needs verification once the locks
+        # have been acquired
+        self.needed_locks[locking.LEVEL_INSTANCE] = \
+          set(i.name for i in _GetNodeInstances(self.cfg, self.op.node_uuid))
+      else:
+        self.needed_locks[locking.LEVEL_INSTANCE] = self.wanted_names
+
+    elif level == locking.LEVEL_NODE:
+      self._LockInstancesNodes()
+
+  def CheckPrereq(self):
+    """Check prerequisites.
+
+    This checks that the node is online. Instances which no longer use the
+    node, e.g. because they were moved while waiting for locks, are skipped.
+
+    """
+    CheckNodeOnline(self, self.op.node_uuid)
+
+    owned_instance_names = self.owned_locks(locking.LEVEL_INSTANCE)
+
+    if self.wanted_names is None:
+      instances = _GetNodeInstances(self.cfg, self.op.node_uuid)
+
+      unlocked_names = set(i.name for i in instances) - owned_instance_names
+      if unlocked_names:
+        self.LogWarning("Skipping instance(s) added to node '%s' after locks"
+                        " were acquired: %s", self.op.node_name,
+                        utils.CommaJoin(utils.NiceSort(unlocked_names)))
+
+      # Only re-activate disks which are supposed to be active
+      instances = [i for i in instances
+                   if i.name in owned_instance_names and i.disks_active]
+    else:
+      assert owned_instance_names == set(self.wanted_names)
+
+      instances = []
+      for name in self.wanted_names:
+        inst = self.cfg.GetInstanceInfoByName(name)
+        if inst is None:
+          self.LogWarning("Skipping instance '%s', it no longer exists", name)
+        elif self.op.node_uuid not in inst.all_nodes:
+          self.LogWarning("Skipping instance '%s', it doesn't use node '%s'",
+                          name, self.op.node_name)
+        else:
+          instances.append(inst)
+
+    self.instances = sorted(instances, key=operator.attrgetter("name"))
+
+  def Exec(self, feedback_fn):
+    """Activate the disks.
+
+    """
+    results = {}
+    instance_disks = []
+
+    for inst in self.instances:
+      pnode = self.cfg.GetNodeInfo(inst.primary_node)
+      if pnode.offline:
+        msg = "Primary node '%s' is offline" % pnode.name
+        self.LogWarning("Not activating disks of instance '%s': %s",
+                        inst.name, msg)
+        results[inst.name] = (False, msg)
+        continue
+
+      # all disks are affected, mark them as active like
+      # L{AssembleInstanceDisks} does
+      self.cfg.MarkInstanceDisksActive(inst.uuid)
+      instance_disks.append((inst, ExpandCheckDisks(inst, None)))
+
+    if instance_disks:
+      feedback_fn("Activating disks of %s instance(s) using node %s" %
+                  (len(instance_disks), self.op.node_name))
+
+      for ((inst, _), (disks_ok, _)) in \
+          zip(instance_disks,
+              AssembleDisksOfInstances(self, instance_disks,
+                                       ignore_size=self.op.ignore_size)):
+        if disks_ok:
+          results[inst.name] = (True, "")
+        else:
+          self.cfg.MarkInstanceDisksInactive(inst.uuid)
+          results[inst.name] = (False, "Cannot activate block devices")
+    else:
+      feedback_fn("No instance disks to activate on node %s" %
+                  self.op.node_name)
+
+    return [(inst.name, ) + results[inst.name] for inst in self.instances]
+
+
 class LUNodeModifyStorage(NoHooksLU):
   """Logical unit for modifying a storage volume on a node.
 
@@ -1221,8 +1339,10 @@ class NodeQuery(QueryBase):
       default_hypervisor = lu.cfg.GetHypervisorType()
       hvparams = lu.cfg.GetClusterInfo().hvparams[default_hypervisor]
       hvspecs = [(default_hypervisor, hvparams)]
-      node_data = lu.rpc.call_node_info(toquery_node_uuids, storage_units,
-                                        hvspecs)
+      node_data = lu.context.livedata.Call(
+        livedata.KIND_NODE, (default_template, default_hypervisor),
+        toquery_node_uuids, self.max_age,
+        lambda uuids: lu.rpc.call_node_info(uuids, storage_units, hvspecs))
       live_data = dict(
           (uuid, rpc.MakeLegacyNodeInfo(nresult.payload, default_template))
           for (uuid, nresult) in node_data.items()
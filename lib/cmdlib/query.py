@@ -82,7 +82,10 @@ class LUQuery(NoHooksLU):
   def CheckArguments(self):
     qcls = _GetQueryImplementation(self.op.what)
 
-    self.impl = qcls(self.op.qfilter, self.op.fields, self.op.use_locking)
+    self.impl = qcls(self.op.qfilter, self.op.fields, self.op.use_locking,
+                     sort_by=self.op.sort_by, limit=self.op.limit,
+                     offset=self.op.offset, count_only=self.op.count_only,
+                     max_age=self.op.max_age)
 
   def ExpandNames(self):
     self.impl.ExpandNames(self)
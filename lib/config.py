@@ -56,12 +56,14 @@ from ganeti import utils
 from ganeti import constants
 from ganeti import rpc
 from ganeti import objects
+from ganeti import optimeline
 from ganeti import serializer
 from ganeti import uidpool
 from ganeti import netutils
 from ganeti import runtime
 from ganeti import pathutils
 from ganeti import network
+from ganeti import config_delta
 
 
 _config_lock = locking.SharedLock("ConfigWriter")
@@ -69,6 +71,10 @@ _config_lock = locking.SharedLock("ConfigWriter")
 # job id used for resource management at config upgrade time
 _UPGRADE_CONFIG_JID = "jid-cfg-upgrade"
 
+#: Number of consecutive configuration deltas after which the whole
+#: configuration is distributed again
+_MAX_CONFIG_DELTAS = 100
+
 
 def _ValidateConfig(data):
   """Verifies that a configuration dict looks valid.
@@ -177,6 +183,243 @@ def _CheckInstanceDiskIvNames(disks):
   return result
 
 
+def _GetDRBDMinors(disks):
+  """Returns the DRBD minors used by a list of disks.
+
+  @type disks: list of L{objects.Disk}
+  @param disks: List of disks, children are searched recursively
+  @rtype: list of tuples; (string, int)
+  @return: List of (node UUID, minor) pairs
+
+  """
+  result = []
+
+  for disk in disks:
+    if disk.dev_type == constants.DT_DRBD8 and len(disk.logical_id) >= 5:
+      (node_a, node_b, _, minor_a, minor_b) = disk.logical_id[:5]
+      result.extend([(node_a, minor_a), (node_b, minor_b)])
+    if disk.children:
+      result.extend(_GetDRBDMinors(disk.children))
+
+  return result
+
+
+def _ContainsObject(container, obj):
+  """Checks whether a configuration container contains an object.
+
+  This is equivalent to C{obj in container.values()}, but only compares the
+  object to the one stored under its UUID.
+
+  """
+  current = container.get(obj.uuid)
+  return current is obj or (current is not None and current == obj)
+
+
+def _AddToIndex(index, key, value):
+  """Adds a value to the set stored for a key.
+
+  """
+  index.setdefault(key, set()).add(value)
+
+
+def _RemoveFromIndex(index, key, value):
+  """Removes a value from the set stored for a key.
+
+  Empty sets are removed, so that indexes only contain used keys.
+
+  """
+  values = index.get(key)
+  if values is not None:
+    values.discard(value)
+    if not values:
+      del index[key]
+
+
+def _RemoveName(index, name, uuid):
+  """Removes a name from a name index if it refers to the given UUID.
+
+  """
+  if index.get(name) == uuid:
+    del index[name]
+
+
+class _ConfigIndex(object):
+  """Lookup indexes over the configuration objects.
+
+  The indexes are updated by L{ConfigWriter} whenever it modifies an object
+  and are rebuilt after loading the configuration.
+
+  @ivar node_names: node name to node UUID
+  @ivar instance_names: instance name to instance UUID
+  @ivar group_names: node group name to node group UUID
+  @ivar network_names: network name to network UUID
+  @ivar node_primary: node UUID to set of UUIDs of the instances having the
+    node as primary node
+  @ivar node_secondary: node UUID to set of UUIDs of the instances having the
+    node as secondary node
+  @ivar group_nodes: node group UUID to set of UUIDs of the nodes in the group
+  @ivar drbd_minors: node UUID to dictionary of DRBD minor to list of UUIDs of
+    the instances using it (more than one entry means the minor is used twice)
+
+  """
+  _INDEXES = [
+    "node_names",
+    "instance_names",
+    "group_names",
+    "network_names",
+    "node_primary",
+    "node_secondary",
+    "group_nodes",
+    "drbd_minors",
+    ]
+
+  def __init__(self, config_data):
+    """Initializes this class and indexes all objects.
+
+    @type config_data: L{objects.ConfigData}
+    @param config_data: Configuration to index
+
+    """
+    self.node_names = {}
+    self.instance_names = {}
+    self.group_names = {}
+    self.network_names = {}
+    self.node_primary = {}
+    self.node_secondary = {}
+    self.group_nodes = {}
+    self.drbd_minors = {}
+
+    # Indexed values per object, needed to remove the object's old entries
+    self._node_keys = {}
+    self._instance_keys = {}
+    self._group_keys = {}
+    self._network_keys = {}
+
+    for node in config_data.nodes.values():
+      self.UpdateNode(node)
+    for instance in config_data.instances.values():
+      self.UpdateInstance(instance)
+    for group in config_data.nodegroups.values():
+      self.UpdateGroup(group)
+    for net in config_data.networks.values():
+      self.UpdateNetwork(net)
+
+  def UpdateNode(self, node):
+    """Adds or updates a node.
+
+    """
+    self.RemoveNode(node.uuid)
+
+    self._node_keys[node.uuid] = (node.name, node.group)
+    self.node_names[node.name] = node.uuid
+    _AddToIndex(self.group_nodes, node.group, node.uuid)
+
+  def RemoveNode(self, node_uuid):
+    """Removes a node.
+
+    """
+    keys = self._node_keys.pop(node_uuid, None)
+    if keys is not None:
+      (name, group) = keys
+      _RemoveName(self.node_names, name, node_uuid)
+      _RemoveFromIndex(self.group_nodes, group, node_uuid)
+
+  def UpdateInstance(self, instance):
+    """Adds or updates an instance.
+
+    """
+    self.RemoveInstance(instance.uuid)
+
+    secondary_nodes = instance.secondary_nodes
+    minors = _GetDRBDMinors(instance.disks)
+
+    self._instance_keys[instance.uuid] = \
+      (instance.name, instance.primary_node, secondary_nodes, minors)
+    self.instance_names[instance.name] = instance.uuid
+    _AddToIndex(self.node_primary, instance.primary_node, instance.uuid)
+    for node_uuid in secondary_nodes:
+      _AddToIndex(self.node_secondary, node_uuid, instance.uuid)
+    for (node_uuid, minor) in minors:
+      self.drbd_minors.setdefault(node_uuid, {}) \
+        .setdefault(minor, []).append(instance.uuid)
+
+  def RemoveInstance(self, inst_uuid):
+    """Removes an instance.
+
+    """
+    keys = self._instance_keys.pop(inst_uuid, None)
+    if keys is None:
+      return
+
+    (name, primary_node, secondary_nodes, minors) = keys
+    _RemoveName(self.instance_names, name, inst_uuid)
+    _RemoveFromIndex(self.node_primary, primary_node, inst_uuid)
+    for node_uuid in secondary_nodes:
+      _RemoveFromIndex(self.node_secondary, node_uuid, inst_uuid)
+    for (node_uuid, minor) in minors:
+      node_minors = self.drbd_minors[node_uuid]
+      node_minors[minor].remove(inst_uuid)
+      if not node_minors[minor]:
+        del node_minors[minor]
+      if not node_minors:
+        del self.drbd_minors[node_uuid]
+
+  def UpdateGroup(self, group):
+    """Adds or updates a node group.
+
+    """
+    self.RemoveGroup(group.uuid)
+
+    self._group_keys[group.uuid] = group.name
+    self.group_names[group.name] = group.uuid
+
+  def RemoveGroup(self, group_uuid):
+    """Removes a node group.
+
+    """
+    name = self._group_keys.pop(group_uuid, None)
+    if name is not None:
+      _RemoveName(self.group_names, name, group_uuid)
+
+  def UpdateNetwork(self, net):
+    """Adds or updates a network.
+
+    """
+    self.RemoveNetwork(net.uuid)
+
+    self._network_keys[net.uuid] = net.name
+    self.network_names[net.name] = net.uuid
+
+  def RemoveNetwork(self, net_uuid):
+    """Removes a network.
+
+    """
+    name = self._network_keys.pop(net_uuid, None)
+    if name is not None:
+      _RemoveName(self.network_names, name, net_uuid)
+
+  def Compare(self, other):
+    """Compares these indexes with another set of indexes.
+
+    The order of instances sharing a DRBD minor is not significant.
+
+    @type other: L{_ConfigIndex}
+    @rtype: list of strings
+    @return: Names of the indexes which differ
+
+    """
+    def _Normalize(name, index):
+      if name == "drbd_minors":
+        return dict((node_uuid, dict((minor, sorted(inst_uuids))
+                                     for (minor, inst_uuids) in minors.items()))
+                    for (node_uuid, minors) in index.items())
+      return index
+
+    return [name for name in self._INDEXES
+            if (_Normalize(name, getattr(self, name)) !=
+                _Normalize(name, getattr(other, name)))]
+
+
 class ConfigWriter(object):
   """The interface to the cluster configuration.
 
@@ -211,6 +454,10 @@ class ConfigWriter(object):
     self._my_hostname = netutils.Hostname.GetSysName()
     self._last_cluster_serial = -1
     self._cfg_id = None
+    self._cfg_parts = None
+    self._cfg_node_serials = {}
+    self._cfg_delta_count = 0
+    self._index = None
     self._context = None
     self._OpenConfig(accept_foreign)
 
@@ -589,6 +836,37 @@ class ConfigWriter(object):
         result.extend(self._CheckDiskIDs(child, l_ids))
     return result
 
+  def _UnlockedGetIndex(self):
+    """Returns the lookup indexes, building them if necessary.
+
+    @rtype: L{_ConfigIndex}
+
+    """
+    if self._index is None:
+      self._index = _ConfigIndex(self._config_data)
+
+    return self._index
+
+  def _UnlockedVerifyIndex(self):
+    """Verifies the lookup indexes against the configuration data.
+
+    Outdated indexes are dropped and rebuilt on their next use.
+
+    @rtype: list
+    @return: a list of error messages; a non-empty list signifies
+        inconsistent indexes
+
+    """
+    if self._index is None:
+      return []
+
+    result = ["lookup index '%s' does not match the configuration data" % name
+              for name in self._index.Compare(_ConfigIndex(self._config_data))]
+    if result:
+      self._index = None
+
+    return result
+
   def _UnlockedVerifyConfig(self):
     """Verify function.
 
@@ -829,8 +1107,8 @@ class ConfigWriter(object):
                 cluster.SimpleFillND(nodegroup.ndparams),
                 constants.NDS_PARAMETER_TYPES)
 
-    # drbd minors check
-    _, duplicates = self._UnlockedComputeDRBDMap()
+    # drbd minors check, using fresh indexes to check the actual data
+    _, duplicates = self._UnlockedComputeDRBDMap(index=_ConfigIndex(data))
     for node, minor, instance_a, instance_b in duplicates:
       result.append("DRBD minor %d on node %s is assigned twice to instances"
                     " %s and %s" % (minor, node, instance_a, instance_b))
@@ -881,14 +1159,15 @@ class ConfigWriter(object):
   def VerifyConfig(self):
     """Verify function.
 
-    This is just a wrapper over L{_UnlockedVerifyConfig}.
+    This is a wrapper over L{_UnlockedVerifyConfig}, additionally checking
+    the lookup indexes using L{_UnlockedVerifyIndex}.
 
     @rtype: list
     @return: a list of error messages; a non-empty list signifies
         configuration errors
 
     """
-    return self._UnlockedVerifyConfig()
+    return self._UnlockedVerifyConfig() + self._UnlockedVerifyIndex()
 
   @locking.ssynchronized(_config_lock)
   def AddTcpUdpPort(self, port):
@@ -934,9 +1213,11 @@ class ConfigWriter(object):
     self._WriteConfig()
     return port
 
-  def _UnlockedComputeDRBDMap(self):
+  def _UnlockedComputeDRBDMap(self, index=None):
     """Compute the used DRBD minor/nodes.
 
+    @type index: L{_ConfigIndex}
+    @param index: indexes to use instead of the maintained ones
     @rtype: (dict, list)
     @return: dictionary of node_uuid: dict of minor: instance_uuid;
         the returned dict will have all the nodes in it (even if with
@@ -945,31 +1226,18 @@ class ConfigWriter(object):
         should raise an exception
 
     """
-    def _AppendUsedMinors(get_node_name_fn, instance, disk, used):
-      duplicates = []
-      if disk.dev_type == constants.DT_DRBD8 and len(disk.logical_id) >= 5:
-        node_a, node_b, _, minor_a, minor_b = disk.logical_id[:5]
-        for node_uuid, minor in ((node_a, minor_a), (node_b, minor_b)):
-          assert node_uuid in used, \
-            ("Node '%s' of instance '%s' not found in node list" %
-             (get_node_name_fn(node_uuid), instance.name))
-          if minor in used[node_uuid]:
-            duplicates.append((node_uuid, minor, instance.uuid,
-                               used[node_uuid][minor]))
-          else:
-            used[node_uuid][minor] = instance.uuid
-      if disk.children:
-        for child in disk.children:
-          duplicates.extend(_AppendUsedMinors(get_node_name_fn, instance, child,
-                                              used))
-      return duplicates
+    if index is None:
+      index = self._UnlockedGetIndex()
 
     duplicates = []
     my_dict = dict((node_uuid, {}) for node_uuid in self._config_data.nodes)
-    for instance in self._config_data.instances.itervalues():
-      for disk in instance.disks:
-        duplicates.extend(_AppendUsedMinors(self._UnlockedGetNodeName,
-                                            instance, disk, my_dict))
+    for (node_uuid, minors) in index.drbd_minors.items():
+      assert node_uuid in my_dict, \
+        "Node '%s' of DRBD disks not found in node list" % node_uuid
+      for (minor, inst_uuids) in minors.items():
+        my_dict[node_uuid][minor] = inst_uuids[0]
+        for inst_uuid in inst_uuids[1:]:
+          duplicates.append((node_uuid, minor, inst_uuid, inst_uuids[0]))
     for (node_uuid, minor), inst_uuid in self._temporary_drbds.iteritems():
       if minor in my_dict[node_uuid] and my_dict[node_uuid][minor] != inst_uuid:
         duplicates.append((node_uuid, minor, inst_uuid,
@@ -1279,6 +1547,8 @@ class ConfigWriter(object):
 
     self._config_data.nodegroups[group.uuid] = group
     self._config_data.cluster.serial_no += 1
+    if self._index is not None:
+      self._index.UpdateGroup(group)
 
   @locking.ssynchronized(_config_lock)
   def RemoveNodeGroup(self, group_uuid):
@@ -1298,6 +1568,8 @@ class ConfigWriter(object):
 
     del self._config_data.nodegroups[group_uuid]
     self._config_data.cluster.serial_no += 1
+    if self._index is not None:
+      self._index.RemoveGroup(group_uuid)
     self._WriteConfig()
 
   def _UnlockedLookupNodeGroup(self, target):
@@ -1318,9 +1590,9 @@ class ConfigWriter(object):
         return self._config_data.nodegroups.keys()[0]
     if target in self._config_data.nodegroups:
       return target
-    for nodegroup in self._config_data.nodegroups.values():
-      if nodegroup.name == target:
-        return nodegroup.uuid
+    group_uuid = self._UnlockedGetIndex().group_names.get(target)
+    if group_uuid is not None:
+      return group_uuid
     raise errors.OpPrereqError("Node group '%s' not found" % target,
                                errors.ECODE_NOENT)
 
@@ -1430,6 +1702,8 @@ class ConfigWriter(object):
     instance.ctime = instance.mtime = time.time()
     self._config_data.instances[instance.uuid] = instance
     self._config_data.cluster.serial_no += 1
+    if self._index is not None:
+      self._index.UpdateInstance(instance)
     self._UnlockedReleaseDRBDMinors(instance.uuid)
     self._UnlockedCommitTemporaryIps(ec_id)
     self._WriteConfig()
@@ -1528,6 +1802,8 @@ class ConfigWriter(object):
 
     del self._config_data.instances[inst_uuid]
     self._config_data.cluster.serial_no += 1
+    if self._index is not None:
+      self._index.RemoveInstance(inst_uuid)
     self._WriteConfig()
 
   @locking.ssynchronized(_config_lock)
@@ -1553,6 +1829,9 @@ class ConfigWriter(object):
                            utils.PathJoin(file_storage_dir, inst.name,
                                           os.path.basename(disk.logical_id[1])))
 
+    if self._index is not None:
+      self._index.UpdateInstance(inst)
+
     # Force update of ssconf files
     self._config_data.cluster.serial_no += 1
 
@@ -1599,19 +1878,16 @@ class ConfigWriter(object):
     """
     return self._UnlockedGetInstanceList()
 
+  @locking.ssynchronized(_config_lock, shared=1)
   def ExpandInstanceName(self, short_name):
     """Attempt to expand an incomplete instance name.
 
     """
-    # Locking is done in L{ConfigWriter.GetAllInstancesInfo}
-    all_insts = self.GetAllInstancesInfo().values()
-    expanded_name = _MatchNameComponentIgnoreCase(
-                      short_name, [inst.name for inst in all_insts])
+    instance_names = self._UnlockedGetIndex().instance_names
+    expanded_name = _MatchNameComponentIgnoreCase(short_name, instance_names)
 
     if expanded_name is not None:
-      # there has to be exactly one instance with that name
-      inst = (filter(lambda n: n.name == expanded_name, all_insts)[0])
-      return (inst.uuid, inst.name)
+      return (instance_names[expanded_name], expanded_name)
     else:
       return (None, None)
 
@@ -1753,10 +2029,10 @@ class ConfigWriter(object):
     return self._UnlockedGetInstanceInfoByName(inst_name)
 
   def _UnlockedGetInstanceInfoByName(self, inst_name):
-    for inst in self._UnlockedGetAllInstancesInfo().values():
-      if inst.name == inst_name:
-        return inst
-    return None
+    inst_uuid = self._UnlockedGetIndex().instance_names.get(inst_name)
+    if inst_uuid is None:
+      return None
+    return self._UnlockedGetInstanceInfo(inst_uuid)
 
   def _UnlockedGetInstanceName(self, inst_uuid):
     inst_info = self._UnlockedGetInstanceInfo(inst_uuid)
@@ -1808,6 +2084,8 @@ class ConfigWriter(object):
     self._UnlockedAddNodeToGroup(node.uuid, node.group)
     self._config_data.nodes[node.uuid] = node
     self._config_data.cluster.serial_no += 1
+    if self._index is not None:
+      self._index.UpdateNode(node)
     self._WriteConfig()
 
   @locking.ssynchronized(_config_lock)
@@ -1823,21 +2101,20 @@ class ConfigWriter(object):
     self._UnlockedRemoveNodeFromGroup(self._config_data.nodes[node_uuid])
     del self._config_data.nodes[node_uuid]
     self._config_data.cluster.serial_no += 1
+    if self._index is not None:
+      self._index.RemoveNode(node_uuid)
     self._WriteConfig()
 
+  @locking.ssynchronized(_config_lock, shared=1)
   def ExpandNodeName(self, short_name):
     """Attempt to expand an incomplete node name into a node UUID.
 
     """
-    # Locking is done in L{ConfigWriter.GetAllNodesInfo}
-    all_nodes = self.GetAllNodesInfo().values()
-    expanded_name = _MatchNameComponentIgnoreCase(
-                      short_name, [node.name for node in all_nodes])
+    node_names = self._UnlockedGetIndex().node_names
+    expanded_name = _MatchNameComponentIgnoreCase(short_name, node_names)
 
     if expanded_name is not None:
-      # there has to be exactly one node with that name
-      node = (filter(lambda n: n.name == expanded_name, all_nodes)[0])
-      return (node.uuid, node.name)
+      return (node_names[expanded_name], expanded_name)
     else:
       return (None, None)
 
@@ -1882,14 +2159,9 @@ class ConfigWriter(object):
     @return: a tuple with two lists: the primary and the secondary instances
 
     """
-    pri = []
-    sec = []
-    for inst in self._config_data.instances.values():
-      if inst.primary_node == node_uuid:
-        pri.append(inst.uuid)
-      if node_uuid in inst.secondary_nodes:
-        sec.append(inst.uuid)
-    return (pri, sec)
+    index = self._UnlockedGetIndex()
+    return (list(index.node_primary.get(node_uuid, [])),
+            list(index.node_secondary.get(node_uuid, [])))
 
   @locking.ssynchronized(_config_lock, shared=1)
   def GetNodeGroupInstances(self, uuid, primary_only=False):
@@ -1901,15 +2173,17 @@ class ConfigWriter(object):
     @return: List of instance UUIDs in node group
 
     """
+    index = self._UnlockedGetIndex()
+
     if primary_only:
-      nodes_fn = lambda inst: [inst.primary_node]
+      node_indexes = [index.node_primary]
     else:
-      nodes_fn = lambda inst: inst.all_nodes
+      node_indexes = [index.node_primary, index.node_secondary]
 
-    return frozenset(inst.uuid
-                     for inst in self._config_data.instances.values()
-                     for node_uuid in nodes_fn(inst)
-                     if self._UnlockedGetNodeInfo(node_uuid).group == uuid)
+    return frozenset(inst_uuid
+                     for node_uuid in index.group_nodes.get(uuid, [])
+                     for node_index in node_indexes
+                     for inst_uuid in node_index.get(node_uuid, []))
 
   def _UnlockedGetHvparamsString(self, hvname):
     """Return the string representation of the list of hyervisor parameters of
@@ -2031,10 +2305,10 @@ class ConfigWriter(object):
     return self._UnlockedGetAllNodesInfo()
 
   def _UnlockedGetNodeInfoByName(self, node_name):
-    for node in self._UnlockedGetAllNodesInfo().values():
-      if node.name == node_name:
-        return node
-    return None
+    node_uuid = self._UnlockedGetIndex().node_names.get(node_name)
+    if node_uuid is None:
+      return None
+    return self._UnlockedGetNodeInfo(node_uuid)
 
   @locking.ssynchronized(_config_lock, shared=1)
   def GetNodeInfoByName(self, node_name):
@@ -2259,6 +2533,9 @@ class ConfigWriter(object):
       if node.uuid not in new_group.members:
         new_group.members.append(node.uuid)
 
+      if self._index is not None:
+        self._index.UpdateNode(node)
+
     # Update timestamps and serials (only once per node/group object)
     now = time.time()
     for obj in frozenset(itertools.chain(*resmod)): # pylint: disable=W0142
@@ -2325,9 +2602,14 @@ class ConfigWriter(object):
       raise errors.ConfigurationError(msg)
 
     self._config_data = data
+    self._index = None
     # reset the last serial as -1 so that the next write will cause
     # ssconf update
     self._last_cluster_serial = -1
+    # the state of the master candidates is unknown, so the next write will
+    # distribute the whole file
+    self._cfg_parts = None
+    self._cfg_node_serials = {}
 
     # Upgrade configuration if needed
     self._UpgradeConfig()
@@ -2372,6 +2654,10 @@ class ConfigWriter(object):
       # serializing/deserializing the object.
       self._UnlockedAddNodeToGroup(node.uuid, node.group)
 
+    # Objects have been modified in place, the indexes are rebuilt on their
+    # next use
+    self._index = None
+
     modified = (oldconf != self._config_data.ToDict())
     if modified:
       self._WriteConfig()
@@ -2385,11 +2671,51 @@ class ConfigWriter(object):
                   (utils.CommaJoin(config_errors)))
         logging.critical(errmsg)
 
-  def _DistributeConfig(self, feedback_fn):
+  def _PrepareConfigDelta(self, data, parts, size):
+    """Computes the delta to the previously distributed configuration.
+
+    @type data: dict
+    @param data: Configuration as written to disk
+    @type parts: dict
+    @param parts: Serialized parts of the configuration, see
+      L{config_delta.SerializeConfig}
+    @type size: int
+    @param size: Size of the whole serialized configuration
+    @rtype: dict or None
+    @return: The delta, or None if the whole configuration should be
+      distributed
+
+    """
+    if self._offline:
+      return None
+
+    (prev_parts, self._cfg_parts) = (self._cfg_parts, parts)
+
+    if prev_parts is None or self._cfg_delta_count >= _MAX_CONFIG_DELTAS:
+      self._cfg_delta_count = 0
+      return None
+
+    (delta, delta_size) = config_delta.ComputeDelta(prev_parts, parts, data)
+
+    # Large deltas are not worth the effort of applying them on the nodes
+    if delta_size * 2 > size:
+      self._cfg_delta_count = 0
+      return None
+
+    self._cfg_delta_count += 1
+
+    return delta
+
+  def _DistributeConfig(self, feedback_fn, delta=None):
     """Distribute the configuration to the other nodes.
 
-    Currently, this only copies the configuration file. In the future,
-    it could be used to encapsulate the 2/3-phase update mechanism.
+    Master candidates known to have the configuration the delta is based on
+    only receive the delta, all other master candidates (and those which
+    failed to apply the delta) get a copy of the whole configuration file.
+
+    @type delta: dict or None
+    @param delta: Delta to the previously distributed configuration, see
+      L{config_delta.ComputeDelta}
 
     """
     if self._offline:
@@ -2397,8 +2723,7 @@ class ConfigWriter(object):
 
     bad = False
 
-    node_list = []
-    addr_list = []
+    node_addr = {}
     myhostname = self._my_hostname
     # we can skip checking whether _UnlockedGetNodeInfo returns None
     # since the node list comes from _UnlocketGetNodeList, and we are
@@ -2408,29 +2733,72 @@ class ConfigWriter(object):
       node_info = self._UnlockedGetNodeInfo(node_uuid)
       if node_info.name == myhostname or not node_info.master_candidate:
         continue
-      node_list.append(node_info.name)
-      addr_list.append(node_info.primary_ip)
+      node_addr[node_info.name] = node_info.primary_ip
 
-    # TODO: Use dedicated resolver talking to config writer for name resolution
-    result = \
-      self._GetRpc(addr_list).call_upload_file(node_list, self._cfg_file)
-    for to_node, to_result in result.items():
-      msg = to_result.fail_msg
-      if msg:
-        msg = ("Copy of file %s to node %s failed: %s" %
-               (self._cfg_file, to_node, msg))
-        logging.error(msg)
+    serial = self._config_data.serial_no
+    node_serials = self._cfg_node_serials
+    self._cfg_node_serials = {}
 
-        if feedback_fn:
-          feedback_fn(msg)
-
-        bad = True
+    if delta is None:
+      node_list = node_addr.keys()
+    else:
+      delta_nodes = [name for name in node_addr
+                     if node_serials.get(name) == delta["base"]]
+      node_list = [name for name in node_addr if name not in delta_nodes]
+
+      if delta_nodes:
+        # TODO: Use dedicated resolver talking to config writer for name
+        # resolution
+        result = \
+          self._GetRpc([node_addr[name] for name in delta_nodes]) \
+            .call_upload_config_delta(delta_nodes,
+                                      serializer.DumpJson(delta))
+        for to_node, to_result in result.items():
+          msg = to_result.fail_msg
+          if msg:
+            logging.warning("Applying configuration delta on node %s failed,"
+                            " uploading the whole file: %s", to_node, msg)
+            node_list.append(to_node)
+          else:
+            self._cfg_node_serials[to_node] = serial
+
+    if node_list:
+      # TODO: Use dedicated resolver talking to config writer for name
+      # resolution
+      result = \
+        self._GetRpc([node_addr[name] for name in node_list]) \
+          .call_upload_file(node_list, self._cfg_file)
+      for to_node, to_result in result.items():
+        msg = to_result.fail_msg
+        if msg:
+          msg = ("Copy of file %s to node %s failed: %s" %
+                 (self._cfg_file, to_node, msg))
+          logging.error(msg)
+
+          if feedback_fn:
+            feedback_fn(msg)
+
+          bad = True
+        else:
+          self._cfg_node_serials[to_node] = serial
 
     return not bad
 
   def _WriteConfig(self, destination=None, feedback_fn=None):
     """Write the configuration data to persistent storage.
 
+    The time taken is recorded in the timeline of the current opcode.
+
+    """
+    span = optimeline.StartSpan(constants.OP_PHASE_CONFIG)
+    try:
+      self._WriteConfigData(destination=destination, feedback_fn=feedback_fn)
+    finally:
+      span.End()
+
+  def _WriteConfigData(self, destination=None, feedback_fn=None):
+    """Writes and distributes the configuration data.
+
     """
     assert feedback_fn is None or callable(feedback_fn)
 
@@ -2449,7 +2817,8 @@ class ConfigWriter(object):
     if destination is None:
       destination = self._cfg_file
     self._BumpSerialNo()
-    txt = serializer.Dump(self._config_data.ToDict())
+    data = self._config_data.ToDict()
+    (txt, parts) = config_delta.SerializeConfig(data)
 
     getents = self._getents()
     try:
@@ -2467,7 +2836,9 @@ class ConfigWriter(object):
     self.write_count += 1
 
     # and redistribute the config file to master candidates
-    self._DistributeConfig(feedback_fn)
+    self._DistributeConfig(feedback_fn,
+                           delta=self._PrepareConfigDelta(data, parts,
+                                                          len(txt)))
 
     # Write ssconf files on all nodes (including locally)
     if self._last_cluster_serial < self._config_data.cluster.serial_no:
@@ -2687,14 +3058,14 @@ class ConfigWriter(object):
     if isinstance(target, objects.Cluster):
       test = target == self._config_data.cluster
     elif isinstance(target, objects.Node):
-      test = target in self._config_data.nodes.values()
+      test = _ContainsObject(self._config_data.nodes, target)
       update_serial = True
     elif isinstance(target, objects.Instance):
-      test = target in self._config_data.instances.values()
+      test = _ContainsObject(self._config_data.instances, target)
     elif isinstance(target, objects.NodeGroup):
-      test = target in self._config_data.nodegroups.values()
+      test = _ContainsObject(self._config_data.nodegroups, target)
     elif isinstance(target, objects.Network):
-      test = target in self._config_data.networks.values()
+      test = _ContainsObject(self._config_data.networks, target)
     else:
       raise errors.ProgrammerError("Invalid object type (%s) passed to"
                                    " ConfigWriter.Update" % type(target))
@@ -2712,6 +3083,16 @@ class ConfigWriter(object):
     if isinstance(target, objects.Instance):
       self._UnlockedReleaseDRBDMinors(target.uuid)
 
+    if self._index is not None:
+      if isinstance(target, objects.Node):
+        self._index.UpdateNode(target)
+      elif isinstance(target, objects.Instance):
+        self._index.UpdateInstance(target)
+      elif isinstance(target, objects.NodeGroup):
+        self._index.UpdateGroup(target)
+      elif isinstance(target, objects.Network):
+        self._index.UpdateNetwork(target)
+
     if ec_id is not None:
       # Commit all ips reserved by OpInstanceSetParams and OpGroupSetParams
       self._UnlockedCommitTemporaryIps(ec_id)
@@ -2810,6 +3191,8 @@ class ConfigWriter(object):
     net.ctime = net.mtime = time.time()
     self._config_data.networks[net.uuid] = net
     self._config_data.cluster.serial_no += 1
+    if self._index is not None:
+      self._index.UpdateNetwork(net)
 
   def _UnlockedLookupNetwork(self, target):
     """Lookup a network's UUID.
@@ -2825,9 +3208,9 @@ class ConfigWriter(object):
       return None
     if target in self._config_data.networks:
       return target
-    for net in self._config_data.networks.values():
-      if net.name == target:
-        return net.uuid
+    net_uuid = self._UnlockedGetIndex().network_names.get(target)
+    if net_uuid is not None:
+      return net_uuid
     raise errors.OpPrereqError("Network '%s' not found" % target,
                                errors.ECODE_NOENT)
 
@@ -2860,6 +3243,8 @@ class ConfigWriter(object):
 
     del self._config_data.networks[network_uuid]
     self._config_data.cluster.serial_no += 1
+    if self._index is not None:
+      self._index.RemoveNetwork(network_uuid)
     self._WriteConfig()
 
   def _UnlockedGetGroupNetParams(self, net_uuid, node_uuid):
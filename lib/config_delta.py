@@ -0,0 +1,181 @@
+#
+#
+
+# Copyright (C) 2014 Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Functions for computing and applying configuration deltas.
+
+The configuration is serialized object by object, so that the master can
+find out which objects changed since the last write and only send those to
+the master candidates instead of the whole file.
+
+"""
+
+from ganeti import compat
+from ganeti import errors
+from ganeti import serializer
+
+
+#: Configuration containers whose objects are tracked individually
+CONTAINERS = compat.UniqueFrozenset([
+  "nodes",
+  "instances",
+  "nodegroups",
+  "networks",
+  ])
+
+#: Key of the configuration serial number
+_SERIAL_KEY = "serial_no"
+
+
+def _DumpPart(data):
+  """Serializes a part of the configuration.
+
+  """
+  return serializer.DumpJson(data).rstrip("\n")
+
+
+def _JoinParts(parts):
+  """Builds a JSON object from already serialized members.
+
+  @type parts: list of tuples; (string, string)
+  @param parts: Member names and their serialized values
+
+  """
+  return "{%s}" % ", ".join("%s: %s" % (serializer.DumpJsonString(name),
+                                         value)
+                            for (name, value) in parts)
+
+
+def SerializeConfig(data):
+  """Serializes a configuration object by object.
+
+  @type data: dict
+  @param data: Configuration as returned by L{objects.ConfigData.ToDict}
+  @rtype: tuple; (string, dict)
+  @return: The serialized configuration and a dictionary mapping the path of
+    every part (C{(key, None)} for top-level values, C{(container, uuid)} for
+    objects in containers) to its serialized form
+
+  """
+  parts = {}
+  toplevel = []
+
+  for (key, value) in data.items():
+    if key in CONTAINERS:
+      members = []
+      for (uuid, obj) in value.items():
+        txt = _DumpPart(obj)
+        parts[(key, uuid)] = txt
+        members.append((uuid, txt))
+      txt = _JoinParts(members)
+    else:
+      txt = _DumpPart(value)
+      parts[(key, None)] = txt
+
+    toplevel.append((key, txt))
+
+  return (_JoinParts(toplevel) + "\n", parts)
+
+
+def _GetPart(data, path):
+  """Returns a part of the configuration given its path.
+
+  """
+  (key, uuid) = path
+  if uuid is None:
+    return data[key]
+  else:
+    return data[key][uuid]
+
+
+def ComputeDelta(old_parts, new_parts, data):
+  """Computes the differences between two versions of the configuration.
+
+  @type old_parts: dict
+  @param old_parts: Serialized parts of the previous configuration, as
+    returned by L{SerializeConfig}
+  @type new_parts: dict
+  @param new_parts: Serialized parts of the new configuration
+  @type data: dict
+  @param data: The new configuration, as passed to L{SerializeConfig}
+  @rtype: tuple; (dict, int)
+  @return: The delta, suitable for L{ApplyDelta}, and the combined size of
+    the serialized parts it contains
+
+  """
+  update = []
+  size = 0
+
+  for (path, txt) in new_parts.items():
+    if old_parts.get(path) != txt:
+      update.append([path[0], path[1], _GetPart(data, path)])
+      size += len(txt)
+
+  remove = [list(path) for path in old_parts if path not in new_parts]
+
+  delta = {
+    "base": serializer.LoadJson(old_parts[(_SERIAL_KEY, None)]),
+    "serial": data[_SERIAL_KEY],
+    "update": update,
+    "remove": remove,
+    }
+
+  return (delta, size)
+
+
+def ApplyDelta(data, delta):
+  """Applies a delta to a configuration.
+
+  @type data: dict
+  @param data: Configuration, modified in place
+  @type delta: dict
+  @param delta: Delta as computed by L{ComputeDelta}
+
+  """
+  serial = data.get(_SERIAL_KEY)
+  if serial != delta["base"]:
+    raise errors.ConfigurationError("Configuration delta applies to serial"
+                                    " number %s, but the local configuration"
+                                    " has serial number %s" %
+                                    (delta["base"], serial))
+
+  for (key, uuid) in delta["remove"]:
+    if uuid is None:
+      data.pop(key, None)
+    else:
+      data.get(key, {}).pop(uuid, None)
+
+  for (key, uuid, value) in delta["update"]:
+    if uuid is None:
+      data[key] = value
+    else:
+      data.setdefault(key, {})[uuid] = value
+
+  if data.get(_SERIAL_KEY) != delta["serial"]:
+    raise errors.ConfigurationError("Configuration delta did not result in"
+                                    " serial number %s" % delta["serial"])
@@ -34,6 +34,7 @@
 
 from ganeti import constants
 from ganeti import errors
+from ganeti import optimeline
 from ganeti import utils
 from ganeti import compat
 from ganeti import pathutils
@@ -222,7 +223,12 @@ class HooksMaster(object):
       # even attempt to run, or this LU doesn't do hooks at all
       return
 
-    results = self._RunWrapper(node_names, self.hooks_path, phase, env)
+    span = optimeline.StartSpan(constants.OP_PHASE_HOOKS)
+    try:
+      results = self._RunWrapper(node_names, self.hooks_path, phase, env)
+    finally:
+      span.End()
+
     if not results:
       msg = "Communication Failure"
       if phase == constants.HOOKS_PHASE_PRE:
@@ -714,7 +714,8 @@ TQueryResult = TListOf(TQueryRow)
 TQueryResponse = \
     TObjectCheck(objects.QueryResponse, {
         "fields": TListOf(TQueryFieldDef),
-        "data": TQueryResult
+        "data": TQueryResult,
+        "count": TNonNegativeInt,
     })
 
 TQueryFieldsResponse = \
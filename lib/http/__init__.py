@@ -106,6 +106,15 @@ class HttpConnectionClosed(Exception):
   """
 
 
+class HttpIdleConnectionClosed(HttpError):
+  """Internal exception for a connection closed before a message started.
+
+  Raised when the peer closes the connection without sending a single byte of
+  a new message, e.g. when a persistent connection is no longer needed.
+
+  """
+
+
 class HttpSessionHandshakeUnexpectedEOF(HttpError):
   """Internal exception for errors during SSL handshake.
 
@@ -522,6 +531,25 @@ def ShutdownConnection(sock, close_timeout, write_timeout, msgreader, force):
       raise HttpError("Error while shutting down connection: %s" % err)
 
 
+def WaitForData(sock, timeout):
+  """Waits for data to become available for reading.
+
+  @type sock: socket
+  @param sock: Socket to wait on
+  @type timeout: float
+  @param timeout: How long to wait for data
+  @rtype: bool
+  @return: Whether data (or an end-of-file condition) is available
+
+  """
+  # OpenSSL might have already buffered data which wouldn't be signalled by
+  # polling the underlying socket
+  if isinstance(sock, OpenSSL.SSL.ConnectionType) and sock.pending():
+    return True
+
+  return utils.WaitForFdCondition(sock, select.POLLIN, timeout) is not None
+
+
 def Handshake(sock, write_timeout):
   """Shakes peer's hands.
 
@@ -802,6 +830,7 @@ class HttpMessageReader(object):
 
     buf = ""
     eof = False
+    received = False
     while self.parser_status != self.PS_COMPLETE:
       # TODO: Don't read more than necessary (Content-Length), otherwise
       # data might be lost and/or an error could occur
@@ -809,6 +838,10 @@ class HttpMessageReader(object):
 
       if data:
         buf += data
+        received = True
+      elif not received:
+        raise HttpIdleConnectionClosed("Connection closed before message"
+                                       " was sent")
       else:
         eof = True
 
@@ -34,12 +34,14 @@
 import logging
 import pycurl
 import threading
+import time
 from cStringIO import StringIO
 
 from ganeti import http
 from ganeti import compat
 from ganeti import netutils
 from ganeti import locking
+from ganeti import query
 
 
 class HttpClientRequest(object):
@@ -122,12 +124,18 @@ class HttpClientRequest(object):
     """Returns the full URL for this requests.
 
     """
-    if netutils.IPAddress.IsValid(self.host):
-      address = netutils.FormatAddress((self.host, self.port))
-    else:
-      address = "%s:%s" % (self.host, self.port)
     # TODO: Support for non-SSL requests
-    return "https://%s%s" % (address, self.path)
+    return "https://%s%s" % (_FormatPeer(self.host, self.port), self.path)
+
+
+def _FormatPeer(host, port):
+  """Formats host and port for use in URLs and messages.
+
+  """
+  if netutils.IPAddress.IsValid(host):
+    return netutils.FormatAddress((host, port))
+  else:
+    return "%s:%s" % (host, port)
 
 
 def _StartRequest(curl, req):
@@ -304,6 +312,237 @@ class _PendingRequestMonitor(object):
     return result
 
 
+class CurlHandlePool(object):
+  """Pool of reusable cURL handles.
+
+  cURL keeps connections open after a request has been processed. By reusing
+  the same handle for the next request to the same peer the connection, and
+  therefore the TCP and SSL handshakes, can be reused as well. Handles are
+  keyed by host, port and cURL configuration function.
+
+  """
+  _LOCK = "_lock"
+
+  def __init__(self, max_idle, idle_timeout, _curl=pycurl.Curl,
+               _time_fn=time.time):
+    """Initializes this class.
+
+    @type max_idle: int
+    @param max_idle: Maximum number of idle handles kept per peer
+    @type idle_timeout: number
+    @param idle_timeout: Number of seconds after which idle handles are closed
+
+    """
+    assert max_idle >= 0
+    assert idle_timeout > 0
+
+    self._max_idle = max_idle
+    self._idle_timeout = idle_timeout
+    self._curl = _curl
+    self._time_fn = _time_fn
+
+    # The lock monitor runs in another thread, hence locking is necessary
+    self._lock = locking.SharedLock("CurlHandlePool")
+
+    # Idle handles per key, most recently used at the end
+    self._idle = {}
+
+    # Per-peer statistics, (hits, misses) per (host, port)
+    self._peer_stats = {}
+
+    self._hits = 0
+    self._misses = 0
+    self._evictions = 0
+
+    self._monitor_cbs = []
+
+  @staticmethod
+  def _GetKey(req):
+    """Returns the pool key for a request.
+
+    """
+    return (req.host, req.port, req.curl_config_fn)
+
+  def _ExpireUnlocked(self, now):
+    """Removes handles which have been idle for too long.
+
+    @return: List of removed cURL handles
+
+    """
+    expired = []
+
+    for (key, handles) in self._idle.items():
+      while handles and (now - handles[0][0]) > self._idle_timeout:
+        expired.append(handles.pop(0)[1])
+
+      if not handles:
+        del self._idle[key]
+
+    self._evictions += len(expired)
+
+    return expired
+
+  @staticmethod
+  def _CloseHandles(handles):
+    """Closes a number of cURL handles.
+
+    """
+    for curl in handles:
+      curl.close()
+
+  def Get(self, req):
+    """Returns a cURL handle for a request.
+
+    @type req: L{HttpClientRequest}
+    @param req: HTTP request
+    @rtype: pycurl.Curl
+
+    """
+    key = self._GetKey(req)
+
+    self._lock.acquire()
+    try:
+      expired = self._ExpireUnlocked(self._time_fn())
+
+      peer_stats = self._peer_stats.setdefault((req.host, req.port), [0, 0])
+
+      handles = self._idle.get(key)
+      if handles:
+        (_, curl) = handles.pop()
+        if not handles:
+          del self._idle[key]
+        self._hits += 1
+        peer_stats[0] += 1
+      else:
+        curl = None
+        self._misses += 1
+        peer_stats[1] += 1
+    finally:
+      self._lock.release()
+
+    self._CloseHandles(expired)
+
+    if curl is None:
+      curl = self._curl()
+
+    return curl
+
+  def Put(self, req, curl, reusable):
+    """Returns a cURL handle to the pool.
+
+    @type req: L{HttpClientRequest}
+    @param req: The request which has been processed using the handle
+    @type curl: pycurl.Curl
+    @param curl: cURL handle
+    @type reusable: bool
+    @param reusable: Whether the handle can be used for further requests;
+      handles used for failed requests are closed
+
+    """
+    if not reusable:
+      self._CloseHandles([curl])
+      return
+
+    key = self._GetKey(req)
+
+    self._lock.acquire()
+    try:
+      now = self._time_fn()
+
+      expired = self._ExpireUnlocked(now)
+
+      handles = self._idle.setdefault(key, [])
+      handles.append((now, curl))
+
+      if len(handles) > self._max_idle:
+        # Remove least recently used handle
+        expired.append(handles.pop(0)[1])
+        self._evictions += 1
+
+      if not handles:
+        del self._idle[key]
+    finally:
+      self._lock.release()
+
+    self._CloseHandles(expired)
+
+  def Clear(self):
+    """Closes all idle handles.
+
+    """
+    self._lock.acquire()
+    try:
+      handles = [curl
+                 for entries in self._idle.values()
+                 for (_, curl) in entries]
+      self._idle.clear()
+    finally:
+      self._lock.release()
+
+    self._CloseHandles(handles)
+
+  def RegisterWithMonitor(self, lock_monitor_cb):
+    """Registers this pool with a lock monitor, unless already done.
+
+    @param lock_monitor_cb: Callable for registering with lock monitor
+
+    """
+    self._lock.acquire()
+    try:
+      if lock_monitor_cb in self._monitor_cbs:
+        return
+      self._monitor_cbs.append(lock_monitor_cb)
+    finally:
+      self._lock.release()
+
+    lock_monitor_cb(self)
+
+  @locking.ssynchronized(_LOCK, shared=1)
+  def GetStats(self):
+    """Returns statistics about the pool.
+
+    @rtype: dict
+    @return: Dictionary with the number of hits, misses, evicted and idle
+      handles
+
+    """
+    return {
+      "hits": self._hits,
+      "misses": self._misses,
+      "evictions": self._evictions,
+      "idle": sum(len(handles) for handles in self._idle.values()),
+      }
+
+  @locking.ssynchronized(_LOCK, shared=1)
+  def GetLockInfo(self, requested):
+    """Retrieves information about pooled connections.
+
+    Every peer contacted through this pool is reported as one item, the
+    mode containing the number of idle handles and the pool hits and misses.
+
+    @type requested: set
+    @param requested: Requested information, see C{query.LQ_*}
+
+    """
+    idle = {}
+    for ((host, port, _), handles) in self._idle.items():
+      idle[(host, port)] = idle.get((host, port), 0) + len(handles)
+
+    result = []
+
+    for ((host, port), (hits, misses)) in self._peer_stats.items():
+      if query.LQ_MODE in requested:
+        mode = ("idle=%s hits=%s misses=%s" %
+                (idle.get((host, port), 0), hits, misses))
+      else:
+        mode = None
+
+      result.append(("rpc-pool/%s" % _FormatPeer(host, port),
+                     mode, None, None))
+
+    return result
+
+
 def _ProcessCurlRequests(multi, requests):
   """cURL request processor.
 
@@ -352,14 +591,17 @@ def _ProcessCurlRequests(multi, requests):
     multi.select(1.0)
 
 
-def ProcessRequests(requests, lock_monitor_cb=None, _curl=pycurl.Curl,
-                    _curl_multi=pycurl.CurlMulti,
+def ProcessRequests(requests, lock_monitor_cb=None, pool=None,
+                    _curl=pycurl.Curl, _curl_multi=pycurl.CurlMulti,
                     _curl_process=_ProcessCurlRequests):
   """Processes any number of HTTP client requests.
 
   @type requests: list of L{HttpClientRequest}
   @param requests: List of all requests
   @param lock_monitor_cb: Callable for registering with lock monitor
+  @type pool: L{CurlHandlePool} or None
+  @param pool: Pool to take cURL handles from and return them to after the
+    requests have been processed; if C{None}, new handles are used
 
   """
   assert compat.all((req.error is None and
@@ -368,10 +610,16 @@ def ProcessRequests(requests, lock_monitor_cb=None, _curl=pycurl.Curl,
                      req.resp_body is None)
                     for req in requests)
 
+  if pool is None:
+    get_curl_fn = lambda _: _curl()
+  else:
+    get_curl_fn = pool.Get
+
   # Prepare all requests
   curl_to_client = \
     dict((client.GetCurlHandle(), client)
-         for client in map(lambda req: _StartRequest(_curl(), req), requests))
+         for client in map(lambda req: _StartRequest(get_curl_fn(req), req),
+                           requests))
 
   assert len(curl_to_client) == len(requests)
 
@@ -379,6 +627,9 @@ def ProcessRequests(requests, lock_monitor_cb=None, _curl=pycurl.Curl,
     monitor = _PendingRequestMonitor(threading.currentThread(),
                                      curl_to_client.values)
     lock_monitor_cb(monitor)
+
+    if pool is not None:
+      pool.RegisterWithMonitor(lock_monitor_cb)
   else:
     monitor = _NoOpRequestMonitor
 
@@ -386,10 +637,14 @@ def ProcessRequests(requests, lock_monitor_cb=None, _curl=pycurl.Curl,
   for (curl, msg) in _curl_process(_curl_multi(), curl_to_client.keys()):
     monitor.acquire(shared=0)
     try:
-      curl_to_client.pop(curl).Done(msg)
+      client = curl_to_client.pop(curl)
+      client.Done(msg)
     finally:
       monitor.release()
 
+    if pool is not None:
+      pool.Put(client.GetCurrentRequest(), curl, not msg)
+
   assert not curl_to_client, "Not all requests were processed"
 
   # Don't try to read information anymore as all requests have been processed
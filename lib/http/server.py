@@ -33,9 +33,12 @@
 
 import BaseHTTPServer
 import cgi
+import errno
 import logging
 import os
+import select
 import socket
+import threading
 import time
 import signal
 import asyncore
@@ -45,6 +48,7 @@ from ganeti import utils
 from ganeti import netutils
 from ganeti import compat
 from ganeti import errors
+from ganeti import workerpool
 
 
 WEEKDAYNAME = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
@@ -68,6 +72,28 @@ DEFAULT_ERROR_MESSAGE = """\
 </html>
 """
 
+#: Fork a new process for every connection
+SERVING_MODE_FORK = "fork"
+
+#: Handle connections in a fixed number of long-lived processes
+SERVING_MODE_PREFORK = "prefork"
+
+#: Handle connections in a pool of threads
+SERVING_MODE_THREADS = "threads"
+
+SERVING_MODES = compat.UniqueFrozenset([
+  SERVING_MODE_FORK,
+  SERVING_MODE_PREFORK,
+  SERVING_MODE_THREADS,
+  ])
+
+#: Default number of worker processes or threads
+DEFAULT_WORKERS = 8
+
+# Values for the "Connection" header
+_CONNECTION_CLOSE = "close"
+_CONNECTION_KEEP_ALIVE = "keep-alive"
+
 
 def _DateTimeHeader(gmnow=None):
   """Return the current date and time formatted for a message header.
@@ -225,6 +251,17 @@ class _HttpClientToServerMessageReader(http.HttpMessageReader):
     return http.HttpClientToServerStartLine(method, path, version)
 
 
+def _IsPersistent(msg):
+  """Checks whether a response keeps the connection open.
+
+  @type msg: L{http.HttpMessage}
+  @param msg: Response message
+
+  """
+  return (msg.headers is not None and
+          msg.headers.get(http.HTTP_CONNECTION) == _CONNECTION_KEEP_ALIVE)
+
+
 def _HandleServerRequestInner(handler, req_msg):
   """Calls the handler function for the current request.
 
@@ -277,13 +314,16 @@ class HttpResponder(object):
     """
     self._handler = handler
 
-  def __call__(self, fn):
+  def __call__(self, fn, keepalive=False):
     """Handles a request.
 
     @type fn: callable
     @param fn: Callback for retrieving HTTP request, must return a tuple
       containing request message (L{http.HttpMessage}) and C{None} or the
       message reader (L{_HttpClientToServerMessageReader})
+    @type keepalive: bool
+    @param keepalive: Whether the connection may be kept open after the
+      response has been sent, if the client supports it
 
     """
     response_msg = http.HttpMessage()
@@ -292,6 +332,7 @@ class HttpResponder(object):
                                        code=None, reason=None)
 
     force_close = True
+    persistent = False
 
     try:
       (request_msg, req_msg_reader) = fn()
@@ -315,8 +356,12 @@ class HttpResponder(object):
       # Only wait for client to close if we didn't have any exception.
       force_close = False
 
+      persistent = (keepalive and req_msg_reader is not None and
+                    not req_msg_reader.peer_will_close)
+
     return (request_msg, req_msg_reader, force_close,
-            self._Finalize(self.responses, response_msg))
+            self._Finalize(self.responses, response_msg,
+                           persistent=persistent))
 
   @staticmethod
   def _SetError(responses, handler, response_msg, err):
@@ -356,15 +401,26 @@ class HttpResponder(object):
     response_msg.body = body
 
   @staticmethod
-  def _Finalize(responses, msg):
+  def _Finalize(responses, msg, persistent=False):
     assert msg.start_line.reason is None
 
     if not msg.headers:
       msg.headers = {}
 
+    if persistent:
+      connection = _CONNECTION_KEEP_ALIVE
+
+      # Without a length the client could only detect the end of the message
+      # body by the connection being closed
+      if msg.body:
+        msg.headers[http.HTTP_CONTENT_LENGTH] = len(msg.body)
+      else:
+        msg.headers[http.HTTP_CONTENT_LENGTH] = 0
+    else:
+      connection = _CONNECTION_CLOSE
+
     msg.headers.update({
-      # TODO: Keep-alive is not supported
-      http.HTTP_CONNECTION: "close",
+      http.HTTP_CONNECTION: connection,
       http.HTTP_DATE: _DateTimeHeader(),
       http.HTTP_SERVER: http.HTTP_GANETI_VERSION,
       })
@@ -388,7 +444,7 @@ class HttpServerRequestExecutor(object):
   This class implements the server side of HTTP. It's based on code of
   Python's BaseHTTPServer, from both version 2.4 and 3k. It does not
   support non-ASCII character encodings. Keep-alive connections are
-  not supported.
+  only supported if a keep-alive timeout is given.
 
   """
   # Timeouts in seconds for socket layer
@@ -396,9 +452,15 @@ class HttpServerRequestExecutor(object):
   READ_TIMEOUT = 10
   CLOSE_TIMEOUT = 1
 
-  def __init__(self, server, handler, sock, client_addr):
+  def __init__(self, server, handler, sock, client_addr,
+               keepalive_timeout=None):
     """Initializes this class.
 
+    @type keepalive_timeout: number or None
+    @param keepalive_timeout: How long to wait for another request on a
+      persistent connection; C{None} to close connection after the first
+      request
+
     """
     responder = HttpResponder(handler)
 
@@ -410,6 +472,8 @@ class HttpServerRequestExecutor(object):
 
     request_msg_reader = None
     force_close = True
+    peer_closed = False
+    served = 0
 
     logging.debug("Connection from %s:%s", client_addr[0], client_addr[1])
     try:
@@ -424,23 +488,44 @@ class HttpServerRequestExecutor(object):
             # Ignore rest
             return
 
-        (request_msg, request_msg_reader, force_close, response_msg) = \
-          responder(compat.partial(self._ReadRequest, sock, self.READ_TIMEOUT))
-        if response_msg:
-          # HttpMessage.start_line can be of different types
-          # Instance of 'HttpClientToServerStartLine' has no 'code' member
-          # pylint: disable=E1103,E1101
-          logging.info("%s:%s %s %s", client_addr[0], client_addr[1],
-                       request_msg.start_line, response_msg.start_line.code)
-          self._SendResponse(sock, request_msg, response_msg,
-                             self.WRITE_TIMEOUT)
+        while True:
+          try:
+            (request_msg, request_msg_reader, force_close, response_msg) = \
+              responder(compat.partial(self._ReadRequest, sock,
+                                       self.READ_TIMEOUT),
+                        keepalive=bool(keepalive_timeout))
+          except http.HttpIdleConnectionClosed:
+            if not served:
+              raise
+
+            # Client closed persistent connection between requests
+            peer_closed = True
+            break
+
+          served += 1
+
+          if response_msg:
+            # HttpMessage.start_line can be of different types
+            # Instance of 'HttpClientToServerStartLine' has no 'code' member
+            # pylint: disable=E1103,E1101
+            logging.info("%s:%s %s %s", client_addr[0], client_addr[1],
+                         request_msg.start_line, response_msg.start_line.code)
+            self._SendResponse(sock, request_msg, response_msg,
+                               self.WRITE_TIMEOUT)
+
+          if not (response_msg and _IsPersistent(response_msg) and
+                  server.WaitForRequest(sock, keepalive_timeout)):
+            break
       finally:
-        http.ShutdownConnection(sock, self.CLOSE_TIMEOUT, self.WRITE_TIMEOUT,
-                                request_msg_reader, force_close)
+        if not peer_closed:
+          http.ShutdownConnection(sock, self.CLOSE_TIMEOUT,
+                                  self.WRITE_TIMEOUT, request_msg_reader,
+                                  force_close)
 
       sock.close()
     finally:
-      logging.debug("Disconnected %s:%s", client_addr[0], client_addr[1])
+      logging.debug("Disconnected %s:%s after %s request(s)",
+                    client_addr[0], client_addr[1], served)
 
   @staticmethod
   def _ReadRequest(sock, timeout):
@@ -471,15 +556,43 @@ class HttpServerRequestExecutor(object):
       raise http.HttpError("Error sending response: %s" % err)
 
 
+class _HttpServerWorker(workerpool.BaseWorker):
+  """Worker thread handling connections for L{HttpServer}.
+
+  """
+  def RunTask(self, server, connection, client_addr): # pylint: disable=W0221
+    """Handles a connection.
+
+    """
+    try:
+      server.HandleConnection(connection, client_addr, server.keepalive_timeout)
+    finally:
+      server.ConnectionDone()
+
+
 class HttpServer(http.HttpBase, asyncore.dispatcher):
   """Generic HTTP server class
 
+  Connections can be handled in one of three ways, see L{SERVING_MODES}:
+
+    - L{SERVING_MODE_FORK}: every connection is handled in a newly forked
+      child process, isolating requests from each other
+    - L{SERVING_MODE_PREFORK}: a fixed number of long-lived child processes
+      accept and handle connections
+    - L{SERVING_MODE_THREADS}: connections are handled by a pool of threads;
+      the handler must be thread-safe
+
   """
   MAX_CHILDREN = 20
 
+  #: How often, in seconds, idle workers check whether they should stop
+  #: waiting for the next request on a persistent connection
+  _WORKER_CHECK_INTERVAL = 1.0
+
   def __init__(self, mainloop, local_address, port, handler,
                ssl_params=None, ssl_verify_peer=False,
-               request_executor_class=None):
+               request_executor_class=None, keepalive_timeout=None,
+               serving_mode=SERVING_MODE_FORK, num_workers=DEFAULT_WORKERS):
     """Initializes the HTTP server
 
     @type mainloop: ganeti.daemon.Mainloop
@@ -496,8 +609,20 @@ class HttpServer(http.HttpBase, asyncore.dispatcher):
     @type request_executor_class: class
     @param request_executor_class: an class derived from the
         HttpServerRequestExecutor class
+    @type keepalive_timeout: number or None
+    @param keepalive_timeout: How long a connection may stay idle between
+        requests; C{None} disables persistent connections
+    @type serving_mode: string
+    @param serving_mode: How to handle connections, one of L{SERVING_MODES}
+    @type num_workers: int
+    @param num_workers: Number of worker processes or threads for the
+        L{SERVING_MODE_PREFORK} and L{SERVING_MODE_THREADS} modes
 
     """
+    assert serving_mode in SERVING_MODES, \
+      "Invalid serving mode '%s'" % serving_mode
+    assert num_workers > 0
+
     http.HttpBase.__init__(self)
     asyncore.dispatcher.__init__(self)
 
@@ -510,6 +635,9 @@ class HttpServer(http.HttpBase, asyncore.dispatcher):
     self.local_address = local_address
     self.port = port
     self.handler = handler
+    self.keepalive_timeout = keepalive_timeout
+    self.serving_mode = serving_mode
+    self.num_workers = num_workers
     family = netutils.IPAddress.GetAddressFamily(local_address)
     self.socket = self._CreateSocket(ssl_params, ssl_verify_peer, family)
 
@@ -517,6 +645,16 @@ class HttpServer(http.HttpBase, asyncore.dispatcher):
     self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
     self._children = []
+    self._stopping = False
+
+    # Pool of threads for SERVING_MODE_THREADS
+    self._worker_pool = None
+    self._connections_lock = threading.Lock()
+    self._connections = 0
+
+    # Set in pre-forked worker processes, tracks termination signals
+    self._worker_signal = None
+
     self.set_socket(self.socket)
     self.accepting = True
     mainloop.RegisterSignal(self)
@@ -525,9 +663,34 @@ class HttpServer(http.HttpBase, asyncore.dispatcher):
     self.socket.bind((self.local_address, self.port))
     self.socket.listen(1024)
 
+    if self.serving_mode == SERVING_MODE_PREFORK:
+      self._SpawnWorkers()
+    elif self.serving_mode == SERVING_MODE_THREADS:
+      self._worker_pool = workerpool.WorkerPool("HttpServer",
+                                                self.num_workers,
+                                                _HttpServerWorker)
+
   def Stop(self):
+    self._stopping = True
+
     self.socket.close()
 
+    if self._worker_pool is not None:
+      self._worker_pool.TerminateWorkers()
+      self._worker_pool = None
+
+    if self.serving_mode == SERVING_MODE_PREFORK:
+      for pid in self._children:
+        utils.IgnoreProcessNotFound(os.kill, pid, signal.SIGTERM)
+
+  def readable(self):
+    """Whether the main loop should accept connections.
+
+    Pre-forked workers accept connections themselves.
+
+    """
+    return self.serving_mode != SERVING_MODE_PREFORK
+
   def handle_accept(self):
     self._IncomingConnection()
 
@@ -535,6 +698,10 @@ class HttpServer(http.HttpBase, asyncore.dispatcher):
     if signum == signal.SIGCHLD:
       self._CollectChildren(True)
 
+      if self.serving_mode == SERVING_MODE_PREFORK and not self._stopping:
+        # Replace workers which have terminated
+        self._SpawnWorkers()
+
   def _CollectChildren(self, quick):
     """Checks whether any child processes are done
 
@@ -556,7 +723,7 @@ class HttpServer(http.HttpBase, asyncore.dispatcher):
         if pid and pid in self._children:
           self._children.remove(pid)
 
-    for child in self._children:
+    for child in self._children[:]:
       try:
         pid, _ = os.waitpid(child, os.WNOHANG)
       except os.error:
@@ -564,6 +731,142 @@ class HttpServer(http.HttpBase, asyncore.dispatcher):
       if pid and pid in self._children:
         self._children.remove(pid)
 
+  def _PrepareChild(self):
+    """Prepares a newly forked child process.
+
+    """
+    # In case the handler code uses temporary files
+    utils.ResetTempfileModule()
+
+  def HandleConnection(self, connection, client_addr, keepalive_timeout):
+    """Handles a single connection using the request executor.
+
+    @param connection: Connected socket
+    @param client_addr: Client address
+    @type keepalive_timeout: number or None
+    @param keepalive_timeout: Keep-alive timeout for this connection
+
+    """
+    try:
+      self.request_executor(self, self.handler, connection, client_addr,
+                            keepalive_timeout=keepalive_timeout)
+    except Exception: # pylint: disable=W0703
+      logging.exception("Error while handling request from %s:%s",
+                        client_addr[0], client_addr[1])
+      try:
+        connection.close()
+      except socket.error:
+        pass
+
+  def ConnectionDone(self):
+    """Called by worker threads when they finished handling a connection.
+
+    """
+    self._connections_lock.acquire()
+    try:
+      self._connections -= 1
+    finally:
+      self._connections_lock.release()
+
+  def _HasWaitingClients(self):
+    """Checks whether clients are waiting for a free worker.
+
+    """
+    if self.serving_mode == SERVING_MODE_PREFORK:
+      return (self._worker_signal.called or
+              utils.SingleWaitForFdCondition(self.socket, select.POLLIN,
+                                             0) is not None)
+
+    elif self.serving_mode == SERVING_MODE_THREADS:
+      return self._stopping or self._connections > self.num_workers
+
+    return False
+
+  def WaitForRequest(self, sock, timeout):
+    """Waits for the next request on a persistent connection.
+
+    With pre-forked workers or threads an idle persistent connection occupies
+    a worker. Waiting is therefore aborted as soon as other clients are
+    waiting to be served; the idle client will open a new connection when it
+    needs one.
+
+    @type sock: socket
+    @param sock: Connected socket
+    @type timeout: number
+    @param timeout: Keep-alive timeout
+    @rtype: bool
+    @return: Whether the client sent data
+
+    """
+    if self.serving_mode == SERVING_MODE_FORK:
+      return http.WaitForData(sock, timeout)
+
+    running_timeout = utils.RunningTimeout(timeout, True)
+
+    while True:
+      remaining = running_timeout.Remaining()
+      if remaining <= 0 or self._HasWaitingClients():
+        return False
+
+      if http.WaitForData(sock, min(remaining, self._WORKER_CHECK_INTERVAL)):
+        return True
+
+  def _SpawnWorkers(self):
+    """Forks worker processes until L{num_workers} are running.
+
+    """
+    assert self.serving_mode == SERVING_MODE_PREFORK
+
+    parent_pid = os.getpid()
+
+    while len(self._children) < self.num_workers:
+      pid = os.fork()
+      if pid == 0:
+        # Child process
+        try:
+          self._RunWorker(parent_pid)
+        except Exception: # pylint: disable=W0703
+          logging.exception("Error in HTTP server worker")
+          os._exit(1) # pylint: disable=W0212
+        os._exit(0) # pylint: disable=W0212
+      else:
+        self._children.append(pid)
+
+  def _RunWorker(self, parent_pid):
+    """Main loop of a pre-forked worker process.
+
+    @type parent_pid: int
+    @param parent_pid: Process ID of the server process
+
+    """
+    # Workers don't manage any children of their own
+    self._children = []
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+
+    # Finish handling the current connection before terminating
+    self._worker_signal = utils.SignalHandler([signal.SIGTERM, signal.SIGINT])
+
+    self._PrepareChild()
+
+    logging.debug("HTTP server worker %s started", os.getpid())
+
+    while not (self._worker_signal.called or os.getppid() != parent_pid):
+      if utils.SingleWaitForFdCondition(self.socket, select.POLLIN,
+                                        self._WORKER_CHECK_INTERVAL) is None:
+        continue
+
+      try:
+        (connection, client_addr) = self.socket.accept()
+      except socket.error, err:
+        # Another worker may have been faster
+        if err.args and err.args[0] in (errno.EAGAIN, errno.EINTR):
+          continue
+        raise
+
+      self.HandleConnection(connection, client_addr, self.keepalive_timeout)
+
+    logging.debug("HTTP server worker %s terminating", os.getpid())
+
   def _IncomingConnection(self):
     """Called for each incoming connection
 
@@ -571,8 +874,25 @@ class HttpServer(http.HttpBase, asyncore.dispatcher):
     # pylint: disable=W0212
     (connection, client_addr) = self.socket.accept()
 
+    if self.serving_mode == SERVING_MODE_THREADS:
+      self._connections_lock.acquire()
+      try:
+        self._connections += 1
+      finally:
+        self._connections_lock.release()
+
+      self._worker_pool.AddTask((self, connection, client_addr))
+      return
+
     self._CollectChildren(False)
 
+    # Idle persistent connections occupy a child process each; only allow
+    # them while there's enough room for new connections
+    if len(self._children) < (self.MAX_CHILDREN / 2):
+      keepalive_timeout = self.keepalive_timeout
+    else:
+      keepalive_timeout = None
+
     pid = os.fork()
     if pid == 0:
       # Child process
@@ -587,10 +907,10 @@ class HttpServer(http.HttpBase, asyncore.dispatcher):
           pass
         self.socket = None
 
-        # In case the handler code uses temporary files
-        utils.ResetTempfileModule()
+        self._PrepareChild()
 
-        self.request_executor(self, self.handler, connection, client_addr)
+        self.request_executor(self, self.handler, connection, client_addr,
+                              keepalive_timeout=keepalive_timeout)
       except Exception: # pylint: disable=W0703
         logging.exception("Error while handling request from %s:%s",
                           client_addr[0], client_addr[1])
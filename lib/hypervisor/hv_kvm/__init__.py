@@ -57,6 +57,7 @@ except ImportError:
 
 from ganeti import utils
 from ganeti import constants
+from ganeti import compat
 from ganeti import errors
 from ganeti import serializer
 from ganeti import objects
@@ -64,11 +65,14 @@ from ganeti import uidpool
 from ganeti import ssconf
 from ganeti import netutils
 from ganeti import pathutils
+from ganeti import workerpool
 from ganeti.hypervisor import hv_base
 from ganeti.utils import wrapper as utils_wrapper
 
 from ganeti.hypervisor.hv_kvm.monitor import QmpConnection, QmpMessage, \
-                                             MonitorSocket
+                                             MonitorSocket, \
+                                             QmpConnectionPool, \
+                                             QmpCommandNotSupported
 from ganeti.hypervisor.hv_kvm.netdev import OpenTap
 
 
@@ -115,17 +119,54 @@ _RUNTIME_ENTRY = {
 _MIGRATION_CAPS_DELIM = ":"
 
 
+#: QMP connections of all instances, see L{StartQmpPooling}
+_QMP_POOL = QmpConnectionPool()
+
+
+def StartQmpPooling():
+  """Keeps QMP connections to instances until L{StopQmpPooling} is called.
+
+  """
+  _QMP_POOL.Start()
+
+
+def StopQmpPooling():
+  """Closes the kept QMP connections to instances.
+
+  @rtype: tuple; (int, int)
+  @return: the number of connections established and the number of times
+    connections were used since L{StartQmpPooling} was called
+
+  """
+  return _QMP_POOL.Stop()
+
+
 def _with_qmp(fn):
   """Wrapper used on hotplug related methods"""
   def wrapper(self, instance, *args, **kwargs):
-    """Create a QmpConnection and run the wrapped method"""
-    if not getattr(self, "qmp", None):
-      filename = self._InstanceQmpMonitor(instance.name)# pylint: disable=W0212
-      self.qmp = QmpConnection(filename)
-    return fn(self, instance, *args, **kwargs)
+    """Run the wrapped method with the instance's pooled QMP connection"""
+    def _Call(qmp):
+      prev_qmp = self.qmp
+      self.qmp = qmp
+      try:
+        return fn(self, instance, *args, **kwargs)
+      finally:
+        self.qmp = prev_qmp
+    return self._CallQmp(instance.name, _Call) # pylint: disable=W0212
   return wrapper
 
 
+class _ParallelWorker(workerpool.BaseWorker):
+  """Worker used by L{KVMHypervisor.GetAllInstancesInfo}.
+
+  """
+  def RunTask(self, fn, *args): # pylint: disable=W0221
+    """Calls the given function.
+
+    """
+    fn(*args)
+
+
 def _GetDriveURI(disk, link, uri):
   """Helper function to get the drive uri to be used in --drive kvm option
 
@@ -283,6 +324,7 @@ class KVMHypervisor(hv_base.BaseHypervisor):
   _CONF_DIR = _ROOT_DIR + "/conf" # contains instances startup data
   _NICS_DIR = _ROOT_DIR + "/nic" # contains instances nic <-> tap associations
   _KEYMAP_DIR = _ROOT_DIR + "/keymap" # contains instances keymaps
+  _CAPS_DIR = _ROOT_DIR + "/caps" # contains kvm binaries capabilities
   # KVM instances with chroot enabled are started in empty chroot directories.
   _CHROOT_DIR = _ROOT_DIR + "/chroot" # for empty chroot directories
   # After an instance is stopped, its chroot directory is removed.
@@ -292,7 +334,7 @@ class KVMHypervisor(hv_base.BaseHypervisor):
   # a separate directory, called 'chroot-quarantine'.
   _CHROOT_QUARANTINE_DIR = _ROOT_DIR + "/chroot-quarantine"
   _DIRS = [_ROOT_DIR, _PIDS_DIR, _UIDS_DIR, _CTRL_DIR, _CONF_DIR, _NICS_DIR,
-           _CHROOT_DIR, _CHROOT_QUARANTINE_DIR, _KEYMAP_DIR]
+           _CHROOT_DIR, _CHROOT_QUARANTINE_DIR, _KEYMAP_DIR, _CAPS_DIR]
 
   PARAMETERS = {
     constants.HV_KVM_PATH: hv_base.REQ_FILE_CHECK,
@@ -391,6 +433,9 @@ class KVMHypervisor(hv_base.BaseHypervisor):
   _MIGRATION_INFO_MAX_BAD_ANSWERS = 5
   _MIGRATION_INFO_RETRY_DELAY = 2
 
+  # Number of instances queried concurrently by GetAllInstancesInfo
+  _INSTANCE_INFO_WORKERS = 8
+
   _VERSION_RE = re.compile(r"\b(\d+)\.(\d+)(\.(\d+))?\b")
 
   _CPU_INFO_RE = re.compile(r"cpu\s+\#(\d+).*thread_id\s*=\s*(\d+)", re.I)
@@ -418,9 +463,6 @@ class KVMHypervisor(hv_base.BaseHypervisor):
   _BOOT_RE = re.compile(r"^-drive\s([^-]|(?<!^)-)*,boot=on\|off", re.M | re.S)
   _UUID_RE = re.compile(r"^-uuid\s", re.M)
 
-  _INFO_VERSION_RE = \
-    re.compile(r'^QEMU (\d+)\.(\d+)(\.(\d+))?.*monitor.*', re.M)
-  _INFO_VERSION_CMD = "info version"
 
   # Slot 0 for Host bridge, Slot 1 for ISA bridge, Slot 2 for VGA controller
   _DEFAULT_PCI_RESERVATIONS = "11100000000000000000000000000000"
@@ -446,6 +488,9 @@ class KVMHypervisor(hv_base.BaseHypervisor):
     _KVMOPT_DEVICELIST: (["-device", "?"], True),
   }
 
+  # Output of kvm invocations, see _GetKVMOutput
+  _KVM_OUTPUT_CACHE = {}
+
   def __init__(self):
     hv_base.BaseHypervisor.__init__(self)
     # Let's make sure the directories we need exist, even if the RUN_DIR lives
@@ -816,7 +861,7 @@ class KVMHypervisor(hv_base.BaseHypervisor):
     """
     result = {}
     output = self._CallMonitorCommand(instance_name, self._CPU_INFO_CMD)
-    for line in output.stdout.splitlines():
+    for line in output.splitlines():
       match = self._CPU_INFO_RE.search(line)
       if not match:
         continue
@@ -874,36 +919,74 @@ class KVMHypervisor(hv_base.BaseHypervisor):
     times = "0"
 
     try:
-      qmp = QmpConnection(self._InstanceQmpMonitor(instance_name))
-      qmp.connect()
-      vcpus = len(qmp.Execute("query-cpus"))
-      # Will fail if ballooning is not enabled, but we can then just resort to
-      # the value above.
+      (vcpus, memory) = self._CallQmp(instance_name, self._QueryResources,
+                                      vcpus, memory)
+    except errors.HypervisorError:
+      pass
+
+    return (instance_name, pid, memory, vcpus, istat, times)
+
+  @staticmethod
+  def _QueryResources(qmp, vcpus, memory):
+    """Queries the number of vCPUs and the memory of an instance.
+
+    @type qmp: L{QmpConnection}
+    @param qmp: the connection to the instance
+    @return: (vcpus, memory), C{memory} is the passed value if ballooning is
+        not enabled
+
+    """
+    vcpus = len(qmp.Execute("query-cpus"))
+    try:
       mem_bytes = qmp.Execute("query-balloon")[qmp.ACTUAL_KEY]
       memory = mem_bytes / 1048576
     except errors.HypervisorError:
+      # Will fail if ballooning is not enabled, but we can then just resort to
+      # the value above.
       pass
+    return (vcpus, memory)
 
-    return (instance_name, pid, memory, vcpus, istat, times)
+  def _CollectInstanceInfo(self, name, data):
+    """Adds the properties of an instance to a dictionary.
+
+    """
+    try:
+      info = self.GetInstanceInfo(name)
+    except errors.HypervisorError:
+      # Ignore exceptions due to instances being shut down
+      return
+    if info:
+      data[name] = info
 
   def GetAllInstancesInfo(self, hvparams=None):
     """Get properties of all instances.
 
+    The instances are queried concurrently.
+
     @type hvparams: dict of strings
     @param hvparams: hypervisor parameter
     @return: list of tuples (name, id, memory, vcpus, stat, times)
 
     """
-    data = []
-    for name in os.listdir(self._PIDS_DIR):
+    names = os.listdir(self._PIDS_DIR)
+    data = {}
+
+    if len(names) < 2:
+      for name in names:
+        self._CollectInstanceInfo(name, data)
+    else:
+      pool = workerpool.WorkerPool("KvmInstanceInfo",
+                                   min(self._INSTANCE_INFO_WORKERS,
+                                       len(names)),
+                                   _ParallelWorker)
       try:
-        info = self.GetInstanceInfo(name)
-      except errors.HypervisorError:
-        # Ignore exceptions due to instances being shut down
-        continue
-      if info:
-        data.append(info)
-    return data
+        pool.AddManyTasks([(self._CollectInstanceInfo, name, data)
+                           for name in names])
+        pool.Quiesce()
+      finally:
+        pool.TerminateWorkers()
+
+    return [data[name] for name in names if name in data]
 
   def _GenerateKVMBlockDevicesOptions(self, instance, up_hvp, kvm_disks,
                                       kvmhelp, devlist):
@@ -1753,13 +1836,12 @@ class KVMHypervisor(hv_base.BaseHypervisor):
         raise errors.HypervisorError("Failed to open SPICE password file %s: %s"
                                      % (spice_password_file, err))
 
-      qmp = QmpConnection(self._InstanceQmpMonitor(instance.name))
-      qmp.connect()
       arguments = {
           "protocol": "spice",
           "password": spice_pwd,
       }
-      qmp.Execute("set_password", arguments)
+      self._CallQmp(instance.name,
+                    lambda qmp: qmp.Execute("set_password", arguments))
 
     for filename in temp_files:
       utils.RemoveFile(filename)
@@ -1790,23 +1872,48 @@ class KVMHypervisor(hv_base.BaseHypervisor):
     self._SaveKVMRuntime(instance, kvm_runtime)
     self._ExecuteKVMRuntime(instance, kvm_runtime, kvmhelp)
 
+  @classmethod
+  def _CallQmp(cls, instance_name, fn, *args):
+    """Calls a function with the pooled QMP connection of an instance.
+
+    @see: L{QmpConnectionPool.Call}
+
+    """
+    return _QMP_POOL.Call(cls._InstanceQmpMonitor(instance_name), fn, *args)
+
   @classmethod
   def _CallMonitorCommand(cls, instance_name, command, timeout=None):
     """Invoke a command on the instance monitor.
 
+    If the instance has a QMP socket the command is executed with
+    C{human-monitor-command} over the pooled QMP connection, in which case
+    C{timeout} is not used as every message has a timeout.
+
+    @rtype: string
+    @return: the output of the command
+
     """
+    if os.path.exists(cls._InstanceQmpMonitor(instance_name)):
+      try:
+        return cls._CallQmp(instance_name,
+                            lambda qmp: qmp.HumanMonitorCommand(command))
+      except QmpCommandNotSupported:
+        logging.debug("Instance %s can't execute monitor commands via QMP",
+                      instance_name)
+      except errors.HypervisorError, err:
+        raise errors.HypervisorError("Failed to send command '%s' to instance"
+                                     " '%s': %s" % (command, instance_name,
+                                                    err))
+
     if timeout is not None:
       timeout_cmd = "timeout %s" % (timeout, )
     else:
       timeout_cmd = ""
 
-    # TODO: Replace monitor calls with QMP once KVM >= 0.14 is the minimum
-    # version. The monitor protocol is designed for human consumption, whereas
-    # QMP is made for programmatic usage. In the worst case QMP can also
-    # execute monitor commands. As it is, all calls to socat take at least
-    # 500ms and likely more: socat can't detect the end of the reply and waits
-    # for 500ms of no data received before exiting (500 ms is the default for
-    # the "-t" parameter).
+    # Instances without QMP only have the human monitor. All calls to socat
+    # take at least 500ms and likely more: socat can't detect the end of the
+    # reply and waits for 500ms of no data received before exiting (500 ms is
+    # the default for the "-t" parameter).
     socat = ("echo %s | %s %s STDIO UNIX-CONNECT:%s" %
              (utils.ShellQuote(command),
               timeout_cmd,
@@ -1819,7 +1926,7 @@ class KVMHypervisor(hv_base.BaseHypervisor):
              (command, instance_name, result.fail_reason, result.output))
       raise errors.HypervisorError(msg)
 
-    return result
+    return result.stdout
 
   @_with_qmp
   def VerifyHotplugSupport(self, instance, action, dev_type):
@@ -1846,17 +1953,12 @@ class KVMHypervisor(hv_base.BaseHypervisor):
 
     """
     try:
-      output = self._CallMonitorCommand(instance.name, self._INFO_VERSION_CMD)
+      version = self._CallQmp(instance.name, lambda qmp: qmp.version)
     except errors.HypervisorError:
       raise errors.HotplugError("Instance is probably down")
 
-    match = self._INFO_VERSION_RE.search(output.stdout)
-    if not match:
-      raise errors.HotplugError("Cannot parse qemu version via monitor")
-
     #TODO: delegate more fine-grained checks to VerifyHotplugSupport
-    v_major, v_min, _, _ = match.groups()
-    if (int(v_major), int(v_min)) < (1, 7):
+    if version[:2] < (1, 7):
       raise errors.HotplugError("Hotplug not supported for qemu versions < 1.7")
 
   @_with_qmp
@@ -1986,10 +2088,86 @@ class KVMHypervisor(hv_base.BaseHypervisor):
       v_rev = 0
     return (v_all, v_maj, v_min, v_rev)
 
+  @classmethod
+  def _KVMCapsFile(cls, kvm_path):
+    """Returns the file caching the output of a kvm executable.
+
+    """
+    return utils.PathJoin(cls._CAPS_DIR,
+                          compat.sha1_hash(kvm_path).hexdigest())
+
+  @staticmethod
+  def _GetKVMBinaryId(kvm_path):
+    """Returns the identity of a kvm executable.
+
+    Any change to the executable, e.g. by a package upgrade, changes its
+    identity.
+
+    @rtype: list
+    @return: device, inode, size and modification time of the executable
+
+    """
+    try:
+      st = os.stat(kvm_path)
+    except EnvironmentError, err:
+      raise errors.HypervisorError("Can't stat KVM executable %s: %s" %
+                                   (kvm_path, err))
+
+    return [st.st_dev, st.st_ino, st.st_size, st.st_mtime]
+
+  @classmethod
+  def _LoadKVMCaps(cls, kvm_path, binary_id):
+    """Loads the cached output of a kvm executable.
+
+    @rtype: dict
+    @return: the cached output by option, empty if the cache doesn't exist or
+        belongs to a different executable
+
+    """
+    try:
+      data = serializer.LoadJson(utils.ReadFile(cls._KVMCapsFile(kvm_path)))
+    except EnvironmentError, err:
+      if err.errno != errno.ENOENT:
+        logging.warning("Can't read cached output of %s: %s", kvm_path, err)
+      return {}
+    except Exception, err: # pylint: disable=W0703
+      logging.warning("Ignoring invalid cached output of %s: %s",
+                      kvm_path, err)
+      return {}
+
+    if (not isinstance(data, dict) or data.get("path") != kvm_path or
+        data.get("id") != binary_id or
+        not isinstance(data.get("output"), dict)):
+      return {}
+
+    return data["output"]
+
+  @classmethod
+  def _SaveKVMCaps(cls, kvm_path, binary_id, output):
+    """Saves the output of a kvm executable to the cache.
+
+    Failures are only logged, as the output can always be fetched again.
+
+    """
+    data = {
+      "path": kvm_path,
+      "id": binary_id,
+      "output": output,
+      }
+    try:
+      utils.WriteFile(cls._KVMCapsFile(kvm_path),
+                      data=serializer.DumpJson(data), mode=0644)
+    except EnvironmentError, err:
+      logging.warning("Can't cache output of %s: %s", kvm_path, err)
+
   @classmethod
   def _GetKVMOutput(cls, kvm_path, option):
     """Return the output of a kvm invocation
 
+    The output is cached in memory and in L{_CAPS_DIR}, so that it's shared
+    between processes and survives node daemon restarts, and the executable
+    is only run again after it has changed.
+
     @type kvm_path: string
     @param kvm_path: path to the kvm executable
     @type option: a key of _KVMOPTS_CMDS
@@ -2000,12 +2178,28 @@ class KVMHypervisor(hv_base.BaseHypervisor):
     """
     assert option in cls._KVMOPTS_CMDS, "Invalid output option"
 
+    binary_id = cls._GetKVMBinaryId(kvm_path)
+
+    (cached_id, output) = cls._KVM_OUTPUT_CACHE.get(kvm_path, (None, None))
+    if cached_id != binary_id:
+      output = cls._LoadKVMCaps(kvm_path, binary_id)
+      cls._KVM_OUTPUT_CACHE[kvm_path] = (binary_id, output)
+
+    if option in output:
+      return output[option]
+
     optlist, can_fail = cls._KVMOPTS_CMDS[option]
 
     result = utils.RunCmd([kvm_path] + optlist)
     if result.failed and not can_fail:
       raise errors.HypervisorError("Unable to get KVM %s output" %
                                     " ".join(optlist))
+
+    if binary_id == cls._GetKVMBinaryId(kvm_path):
+      # Don't cache the output if the executable changed while running it
+      output[option] = result.output
+      cls._SaveKVMCaps(kvm_path, binary_id, output)
+
     return result.output
 
   @classmethod
@@ -2234,19 +2428,19 @@ class KVMHypervisor(hv_base.BaseHypervisor):
     """
     info_command = "info migrate"
     for _ in range(self._MIGRATION_INFO_MAX_BAD_ANSWERS):
-      result = self._CallMonitorCommand(instance.name, info_command)
-      match = self._MIGRATION_STATUS_RE.search(result.stdout)
+      output = self._CallMonitorCommand(instance.name, info_command)
+      match = self._MIGRATION_STATUS_RE.search(output)
       if not match:
-        if not result.stdout:
+        if not output:
           logging.info("KVM: empty 'info migrate' result")
         else:
           logging.warning("KVM: unknown 'info migrate' result: %s",
-                          result.stdout)
+                          output)
       else:
         status = match.group(1)
         if status in constants.HV_KVM_MIGRATION_VALID_STATUSES:
           migration_status = objects.MigrationStatus(status=status)
-          match = self._MIGRATION_PROGRESS_RE.search(result.stdout)
+          match = self._MIGRATION_PROGRESS_RE.search(output)
           if match:
             migration_status.transferred_ram = match.group("transferred")
             migration_status.total_ram = match.group("total")
@@ -38,6 +38,8 @@ import errno
 import socket
 import StringIO
 import logging
+import threading
+import time
 try:
   import fdsend   # pylint: disable=F0401
 except ImportError:
@@ -63,6 +65,16 @@ class QmpCommandNotSupported(errors.HypervisorError):
   pass
 
 
+class QmpCommandError(errors.HypervisorError):
+  """QMP command failed.
+
+  This is raised if the monitor answered a command with an error, as opposed
+  to errors while communicating with it. The connection can still be used.
+
+  """
+  pass
+
+
 class QmpMessage(object):
   """QEMU Messaging Protocol (QMP) message.
 
@@ -253,6 +265,8 @@ class QmpConnection(MonitorSocket):
   _QEMU_KEY = "qemu"
   _CAPABILITIES_COMMAND = "qmp_capabilities"
   _QUERY_COMMANDS = "query-commands"
+  _HUMAN_MONITOR_COMMAND = "human-monitor-command"
+  _COMMAND_LINE_KEY = "command-line"
   _MESSAGE_END_TOKEN = "\r\n"
   _QEMU_PCI_SLOTS = 32 # The number of PCI slots QEMU exposes by default
 
@@ -278,6 +292,10 @@ class QmpConnection(MonitorSocket):
     @raise errors.ProgrammerError: when there are data serialization errors
 
     """
+    if self._connected:
+      # The greeting has been received already
+      return
+
     super(QmpConnection, self).connect()
     # Check if we receive a correct greeting message from the server
     # (As per the QEMU Protocol Specification 0.1 - section 2.2)
@@ -446,11 +464,11 @@ class QmpConnection(MonitorSocket):
       response = self._Recv()
       err = response[self._ERROR_KEY]
       if err:
-        raise errors.HypervisorError("kvm: error executing the %s"
-                                     " command: %s (%s):" %
-                                     (command,
-                                      err[self._ERROR_DESC_KEY],
-                                      err[self._ERROR_CLASS_KEY]))
+        raise QmpCommandError("kvm: error executing the %s"
+                              " command: %s (%s):" %
+                              (command,
+                               err[self._ERROR_DESC_KEY],
+                               err[self._ERROR_CLASS_KEY]))
 
       elif response[self._EVENT_KEY]:
         # Filter-out any asynchronous events
@@ -458,6 +476,20 @@ class QmpConnection(MonitorSocket):
 
       return response[self._RETURN_KEY]
 
+  def HumanMonitorCommand(self, command):
+    """Executes a command of the human monitor.
+
+    @type command: str
+    @param command: the command line to execute
+    @rtype: str
+    @return: the output of the command
+    @raise QmpCommandNotSupported: if the instance doesn't support executing
+        human monitor commands via QMP
+
+    """
+    return self.Execute(self._HUMAN_MONITOR_COMMAND,
+                        {self._COMMAND_LINE_KEY: command.strip()})
+
   @_ensure_connection
   def HotAddNic(self, nic, devid, tapfds=None, vhostfds=None, features=None):
     """Hot-add a NIC
@@ -724,3 +756,215 @@ class QmpConnection(MonitorSocket):
       # succeeded, the whole hot-add action will fail and the runtime file will
       # not be updated which will make the instance non migrate-able
       logging.info("Removing fdset with id %s failed: %s", fdset, err)
+
+
+class _QmpSession(object):
+  """Session of L{QmpConnectionPool} for a single monitor socket.
+
+  @ivar lock: lock serializing the use of the session
+  @ivar refs: the number of threads using or waiting for the session,
+      protected by the lock of the pool
+  @ivar users: the number of nested uses by the thread holding the lock
+  @ivar connection: the L{QmpConnection}, C{None} if not connected
+  @ivar socket_id: device and inode of the socket when it was connected to
+  @ivar last_used: when the connection has been used for the last time
+
+  """
+  def __init__(self):
+    """Initializes this class.
+
+    """
+    self.lock = threading.RLock()
+    self.refs = 0
+    self.users = 0
+    self.connection = None
+    self.socket_id = None
+    self.last_used = None
+
+
+def _GetSocketId(filename):
+  """Returns the device and inode of a socket, C{None} if it doesn't exist.
+
+  """
+  try:
+    st = os.stat(filename)
+  except EnvironmentError:
+    return None
+
+  return (st.st_dev, st.st_ino)
+
+
+class QmpConnectionPool(object):
+  """Pool of QMP connections, one per monitor socket.
+
+  QEMU accepts only one client on a QMP socket at a time, so all users of a
+  socket must share a connection and connections must not be kept longer
+  than necessary. While keeping is enabled (see L{Start}), e.g. for the
+  duration of a request to the node daemon, connections are kept and reused;
+  otherwise they're closed as soon as they're not used anymore.
+
+  Every connection is used by one thread at a time, nested uses by the same
+  thread share it. Before a kept connection is reused it's verified that the
+  socket is still the one it's connected to, i.e. that the instance hasn't
+  been restarted, and, if it has been idle for a while, that the monitor
+  still answers.
+
+  """
+  #: Kept connections idle for longer than this are checked before reuse
+  _CHECK_IDLE_TIME = 5.0
+
+  #: Command used to check a connection
+  _CHECK_COMMAND = "query-status"
+
+  def __init__(self, _connection_cls=QmpConnection, _time_fn=time.time):
+    """Initializes this class.
+
+    """
+    self._connection_cls = _connection_cls
+    self._time_fn = _time_fn
+
+    self._lock = threading.Lock()
+    self._sessions = {}
+    self._keep = False
+    self._connects = 0
+    self._uses = 0
+
+  def Start(self):
+    """Keeps connections until L{Stop} is called.
+
+    """
+    self._lock.acquire()
+    try:
+      self._keep = True
+      self._connects = 0
+      self._uses = 0
+    finally:
+      self._lock.release()
+
+  def Stop(self):
+    """Closes all kept connections.
+
+    @rtype: tuple; (int, int)
+    @return: the number of connections established and the number of times
+        connections were used while keeping them
+
+    """
+    self._lock.acquire()
+    try:
+      self._keep = False
+      result = (self._connects, self._uses)
+      idle = [(filename, session)
+              for (filename, session) in self._sessions.items()
+              if not session.refs]
+      for (filename, _) in idle:
+        del self._sessions[filename]
+    finally:
+      self._lock.release()
+
+    for (_, session) in idle:
+      self._Close(session)
+
+    return result
+
+  @staticmethod
+  def _Close(session):
+    """Closes the connection of a session.
+
+    """
+    if session.connection is not None:
+      try:
+        session.connection.close()
+      except EnvironmentError, err:
+        logging.debug("Error while closing QMP connection: %s", err)
+      session.connection = None
+
+  def _Connect(self, filename, session):
+    """Returns a working connection for a session.
+
+    """
+    if session.connection is not None:
+      if session.users > 1:
+        # Nested use, the connection is known to work
+        return session.connection
+
+      if _GetSocketId(filename) != session.socket_id:
+        logging.debug("QMP socket %s has been replaced, reconnecting",
+                      filename)
+        self._Close(session)
+      elif self._time_fn() - session.last_used > self._CHECK_IDLE_TIME:
+        try:
+          session.connection.Execute(self._CHECK_COMMAND)
+        except errors.HypervisorError, err:
+          logging.debug("QMP connection to %s doesn't work anymore (%s),"
+                        " reconnecting", filename, err)
+          self._Close(session)
+
+    if session.connection is None:
+      socket_id = _GetSocketId(filename)
+      connection = self._connection_cls(filename)
+      connection.connect()
+      session.connection = connection
+      session.socket_id = socket_id
+
+      self._lock.acquire()
+      try:
+        self._connects += 1
+      finally:
+        self._lock.release()
+
+    return session.connection
+
+  def Call(self, filename, fn, *args):
+    """Calls a function with a connection to a QMP socket.
+
+    @type filename: string
+    @param filename: the QMP socket
+    @type fn: callable
+    @param fn: function called with the L{QmpConnection} and C{args}
+    @return: the result of C{fn}
+    @raise errors.HypervisorError: when there are communication errors; the
+        connection is closed in this case
+
+    """
+    self._lock.acquire()
+    try:
+      session = self._sessions.get(filename, None)
+      if session is None:
+        session = self._sessions[filename] = _QmpSession()
+      session.refs += 1
+      self._uses += 1
+    finally:
+      self._lock.release()
+
+    session.lock.acquire()
+    try:
+      session.users += 1
+      try:
+        connection = self._Connect(filename, session)
+        try:
+          # pylint: disable=W0142
+          return fn(connection, *args)
+        except (QmpCommandError, QmpCommandNotSupported, errors.HotplugError):
+          # The connection itself works
+          raise
+        except errors.HypervisorError:
+          # The state of the connection is unknown
+          self._Close(session)
+          raise
+      finally:
+        session.last_used = self._time_fn()
+        session.users -= 1
+
+        self._lock.acquire()
+        try:
+          session.refs -= 1
+          discard = not (self._keep or session.refs)
+          if discard:
+            del self._sessions[filename]
+        finally:
+          self._lock.release()
+
+        if discard:
+          self._Close(session)
+    finally:
+      session.lock.release()
@@ -46,6 +46,7 @@ from ganeti import errors
 from ganeti import utils
 from ganeti import netutils
 from ganeti import compat
+from ganeti import pathutils
 
 
 #: Used to recognize point at which socat(1) starts to listen on its socket.
@@ -83,9 +84,26 @@ DD_STDERR_IGNORE = re.compile(r"^\d+\+\d+\s*records\s+(?:in|out)$", re.I)
 #: unavailable and SIGUSR1 is used instead)
 DD_INFO_SIGNAL = getattr(signal, "SIGINFO", signal.SIGUSR1)
 
-#: Buffer size: at most this many bytes are transferred at once
+#: Default buffer size: at most this many bytes are transferred at once
 BUFSIZE = 1024 * 1024
 
+#: Commands to compress data, by compression method; the first installed
+#: alternative is used. All alternatives of a method must produce the same
+#: format, as the peer may choose a different one. Multi-threaded programs are
+#: preferred, as single-threaded compression limits the throughput.
+COMPRESS_CMDS = {
+  constants.IEC_GZIP: [["pigz", "-c"], ["gzip", "-c"]],
+  constants.IEC_ZSTD: [["zstd", "-q", "-c", "-T0"]],
+  constants.IEC_LZ4: [["lz4", "-q", "-c"]],
+  }
+
+#: Commands to decompress data, by compression method, see L{COMPRESS_CMDS}
+DECOMPRESS_CMDS = {
+  constants.IEC_GZIP: [["pigz", "-d", "-c"], ["gunzip", "-c"]],
+  constants.IEC_ZSTD: [["zstd", "-q", "-d", "-c"]],
+  constants.IEC_LZ4: [["lz4", "-q", "-d", "-c"]],
+  }
+
 # Common options for socat
 SOCAT_TCP_OPTS = ["keepalive", "keepidle=60", "keepintvl=10", "keepcnt=5"]
 SOCAT_OPENSSL_OPTS = ["verify=1", "method=TLSv1",
@@ -133,6 +151,11 @@ class CommandBuilder(object):
     self._dd_stderr_fd = dd_stderr_fd
     self._dd_pid_fd = dd_pid_fd
 
+    if self._opts.buffer_size:
+      self._bufsize = self._opts.buffer_size
+    else:
+      self._bufsize = BUFSIZE
+
     assert (self._opts.magic is None or
             constants.IE_MAGIC_RE.match(self._opts.magic))
 
@@ -221,7 +244,7 @@ class CommandBuilder(object):
       "-d", "-d",
 
       # Buffer size
-      "-b%s" % BUFSIZE,
+      "-b%s" % self._bufsize,
 
       # Unidirectional mode, the first address is only used for reading, and the
       # second address is only used for writing
@@ -277,7 +300,7 @@ class CommandBuilder(object):
     # redirecting stdin, as the background process (dd) would have
     # /dev/null as stdin otherwise
     dd_cmd.write("LC_ALL=C dd bs=%s <&0 2>&%d & pid=${!};" %
-                 (BUFSIZE, self._dd_stderr_fd))
+                 (self._bufsize, self._dd_stderr_fd))
     # Send PID to daemon
     dd_cmd.write(" echo $pid >&%d;" % self._dd_pid_fd)
     # And wait for dd
@@ -289,6 +312,58 @@ class CommandBuilder(object):
 
     return dd_cmd.getvalue()
 
+  def _GetCompressionCommand(self):
+    """Returns the command to compress or decompress the data.
+
+    @rtype: string or None
+    @return: the command, C{None} if the data isn't compressed
+
+    """
+    compr = self._opts.compress
+
+    assert compr in constants.IEC_ALL
+
+    if compr == constants.IEC_NONE:
+      return None
+
+    if self._mode == constants.IEM_IMPORT:
+      alternatives = DECOMPRESS_CMDS[compr]
+    elif self._mode == constants.IEM_EXPORT:
+      alternatives = COMPRESS_CMDS[compr]
+    else:
+      raise errors.GenericError("Invalid mode '%s'" % self._mode)
+
+    fallback = utils.ShellQuoteArgs(alternatives[-1])
+
+    if len(alternatives) == 1:
+      return fallback
+
+    # Use the first installed program
+    conditions = ["type -P %s >/dev/null; then %s;" %
+                  (utils.ShellQuote(args[0]), utils.ShellQuoteArgs(args))
+                  for args in alternatives[:-1]]
+
+    return "{ if %s else %s; fi; }" % (" elif ".join(conditions), fallback)
+
+  def _GetSparseCommand(self):
+    """Returns the command to skip zeroed blocks or to restore them.
+
+    @rtype: string or None
+    @return: the command, C{None} if zeroed blocks are transferred
+
+    """
+    if not self._opts.sparse:
+      return None
+
+    if self._mode == constants.IEM_IMPORT:
+      mode = "decode"
+    elif self._mode == constants.IEM_EXPORT:
+      mode = "encode"
+    else:
+      raise errors.GenericError("Invalid mode '%s'" % self._mode)
+
+    return utils.ShellQuoteArgs([pathutils.SPARSE_COPY, mode])
+
   def _GetTransportCommand(self):
     """Returns the command for the transport part of the daemon.
 
@@ -297,26 +372,32 @@ class CommandBuilder(object):
                  (utils.ShellQuoteArgs(self._GetSocatCommand()),
                   self._socat_stderr_fd))
     dd_cmd = self._GetDdCommand()
-
-    compr = self._opts.compress
-
-    assert compr in constants.IEC_ALL
+    compr_cmd = self._GetCompressionCommand()
+    sparse_cmd = self._GetSparseCommand()
 
     parts = []
 
+    # Zeroed blocks are skipped after measuring the throughput, so progress
+    # still refers to the size of the data
     if self._mode == constants.IEM_IMPORT:
       parts.append(socat_cmd)
 
-      if compr == constants.IEC_GZIP:
-        parts.append("gunzip -c")
+      if compr_cmd:
+        parts.append(compr_cmd)
+
+      if sparse_cmd:
+        parts.append(sparse_cmd)
 
       parts.append(dd_cmd)
 
     elif self._mode == constants.IEM_EXPORT:
       parts.append(dd_cmd)
 
-      if compr == constants.IEC_GZIP:
-        parts.append("gzip -c")
+      if sparse_cmd:
+        parts.append(sparse_cmd)
+
+      if compr_cmd:
+        parts.append(compr_cmd)
 
       parts.append(socat_cmd)
 
@@ -33,8 +33,14 @@
 Locking: there's a single, large lock in the L{JobQueue} class. It's
 used by all other classes in this module.
 
-@var JOBQUEUE_THREADS: the number of worker threads we start for
-    processing jobs
+@var JOB_CLASS_WORKERS: the minimum and maximum number of worker threads
+    processing the jobs of each concurrency class
+@var JOBQUEUE_REPLICATION_WINDOW: time in seconds during which updates of
+    job files are collected before being replicated to other nodes
+@var JOBQUEUE_CACHE_SIZE: the maximum number of finalized jobs kept in
+    memory for read-only access
+@var JOBQUEUE_CACHE_MEMORY: the maximum size in bytes of the job files of
+    the finalized jobs kept in memory
 
 """
 
@@ -45,6 +51,7 @@ import weakref
 import threading
 import itertools
 import operator
+import collections
 
 try:
   # pylint: disable=E0611
@@ -59,6 +66,7 @@ from ganeti import workerpool
 from ganeti import locking
 from ganeti import opcodes
 from ganeti import opcodes_base
+from ganeti import optimeline
 from ganeti import errors
 from ganeti import mcpu
 from ganeti import utils
@@ -74,7 +82,12 @@ from ganeti import pathutils
 from ganeti import vcluster
 
 
-JOBQUEUE_THREADS = 25
+JOBQUEUE_REPLICATION_WINDOW = 0.02
+JOBQUEUE_CACHE_SIZE = 1000
+JOBQUEUE_CACHE_MEMORY = 32 * 1024 * 1024
+
+#: Maximum number of jobs repaired in the job index before rebuilding it
+_MAX_JOB_INDEX_REPAIR = 1000
 
 # member lock names to be passed to @ssynchronized decorator
 _LOCK = "_lock"
@@ -83,6 +96,76 @@ _QUEUE = "_queue"
 #: Retrieves "id" attribute
 _GetIdAttr = operator.attrgetter("id")
 
+#: Concurrency classes of jobs, the jobs of each class are processed by their
+#: own workers
+(JOB_CLASS_SHORT,
+ JOB_CLASS_NORMAL,
+ JOB_CLASS_LONG) = ("short", "normal", "long")
+
+#: Concurrency classes ordered by how long their opcodes usually take
+_JOB_CLASS_ORDER = [JOB_CLASS_SHORT, JOB_CLASS_NORMAL, JOB_CLASS_LONG]
+
+JOB_CLASS_WORKERS = {
+  JOB_CLASS_SHORT: (5, 10),
+  JOB_CLASS_NORMAL: (15, 30),
+  JOB_CLASS_LONG: (5, 15),
+  }
+
+#: Opcodes not belonging to L{JOB_CLASS_NORMAL}
+_OPCODE_JOB_CLASS = dict(
+  [(opcls.OP_ID, JOB_CLASS_SHORT) for opcls in [
+    opcodes.OpBackupQuery,
+    opcodes.OpClusterConfigQuery,
+    opcodes.OpClusterQuery,
+    opcodes.OpExtStorageDiagnose,
+    opcodes.OpGroupQuery,
+    opcodes.OpInstanceQuery,
+    opcodes.OpInstanceQueryData,
+    opcodes.OpNetworkQuery,
+    opcodes.OpNodeQuery,
+    opcodes.OpNodeQueryStorage,
+    opcodes.OpNodeQueryvols,
+    opcodes.OpOsDiagnose,
+    opcodes.OpQuery,
+    opcodes.OpQueryFields,
+    opcodes.OpTagsDel,
+    opcodes.OpTagsGet,
+    opcodes.OpTagsSearch,
+    opcodes.OpTagsSet,
+    ]] +
+  [(opcls.OP_ID, JOB_CLASS_LONG) for opcls in [
+    opcodes.OpBackupExport,
+    opcodes.OpClusterVerify,
+    opcodes.OpClusterVerifyConfig,
+    opcodes.OpClusterVerifyDisks,
+    opcodes.OpClusterVerifyGroup,
+    opcodes.OpGroupEvacuate,
+    opcodes.OpGroupVerifyDisks,
+    opcodes.OpInstanceChangeGroup,
+    opcodes.OpInstanceCreate,
+    opcodes.OpInstanceFailover,
+    opcodes.OpInstanceGrowDisk,
+    opcodes.OpInstanceMigrate,
+    opcodes.OpInstanceMove,
+    opcodes.OpInstanceMultiAlloc,
+    opcodes.OpInstanceRecreateDisks,
+    opcodes.OpInstanceReinstall,
+    opcodes.OpInstanceReplaceDisks,
+    opcodes.OpNodeEvacuate,
+    opcodes.OpNodeMigrate,
+    ]])
+
+#: Time in seconds after which an opcode still waiting for its locks counts
+#: as blocked when sizing the worker pools
+_LOCK_WAIT_THRESHOLD = 1.0
+
+#: Interval in seconds at which worker pools with queued jobs re-check the
+#: number of blocked workers
+_POOL_ADJUST_INTERVAL = 1.0
+
+#: Weight of the most recent job in the average time jobs wait for a worker
+_LATENCY_WEIGHT = 0.2
+
 
 class CancelJob(Exception):
   """Special exception to cancel a job.
@@ -114,6 +197,141 @@ def _CallJqUpdate(runner, names, file_name, content):
   return runner.call_jobqueue_update(names, virt_file_name, content)
 
 
+def _CallJqUpdateMulti(runner, names, files):
+  """Updates multiple job queue files after virtualizing filenames.
+
+  Nodes running a version without support for C{jobqueue_update_multi} are
+  sent the files one by one.
+
+  """
+  data = serializer.DumpJson([(vcluster.MakeVirtualPath(file_name), content)
+                              for (file_name, content) in files])
+  result = runner.call_jobqueue_update_multi(names, data)
+
+  for node_name in names:
+    if not result[node_name].unknown_call:
+      continue
+
+    logging.info("Node '%s' can't update multiple job queue files at once,"
+                 " updating them one by one", node_name)
+
+    for (file_name, content) in files:
+      node_result = _CallJqUpdate(runner, [node_name], file_name,
+                                  content)[node_name]
+      if node_result.fail_msg:
+        break
+
+    result[node_name] = node_result
+
+  return result
+
+
+def _TimestampToList(timestamp):
+  """Converts a timestamp to the format stored in the job index.
+
+  """
+  if timestamp is None:
+    return None
+  else:
+    return list(timestamp)
+
+
+def _TimestampFromList(timestamp):
+  """Converts a timestamp stored in the job index.
+
+  """
+  if timestamp is None:
+    return None
+  else:
+    return tuple(timestamp)
+
+
+def _GetJobIndexData(job):
+  """Returns the data stored in the job index for a job.
+
+  @type job: L{_QueuedJob}
+  @rtype: list
+
+  """
+  return [job.CalcStatus(), job.CalcPriority(),
+          _TimestampToList(job.received_timestamp),
+          _TimestampToList(job.start_timestamp),
+          _TimestampToList(job.end_timestamp),
+          job.GetSummary()]
+
+
+def _GetConcurrencyClass(op_ids):
+  """Returns the concurrency class of a job.
+
+  A job belongs to the class of its longest-running opcode.
+
+  @type op_ids: list of strings
+  @param op_ids: C{OP_ID} of all opcodes of the job
+  @rtype: string
+
+  """
+  return max([_OPCODE_JOB_CLASS.get(op_id, JOB_CLASS_NORMAL)
+              for op_id in op_ids] or [JOB_CLASS_NORMAL],
+             key=_JOB_CLASS_ORDER.index)
+
+
+class _IndexedJob(object):
+  """Read-only job built from the job index.
+
+  Provides everything needed by the job query fields not requiring
+  L{query.JQ_OPCODES}.
+
+  """
+  __slots__ = ["id", "archived", "received_timestamp", "start_timestamp",
+               "end_timestamp", "_status", "_priority", "_summary"]
+
+  def __init__(self, job_id, archived, data):
+    """Initializes this class.
+
+    @type job_id: int
+    @param job_id: Job ID
+    @type archived: bool
+    @param archived: Whether the job is archived
+    @type data: list
+    @param data: Data as returned by L{_GetJobIndexData}
+
+    """
+    (self._status, self._priority, received_timestamp, start_timestamp,
+     end_timestamp, self._summary) = data
+
+    self.id = job_id
+    self.archived = archived
+    self.received_timestamp = _TimestampFromList(received_timestamp)
+    self.start_timestamp = _TimestampFromList(start_timestamp)
+    self.end_timestamp = _TimestampFromList(end_timestamp)
+
+  def CalcStatus(self):
+    """Returns the job status.
+
+    """
+    return self._status
+
+  def CalcPriority(self):
+    """Returns the job priority.
+
+    """
+    return self._priority
+
+  def GetSummary(self):
+    """Returns the summaries of all opcodes.
+
+    """
+    return self._summary
+
+  def CalcConcurrencyClass(self):
+    """Returns the concurrency class of the job.
+
+    """
+    # Summaries start with the opcode ID without its "OP_" prefix
+    return _GetConcurrencyClass(["OP_%s" % summary.split("(", 1)[0]
+                                 for summary in self._summary])
+
+
 class _SimpleJobQuery:
   """Wrapper for job queries.
 
@@ -130,7 +348,8 @@ class _SimpleJobQuery:
     """Executes a job query using cached field list.
 
     """
-    return self._query.OldStyleQuery([(job.id, job)], sort_by_name=False)[0]
+    return self._query.OldStyleQuery(query.JobQueryData([(job.id, job)]),
+                                     sort_by_name=False)[0]
 
 
 class _QueuedOpCode(object):
@@ -144,11 +363,12 @@ class _QueuedOpCode(object):
   @ivar start_timestamp: timestamp for the start of the execution
   @ivar exec_timestamp: timestamp for the actual LU Exec() function invocation
   @ivar stop_timestamp: timestamp for the end of the execution
+  @ivar timeline: spans of the execution phases, see L{optimeline}
 
   """
   __slots__ = ["input", "status", "result", "log", "priority",
                "start_timestamp", "exec_timestamp", "end_timestamp",
-               "__weakref__"]
+               "timeline", "__weakref__"]
 
   def __init__(self, op):
     """Initializes instances of this class.
@@ -164,6 +384,7 @@ class _QueuedOpCode(object):
     self.start_timestamp = None
     self.exec_timestamp = None
     self.end_timestamp = None
+    self.timeline = []
 
     # Get initial priority (it might change during the lifetime of this opcode)
     self.priority = getattr(op, "priority", constants.OP_PRIO_DEFAULT)
@@ -186,6 +407,7 @@ class _QueuedOpCode(object):
     obj.start_timestamp = state.get("start_timestamp", None)
     obj.exec_timestamp = state.get("exec_timestamp", None)
     obj.end_timestamp = state.get("end_timestamp", None)
+    obj.timeline = state.get("timeline", [])
     obj.priority = state.get("priority", constants.OP_PRIO_DEFAULT)
     return obj
 
@@ -204,6 +426,7 @@ class _QueuedOpCode(object):
       "start_timestamp": self.start_timestamp,
       "exec_timestamp": self.exec_timestamp,
       "end_timestamp": self.end_timestamp,
+      "timeline": list(self.timeline),
       "priority": self.priority,
       }
 
@@ -423,6 +646,22 @@ class _QueuedJob(object):
 
     return min(priorities)
 
+  def GetSummary(self):
+    """Returns the summaries of all opcodes.
+
+    @rtype: list
+
+    """
+    return [op.input.Summary() for op in self.ops]
+
+  def CalcConcurrencyClass(self):
+    """Returns the concurrency class of the job.
+
+    @rtype: string
+
+    """
+    return _GetConcurrencyClass([op.input.OP_ID for op in self.ops])
+
   def GetLogEntries(self, newer_than):
     """Selectively returns the log entries.
 
@@ -1126,6 +1365,9 @@ class _JobProcessor(object):
 
     timeout = opctx.GetNextLockTimeout()
 
+    # Record the phases of the execution in this thread
+    optimeline.SetTimeline(op.timeline)
+
     try:
       # Make sure not to hold queue lock while calling ExecOpCode
       result = self.opexec_fn(op.input,
@@ -1169,6 +1411,8 @@ class _JobProcessor(object):
       logging.debug("%s: %s successful",
                     opctx.log_prefix, opctx.summary)
       return (constants.OP_STATUS_SUCCESS, result)
+    finally:
+      optimeline.SetTimeline(None)
 
   def __call__(self, _nextop_fn=None):
     """Continues execution of a job.
@@ -1460,16 +1704,309 @@ class _JobQueueWorker(workerpool.BaseWorker):
 
     return "/".join(parts)
 
+  def IsWaitingForLocksUnlocked(self, now):
+    """Returns whether the current job has been waiting for locks for a while.
+
+    Must be called with the pool's lock held.
+
+    @type now: float
+    @param now: Current time
+
+    """
+    # pylint: disable=W0212
+    if not self._HasRunningTaskUnlocked():
+      return False
+
+    (_, _, _, (job, )) = self._current_task
+
+    # Opcodes are looked at without holding the queue lock, which is good
+    # enough for sizing the worker pool
+    for op in job.ops:
+      if op.status == constants.OP_STATUS_WAITING:
+        return (op.start_timestamp is not None and
+                now - utils.MergeTime(op.start_timestamp) >=
+                _LOCK_WAIT_THRESHOLD)
+
+    return False
+
 
 class _JobQueueWorkerPool(workerpool.WorkerPool):
-  """Simple class implementing a job-processing workerpool.
+  """Workerpool processing the jobs of one concurrency class.
+
+  The pool starts with the minimum number of workers for its class. For every
+  worker blocked waiting for locks another worker is started, as long as
+  there are jobs waiting and the maximum number isn't reached. Workers are
+  terminated again once fewer of them are blocked.
+
+  Workers only become blocked some time after they started a job, so while
+  jobs are queued the pool is re-checked periodically by a separate thread.
 
   """
-  def __init__(self, queue):
-    super(_JobQueueWorkerPool, self).__init__("Jq",
-                                              JOBQUEUE_THREADS,
-                                              _JobQueueWorker)
+  def __init__(self, queue, job_class, min_workers, max_workers,
+               _time_fn=time.time, _worker_cls=_JobQueueWorker,
+               _adjust_interval=_POOL_ADJUST_INTERVAL):
+    """Initializes this class.
+
+    @type queue: L{JobQueue}
+    @param queue: Job queue
+    @type job_class: string
+    @param job_class: Concurrency class
+    @type min_workers: int
+    @param min_workers: Minimum number of workers
+    @type max_workers: int
+    @param max_workers: Maximum number of workers
+
+    """
+    assert 0 < min_workers <= max_workers
+
+    # Workers may call into the pool while the parent class is still being
+    # initialized
     self.queue = queue
+    self.job_class = job_class
+    self._min_workers = min_workers
+    self._max_workers = max_workers
+    self._time_fn = _time_fn
+    self._adjust_interval = _adjust_interval
+    self._terminating = False
+
+    # Time at which each queued job was added to the pool
+    self._queued_since = {}
+
+    # Average time jobs waited for a worker
+    self._latency = None
+
+    super(_JobQueueWorkerPool, self).__init__("Jq%s" % job_class.title(),
+                                              min_workers, _worker_cls)
+
+    self._adjust_cond = threading.Condition(self._lock)
+    self._adjust_thread = threading.Thread(target=self._AdjustPeriodically,
+                                           name="%s-adjust" % self._name)
+    self._adjust_thread.setDaemon(True)
+    self._adjust_thread.start()
+
+  def _CountWaitingForLocksUnlocked(self):
+    """Returns the number of workers blocked waiting for locks.
+
+    """
+    now = self._time_fn()
+
+    return len([worker for worker in self._workers
+                if worker.IsWaitingForLocksUnlocked(now)])
+
+  def _AdjustUnlocked(self):
+    """Adjusts the number of workers to the number of blocked workers.
+
+    """
+    if self._terminating or not self._active:
+      return
+
+    current = len(self._workers)
+    target = min(self._max_workers,
+                 self._min_workers + self._CountWaitingForLocksUnlocked())
+
+    if target > current:
+      # Only start as many workers as there are jobs waiting for one
+      target = min(target, current + len(self._taskdata))
+
+    if target != current:
+      logging.debug("Changing number of workers for %s jobs from %s to %s",
+                    self.job_class, current, target)
+      self._ResizeUnlocked(target)
+
+  def _AdjustPeriodically(self):
+    """Re-checks the number of workers while jobs are queued.
+
+    Runs in a separate thread until the pool is terminated.
+
+    """
+    self._lock.acquire()
+    try:
+      while not self._terminating:
+        if self._taskdata:
+          self._adjust_cond.wait(self._adjust_interval)
+          self._AdjustUnlocked()
+        else:
+          # Woken up when a job is added
+          self._adjust_cond.wait()
+    finally:
+      self._lock.release()
+
+  def _IsDeferredTaskUnlocked(self, task_id):
+    """Returns whether a task is being added again after it was deferred.
+
+    """
+    # pylint: disable=W0212
+    worker = threading.currentThread()
+
+    return (isinstance(worker, workerpool.BaseWorker) and
+            worker.pool is self and
+            worker._HasRunningTaskUnlocked() and
+            worker._current_task[2] == task_id)
+
+  def _AddTaskUnlocked(self, args, priority, task_id):
+    """Adds a task and records when it was added.
+
+    Tasks deferred by their worker (e.g. after a lock timeout) are added again
+    from the worker running them. They have already been waiting for a worker
+    once and are left out of the average latency.
+
+    """
+    if not self._IsDeferredTaskUnlocked(task_id):
+      self._queued_since[task_id] = self._time_fn()
+
+    workerpool.WorkerPool._AddTaskUnlocked(self, args, priority, task_id)
+
+    self._AdjustUnlocked()
+
+    self._adjust_cond.notifyAll()
+
+  def _WaitForTaskUnlocked(self, worker):
+    """Waits for a task and records how long it had to wait.
+
+    """
+    # Called whenever a worker is done with a task
+    self._AdjustUnlocked()
+
+    task = workerpool.WorkerPool._WaitForTaskUnlocked(self, worker)
+
+    if isinstance(task, list):
+      (_, _, task_id, _) = task
+
+      since = self._queued_since.pop(task_id, None)
+      if since is not None:
+        latency = max(0.0, self._time_fn() - since)
+
+        if self._latency is None:
+          self._latency = latency
+        else:
+          self._latency = (_LATENCY_WEIGHT * latency +
+                           (1.0 - _LATENCY_WEIGHT) * self._latency)
+
+    return task
+
+  def TerminateWorkers(self):
+    """Terminates all workers without starting new ones.
+
+    """
+    self._lock.acquire()
+    try:
+      self._terminating = True
+      self._adjust_cond.notifyAll()
+    finally:
+      self._lock.release()
+
+    self._adjust_thread.join()
+
+    workerpool.WorkerPool.TerminateWorkers(self)
+
+  def GetStats(self):
+    """Returns statistics about the pool.
+
+    @rtype: dict
+    @return: Number of queued jobs (C{queued}), of jobs being processed
+      (C{running}), of workers blocked waiting for locks (C{lockwait}) and of
+      workers (C{workers}) as well as the average time in seconds jobs waited
+      for a worker (C{latency}, C{None} if no job was started yet)
+
+    """
+    self._lock.acquire()
+    try:
+      # pylint: disable=W0212
+      running = len([worker for worker in self._workers + self._termworkers
+                     if worker._HasRunningTaskUnlocked()])
+
+      return {
+        "queued": len(self._taskdata),
+        "running": running,
+        "lockwait": self._CountWaitingForLocksUnlocked(),
+        "workers": len(self._workers),
+        "latency": self._latency,
+        }
+    finally:
+      self._lock.release()
+
+
+class _JobQueueWorkerPools(object):
+  """Worker pools for all concurrency classes.
+
+  Provides the parts of the L{workerpool.WorkerPool} interface used by the job
+  queue, passing every job to the pool of its concurrency class.
+
+  """
+  def __init__(self, queue, _pool_cls=_JobQueueWorkerPool):
+    """Initializes this class.
+
+    @type queue: L{JobQueue}
+    @param queue: Job queue
+
+    """
+    self._pools = {}
+
+    try:
+      for (job_class, (min_workers, max_workers)) in JOB_CLASS_WORKERS.items():
+        self._pools[job_class] = _pool_cls(queue, job_class, min_workers,
+                                           max_workers)
+    except:
+      self.TerminateWorkers()
+      raise
+
+  def AddJobs(self, jobs):
+    """Adds jobs to the pools of their concurrency classes.
+
+    @type jobs: list of L{_QueuedJob}
+
+    """
+    by_class = {}
+
+    for job in jobs:
+      by_class.setdefault(job.CalcConcurrencyClass(), []).append(job)
+
+    for (job_class, class_jobs) in by_class.items():
+      self._pools[job_class].AddManyTasks([(job, ) for job in class_jobs],
+                                          priority=[job.CalcPriority()
+                                                    for job in class_jobs],
+                                          task_id=map(_GetIdAttr, class_jobs))
+
+  def ChangeJobPriority(self, job):
+    """Updates the priority of a queued job.
+
+    @type job: L{_QueuedJob}
+    @raise workerpool.NoSuchTask: When the job is not queued
+
+    """
+    self._pools[job.CalcConcurrencyClass()].ChangeTaskPriority(
+      job.id, job.CalcPriority())
+
+  def SetActive(self, active):
+    """Enables or disables processing of jobs, see L{workerpool.WorkerPool}.
+
+    """
+    for pool in self._pools.values():
+      pool.SetActive(active)
+
+  def HasRunningTasks(self):
+    """Checks whether any job is being processed.
+
+    """
+    return compat.any(pool.HasRunningTasks() for pool in self._pools.values())
+
+  def TerminateWorkers(self):
+    """Terminates the workers of all pools.
+
+    """
+    for pool in self._pools.values():
+      pool.TerminateWorkers()
+
+  def GetStats(self):
+    """Returns statistics about all pools.
+
+    @rtype: dict
+    @return: Concurrency classes as keys, L{_JobQueueWorkerPool.GetStats}
+      results as values
+
+    """
+    return dict((job_class, pool.GetStats())
+                for (job_class, pool) in self._pools.items())
 
 
 class _JobDependencyManager:
@@ -1608,6 +2145,350 @@ class _JobDependencyManager:
       self._enqueue_fn(jobs)
 
 
+class _JobFileReplicator(object):
+  """Replicates job queue files to other nodes using group commits.
+
+  Callers of L{Replicate} block until their file has been sent to the other
+  nodes. The first caller of a batch waits up to the batching window for more
+  files to arrive and then sends all of them using one call; callers arriving
+  while a batch is being sent are collected into the next one. If a file is
+  updated multiple times before being sent, only the latest content is sent.
+  A forced replication (e.g. for a finalized job) ends the batching window
+  immediately.
+
+  """
+  def __init__(self, send_fn, window):
+    """Initializes this class.
+
+    @type send_fn: callable
+    @param send_fn: Function sending a list of (file name, content) pairs to
+      the other nodes
+    @type window: number
+    @param window: Time in seconds to wait for more files before sending a
+      batch
+
+    """
+    self._send_fn = send_fn
+    self._window = window
+
+    self._lock = threading.Lock()
+    self._cond = threading.Condition(self._lock)
+
+    # Files waiting to be sent, in the order of their first update
+    self._pending = {}
+    self._order = []
+
+    # Batches are numbered; callers wait until their batch has been sent
+    self._batch = 1
+    self._done = 0
+    self._sending = False
+    self._force = False
+
+    # Statistics
+    self._updates = 0
+    self._coalesced = 0
+    self._batches = 0
+    self._forced = 0
+
+  def Replicate(self, file_name, data, force):
+    """Replicates a file and waits for it to be sent.
+
+    @type file_name: string
+    @param file_name: Path of the file
+    @type data: string
+    @param data: New file content
+    @type force: bool
+    @param force: Whether to send the file without waiting for the batching
+      window to end
+
+    """
+    self._lock.acquire()
+    try:
+      self._updates += 1
+
+      if file_name in self._pending:
+        self._coalesced += 1
+      else:
+        self._order.append(file_name)
+
+      self._pending[file_name] = data
+
+      if force:
+        self._force = True
+        self._cond.notifyAll()
+
+      batch = self._batch
+
+      while self._done < batch:
+        if self._sending:
+          self._cond.wait()
+        else:
+          self._SendBatch()
+    finally:
+      self._lock.release()
+
+  def _SendBatch(self):
+    """Waits for the batching window to end and sends the current batch.
+
+    Must be called with the lock held, which is released while sending.
+
+    """
+    self._sending = True
+    try:
+      if self._window > 0:
+        end = time.time() + self._window
+        while not self._force:
+          remaining = end - time.time()
+          if remaining <= 0:
+            break
+          self._cond.wait(remaining)
+
+      if self._force:
+        self._forced += 1
+
+      files = [(name, self._pending[name]) for name in self._order]
+      batch = self._batch
+
+      self._pending = {}
+      self._order = []
+      self._force = False
+      self._batch += 1
+      self._batches += 1
+
+      self._lock.release()
+      try:
+        self._send_fn(files)
+      finally:
+        self._lock.acquire()
+        # Errors are reported to the caller sending the batch only
+        self._done = batch
+    finally:
+      self._sending = False
+      self._cond.notifyAll()
+
+  def GetStats(self):
+    """Returns replication statistics.
+
+    @rtype: dict
+
+    """
+    self._lock.acquire()
+    try:
+      return {
+        "window": self._window,
+        "updates": self._updates,
+        "coalesced": self._coalesced,
+        "batches": self._batches,
+        "forced": self._forced,
+        }
+    finally:
+      self._lock.release()
+
+  def GetLockInfo(self, requested):
+    """Retrieves information about the replication of job files.
+
+    The statistics are reported in the mode of a single item.
+
+    @type requested: set
+    @param requested: Requested information, see C{query.LQ_*}
+
+    """
+    if query.LQ_MODE in requested:
+      stats = self.GetStats()
+      mode = ("window=%s updates=%s coalesced=%s batches=%s forced=%s" %
+              (stats["window"], stats["updates"], stats["coalesced"],
+               stats["batches"], stats["forced"]))
+    else:
+      mode = None
+
+    return [("jqueue-replication", mode, None, None)]
+
+
+class _FinalizedJobCache(object):
+  """Least recently used cache of read-only finalized jobs.
+
+  Finalized jobs don't change anymore until they're archived, so the job
+  objects can be shared by all readers. The number of jobs and the sum of
+  the sizes of their job files are bounded.
+
+  """
+  def __init__(self, max_jobs, max_size):
+    """Initializes this class.
+
+    @type max_jobs: int
+    @param max_jobs: Maximum number of cached jobs
+    @type max_size: int
+    @param max_size: Maximum sum of the sizes of the cached jobs' files
+
+    """
+    self._max_jobs = max_jobs
+    self._max_size = max_size
+
+    self._lock = threading.Lock()
+
+    # Job ID to (job, size, last use)
+    self._jobs = {}
+    self._size = 0
+
+    # Uses in chronological order as (job ID, use); entries for jobs which
+    # have been used again since are outdated and skipped
+    self._uses = collections.deque()
+    self._counter = itertools.count()
+
+    # Incremented whenever a job is removed
+    self._generation = 0
+
+    # Statistics
+    self._hits = 0
+    self._misses = 0
+    self._evictions = 0
+
+  def Get(self, job_id):
+    """Returns a cached job.
+
+    @type job_id: int
+    @param job_id: Job ID
+    @rtype: L{_QueuedJob} or None
+
+    """
+    self._lock.acquire()
+    try:
+      entry = self._jobs.get(job_id, None)
+      if entry is None:
+        self._misses += 1
+        return None
+
+      self._hits += 1
+
+      (job, size, _) = entry
+      self._UseUnlocked(job_id, job, size)
+
+      return job
+    finally:
+      self._lock.release()
+
+  def GetGeneration(self):
+    """Returns the current generation.
+
+    Must be called before loading a job to be added, see L{Add}.
+
+    """
+    return self._generation
+
+  def Add(self, job, size, generation):
+    """Adds a job to the cache.
+
+    The job is not added if a job was removed in the meantime, as it could
+    have been loaded before being archived.
+
+    @type job: L{_QueuedJob}
+    @param job: Read-only finalized job
+    @type size: int
+    @param size: Size of the job file
+    @type generation: int
+    @param generation: Generation before the job was loaded
+
+    """
+    assert not job.writable
+    assert job.CalcStatus() in constants.JOBS_FINALIZED
+
+    if size > self._max_size:
+      return
+
+    self._lock.acquire()
+    try:
+      if generation != self._generation:
+        return
+
+      self._RemoveUnlocked(job.id)
+      self._size += size
+      self._UseUnlocked(job.id, job, size)
+
+      while len(self._jobs) > self._max_jobs or self._size > self._max_size:
+        (job_id, use) = self._uses.popleft()
+        entry = self._jobs.get(job_id, None)
+        if entry is not None and entry[2] == use:
+          self._RemoveUnlocked(job_id)
+          self._evictions += 1
+    finally:
+      self._lock.release()
+
+  def Remove(self, job_id):
+    """Removes a job from the cache.
+
+    @type job_id: int
+    @param job_id: Job ID
+
+    """
+    self._lock.acquire()
+    try:
+      self._generation += 1
+      self._RemoveUnlocked(job_id)
+    finally:
+      self._lock.release()
+
+  def _UseUnlocked(self, job_id, job, size):
+    """Marks a job as most recently used.
+
+    """
+    use = self._counter.next()
+    self._jobs[job_id] = (job, size, use)
+    self._uses.append((job_id, use))
+
+    # Drop outdated uses once they dominate
+    if len(self._uses) > 2 * len(self._jobs) + 100:
+      self._uses = collections.deque(sorted(((i, u) for (i, (_, _, u)) in
+                                             self._jobs.items()),
+                                            key=operator.itemgetter(1)))
+
+  def _RemoveUnlocked(self, job_id):
+    """Removes a job.
+
+    Uses of the job are left in the queue of uses and skipped later.
+
+    """
+    entry = self._jobs.pop(job_id, None)
+    if entry is not None:
+      self._size -= entry[1]
+
+  def GetStats(self):
+    """Returns cache statistics.
+
+    @rtype: dict
+
+    """
+    self._lock.acquire()
+    try:
+      return {
+        "jobs": len(self._jobs),
+        "size": self._size,
+        "hits": self._hits,
+        "misses": self._misses,
+        "evictions": self._evictions,
+        }
+    finally:
+      self._lock.release()
+
+  def GetLockInfo(self, requested):
+    """Retrieves information about the cache.
+
+    The statistics are reported in the mode of a single item.
+
+    @type requested: set
+    @param requested: Requested information, see C{query.LQ_*}
+
+    """
+    if query.LQ_MODE in requested:
+      stats = self.GetStats()
+      mode = ("jobs=%s size=%s hits=%s misses=%s evictions=%s" %
+              (stats["jobs"], stats["size"], stats["hits"], stats["misses"],
+               stats["evictions"]))
+    else:
+      mode = None
+
+    return [("jqueue-cache", mode, None, None)]
+
+
 def _RequireOpenQueue(fn):
   """Decorator for "public" functions.
 
@@ -1721,8 +2602,22 @@ class JobQueue(object):
                                         self._EnqueueJobs)
     self.context.glm.AddToLockMonitor(self.depmgr)
 
+    # Replication of job files to other nodes
+    self._replicator = _JobFileReplicator(self._ReplicateFiles,
+                                          JOBQUEUE_REPLICATION_WINDOW)
+    self.context.glm.AddToLockMonitor(self._replicator)
+
+    # Read-only finalized jobs
+    self._jobcache = _FinalizedJobCache(JOBQUEUE_CACHE_SIZE,
+                                        JOBQUEUE_CACHE_MEMORY)
+    self.context.glm.AddToLockMonitor(self._jobcache)
+
+    # Index of all jobs, including archived ones
+    self._index = jstore.JobIndex(pathutils.JOB_QUEUE_INDEX_FILE)
+    self._OpenJobIndexUnlocked()
+
     # Setup worker pool
-    self._wpool = _JobQueueWorkerPool(self)
+    self._wpool = _JobQueueWorkerPools(self)
     try:
       self._InspectQueue()
     except:
@@ -1759,6 +2654,9 @@ class JobQueue(object):
       if job is None:
         continue
 
+      # The index may not have been updated before the last shutdown
+      self._index.Set(job.id, False, _GetJobIndexData(job))
+
       status = job.CalcStatus()
 
       if status == constants.JOB_STATUS_QUEUED:
@@ -1787,6 +2685,77 @@ class JobQueue(object):
 
     logging.info("Job queue inspection finished")
 
+  def _OpenJobIndexUnlocked(self):
+    """Loads the job index and brings it up to date.
+
+    The index is rebuilt if it can't be loaded or if too many jobs are
+    missing from it, e.g. because it was last used on another master
+    node. Jobs in the queue directory are updated by L{_InspectQueue}.
+
+    """
+    if self._index.Load():
+      all_job_ids = self._index.GetJobIds(True)
+      if all_job_ids:
+        last_job_id = all_job_ids[-1]
+      else:
+        last_job_id = 0
+
+      # Jobs submitted since the index was last updated
+      check = set(range(last_job_id + 1, self._last_serial + 1))
+
+      if len(check) <= _MAX_JOB_INDEX_REPAIR:
+        # Jobs which were archived since the index was last updated
+        check.update(self._index.GetJobIds(False))
+        check.difference_update(self._GetJobIDsUnlocked(sort=False))
+
+        if len(check) <= _MAX_JOB_INDEX_REPAIR:
+          for job_id in check:
+            self._UpdateJobIndexFromDiskUnlocked(job_id)
+          return
+
+    logging.info("Rebuilding job index")
+
+    jobs = {}
+    for job_id in self._GetJobIDsUnlocked(archived=True):
+      job = self.SafeLoadJobFromDisk(job_id, True, writable=False)
+      if job is not None:
+        jobs[job_id] = (job.archived, _GetJobIndexData(job))
+
+    self._index.Replace(jobs)
+
+    logging.info("Job index rebuilt with %s jobs", len(jobs))
+
+  def _UpdateJobIndexFromDiskUnlocked(self, job_id):
+    """Updates the index entry of a job from its file.
+
+    @type job_id: int
+    @param job_id: Job ID
+
+    """
+    job = self.SafeLoadJobFromDisk(job_id, True, writable=False)
+    if job is None:
+      self._index.Remove(job_id)
+    else:
+      self._index.Set(job_id, job.archived, _GetJobIndexData(job))
+
+  def _GetIndexedJob(self, job_id):
+    """Returns a job from the index.
+
+    Jobs not found in the index are loaded from disk.
+
+    @type job_id: int
+    @param job_id: Job ID
+    @rtype: L{_IndexedJob} or L{_QueuedJob} or None
+
+    """
+    entry = self._index.Get(job_id)
+    if entry is None:
+      return self.SafeLoadJobFromDisk(job_id, True, writable=False)
+
+    (archived, data) = entry
+
+    return _IndexedJob(job_id, archived, data)
+
   def _GetRpc(self, address_list):
     """Gets RPC runner with context.
 
@@ -1905,11 +2874,13 @@ class JobQueue(object):
     addr_list = [self._nodes[name] for name in name_list]
     return name_list, addr_list
 
-  def _UpdateJobQueueFile(self, file_name, data, replicate):
+  def _UpdateJobQueueFile(self, file_name, data, replicate, force=True):
     """Writes a file locally and then replicates it to all nodes.
 
     This function will replace the contents of a file on the local
-    node and then replicate it to all the other nodes we have.
+    node and then replicate it to all the other nodes we have. The
+    replication is done together with other files updated at the same
+    time, see L{_JobFileReplicator}.
 
     @type file_name: str
     @param file_name: the path of the file to be replicated
@@ -1917,6 +2888,9 @@ class JobQueue(object):
     @param data: the new contents of the file
     @type replicate: boolean
     @param replicate: whether to spread the changes to the remote nodes
+    @type force: boolean
+    @param force: whether to replicate the file without waiting for
+        updates of other files
 
     """
     getents = runtime.GetEnts()
@@ -1925,9 +2899,28 @@ class JobQueue(object):
                     mode=constants.JOB_QUEUE_FILES_PERMS)
 
     if replicate:
-      names, addrs = self._GetNodeIp()
+      self._replicator.Replicate(file_name, data, force)
+
+  def _ReplicateFiles(self, files):
+    """Replicates files to all nodes.
+
+    @type files: list of (str, str)
+    @param files: list of file names and their contents
+
+    """
+    names, addrs = self._GetNodeIp()
+    if not names:
+      return
+
+    if len(files) == 1:
+      ((file_name, data), ) = files
       result = _CallJqUpdate(self._GetRpc(addrs), names, file_name, data)
-      self._CheckRpcResult(result, self._nodes, "Updating %s" % file_name)
+    else:
+      result = _CallJqUpdateMulti(self._GetRpc(addrs), names, files)
+
+    self._CheckRpcResult(result, names,
+                         "Updating %s" %
+                         utils.CommaJoin(file_name for (file_name, _) in files))
 
   def _RenameFilesUnlocked(self, rename):
     """Renames a file locally and then replicate the change.
@@ -2083,6 +3076,8 @@ class JobQueue(object):
         # non-archived case
         logging.exception("Can't parse job %s, will archive.", job_id)
         self._RenameFilesUnlocked([(old_path, new_path)])
+      self._index.Remove(job_id)
+      self._jobcache.Remove(job_id)
       return None
 
     assert job.writable, "Job just loaded is not writable"
@@ -2104,6 +3099,14 @@ class JobQueue(object):
     @return: either None or the job object
 
     """
+    if writable is False:
+      # Read-only finalized jobs can be shared
+      job = self._jobcache.Get(job_id)
+      if job is not None and (try_archived or not job.archived):
+        return job
+
+    generation = self._jobcache.GetGeneration()
+
     path_functions = [(self._GetJobPath, False)]
 
     if try_archived:
@@ -2135,6 +3138,9 @@ class JobQueue(object):
     except Exception, err: # pylint: disable=W0703
       raise errors.JobFileCorrupted(err)
 
+    if not writable and job.CalcStatus() in constants.JOBS_FINALIZED:
+      self._jobcache.Add(job, len(raw_data), generation)
+
     return job
 
   def SafeLoadJobFromDisk(self, job_id, try_archived, writable=None):
@@ -2375,9 +3381,7 @@ class JobQueue(object):
 
     """
     assert self._lock.is_owned(shared=0), "Must own lock in exclusive mode"
-    self._wpool.AddManyTasks([(job, ) for job in jobs],
-                             priority=[job.CalcPriority() for job in jobs],
-                             task_id=map(_GetIdAttr, jobs))
+    self._wpool.AddJobs(jobs)
 
   def _GetJobStatusForDependencies(self, job_id):
     """Gets the status of a job for dependencies.
@@ -2422,7 +3426,20 @@ class JobQueue(object):
     filename = self._GetJobPath(job.id)
     data = serializer.DumpJson(job.Serialize())
     logging.debug("Writing job %s to %s", job.id, filename)
-    self._UpdateJobQueueFile(filename, data, replicate)
+
+    # Finalized jobs can be archived as soon as this function returns. When
+    # the queue lock is held exclusively, no other updates can be batched.
+    force = (job.CalcStatus() in constants.JOBS_FINALIZED or
+             self._lock.is_owned(shared=0))
+
+    span = optimeline.StartSpan(constants.OP_PHASE_REPLICATION)
+    try:
+      self._UpdateJobQueueFile(filename, data, replicate, force=force)
+    finally:
+      span.End()
+
+    # Only written once the job file has been written
+    self._index.Set(job.id, False, _GetJobIndexData(job))
 
   def WaitForJobChanges(self, job_id, fields, prev_job_info, prev_log_serial,
                         timeout):
@@ -2494,7 +3511,7 @@ class JobQueue(object):
 
       if success:
         try:
-          self._wpool.ChangeTaskPriority(job.id, job.CalcPriority())
+          self._wpool.ChangeJobPriority(job)
         except workerpool.NoSuchTask:
           logging.debug("Job %s is not in workerpool at this time", job.id)
 
@@ -2558,6 +3575,10 @@ class JobQueue(object):
     # TODO: What if 1..n files fail to rename?
     self._RenameFilesUnlocked(rename_files)
 
+    for job in archive_jobs:
+      self._index.Set(job.id, True, _GetJobIndexData(job))
+      self._jobcache.Remove(job.id)
+
     logging.debug("Successfully archived job(s) %s",
                   utils.CommaJoin(job.id for job in archive_jobs))
 
@@ -2611,7 +3632,7 @@ class JobQueue(object):
     archived_count = 0
     last_touched = 0
 
-    all_job_ids = self._GetJobIDsUnlocked()
+    all_job_ids = self._index.GetJobIds(False)
     pending = []
     for idx, job_id in enumerate(all_job_ids):
       last_touched = idx + 1
@@ -2622,18 +3643,27 @@ class JobQueue(object):
       if time.time() > end_time:
         break
 
-      # Returns None if the job failed to load
-      job = self._LoadJobUnlocked(job_id)
-      if job:
-        if job.end_timestamp is None:
-          if job.start_timestamp is None:
-            job_age = job.received_timestamp
-          else:
-            job_age = job.start_timestamp
+      # Only jobs selected using the index are loaded from disk
+      entry = self._index.Get(job_id)
+      if entry is None:
+        continue
+
+      indexed_job = _IndexedJob(job_id, entry[0], entry[1])
+      if indexed_job.CalcStatus() not in constants.JOBS_FINALIZED:
+        continue
+
+      if indexed_job.end_timestamp is None:
+        if indexed_job.start_timestamp is None:
+          job_age = indexed_job.received_timestamp
         else:
-          job_age = job.end_timestamp
+          job_age = indexed_job.start_timestamp
+      else:
+        job_age = indexed_job.end_timestamp
 
-        if age == -1 or now - job_age[0] > age:
+      if age == -1 or now - job_age[0] > age:
+        # Returns None if the job failed to load
+        job = self._LoadJobUnlocked(job_id)
+        if job:
           pending.append(job)
 
           # Archive 10 jobs at a time
@@ -2646,45 +3676,68 @@ class JobQueue(object):
 
     return (archived_count, len(all_job_ids) - last_touched)
 
-  def _Query(self, fields, qfilter):
+  def _Query(self, fields, qfilter, sort_by=None):
     qobj = query.Query(query.JOB_FIELDS, fields, qfilter=qfilter,
-                       namefield="id")
+                       namefield="id", sort_by=sort_by)
 
     # Archived jobs are only looked at if the "archived" field is referenced
     # either as a requested field or in the filter. By default archived jobs
     # are ignored.
     include_archived = (query.JQ_ARCHIVED in qobj.RequestedData())
 
+    # Job files are only loaded if per-opcode data is needed, otherwise the
+    # job index is used
+    if query.JQ_OPCODES in qobj.RequestedData():
+      load_fn = compat.partial(self.SafeLoadJobFromDisk, try_archived=True,
+                               writable=False)
+    else:
+      load_fn = self._GetIndexedJob
+
     job_ids = qobj.RequestedNames()
 
     list_all = (job_ids is None)
 
     if list_all:
-      # Since files are added to/removed from the queue atomically, there's no
-      # risk of getting the job ids in an inconsistent state.
-      job_ids = self._GetJobIDsUnlocked(archived=include_archived)
+      # The index is updated after job files have been written or renamed, so
+      # it contains only jobs which exist on disk
+      job_ids = self._index.GetJobIds(include_archived)
 
     jobs = []
 
     for job_id in job_ids:
-      job = self.SafeLoadJobFromDisk(job_id, True, writable=False)
+      job = load_fn(job_id)
       if job is not None or not list_all:
         jobs.append((job_id, job))
 
-    return (qobj, jobs, list_all)
+    if query.JQ_CLASSES in qobj.RequestedData():
+      class_stats = self._wpool.GetStats()
+    else:
+      class_stats = None
+
+    return (qobj, query.JobQueryData(jobs, class_stats=class_stats), list_all)
 
-  def QueryJobs(self, fields, qfilter):
+  def QueryJobs(self, fields, qfilter, sort_by=None, limit=None, offset=0,
+                count_only=False):
     """Returns a list of jobs in queue.
 
     @type fields: sequence
     @param fields: List of wanted fields
     @type qfilter: None or query2 filter (list)
     @param qfilter: Query filter
+    @type sort_by: None or list of strings
+    @param sort_by: Fields to sort by, see L{query.Query}
+    @type limit: None or int
+    @param limit: Maximum number of jobs to return
+    @type offset: int
+    @param offset: Number of leading jobs to skip
+    @type count_only: boolean
+    @param count_only: Whether to only count the matching jobs
 
     """
-    (qobj, ctx, _) = self._Query(fields, qfilter)
+    (qobj, ctx, _) = self._Query(fields, qfilter, sort_by=sort_by)
 
-    return query.GetQueryResponse(qobj, ctx, sort_by_name=False)
+    return query.GetQueryResponse(qobj, ctx, sort_by_name=False, limit=limit,
+                                  offset=offset, count_only=count_only)
 
   def OldStyleQueryJobs(self, job_ids, fields):
     """Returns a list of jobs in queue.
@@ -2752,5 +3805,7 @@ class JobQueue(object):
     """
     self._wpool.TerminateWorkers()
 
+    self._index.Close()
+
     self._queue_filelock.Close()
     self._queue_filelock = None
@@ -32,10 +32,13 @@
 
 import errno
 import os
+import logging
+import threading
 
 from ganeti import constants
 from ganeti import errors
 from ganeti import runtime
+from ganeti import serializer
 from ganeti import utils
 from ganeti import pathutils
 
@@ -233,3 +236,236 @@ def ParseJobId(job_id):
     return int(job_id)
   except (ValueError, TypeError):
     raise errors.ParameterError("Invalid job ID '%s'" % job_id)
+
+
+class JobIndex(object):
+  """Persistent index of jobs in the queue and the archive.
+
+  For every job the index stores whether the job is archived and some
+  opaque data provided by the caller. It is kept in memory and written to a
+  journal file, to which a line is appended for every change. Once the
+  journal contains enough outdated lines, it is rewritten.
+
+  The first line of the file contains a header. Every other line contains
+  a list of job ID, archived flag and data; the archived flag and the data
+  are C{None} for removed jobs. Incomplete or invalid lines at the end of
+  the file are ignored.
+
+  """
+  #: Version of the file format
+  VERSION = 1
+
+  #: Minimum number of outdated lines before the journal is rewritten
+  _MIN_OUTDATED = 1000
+
+  def __init__(self, file_name, _getents=runtime.GetEnts):
+    """Initializes this class.
+
+    @type file_name: string
+    @param file_name: Path to the index file
+
+    """
+    self._file_name = file_name
+    self._getents = _getents
+    self._lock = threading.Lock()
+    self._jobs = {}
+    self._lines = 0
+    self._fd = None
+
+  def Load(self):
+    """Loads the index from its file.
+
+    @rtype: bool
+    @return: Whether a valid index was found; if not, the index is empty
+
+    """
+    self._lock.acquire()
+    try:
+      self._jobs = {}
+      self._lines = 0
+      self._CloseUnlocked()
+
+      try:
+        content = utils.ReadFile(self._file_name)
+      except EnvironmentError, err:
+        if err.errno != errno.ENOENT:
+          logging.warning("Can't read job index %s: %s", self._file_name, err)
+        return False
+
+      lines = content.splitlines()
+
+      try:
+        header = serializer.LoadJson(lines[0])
+      except (IndexError, ValueError):
+        header = None
+
+      if not (isinstance(header, dict) and
+              header.get("version") == self.VERSION):
+        logging.warning("Job index %s has an invalid header, ignoring it",
+                        self._file_name)
+        return False
+
+      complete = True
+
+      for line in lines[1:]:
+        try:
+          (job_id, archived, data) = serializer.LoadJson(line)
+        except (TypeError, ValueError):
+          logging.warning("Ignoring invalid end of job index %s",
+                          self._file_name)
+          complete = False
+          break
+
+        if archived is None:
+          self._jobs.pop(job_id, None)
+        else:
+          self._jobs[job_id] = (archived, data)
+
+        self._lines += 1
+
+      if complete and content.endswith("\n"):
+        self._fd = os.open(self._file_name, os.O_WRONLY | os.O_APPEND)
+      else:
+        # Don't append to an incomplete line
+        self._WriteUnlocked()
+
+      return True
+    finally:
+      self._lock.release()
+
+  def Replace(self, jobs):
+    """Replaces the contents of the index.
+
+    @type jobs: dict
+    @param jobs: Dictionary of job ID to a tuple of archived flag and data
+
+    """
+    self._lock.acquire()
+    try:
+      self._jobs = dict(jobs)
+      self._WriteUnlocked()
+    finally:
+      self._lock.release()
+
+  def Set(self, job_id, archived, data):
+    """Adds or updates a job.
+
+    Nothing is written if the job's entry didn't change.
+
+    @type job_id: int
+    @param job_id: Job ID
+    @type archived: bool
+    @param archived: Whether the job is archived
+    @param data: Data to store for the job, must be serializable
+
+    """
+    entry = (archived, data)
+
+    self._lock.acquire()
+    try:
+      if self._jobs.get(job_id) != entry:
+        self._jobs[job_id] = entry
+        self._AppendUnlocked([job_id, archived, data])
+    finally:
+      self._lock.release()
+
+  def Remove(self, job_id):
+    """Removes a job.
+
+    @type job_id: int
+    @param job_id: Job ID
+
+    """
+    self._lock.acquire()
+    try:
+      if self._jobs.pop(job_id, None) is not None:
+        self._AppendUnlocked([job_id, None, None])
+    finally:
+      self._lock.release()
+
+  def Get(self, job_id):
+    """Returns the entry of a job.
+
+    @type job_id: int
+    @param job_id: Job ID
+    @rtype: tuple or None
+    @return: Tuple of archived flag and data, or C{None} if the job is unknown
+
+    """
+    self._lock.acquire()
+    try:
+      return self._jobs.get(job_id, None)
+    finally:
+      self._lock.release()
+
+  def GetJobIds(self, archived):
+    """Returns the sorted IDs of known jobs.
+
+    @type archived: bool
+    @param archived: Whether to include archived jobs
+
+    """
+    self._lock.acquire()
+    try:
+      if archived:
+        result = self._jobs.keys()
+      else:
+        result = [job_id for (job_id, (job_archived, _)) in self._jobs.items()
+                  if not job_archived]
+    finally:
+      self._lock.release()
+
+    result.sort()
+    return result
+
+  def Close(self):
+    """Closes the journal file.
+
+    """
+    self._lock.acquire()
+    try:
+      self._CloseUnlocked()
+    finally:
+      self._lock.release()
+
+  def _CloseUnlocked(self):
+    """Closes the journal file.
+
+    """
+    if self._fd is not None:
+      os.close(self._fd)
+      self._fd = None
+
+  def _AppendUnlocked(self, record):
+    """Appends a record to the journal file.
+
+    """
+    if (self._fd is None or
+        self._lines > 2 * len(self._jobs) + self._MIN_OUTDATED):
+      self._WriteUnlocked()
+      return
+
+    data = serializer.DumpJson(record)
+    offset = 0
+    while offset < len(data):
+      offset += os.write(self._fd, buffer(data, offset))
+    os.fsync(self._fd)
+    self._lines += 1
+
+  def _WriteUnlocked(self):
+    """Rewrites the whole journal file.
+
+    """
+    self._CloseUnlocked()
+
+    lines = [serializer.DumpJson({"version": self.VERSION})]
+    lines.extend(serializer.DumpJson([job_id, archived, data])
+                 for (job_id, (archived, data)) in sorted(self._jobs.items()))
+
+    getents = self._getents()
+    utils.WriteFile(self._file_name, data="".join(lines),
+                    uid=getents.masterd_uid, gid=getents.daemons_gid,
+                    mode=constants.JOB_QUEUE_FILES_PERMS)
+
+    self._lines = len(self._jobs)
+    self._fd = os.open(self._file_name, os.O_WRONLY | os.O_APPEND)
@@ -43,6 +43,8 @@ import logging
 import heapq
 import itertools
 import time
+import bisect
+import copy
 
 from ganeti import errors
 from ganeti import utils
@@ -71,6 +73,27 @@ _LS_ACQUIRE_MODES = compat.UniqueFrozenset([
   _LS_ACQUIRE_OPPORTUNISTIC,
   ])
 
+#: Waiting acquires of locks wait for notifications using pipes, see
+#: L{PipeCondition}
+CONDITION_PIPE = "pipe"
+
+#: Waiting acquires of locks wait for notifications using locks, see
+#: L{ThreadingCondition}
+CONDITION_THREADING = "threading"
+
+CONDITION_TYPES = compat.UniqueFrozenset([
+  CONDITION_PIPE,
+  CONDITION_THREADING,
+  ])
+
+#: Maximum interval at which expired timeouts of waiting acquires are checked
+#: when using L{CONDITION_THREADING} (seconds)
+_WAITER_TIMER_MAX_SLEEP = 1.0
+
+#: Upper bounds of the buckets of lock profile histograms (seconds), the last
+#: bucket counts all longer durations
+PROFILE_BUCKETS = [0.001, 0.01, 0.1, 1.0, 10.0, 60.0, 600.0]
+
 
 def ssynchronized(mylock, shared=0):
   """Shared Synchronization decorator.
@@ -306,6 +329,257 @@ class SingleNotifyPipeCondition(_BaseCondition):
       self._write_fd = None
 
 
+class _WaiterTimer(object):
+  """Wakes up waiters of L{SingleNotifyThreadingCondition} on timeout.
+
+  Waiters block on a lock, which can't be acquired with a timeout in Python
+  2. Instead a single thread, started on first use, releases the locks of
+  waiters whose timeout expired. It sleeps until the earliest deadline of the
+  waiters still waiting, but at most C{max_sleep} seconds, and blocks while
+  there are none. Adding an earlier deadline interrupts the sleep through a
+  pipe. Deadlines of waiters woken up before their timeout are discarded.
+
+  """
+  def __init__(self, max_sleep=_WAITER_TIMER_MAX_SLEEP, _time_fn=time.time):
+    """Initializes this class.
+
+    """
+    self._max_sleep = max_sleep
+    self._time_fn = _time_fn
+    self._lock = threading.Lock()
+    self._thread = None
+
+    # Heap of deadlines, may contain entries of waiters no longer waiting
+    self._deadlines = []
+    # Waiters with a deadline which haven't been woken up yet
+    self._timed = set()
+
+    # Time until which the thread sleeps, None if it's busy or blocked
+    self._sleep_until = None
+    self._interrupted = False
+    self._read_fd = None
+    self._write_fd = None
+
+    # Released while there are deadlines, blocks the thread otherwise
+    self._idle = True
+    self._pending = threading.Lock()
+    self._pending.acquire()
+
+  def NewWaiter(self):
+    """Returns a new waiter, a locked C{threading.Lock}.
+
+    """
+    waiter = threading.Lock()
+    waiter.acquire()
+    return waiter
+
+  def Wake(self, waiter):
+    """Wakes up a waiter unless it was already woken up.
+
+    """
+    self._lock.acquire()
+    try:
+      if waiter in self._timed:
+        self._timed.remove(waiter)
+
+        if not self._timed:
+          # Let the thread block instead of sleeping until a stale deadline
+          del self._deadlines[:]
+          self._Interrupt()
+
+      if waiter.locked():
+        waiter.release()
+    finally:
+      self._lock.release()
+
+  def AddTimeout(self, waiter, timeout):
+    """Wakes up a waiter after a timeout.
+
+    """
+    self._lock.acquire()
+    try:
+      deadline = self._time_fn() + timeout
+
+      heapq.heappush(self._deadlines, (deadline, waiter))
+      self._timed.add(waiter)
+
+      if self._thread is None:
+        (self._read_fd, self._write_fd) = os.pipe()
+        self._thread = threading.Thread(target=self._Run,
+                                        name="LockWaiterTimer")
+        self._thread.setDaemon(True)
+        self._thread.start()
+
+      if self._idle:
+        self._idle = False
+        self._pending.release()
+      elif self._sleep_until is not None and deadline < self._sleep_until:
+        self._Interrupt()
+    finally:
+      self._lock.release()
+
+  def _Interrupt(self):
+    """Interrupts the sleeping thread.
+
+    Must be called while holding the lock.
+
+    """
+    if self._sleep_until is not None and not self._interrupted:
+      self._interrupted = True
+      os.write(self._write_fd, "x")
+
+  def _ExpireDeadlines(self):
+    """Wakes up waiters whose timeout expired.
+
+    @rtype: number or None
+    @return: Number of seconds to sleep, C{None} if there are no deadlines
+      left
+
+    """
+    now = self._time_fn()
+
+    self._lock.acquire()
+    try:
+      self._sleep_until = None
+      self._interrupted = False
+
+      while self._deadlines:
+        (deadline, waiter) = self._deadlines[0]
+
+        if waiter in self._timed:
+          if deadline > now:
+            break
+
+          self._timed.remove(waiter)
+          if waiter.locked():
+            waiter.release()
+
+        heapq.heappop(self._deadlines)
+
+      if self._deadlines:
+        timeout = min(self._deadlines[0][0] - now, self._max_sleep)
+        self._sleep_until = now + timeout
+        return timeout
+
+      # Block again until the next deadline is added
+      self._idle = True
+      self._pending.acquire()
+      return None
+    finally:
+      self._lock.release()
+
+  def _Sleep(self, timeout):
+    """Sleeps until a timeout expires or the sleep is interrupted.
+
+    @type timeout: float
+    @param timeout: Number of seconds to sleep
+
+    """
+    poller = select.poll()
+    poller.register(self._read_fd, select.POLLIN)
+
+    try:
+      # poll() wants milliseconds
+      result = poller.poll(timeout * 1000)
+    except EnvironmentError, err:
+      if err.errno != errno.EINTR:
+        raise
+      result = None
+
+    if result:
+      os.read(self._read_fd, 4096)
+
+  def _Run(self):
+    """Thread function.
+
+    """
+    while True:
+      self._pending.acquire()
+      self._pending.release()
+
+      while True:
+        timeout = self._ExpireDeadlines()
+        if timeout is None:
+          break
+
+        self._Sleep(timeout)
+
+
+class SingleNotifyThreadingCondition(_BaseCondition):
+  """Condition which can only be notified once, without file descriptors.
+
+  Has the same semantics as L{SingleNotifyPipeCondition}, but every waiter
+  blocks on a lock of its own instead of polling a pipe, so no file
+  descriptors are needed and notifications only cost futex operations.
+  Timeouts are handled by L{_WaiterTimer}.
+
+  """
+  __slots__ = [
+    "_waiters",
+    "_notified",
+    ]
+
+  _timer = _WaiterTimer()
+
+  def __init__(self, lock):
+    """Constructor for SingleNotifyThreadingCondition
+
+    """
+    _BaseCondition.__init__(self, lock)
+    self._waiters = []
+    self._notified = False
+
+  def _check_unnotified(self):
+    """Throws an exception if already notified.
+
+    """
+    if self._notified:
+      raise RuntimeError("cannot use already notified condition")
+
+  def wait(self, timeout):
+    """Wait for a notification.
+
+    @type timeout: float or None
+    @param timeout: Waiting timeout (can be None)
+
+    """
+    self._check_owned()
+    self._check_unnotified()
+
+    timer = self._timer
+    waiter = timer.NewWaiter()
+
+    if timeout is None:
+      pass
+    elif timeout > 0:
+      timer.AddTimeout(waiter, timeout)
+    else:
+      waiter.release()
+
+    self._waiters.append(waiter)
+    try:
+      state = self._release_save()
+      try:
+        # Wait for notification or timeout
+        waiter.acquire()
+      finally:
+        # Re-acquire lock
+        self._acquire_restore(state)
+    finally:
+      self._waiters.remove(waiter)
+
+  def notifyAll(self): # pylint: disable=C0103
+    """Wake up all waiters.
+
+    """
+    self._check_owned()
+    self._check_unnotified()
+    self._notified = True
+
+    for waiter in self._waiters:
+      self._timer.Wake(waiter)
+
+
 class PipeCondition(_BaseCondition):
   """Group-only non-polling condition with counters.
 
@@ -394,6 +668,58 @@ class _PipeConditionWithMode(PipeCondition):
     PipeCondition.__init__(self, lock)
 
 
+class ThreadingCondition(PipeCondition):
+  """Group-only condition with counters not using file descriptors.
+
+  Works like L{PipeCondition}, but is based on
+  L{SingleNotifyThreadingCondition}.
+
+  """
+  __slots__ = []
+
+  _single_condition_class = SingleNotifyThreadingCondition
+
+
+class _ThreadingConditionWithMode(_PipeConditionWithMode):
+  __slots__ = []
+
+  _single_condition_class = SingleNotifyThreadingCondition
+
+
+#: Conditions used by L{SharedLock} for waiting acquires, by type
+_CONDITION_CLASSES = {
+  CONDITION_PIPE: _PipeConditionWithMode,
+  CONDITION_THREADING: _ThreadingConditionWithMode,
+  }
+
+#: Conditions used by L{_BatchGrantQueue}, by type
+_GROUP_CONDITION_CLASSES = {
+  CONDITION_PIPE: PipeCondition,
+  CONDITION_THREADING: ThreadingCondition,
+  }
+
+#: Condition type used by newly created locks, see L{SetConditionType}
+_condition_type = CONDITION_PIPE
+
+
+def SetConditionType(condition_type):
+  """Selects the type of condition used by locks created afterwards.
+
+  Meant to be called once at startup, before any locks are created.
+
+  @type condition_type: string
+  @param condition_type: One of L{CONDITION_TYPES}
+
+  """
+  global _condition_type # pylint: disable=W0603
+
+  if condition_type not in CONDITION_TYPES:
+    raise errors.ProgrammerError("Unknown condition type '%s'" %
+                                 condition_type)
+
+  _condition_type = condition_type
+
+
 class SharedLock(object):
   """Implements a shared lock.
 
@@ -423,23 +749,38 @@ class SharedLock(object):
     "__pending_shared",
     "__shr",
     "__time_fn",
+    "__monitor",
+    "__condition_class",
+    "__pending_fn",
     "name",
     ]
 
-  __condition_class = _PipeConditionWithMode
-
-  def __init__(self, name, monitor=None, _time_fn=time.time):
+  def __init__(self, name, monitor=None, condition_type=None,
+               pending_fn=None, _time_fn=time.time):
     """Construct a new SharedLock.
 
     @param name: the name of the lock
     @type monitor: L{LockMonitor}
     @param monitor: Lock monitor with which to register
+    @type condition_type: string or None
+    @param condition_type: One of L{CONDITION_TYPES}, defaults to the type
+      selected using L{SetConditionType}
+    @type pending_fn: callable or None
+    @param pending_fn: Function returning acquires waiting for the lock
+      elsewhere, e.g. in a L{_BatchGrantQueue}, in the format used by
+      L{GetLockInfo} for pending acquires
 
     """
     object.__init__(self)
 
     self.name = name
 
+    if condition_type is None:
+      condition_type = _condition_type
+
+    # Condition used by waiting acquires
+    self.__condition_class = _CONDITION_CLASSES[condition_type]
+
     # Used for unittesting
     self.__time_fn = _time_fn
 
@@ -458,6 +799,12 @@ class SharedLock(object):
     # is this lock in the deleted state?
     self.__deleted = False
 
+    # Monitor providing the profiler, if enabled
+    self.__monitor = monitor
+
+    # Additional pending acquires for the lock monitor
+    self.__pending_fn = pending_fn
+
     # Register with lock monitor
     if monitor:
       logging.debug("Adding lock %s to monitor", name)
@@ -475,6 +822,13 @@ class SharedLock(object):
     @param requested: Requested information, see C{query.LQ_*}
 
     """
+    if self.__pending_fn and query.LQ_PENDING in requested:
+      # Called without holding the internal lock, as batched acquires hold
+      # their queue's lock while acquiring this one
+      other_pending = self.__pending_fn()
+    else:
+      other_pending = []
+
     self.__lock.acquire()
     try:
       # Note: to avoid unintentional race conditions, no references to
@@ -518,6 +872,8 @@ class SharedLock(object):
             # List of names will be sorted in L{query._GetLockPending}
             pending.append((pendmode, [i.getName()
                                        for i in cond.get_waiting()]))
+
+        pending.extend(other_pending)
       else:
         pending = None
 
@@ -577,6 +933,15 @@ class SharedLock(object):
   #: retrieve a locks' "_is_owned" attribute
   _is_owned = is_owned
 
+  def __get_profiler(self):
+    """Returns the lock profiler or C{None} if profiling is disabled.
+
+    """
+    if self.__monitor:
+      return self.__monitor.profiler
+
+    return None
+
   def _count_pending(self):
     """Returns the number of pending acquires.
 
@@ -762,13 +1127,39 @@ class SharedLock(object):
     if priority is None:
       priority = _DEFAULT_PRIORITY
 
+    profiler = self.__get_profiler()
+    if profiler:
+      start = self.__time_fn()
+
     self.__lock.acquire()
     try:
       # We already got the lock, notify now
       if __debug__ and callable(test_notify):
         test_notify()
 
-      return self.__acquire_unlocked(shared, timeout, priority)
+      acquired = self.__acquire_unlocked(shared, timeout, priority)
+    finally:
+      self.__lock.release()
+
+    if profiler:
+      profiler.RecordAcquire(self, shared, priority, timeout, start,
+                             self.__time_fn(), acquired)
+
+    return acquired
+
+  def _acquire_unprofiled(self, shared, priority):
+    """Tries to acquire the lock without waiting.
+
+    Used by L{_BatchGrantQueue}, which records the time spent waiting for all
+    locks of a request instead of every attempt.
+
+    @rtype: bool
+    @return: Whether the lock was acquired
+
+    """
+    self.__lock.acquire()
+    try:
+      return self.__acquire_unlocked(shared, 0, priority)
     finally:
       self.__lock.release()
 
@@ -841,6 +1232,10 @@ class SharedLock(object):
     finally:
       self.__lock.release()
 
+    profiler = self.__get_profiler()
+    if profiler:
+      profiler.RecordRelease(self, self.__time_fn())
+
   def __notify_topmost(self):
     """Notifies topmost condition in queue of pending acquires.
 
@@ -908,6 +1303,11 @@ class SharedLock(object):
 
         assert self.__deleted
 
+        # A deleted lock is no longer held
+        profiler = self.__get_profiler()
+        if profiler:
+          profiler.RecordRelease(self, self.__time_fn())
+
       return acquired
     finally:
       self.__lock.release()
@@ -978,6 +1378,287 @@ class _AcquireTimeout(Exception):
   """
 
 
+class _BatchGrantRequest(object):
+  """Pending request of L{_BatchGrantQueue}.
+
+  """
+  __slots__ = [
+    "locks",
+    "names",
+    "shared",
+    "cond",
+    "thread",
+    "blockers",
+    ]
+
+  def __init__(self, locks, shared, cond):
+    """Initializes this class.
+
+    @type locks: list of tuples; (string, L{SharedLock})
+    @param locks: Names and locks, sorted by name
+    @param cond: Condition to wait on until the request may be granted
+
+    """
+    self.locks = locks
+    self.names = frozenset(name for (name, _) in locks)
+    self.shared = shared
+    self.cond = cond
+    self.thread = threading.currentThread()
+
+    # Names of the locks the request had to wait for when last tried
+    self.blockers = frozenset()
+
+
+class _BatchGrantQueue(object):
+  """Grants all locks of an acquire of a L{LockSet} at once.
+
+  Instead of acquiring one lock after the other, with every lock acquired
+  early blocking other acquires while waiting for the remaining ones, a
+  request is queued for all locks and granted once every one of them can be
+  acquired. If that fails nothing is held and the request keeps waiting.
+
+  Requests are ordered by priority and, within a priority, by the time they
+  were queued. A request is only tried if no request ahead of it conflicts
+  with it, i.e. needs one of its locks in a mode which isn't compatible.
+  Small requests therefore can't overtake a large request needing some of
+  the same locks, which would otherwise be starved by them.
+
+  Whenever locks of the set are released, L{Notify} must be called with their
+  names to let the waiting requests needing them retry.
+
+  """
+  def __init__(self, name, monitor=None, _time_fn=time.time):
+    """Initializes this class.
+
+    @type name: string
+    @param name: Name of the lock set
+    @type monitor: L{LockMonitor}
+    @param monitor: Lock monitor providing the profiler
+
+    """
+    self._name = name
+    self._monitor = monitor
+    self._time_fn = _time_fn
+    self._lock = threading.Lock()
+    self._cond_class = _GROUP_CONDITION_CLASSES[_condition_type]
+    self._seq = itertools.count()
+
+    # Queued requests by lock name, as (priority, sequence, request)
+    self._by_name = {}
+
+  def _Add(self, entry):
+    """Adds a queue entry.
+
+    """
+    for name in entry[2].names:
+      self._by_name.setdefault(name, set()).add(entry)
+
+  def _Remove(self, entry):
+    """Removes a queue entry.
+
+    """
+    for name in entry[2].names:
+      entries = self._by_name[name]
+      entries.remove(entry)
+      if not entries:
+        del self._by_name[name]
+
+  def _GetBlockers(self, entry):
+    """Returns the names of the locks on which requests ahead conflict.
+
+    @rtype: set
+
+    """
+    request = entry[2]
+    blockers = set()
+
+    for name in request.names:
+      for other_entry in self._by_name[name]:
+        if (other_entry < entry and
+            not (request.shared and other_entry[2].shared)):
+          blockers.add(name)
+          break
+
+    return blockers
+
+  def _TryAcquire(self, request, priority, ignore_deleted):
+    """Acquires all locks of a request unless one of them is held.
+
+    @rtype: list or None
+    @return: Names of acquired locks, C{None} if nothing was acquired
+
+    """
+    acquired = []
+
+    try:
+      for (name, lock) in request.locks:
+        try:
+          success = lock._acquire_unprofiled(request.shared, priority)
+        except errors.LockError:
+          if ignore_deleted:
+            continue
+
+          raise errors.LockError("Lock '%s' not found in set '%s' (it may"
+                                 " have been removed)" % (name, self._name))
+
+        if not success:
+          request.blockers = frozenset([name])
+          break
+
+        acquired.append((name, lock))
+      else:
+        return [name for (name, _) in acquired]
+    except:
+      for (_, lock) in acquired:
+        lock.release()
+      raise
+
+    for (_, lock) in acquired:
+      lock.release()
+
+    return None
+
+  def _WakeUnlocked(self, names):
+    """Wakes up the requests needing any of the given locks.
+
+    Must be called while holding the internal lock.
+
+    """
+    woken = set()
+
+    for name in names:
+      for (_, _, request) in self._by_name.get(name, []):
+        if request not in woken:
+          woken.add(request)
+          request.cond.notifyAll()
+
+  def _GetProfiler(self):
+    """Returns the lock profiler or C{None} if profiling is disabled.
+
+    """
+    if self._monitor:
+      return self._monitor.profiler
+
+    return None
+
+  def Acquire(self, locks, shared, priority, timeout_fn, ignore_deleted,
+              test_notify=None):
+    """Acquires all given locks at once.
+
+    @type locks: list of tuples; (string, L{SharedLock})
+    @param locks: Names and locks, sorted by name
+    @param shared: Whether to acquire in shared mode
+    @param priority: Priority for acquiring locks
+    @param timeout_fn: Function returning remaining timeout
+    @type ignore_deleted: bool
+    @param ignore_deleted: Whether to skip deleted locks instead of raising
+      L{errors.LockError}
+    @type test_notify: callable or None
+    @param test_notify: Special callback function for unittesting, called
+      with the name of every lock once the request has been queued
+    @rtype: list or None
+    @return: Names of acquired locks, C{None} in case of a timeout
+
+    """
+    profiler = self._GetProfiler()
+    if profiler:
+      start = self._time_fn()
+
+    request = _BatchGrantRequest(locks, shared, self._cond_class(self._lock))
+    entry = (priority, self._seq.next(), request)
+    result = None
+    timeout = None
+
+    self._lock.acquire()
+    try:
+      self._Add(entry)
+      try:
+        if __debug__ and callable(test_notify):
+          for (name, _) in locks:
+            test_notify(name)
+
+        while True:
+          blockers = self._GetBlockers(entry)
+          if blockers:
+            request.blockers = frozenset(blockers)
+          else:
+            result = self._TryAcquire(request, priority, ignore_deleted)
+            if result is not None:
+              break
+
+          timeout = timeout_fn()
+          if timeout is not None and timeout <= 0:
+            break
+
+          request.cond.wait(timeout)
+      finally:
+        self._Remove(entry)
+
+        if result is None:
+          # Requests behind this one may no longer be blocked; if the request
+          # was granted they have to wait for its locks to be released anyway
+          self._WakeUnlocked(request.names)
+    finally:
+      self._lock.release()
+
+    if profiler:
+      end = self._time_fn()
+
+      if result is None:
+        # Timeouts are accounted to the locks the request had to wait for
+        names = request.blockers
+      else:
+        names = result
+
+      for (name, lock) in locks:
+        if name in names:
+          profiler.RecordAcquire(lock, shared, priority, timeout, start, end,
+                                 result is not None)
+
+    return result
+
+  def Notify(self, names):
+    """Lets waiting requests retry after locks have been released.
+
+    @type names: iterable of strings
+    @param names: Names of the released locks
+
+    """
+    self._lock.acquire()
+    try:
+      self._WakeUnlocked(names)
+    finally:
+      self._lock.release()
+
+  def GetPending(self, name):
+    """Returns the requests waiting for a lock.
+
+    @type name: string
+    @param name: Lock name
+    @rtype: list of tuples; (string, list of strings)
+    @return: Mode and name of waiting thread for every request, in the order
+      of the queue
+
+    """
+    self._lock.acquire()
+    try:
+      entries = sorted(self._by_name.get(name, []))
+    finally:
+      self._lock.release()
+
+    result = []
+
+    for (_, _, request) in entries:
+      if request.shared:
+        mode = _SHARED_TEXT
+      else:
+        mode = _EXCLUSIVE_TEXT
+
+      result.append((mode, [request.thread.getName()]))
+
+    return result
+
+
 class LockSet(object):
   """Implements a set of locks.
 
@@ -992,13 +1673,17 @@ class LockSet(object):
   @ivar name: the name of the lockset
 
   """
-  def __init__(self, members, name, monitor=None):
+  def __init__(self, members, name, monitor=None, batched=False):
     """Constructs a new LockSet.
 
     @type members: list of strings
     @param members: initial members of the set
     @type monitor: L{LockMonitor}
     @param monitor: Lock monitor with which to register member locks
+    @type batched: bool
+    @param batched: Whether to grant all locks of an acquire at once instead
+      of acquiring them one by one, see L{_BatchGrantQueue}; opportunistic
+      acquires always acquire locks one by one
 
     """
     assert members is not None, "members parameter is not a list"
@@ -1007,6 +1692,12 @@ class LockSet(object):
     # Lock monitor
     self.__monitor = monitor
 
+    # Queue for batched acquires
+    if batched:
+      self.__batch_queue = _BatchGrantQueue(name, monitor=monitor)
+    else:
+      self.__batch_queue = None
+
     # Used internally to guarantee coherency
     self.__lock = SharedLock(self._GetLockName("[lockset]"), monitor=monitor)
 
@@ -1015,8 +1706,9 @@ class LockSet(object):
     self.__lockdict = {}
 
     for mname in members:
-      self.__lockdict[mname] = SharedLock(self._GetLockName(mname),
-                                          monitor=monitor)
+      self.__lockdict[mname] = \
+        SharedLock(self._GetLockName(mname), monitor=monitor,
+                   pending_fn=self._GetBatchPendingFn(mname))
 
     # The owner dict contains the set of locks each thread owns. For
     # performance each thread can access its own key without a global lock on
@@ -1048,6 +1740,27 @@ class LockSet(object):
     """
     return self.__lockdict
 
+  def _GetBatchPendingFn(self, mname):
+    """Returns the function listing batched acquires waiting for a lock.
+
+    @see: L{SharedLock.__init__}
+
+    """
+    if self.__batch_queue is None:
+      return None
+
+    return compat.partial(self.__batch_queue.GetPending, mname)
+
+  def _notify_released(self, names):
+    """Lets batched acquires retry after locks have been released.
+
+    @type names: iterable of strings
+    @param names: Names of the released locks
+
+    """
+    if self.__batch_queue is not None:
+      self.__batch_queue.Notify(names)
+
   def is_owned(self):
     """Is the current thread a current level owner?
 
@@ -1134,12 +1847,16 @@ class LockSet(object):
 
   def _release_and_delete_owned(self):
     """Release and delete all resources owned by the current thread"""
-    for lname in self.list_owned():
+    names = self.list_owned()
+
+    for lname in names:
       lock = self.__lockdict[lname]
       if lock.is_owned():
         lock.release()
       self._del_owned(name=lname)
 
+    self._notify_released(names)
+
   def __names(self):
     """Return the current set of names.
 
@@ -1306,6 +2023,11 @@ class LockSet(object):
       else:
         acquire_list.append((lname, lock))
 
+    if (self.__batch_queue is not None and
+        mode != _LS_ACQUIRE_OPPORTUNISTIC):
+      return self.__acquire_batched(acquire_list, mode, shared, priority,
+                                    timeout_fn, test_notify)
+
     # This will hold the locknames we effectively acquired.
     acquired = set()
 
@@ -1371,6 +2093,37 @@ class LockSet(object):
 
     return acquired
 
+  def __acquire_batched(self, acquire_list, mode, shared, priority,
+                        timeout_fn, test_notify):
+    """Acquires a number of locks at once using the batch queue.
+
+    @param acquire_list: Names and locks, sorted by name
+    @see: L{__acquire_inner}
+
+    """
+    names = self.__batch_queue.Acquire(acquire_list, shared, priority,
+                                       timeout_fn, mode == _LS_ACQUIRE_ALL,
+                                       test_notify=test_notify)
+
+    if names is None:
+      raise _AcquireTimeout()
+
+    try:
+      for lname in names:
+        # now the lock cannot be deleted, we have it!
+        self._add_owned(name=lname)
+    except:
+      # We shouldn't have problems adding the locks to the owners list, but if
+      # we did we'll try to release them and re-raise the exception
+      for lname in names:
+        lock = self.__lockdict[lname]
+        if lock.is_owned():
+          lock.release()
+      self._notify_released(names)
+      raise
+
+    return set(names)
+
   def downgrade(self, names=None):
     """Downgrade a set of resource locks from exclusive to shared mode.
 
@@ -1405,6 +2158,9 @@ class LockSet(object):
         self.__lock.downgrade()
         assert self.__lock.is_owned(shared=1)
 
+    # Shared acquires may be possible now
+    self._notify_released(names)
+
     return True
 
   def release(self, names=None):
@@ -1445,6 +2201,8 @@ class LockSet(object):
       self.__lockdict[lockname].release()
       self._del_owned(name=lockname)
 
+    self._notify_released(names)
+
   def add(self, names, acquired=0, shared=0):
     """Add a new set of elements to the set
 
@@ -1482,7 +2240,8 @@ class LockSet(object):
                                (invalid_names, self.name))
 
       for lockname in names:
-        lock = SharedLock(self._GetLockName(lockname), monitor=self.__monitor)
+        lock = SharedLock(self._GetLockName(lockname), monitor=self.__monitor,
+                          pending_fn=self._GetBatchPendingFn(lockname))
 
         if acquired:
           # No need for priority or timeout here as this lock has just been
@@ -1563,6 +2322,9 @@ class LockSet(object):
         if self.is_owned():
           self._del_owned(name=lname)
 
+    # Batched acquires of removed locks must fail
+    self._notify_released(removed)
+
     return removed
 
 
@@ -1638,7 +2400,8 @@ class GanetiLockManager(object):
   """
   _instance = None
 
-  def __init__(self, node_uuids, nodegroups, instance_names, networks):
+  def __init__(self, node_uuids, nodegroups, instance_names, networks,
+               profiling=False, batched=False):
     """Constructs a new GanetiLockManager object.
 
     There should be only a GanetiLockManager object at any time, so this
@@ -1647,6 +2410,11 @@ class GanetiLockManager(object):
     @param node_uuids: list of node UUIDs
     @param nodegroups: list of nodegroup uuids
     @param instance_names: list of instance names
+    @type profiling: bool
+    @param profiling: Whether to collect profiling data for all locks
+    @type batched: bool
+    @param batched: Whether to grant all locks of an acquire at once for lock
+      sets with more than one lock, see L{LockSet}
 
     """
     assert self.__class__._instance is None, \
@@ -1655,17 +2423,22 @@ class GanetiLockManager(object):
     self.__class__._instance = self
 
     self._monitor = LockMonitor()
+    self._monitor.SetProfiling(profiling)
 
     # The keyring contains all the locks, at their level and in the correct
     # locking order.
     self.__keyring = {
       LEVEL_CLUSTER: LockSet([BGL], "cluster", monitor=self._monitor),
-      LEVEL_NODE: LockSet(node_uuids, "node", monitor=self._monitor),
-      LEVEL_NODE_RES: LockSet(node_uuids, "node-res", monitor=self._monitor),
-      LEVEL_NODEGROUP: LockSet(nodegroups, "nodegroup", monitor=self._monitor),
+      LEVEL_NODE: LockSet(node_uuids, "node", monitor=self._monitor,
+                          batched=batched),
+      LEVEL_NODE_RES: LockSet(node_uuids, "node-res", monitor=self._monitor,
+                              batched=batched),
+      LEVEL_NODEGROUP: LockSet(nodegroups, "nodegroup", monitor=self._monitor,
+                               batched=batched),
       LEVEL_INSTANCE: LockSet(instance_names, "instance",
-                              monitor=self._monitor),
-      LEVEL_NETWORK: LockSet(networks, "network", monitor=self._monitor),
+                              monitor=self._monitor, batched=batched),
+      LEVEL_NETWORK: LockSet(networks, "network", monitor=self._monitor,
+                             batched=batched),
       LEVEL_NODE_ALLOC: LockSet([NAL], "node-alloc", monitor=self._monitor),
       }
 
@@ -1681,13 +2454,13 @@ class GanetiLockManager(object):
     """
     return self._monitor.RegisterLock(provider)
 
-  def QueryLocks(self, fields):
+  def QueryLocks(self, fields, **kwargs):
     """Queries information from all locks.
 
     See L{LockMonitor.QueryLocks}.
 
     """
-    return self._monitor.QueryLocks(fields)
+    return self._monitor.QueryLocks(fields, **kwargs)
 
   def _names(self, level):
     """List the lock names at the given level.
@@ -1893,6 +2666,215 @@ def _MonitorSortKey((item, idx, num)):
   return (utils.NiceSortKey(name), num, idx)
 
 
+def _GetOwnerTask(name):
+  """Returns the task of a lock owner used to aggregate profiling data.
+
+  Job queue workers are named C{<worker>/Job<id>/<opcode>}, only the opcode
+  is used so that the data of all jobs of a kind is aggregated.
+
+  @type name: string
+  @param name: Thread name
+
+  """
+  parts = name.split("/")
+
+  if len(parts) == 3 and parts[1].startswith("Job"):
+    return parts[2]
+
+  return name
+
+
+class LockProfile(object):
+  """Aggregated profiling data of a lock.
+
+  Times are in seconds, histograms count durations by L{PROFILE_BUCKETS}.
+
+  @ivar acquires: Number of successful acquires
+  @ivar timeouts: Number of acquires which timed out; each of them usually
+    causes a job to retry with the next timeout of
+    L{mcpu.LockAttemptTimeoutStrategy}
+  @ivar modes: Number of acquires per mode
+  @ivar priorities: Number of acquires per priority
+  @ivar owners: Number of acquires, number of timeouts, total waiting and
+    holding time per owner task (see L{_GetOwnerTask})
+
+  """
+  __slots__ = [
+    "acquires",
+    "timeouts",
+    "wait_total",
+    "wait_max",
+    "wait_histogram",
+    "hold_total",
+    "hold_max",
+    "hold_histogram",
+    "modes",
+    "priorities",
+    "owners",
+    ]
+
+  def __init__(self):
+    """Initializes this class.
+
+    """
+    self.acquires = 0
+    self.timeouts = 0
+    self.wait_total = 0.0
+    self.wait_max = 0.0
+    self.wait_histogram = [0] * (len(PROFILE_BUCKETS) + 1)
+    self.hold_total = 0.0
+    self.hold_max = 0.0
+    self.hold_histogram = [0] * (len(PROFILE_BUCKETS) + 1)
+    self.modes = {}
+    self.priorities = {}
+    self.owners = {}
+
+  def GetOwner(self, task):
+    """Returns the per-owner data for a task.
+
+    """
+    try:
+      return self.owners[task]
+    except KeyError:
+      result = self.owners[task] = [0, 0, 0.0, 0.0]
+      return result
+
+  def AddWait(self, duration):
+    """Records the time spent waiting for an acquire.
+
+    """
+    self.wait_total += duration
+    self.wait_max = max(self.wait_max, duration)
+    self.wait_histogram[bisect.bisect_left(PROFILE_BUCKETS, duration)] += 1
+
+  def AddHold(self, duration):
+    """Records the time a lock was held.
+
+    """
+    self.hold_total += duration
+    self.hold_max = max(self.hold_max, duration)
+    self.hold_histogram[bisect.bisect_left(PROFILE_BUCKETS, duration)] += 1
+
+
+class LockProfiler(object):
+  """Collects the waiting and holding times of locks.
+
+  Data is aggregated by lock name, hence it is retained if a lock is removed
+  and added again.
+
+  """
+  def __init__(self):
+    """Initializes this class.
+
+    """
+    # A plain lock is required as this class is used by L{SharedLock}
+    self._lock = threading.Lock()
+
+    self._profiles = {}
+
+    # Acquire time and owner task per lock and owning thread
+    self._held = {}
+
+  def _GetProfile(self, name):
+    """Returns the profile for a lock name.
+
+    Must be called with the internal lock held.
+
+    """
+    try:
+      return self._profiles[name]
+    except KeyError:
+      result = self._profiles[name] = LockProfile()
+      return result
+
+  def RecordAcquire(self, lock, shared, priority, timeout, start, end,
+                    acquired):
+    """Records an attempt to acquire a lock.
+
+    @type lock: L{SharedLock}
+    @param shared: Whether the lock was acquired in shared mode
+    @param priority: Priority of the acquire
+    @param timeout: Timeout of the acquire
+    @type start: float
+    @param start: Time at which the acquire started
+    @type end: float
+    @param end: Time at which the acquire returned
+    @type acquired: bool
+    @param acquired: Whether the lock was acquired
+
+    """
+    thread = threading.currentThread()
+    task = _GetOwnerTask(thread.getName())
+    wait = max(0, end - start)
+
+    if shared:
+      mode = _SHARED_TEXT
+    else:
+      mode = _EXCLUSIVE_TEXT
+
+    self._lock.acquire()
+    try:
+      profile = self._GetProfile(lock.name)
+      owner = profile.GetOwner(task)
+
+      profile.AddWait(wait)
+      owner[2] += wait
+
+      if acquired:
+        profile.acquires += 1
+        profile.modes[mode] = profile.modes.get(mode, 0) + 1
+        profile.priorities[priority] = profile.priorities.get(priority, 0) + 1
+        owner[0] += 1
+
+        self._held[(id(lock), thread)] = (end, task)
+
+      elif timeout is not None:
+        profile.timeouts += 1
+        owner[1] += 1
+    finally:
+      self._lock.release()
+
+  def RecordRelease(self, lock, now):
+    """Records the release of a lock by the current thread.
+
+    @type lock: L{SharedLock}
+    @type now: float
+    @param now: Time of the release
+
+    """
+    thread = threading.currentThread()
+
+    self._lock.acquire()
+    try:
+      try:
+        (start, task) = self._held.pop((id(lock), thread))
+      except KeyError:
+        # Lock was acquired before profiling was enabled
+        return
+
+      duration = max(0, now - start)
+
+      profile = self._GetProfile(lock.name)
+      profile.AddHold(duration)
+      profile.GetOwner(task)[3] += duration
+    finally:
+      self._lock.release()
+
+  def GetProfiles(self):
+    """Returns a copy of the profiling data of all locks.
+
+    @rtype: dict
+    @return: Dictionary with lock names as keys and L{LockProfile} instances
+      as values
+
+    """
+    self._lock.acquire()
+    try:
+      return copy.deepcopy(self._profiles)
+    finally:
+      self._lock.release()
+
+
 class LockMonitor(object):
   _LOCK_ATTR = "_lock"
 
@@ -1909,6 +2891,22 @@ class LockMonitor(object):
     # references and deletion.
     self._locks = weakref.WeakKeyDictionary()
 
+    # Lock profiler, None while profiling is disabled
+    self.profiler = None
+
+  def SetProfiling(self, enabled):
+    """Enables or disables profiling of the registered locks.
+
+    Disabling profiling discards the data collected so far.
+
+    @type enabled: bool
+
+    """
+    if not enabled:
+      self.profiler = None
+    elif self.profiler is None:
+      self.profiler = LockProfiler()
+
   @ssynchronized(_LOCK_ATTR)
   def RegisterLock(self, provider):
     """Registers a new lock.
@@ -1947,31 +2945,46 @@ class LockMonitor(object):
             for (provider, num) in items
             for (idx, info) in enumerate(provider.GetLockInfo(requested))]
 
-  def _Query(self, fields):
+  def _Query(self, fields, sort_by=None):
     """Queries information from all locks.
 
     @type fields: list of strings
     @param fields: List of fields to return
+    @type sort_by: None or list of strings
+    @param sort_by: Fields to sort by, see L{query.Query}
 
     """
-    qobj = query.Query(query.LOCK_FIELDS, fields)
+    qobj = query.Query(query.LOCK_FIELDS, fields, sort_by=sort_by)
+    requested = qobj.RequestedData()
 
     # Get all data with internal lock held and then sort by name and incoming
     # order
-    lockinfo = sorted(self._GetLockInfo(qobj.RequestedData()),
-                      key=_MonitorSortKey)
+    lockinfo = sorted(self._GetLockInfo(requested), key=_MonitorSortKey)
+
+    profiler = self.profiler
+    if profiler and query.LQ_PROFILE in requested:
+      profiles = profiler.GetProfiles()
+    else:
+      profiles = None
 
     # Extract lock information and build query data
-    return (qobj, query.LockQueryData(map(compat.fst, lockinfo)))
+    return (qobj, query.LockQueryData(map(compat.fst, lockinfo),
+                                      profiles=profiles))
 
-  def QueryLocks(self, fields):
+  def QueryLocks(self, fields, sort_by=None, limit=None, offset=0,
+                 count_only=False):
     """Queries information from all locks.
 
     @type fields: list of strings
     @param fields: List of fields to return
+    @param sort_by: Fields to sort by, see L{query.Query}
+    @param limit: Maximum number of locks to return
+    @param offset: Number of leading locks to skip
+    @param count_only: Whether to only count locks
 
     """
-    (qobj, ctx) = self._Query(fields)
+    (qobj, ctx) = self._Query(fields, sort_by=sort_by)
 
     # Prepare query response
-    return query.GetQueryResponse(qobj, ctx)
+    return query.GetQueryResponse(qobj, ctx, limit=limit, offset=offset,
+                                  count_only=count_only)
@@ -532,18 +532,53 @@ class Client(object):
         break
     return result
 
-  def Query(self, what, fields, qfilter):
+  def Query(self, what, fields, qfilter, sort_by=None, limit=None, offset=0,
+            count_only=False, max_age=None):
     """Query for resources/items.
 
+    Query options are only sent if they differ from their defaults, as not
+    all servers support them.
+
     @param what: One of L{constants.QR_VIA_LUXI}
     @type fields: List of strings
     @param fields: List of requested fields
     @type qfilter: None or list
     @param qfilter: Query filter
+    @type sort_by: None or list of strings
+    @param sort_by: Fields to sort by, in order of precedence; a field name
+      prefixed with C{-} sorts in descending order
+    @type limit: None or int
+    @param limit: Maximum number of items to return
+    @type offset: int
+    @param offset: Number of leading items to skip
+    @type count_only: bool
+    @param count_only: Whether to only count the matching items; the number is
+      returned as the response's C{count}
+    @type max_age: None or int
+    @param max_age: Maximum age in seconds of cached live data the master
+      daemon may use instead of querying nodes
     @rtype: L{objects.QueryResponse}
 
     """
-    result = self.CallMethod(REQ_QUERY, (what, fields, qfilter))
+    options = {}
+
+    if sort_by:
+      options["sort_by"] = sort_by
+    if limit is not None:
+      options["limit"] = limit
+    if offset:
+      options["offset"] = offset
+    if count_only:
+      options["count_only"] = count_only
+    if max_age is not None:
+      options["max_age"] = max_age
+
+    if options:
+      args = (what, fields, qfilter, options)
+    else:
+      args = (what, fields, qfilter)
+
+    result = self.CallMethod(REQ_QUERY, args)
     return objects.QueryResponse.FromDict(result)
 
   def QueryFields(self, what, fields):
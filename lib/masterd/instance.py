@@ -1016,7 +1016,8 @@ def _GetInstDiskMagic(base, instance_name, index):
 
 
 def TransferInstanceData(lu, feedback_fn, src_node_uuid, dest_node_uuid,
-                         dest_ip, instance, all_transfers):
+                         dest_ip, instance, all_transfers, compress=None,
+                         buffer_size=None):
   """Transfers an instance's data from one node to another.
 
   @param lu: Logical unit instance
@@ -1031,13 +1032,21 @@ def TransferInstanceData(lu, feedback_fn, src_node_uuid, dest_node_uuid,
   @param instance: Instance object
   @type all_transfers: list of L{DiskTransfer} instances
   @param all_transfers: List of all disk transfers to be made
+  @type compress: string or None
+  @param compress: Compression method (one of L{constants.IEC_ALL}, C{None}
+      for no compression)
+  @type buffer_size: number or None
+  @param buffer_size: Size of the transfer buffers in bytes (C{None} for the
+      daemon's default)
   @rtype: list
   @return: List with a boolean (True=successful, False=failed) for success for
            each transfer
 
   """
-  # Disable compression for all moves as these are all within the same cluster
-  compress = constants.IEC_NONE
+  # Disable compression by default for all moves as these are all within the
+  # same cluster
+  if compress is None:
+    compress = constants.IEC_NONE
 
   src_node_name = lu.cfg.GetNodeName(src_node_uuid)
   dest_node_name = lu.cfg.GetNodeName(dest_node_uuid)
@@ -1063,9 +1072,12 @@ def TransferInstanceData(lu, feedback_fn, src_node_uuid, dest_node_uuid,
         feedback_fn("Exporting %s from %s to %s" %
                     (transfer.name, src_node_name, dest_node_name))
 
+        # Both sides run in this cluster and can skip zeroed blocks
         magic = _GetInstDiskMagic(base_magic, instance.name, idx)
         opts = objects.ImportExportOptions(key_name=None, ca_pem=None,
-                                           compress=compress, magic=magic)
+                                           compress=compress, magic=magic,
+                                           buffer_size=buffer_size,
+                                           sparse=True)
 
         dtp = _DiskTransferPrivate(transfer, True, opts)
 
@@ -1150,18 +1162,27 @@ class _RemoteExportCb(ImportExportCbBase):
 
 
 class ExportInstanceHelper(object):
-  def __init__(self, lu, feedback_fn, instance):
+  def __init__(self, lu, feedback_fn, instance, compress=None,
+               buffer_size=None):
     """Initializes this class.
 
     @param lu: Logical unit instance
     @param feedback_fn: Feedback function
     @type instance: L{objects.Instance}
     @param instance: Instance object
+    @type compress: string or None
+    @param compress: Compression method (one of L{constants.IEC_ALL}, C{None}
+        for the default of the export mode)
+    @type buffer_size: number or None
+    @param buffer_size: Size of the transfer buffers in bytes (C{None} for the
+        daemon's default)
 
     """
     self._lu = lu
     self._feedback_fn = feedback_fn
     self._instance = instance
+    self._compress = compress
+    self._buffer_size = buffer_size
 
     self._snap_disks = []
     self._removed_snaps = [False] * len(instance.disks)
@@ -1273,7 +1294,9 @@ class ExportInstanceHelper(object):
     dresults = TransferInstanceData(self._lu, self._feedback_fn,
                                     src_node_uuid, dest_node.uuid,
                                     dest_node.secondary_ip,
-                                    instance, transfers)
+                                    instance, transfers,
+                                    compress=self._compress,
+                                    buffer_size=self._buffer_size)
 
     assert len(dresults) == len(instance.disks)
 
@@ -1316,6 +1339,8 @@ class ExportInstanceHelper(object):
 
         opts = objects.ImportExportOptions(key_name=key_name,
                                            ca_pem=dest_ca_pem,
+                                           compress=self._compress,
+                                           buffer_size=self._buffer_size,
                                            magic=magic, ipv6=ipv6)
 
         self._feedback_fn("Sending disk %s to %s:%s" % (idx, host, port))
@@ -1449,7 +1474,7 @@ class _RemoteImportCb(ImportExportCbBase):
 
 
 def RemoteImport(lu, feedback_fn, instance, pnode, source_x509_ca,
-                 cds, timeouts):
+                 cds, timeouts, compress=None, buffer_size=None):
   """Imports an instance from another cluster.
 
   @param lu: Logical unit instance
@@ -1464,6 +1489,12 @@ def RemoteImport(lu, feedback_fn, instance, pnode, source_x509_ca,
   @param cds: Cluster domain secret
   @type timeouts: L{ImportExportTimeouts}
   @param timeouts: Timeouts for this import
+  @type compress: string or None
+  @param compress: Compression method (one of L{constants.IEC_ALL}, C{None}
+      for the daemon's default), must match the one used by the source
+  @type buffer_size: number or None
+  @param buffer_size: Size of the transfer buffers in bytes (C{None} for the
+      daemon's default)
 
   """
   source_ca_pem = OpenSSL.crypto.dump_certificate(OpenSSL.crypto.FILETYPE_PEM,
@@ -1500,6 +1531,8 @@ def RemoteImport(lu, feedback_fn, instance, pnode, source_x509_ca,
         # Import daemon options
         opts = objects.ImportExportOptions(key_name=x509_key_name,
                                            ca_pem=source_ca_pem,
+                                           compress=compress,
+                                           buffer_size=buffer_size,
                                            magic=magic, ipv6=ipv6)
 
         ieloop.Add(DiskImport(lu, instance.primary_node, opts, instance,
@@ -0,0 +1,266 @@
+#
+#
+
+# Copyright (C) 2014 Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Cache for live data collected from nodes by queries.
+
+Queries for live fields (e.g. the free memory of nodes or the state of
+instances) call RPCs on all involved nodes. The results of these calls can
+be cached on the master for a limited time, so that frequent queries, e.g.
+by monitoring systems, don't have to contact every node every time.
+
+Caching is opt-in: results are only kept if the cache was created with a
+non-zero time to live, and they are only used by queries which explicitly
+accept data up to a certain age.
+
+"""
+
+import logging
+import threading
+import time
+
+from ganeti import query
+
+
+#: Data returned by the C{node_info} RPC
+KIND_NODE = "node"
+
+#: Data returned by the C{all_instances_info} RPC
+KIND_INSTANCES = "instances"
+
+KINDS = frozenset([
+  KIND_NODE,
+  KIND_INSTANCES,
+  ])
+
+
+class LiveDataCache(object):
+  """Cache for per-node RPC results.
+
+  Results are stored per data kind and node, together with a key describing
+  the RPC arguments (e.g. the hypervisors asked for). Only successful results
+  are stored. Results are dropped when they're older than the time to live
+  or when invalidated by an operation which might have changed them.
+
+  """
+  def __init__(self, ttl, _time_fn=time.time):
+    """Initializes this class.
+
+    @type ttl: number
+    @param ttl: Maximum age of cached results in seconds, zero disables
+      the cache
+
+    """
+    assert ttl >= 0
+
+    self._ttl = ttl
+    self._time_fn = _time_fn
+
+    self._lock = threading.Lock()
+
+    # (Kind, node UUID) to (key, timestamp, RPC result)
+    self._data = {}
+
+    # Incremented whenever results are invalidated
+    self._generation = 0
+
+    # Statistics
+    self._hits = 0
+    self._misses = 0
+    self._invalidations = 0
+
+  def Call(self, kind, key, node_uuids, max_age, fn):
+    """Returns per-node results, calling a function for missing ones.
+
+    @type kind: string
+    @param kind: Data kind, one of L{KINDS}
+    @param key: Hashable value describing the RPC arguments other than the
+      node list; cached results are only used if their key is equal
+    @type node_uuids: list of strings
+    @param node_uuids: Node UUIDs
+    @type max_age: None or number
+    @param max_age: Maximum acceptable age of cached results in seconds;
+      C{None} to always call C{fn} for all nodes
+    @type fn: callable
+    @param fn: Function called with a list of node UUIDs for which no usable
+      result is cached, must return a dictionary of RPC results indexed by
+      node UUID
+    @rtype: dict
+
+    """
+    assert kind in KINDS
+
+    result = {}
+
+    self._lock.acquire()
+    try:
+      now = self._time_fn()
+      generation = self._generation
+
+      if max_age is None or not self._ttl:
+        missing = node_uuids
+      else:
+        missing = []
+
+        for node_uuid in node_uuids:
+          entry = self._GetUnlocked(kind, key, node_uuid, now,
+                                    min(max_age, self._ttl))
+          if entry is None:
+            missing.append(node_uuid)
+          else:
+            result[node_uuid] = entry
+
+        self._hits += len(result)
+        self._misses += len(missing)
+    finally:
+      self._lock.release()
+
+    if missing:
+      fresh = fn(missing)
+      result.update(fresh)
+
+      if self._ttl:
+        self._Store(kind, key, fresh, now, generation)
+
+    return result
+
+  def _GetUnlocked(self, kind, key, node_uuid, now, max_age):
+    """Returns a cached result if it's recent enough.
+
+    """
+    entry = self._data.get((kind, node_uuid), None)
+    if entry is None:
+      return None
+
+    (entry_key, timestamp, rpcresult) = entry
+
+    if entry_key != key or now - timestamp > max_age or now < timestamp:
+      return None
+
+    return rpcresult
+
+  def _Store(self, kind, key, results, timestamp, generation):
+    """Stores successful results.
+
+    Results are not stored if an invalidation happened since C{generation}
+    was retrieved, as they could have been collected before the change.
+
+    """
+    self._lock.acquire()
+    try:
+      if generation != self._generation:
+        logging.debug("Not caching live data of kind '%s', cache was"
+                      " invalidated in the meantime", kind)
+        return
+
+      for (node_uuid, rpcresult) in results.items():
+        if rpcresult.fail_msg or rpcresult.offline:
+          self._data.pop((kind, node_uuid), None)
+        else:
+          self._data[(kind, node_uuid)] = (key, timestamp, rpcresult)
+
+      self._ExpireUnlocked(timestamp)
+    finally:
+      self._lock.release()
+
+  def _ExpireUnlocked(self, now):
+    """Removes results older than the time to live.
+
+    """
+    for (entry_id, (_, timestamp, _)) in self._data.items():
+      if now - timestamp > self._ttl:
+        del self._data[entry_id]
+
+  def Invalidate(self, node_uuids=None, instance_names=None):
+    """Invalidates cached results.
+
+    All results of the given nodes are removed, as well as the instance data
+    of all nodes listing one of the given instances. If neither nodes nor
+    instances are given, the whole cache is cleared.
+
+    @type node_uuids: None or list of strings
+    @param node_uuids: Node UUIDs
+    @type instance_names: None or list of strings
+    @param instance_names: Instance names
+
+    """
+    self._lock.acquire()
+    try:
+      self._generation += 1
+      self._invalidations += 1
+
+      if node_uuids is None and instance_names is None:
+        self._data.clear()
+        return
+
+      node_uuids = frozenset(node_uuids or [])
+      instance_names = frozenset(instance_names or [])
+
+      for ((kind, node_uuid), (_, _, rpcresult)) in self._data.items():
+        if (node_uuid in node_uuids or
+            (kind == KIND_INSTANCES and
+             instance_names.intersection(rpcresult.payload))):
+          del self._data[(kind, node_uuid)]
+    finally:
+      self._lock.release()
+
+  def GetStats(self):
+    """Returns statistics about the cache.
+
+    @rtype: dict
+
+    """
+    self._lock.acquire()
+    try:
+      return {
+        "ttl": self._ttl,
+        "entries": len(self._data),
+        "hits": self._hits,
+        "misses": self._misses,
+        "invalidations": self._invalidations,
+        }
+    finally:
+      self._lock.release()
+
+  def GetLockInfo(self, requested):
+    """Retrieves information about the cache.
+
+    The statistics are reported in the mode of a single item.
+
+    @type requested: set
+    @param requested: Requested information, see C{query.LQ_*}
+
+    """
+    if query.LQ_MODE in requested:
+      mode = ("ttl=%(ttl)s entries=%(entries)s hits=%(hits)s misses=%(misses)s"
+              " invalidations=%(invalidations)s" % self.GetStats())
+    else:
+      mode = None
+
+    return [("livedata-cache", mode, None, None)]
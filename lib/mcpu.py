@@ -51,6 +51,7 @@ from ganeti import errors
 from ganeti import hooksmaster
 from ganeti import cmdlib
 from ganeti import locking
+from ganeti import optimeline
 from ganeti import utils
 from ganeti import compat
 
@@ -297,6 +298,55 @@ def _VerifyLocks(lu, glm, _mode_whitelist=_NODE_ALLOC_MODE_WHITELIST,
            " or node resources")
 
 
+def _GetLiveDataChanges(lu, glm):
+  """Determines the live data a logical unit might change.
+
+  Logical units changing the state of instances or nodes acquire their locks
+  in exclusive mode, while queries only use shared locks or none at all.
+
+  @type lu: L{cmdlib.LogicalUnit}
+  @param lu: Logical unit instance
+  @type glm: L{locking.GanetiLockManager}
+  @param glm: Lock manager
+  @rtype: None or tuple
+  @return: C{None} if all live data might change, otherwise a tuple of
+    node UUIDs and instance names
+
+  """
+  if glm.check_owned(locking.LEVEL_CLUSTER, locking.BGL, shared=0):
+    return None
+
+  instance_names = [name for name in glm.list_owned(locking.LEVEL_INSTANCE)
+                    if glm.check_owned(locking.LEVEL_INSTANCE, name,
+                                       shared=0)]
+
+  node_uuids = set(uuid
+                   for level in [locking.LEVEL_NODE, locking.LEVEL_NODE_RES]
+                   for uuid in glm.list_owned(level)
+                   if glm.check_owned(level, uuid, shared=0))
+
+  # Resources used by instances are accounted for on their nodes
+  node_uuids.update(_GetInstancesNodes(lu.cfg, instance_names))
+
+  return (node_uuids, instance_names)
+
+
+def _GetInstancesNodes(cfg, instance_names):
+  """Returns the UUIDs of all nodes used by the given instances.
+
+  Instances which don't exist (anymore) are ignored.
+
+  """
+  result = set()
+
+  for name in instance_names:
+    instance = cfg.GetInstanceInfoByName(name)
+    if instance is not None:
+      result.update(instance.all_nodes)
+
+  return result
+
+
 class Processor(object):
   """Object which runs OpCodes"""
   DISPATCH_TABLE = _ComputeDispatchTable()
@@ -350,9 +400,13 @@ class Processor(object):
     else:
       priority = None
 
-    acquired = self.context.glm.acquire(level, names, shared=shared,
-                                        timeout=timeout, priority=priority,
-                                        opportunistic=opportunistic)
+    span = optimeline.StartSpan(constants.OP_PHASE_LOCK)
+    try:
+      acquired = self.context.glm.acquire(level, names, shared=shared,
+                                          timeout=timeout, priority=priority,
+                                          opportunistic=opportunistic)
+    finally:
+      span.End()
 
     if acquired is None:
       raise LockAcquireTimeout()
@@ -364,7 +418,12 @@ class Processor(object):
 
     """
     write_count = self.context.cfg.write_count
-    lu.CheckPrereq()
+
+    span = optimeline.StartSpan(constants.OP_PHASE_PREREQ)
+    try:
+      lu.CheckPrereq()
+    finally:
+      span.End()
 
     hm = self.BuildHooksManager(lu)
     h_results = hm.RunPhase(constants.HOOKS_PHASE_PRE)
@@ -384,8 +443,19 @@ class Processor(object):
     else:
       submit_mj_fn = _FailingSubmitManyJobs
 
+    if self._enable_locks:
+      # Locks might be released during execution
+      livedata_changes = _GetLiveDataChanges(lu, self.context.glm)
+    else:
+      livedata_changes = ([], [])
+
     try:
-      result = _ProcessResult(submit_mj_fn, lu.op, lu.Exec(self.Log))
+      span = optimeline.StartSpan(constants.OP_PHASE_EXEC)
+      try:
+        result = _ProcessResult(submit_mj_fn, lu.op, lu.Exec(self.Log))
+      finally:
+        span.End()
+
       h_results = hm.RunPhase(constants.HOOKS_PHASE_POST)
       result = lu.HooksCallBack(constants.HOOKS_PHASE_POST, h_results,
                                 self.Log, result)
@@ -394,8 +464,30 @@ class Processor(object):
       if write_count != self.context.cfg.write_count:
         hm.RunConfigUpdate()
 
+      self._InvalidateLiveData(livedata_changes)
+
     return result
 
+  def _InvalidateLiveData(self, changes):
+    """Invalidates cached live data after executing a logical unit.
+
+    @param changes: Return value of L{_GetLiveDataChanges}
+
+    """
+    if changes is None:
+      self.context.livedata.Invalidate()
+      return
+
+    (node_uuids, instance_names) = changes
+
+    if node_uuids or instance_names:
+      # Instances might have been moved to other nodes
+      node_uuids = set(node_uuids)
+      node_uuids.update(_GetInstancesNodes(self.context.cfg, instance_names))
+
+      self.context.livedata.Invalidate(node_uuids=node_uuids,
+                                       instance_names=instance_names)
+
   def BuildHooksManager(self, lu):
     return self.hmclass.BuildFromLu(lu.rpc.call_hooks_runner, lu)
 
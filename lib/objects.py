@@ -1986,6 +1986,17 @@ class ImportExportStatus(ConfigObject):
     ] + _TIMESTAMPS
 
 
+class DiskWipeStatus(ConfigObject):
+  """Config object representing the status of a disk wipe."""
+  __slots__ = [
+    "size",
+    "progress_mbytes",
+    "method",
+    "exit_status",
+    "error_message",
+    ] + _TIMESTAMPS
+
+
 class ImportExportOptions(ConfigObject):
   """Options for import/export daemon
 
@@ -1995,6 +2006,10 @@ class ImportExportOptions(ConfigObject):
   @ivar magic: Used to ensure the connection goes to the right disk
   @ivar ipv6: Whether to use IPv6
   @ivar connect_timeout: Number of seconds for establishing connection
+  @ivar buffer_size: Size of the transfer buffers in bytes (None for the
+      daemon's default)
+  @ivar sparse: Whether to skip zeroed blocks of the transferred data; must be
+      the same for both sides
 
   """
   __slots__ = [
@@ -2004,6 +2019,8 @@ class ImportExportOptions(ConfigObject):
     "magic",
     "ipv6",
     "connect_timeout",
+    "buffer_size",
+    "sparse",
     ]
 
 
@@ -2087,10 +2104,12 @@ class QueryResponse(_QueryResponseBase):
 
   @ivar fields: List of L{QueryFieldDefinition} objects
   @ivar data: Requested data
+  @ivar count: Number of items matching the query filter
 
   """
   __slots__ = [
     "data",
+    "count",
     ]
 
 
@@ -0,0 +1,199 @@
+#
+#
+
+# Copyright (C) 2014 Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+
+"""Timelines of the phases of opcode execution.
+
+Code running on behalf of an opcode, e.g. acquiring locks, running hooks,
+making RPCs or writing the configuration, records the time it took using
+L{StartSpan}. The span is added to the timeline set for the calling thread
+using L{SetTimeline}; without a timeline nothing is recorded.
+
+A timeline is a list of spans, each consisting of the phase (one of
+L{constants.OP_PHASES}), the start time and the duration in seconds.
+
+"""
+
+import threading
+import time
+
+from ganeti import constants
+
+
+#: Timeline of the calling thread
+_current = threading.local()
+
+
+class _Span(object):
+  """Span of a timeline being recorded.
+
+  """
+  __slots__ = [
+    "_timeline",
+    "_phase",
+    "_start",
+    "_time_fn",
+    ]
+
+  def __init__(self, timeline, phase, time_fn):
+    """Initializes this class.
+
+    """
+    self._timeline = timeline
+    self._phase = phase
+    self._time_fn = time_fn
+    self._start = time_fn()
+
+  def End(self):
+    """Ends the span and adds it to the timeline.
+
+    """
+    AddSpan(self._timeline, self._phase, self._start,
+            self._time_fn() - self._start)
+
+
+class _NoSpan(object):
+  """Span not being recorded.
+
+  """
+  __slots__ = []
+
+  def End(self):
+    """Does nothing.
+
+    """
+
+
+_NO_SPAN = _NoSpan()
+
+
+def SetTimeline(timeline):
+  """Sets the timeline spans of the calling thread are added to.
+
+  @type timeline: list or None
+  @param timeline: Timeline, C{None} to stop recording
+
+  """
+  _current.timeline = timeline
+
+
+def GetTimeline():
+  """Returns the timeline of the calling thread.
+
+  @rtype: list or None
+
+  """
+  return getattr(_current, "timeline", None)
+
+
+def StartSpan(phase, _time_fn=time.time):
+  """Starts a span of the calling thread's timeline.
+
+  The span is recorded when its C{End} method is called.
+
+  @type phase: string
+  @param phase: Phase, one of L{constants.OP_PHASES}
+
+  """
+  assert phase in constants.OP_PHASES
+
+  timeline = GetTimeline()
+
+  if timeline is None:
+    return _NO_SPAN
+
+  return _Span(timeline, phase, _time_fn)
+
+
+def AddSpan(timeline, phase, start, duration,
+            _max_spans=constants.OP_TIMELINE_MAX_SPANS):
+  """Adds a span to a timeline.
+
+  Once the timeline contains the maximum number of spans, the duration is
+  added to the last span of the same phase instead. If there is none, the
+  two most recent spans of another phase are merged to make room for the
+  span, which is dropped if no phase has more than one span.
+
+  @type timeline: list
+  @type phase: string
+  @param phase: Phase, one of L{constants.OP_PHASES}
+  @type start: float
+  @param start: Start time
+  @type duration: float
+  @param duration: Duration in seconds
+
+  """
+  if len(timeline) >= _max_spans:
+    for span in reversed(timeline):
+      if span[0] == phase:
+        span[2] += duration
+        return
+
+    if not _MergeSpans(timeline):
+      return
+
+  timeline.append([phase, start, duration])
+
+
+def _MergeSpans(timeline):
+  """Merges the two most recent spans of the same phase.
+
+  The duration of the later span is added to the earlier one.
+
+  @type timeline: list
+  @rtype: bool
+  @return: Whether two spans were merged
+
+  """
+  later = {}
+
+  for idx in range(len(timeline) - 1, -1, -1):
+    span = timeline[idx]
+    other = later.get(span[0], None)
+    if other is not None:
+      span[2] += timeline[other][2]
+      del timeline[other]
+      return True
+    later[span[0]] = idx
+
+  return False
+
+
+def GetPhaseTime(timeline, phase):
+  """Returns the total time spent in a phase.
+
+  @type timeline: list
+  @type phase: string
+  @param phase: Phase, one of L{constants.OP_PHASES}
+  @rtype: float
+
+  """
+  return sum(duration for (span_phase, _, duration) in timeline
+             if span_phase == phase)
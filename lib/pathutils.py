@@ -67,6 +67,8 @@ XEN_CONSOLE_WRAPPER = _constants.PKGLIBDIR + "/tools/xen-console-wrapper"
 CFGUPGRADE = _constants.PKGLIBDIR + "/tools/cfgupgrade"
 POST_UPGRADE = _constants.PKGLIBDIR + "/tools/post-upgrade"
 ENSURE_DIRS = _constants.PKGLIBDIR + "/ensure-dirs"
+WIPE_DISK = _constants.PKGLIBDIR + "/wipe-disk"
+SPARSE_COPY = _constants.PKGLIBDIR + "/sparse-copy"
 ETC_HOSTS = vcluster.ETC_HOSTS
 
 # Top-level paths
@@ -88,6 +90,7 @@ DISK_LINKS_DIR = RUN_DIR + "/instance-disks"
 SOCKET_DIR = RUN_DIR + "/socket"
 CRYPTO_KEYS_DIR = RUN_DIR + "/crypto"
 IMPORT_EXPORT_DIR = RUN_DIR + "/import-export"
+DISK_WIPE_DIR = RUN_DIR + "/disk-wipe"
 INSTANCE_STATUS_FILE = RUN_DIR + "/instance-status"
 INSTANCE_REASON_DIR = RUN_DIR + "/instance-reason"
 #: User-id pool lock directory (used user IDs have a corresponding lock file in
@@ -155,6 +158,7 @@ JOB_QUEUE_VERSION_FILE = QUEUE_DIR + "/version"
 JOB_QUEUE_SERIAL_FILE = QUEUE_DIR + "/serial"
 JOB_QUEUE_ARCHIVE_DIR = QUEUE_DIR + "/archive"
 JOB_QUEUE_DRAIN_FILE = QUEUE_DIR + "/drain"
+JOB_QUEUE_INDEX_FILE = QUEUE_DIR + "/index"
 
 ALL_CERT_FILES = compat.UniqueFrozenset([
   NODED_CERT_FILE,
@@ -64,12 +64,14 @@ How it works:
 import logging
 import operator
 import re
+import bisect
 
 from ganeti import constants
 from ganeti import errors
 from ganeti import utils
 from ganeti import compat
 from ganeti import objects
+from ganeti import optimeline
 from ganeti import ht
 from ganeti import runtime
 from ganeti import qlang
@@ -104,7 +106,8 @@ from ganeti.constants import (QFT_UNKNOWN, QFT_TEXT, QFT_BOOL, QFT_NUMBER,
 
 (LQ_MODE,
  LQ_OWNER,
- LQ_PENDING) = range(10, 13)
+ LQ_PENDING,
+ LQ_PROFILE) = range(10, 14)
 
 (GQ_CONFIG,
  GQ_NODE,
@@ -115,7 +118,9 @@ from ganeti.constants import (QFT_UNKNOWN, QFT_TEXT, QFT_BOOL, QFT_NUMBER,
  CQ_QUEUE_DRAINED,
  CQ_WATCHER_PAUSE) = range(300, 303)
 
-(JQ_ARCHIVED, ) = range(400, 401)
+(JQ_ARCHIVED,
+ JQ_OPCODES,
+ JQ_CLASSES) = range(400, 403)
 
 # Query field flags
 QFF_HOSTNAME = 0x01
@@ -664,8 +669,33 @@ def _CompileFilter(fields, hints, qfilter):
   return _FilterCompilerHelper(fields)(hints, qfilter)
 
 
+class _DescendingKey(object):
+  """Wrapper reversing the ordering of a sort key.
+
+  """
+  __slots__ = [
+    "value",
+    ]
+
+  def __init__(self, value):
+    """Initializes this class.
+
+    """
+    self.value = value
+
+  def __lt__(self, other):
+    return other.value < self.value
+
+  def __eq__(self, other):
+    return self.value == other.value
+
+  def __ne__(self, other):
+    return self.value != other.value
+
+
 class Query(object):
-  def __init__(self, fieldlist, selected, qfilter=None, namefield=None):
+  def __init__(self, fieldlist, selected, qfilter=None, namefield=None,
+               sort_by=None):
     """Initializes this class.
 
     The field definition is a dictionary with the field's name as a key and a
@@ -682,6 +712,9 @@ class Query(object):
     @param fieldlist: Field definitions
     @type selected: list of strings
     @param selected: List of selected fields
+    @type sort_by: None or list of strings
+    @param sort_by: Fields to sort the result by, in order of precedence; a
+      field name prefixed with C{-} sorts in descending order
 
     """
     assert namefield is None or namefield in fieldlist
@@ -710,6 +743,25 @@ class Query(object):
     else:
       (_, _, _, self._name_fn) = fieldlist[namefield]
 
+    self._sort_fns = []
+    self._sort_datakinds = frozenset()
+
+    if sort_by:
+      for name in sort_by:
+        descending = name.startswith("-")
+        if descending:
+          name = name[1:]
+
+        try:
+          (fdef, datakind, _, fn) = fieldlist[name]
+        except KeyError:
+          raise errors.ParameterError("Unknown field '%s' for sorting" % name)
+
+        self._sort_fns.append((fn, fdef.kind == QFT_TEXT, descending))
+
+        if datakind is not None:
+          self._sort_datakinds |= frozenset([datakind])
+
   def RequestedNames(self):
     """Returns all names referenced in the filter.
 
@@ -725,7 +777,7 @@ class Query(object):
     @rtype: frozenset
 
     """
-    return (self._filter_datakinds |
+    return (self._filter_datakinds | self._sort_datakinds |
             frozenset(datakind for (_, datakind, _, _) in self._fields
                       if datakind is not None))
 
@@ -739,50 +791,143 @@ class Query(object):
     """
     return GetAllFields(self._fields)
 
-  def Query(self, ctx, sort_by_name=True):
+  def Query(self, ctx, sort_by_name=True, limit=None, offset=0):
     """Execute a query.
 
     @param ctx: Data container passed to field retrieval functions, must
       support iteration using C{__iter__}
     @type sort_by_name: boolean
     @param sort_by_name: Whether to sort by name or keep the input data's
-      ordering
+      ordering; fields given as C{sort_by} are always used for sorting
+    @type limit: None or int
+    @param limit: Maximum number of rows to return
+    @type offset: int
+    @param offset: Number of leading rows to skip
+
+    """
+    return list(self.IterQuery(ctx, sort_by_name=sort_by_name, limit=limit,
+                               offset=offset))
+
+  def IterQuery(self, ctx, sort_by_name=True, limit=None, offset=0):
+    """Execute a query, yielding one row at a time.
+
+    Items are filtered before their row is computed. Without sorting, rows
+    are yielded as soon as they have been computed and iterating over the
+    data container stops once the limit is reached. With sorting and a
+    limit, rows are only computed for items which can be among the first
+    C{offset + limit} items seen so far.
+
+    See L{Query} for arguments.
 
     """
-    sort = (self._name_fn and sort_by_name)
+    assert limit is None or limit >= 0
+    assert offset >= 0
+
+    if limit == 0:
+      return
+
+    if limit is None:
+      end = None
+    else:
+      # Rows before the offset are needed to find the ones to return
+      end = offset + limit
+
+    sort_by_name = bool(self._name_fn and sort_by_name)
+    filter_fn = self._filter_fn
+    row_fns = [fn for (_, _, _, fn) in self._fields]
+
+    if not (sort_by_name or self._sort_fns):
+      count = 0
+
+      for item in ctx:
+        if not (filter_fn is None or filter_fn(ctx, item)):
+          continue
+
+        count += 1
+        if count <= offset:
+          continue
+
+        yield self._ComputeRow(row_fns, ctx, item)
+
+        if count == end:
+          return
+
+      return
 
     result = []
 
     for idx, item in enumerate(ctx):
-      if not (self._filter_fn is None or self._filter_fn(ctx, item)):
+      if not (filter_fn is None or filter_fn(ctx, item)):
         continue
 
-      row = [_ProcessResult(fn(ctx, item)) for (_, _, _, fn) in self._fields]
+      key = self._GetSortKey(ctx, item, sort_by_name) + (idx, )
 
-      # Verify result
-      if __debug__:
-        _VerifyResultRow(self._fields, row)
+      if end is None:
+        result.append((key, self._ComputeRow(row_fns, ctx, item)))
+      elif len(result) < end or key < result[-1][0]:
+        # Keep the result sorted and limited while collecting rows
+        bisect.insort(result, (key, self._ComputeRow(row_fns, ctx, item)))
+        del result[end:]
 
-      if sort:
-        (status, name) = _ProcessResult(self._name_fn(ctx, item))
-        assert status == constants.RS_NORMAL
-        # TODO: Are there cases where we wouldn't want to use NiceSort?
-        # Answer: if the name field is non-string...
-        result.append((utils.NiceSortKey(name), idx, row))
-      else:
-        result.append(row)
+    if end is None:
+      # Sorting in-place instead of using "sorted()"
+      result.sort()
+
+    for (_, row) in result[offset:]:
+      yield row
+
+  def Count(self, ctx):
+    """Counts the items matching the filter.
+
+    No result rows are computed.
+
+    @param ctx: Data container, see L{Query.Query}
+    @rtype: int
+
+    """
+    filter_fn = self._filter_fn
+
+    return sum(1 for item in ctx
+               if filter_fn is None or filter_fn(ctx, item))
 
-    if not sort:
-      return result
+  def _GetSortKey(self, ctx, item, sort_by_name):
+    """Computes the sort key for an item.
 
-    # TODO: Would "heapq" be more efficient than sorting?
+    Items for which a sort field has no normal value are sorted last.
 
-    # Sorting in-place instead of using "sorted()"
-    result.sort()
+    @rtype: tuple
 
-    assert not result or (len(result[0]) == 3 and len(result[-1]) == 3)
+    """
+    key = []
+
+    for (fn, nicesort, descending) in self._sort_fns:
+      (status, value) = _ProcessResult(fn(ctx, item))
+      if nicesort and status == RS_NORMAL:
+        value = utils.NiceSortKey(value)
+      if descending:
+        value = _DescendingKey(value)
+      key.append((status != RS_NORMAL, value))
+
+    if sort_by_name:
+      (status, name) = _ProcessResult(self._name_fn(ctx, item))
+      assert status == constants.RS_NORMAL
+      # TODO: Are there cases where we wouldn't want to use NiceSort?
+      # Answer: if the name field is non-string...
+      key.append(utils.NiceSortKey(name))
+
+    return tuple(key)
+
+  def _ComputeRow(self, row_fns, ctx, item):
+    """Computes a result row.
+
+    """
+    row = [_ProcessResult(fn(ctx, item)) for fn in row_fns]
 
-    return map(operator.itemgetter(2), result)
+    # Verify result
+    if __debug__:
+      _VerifyResultRow(self._fields, row)
+
+    return row
 
   def OldStyleQuery(self, ctx, sort_by_name=True):
     """Query with "old" query result format.
@@ -893,17 +1038,46 @@ def _PrepareFieldList(fields, aliases):
   return result
 
 
-def GetQueryResponse(query, ctx, sort_by_name=True):
+def GetQueryResponse(query, ctx, sort_by_name=True, limit=None, offset=0,
+                     count_only=False):
   """Prepares the response for a query.
 
+  The response's C{count} is the total number of items matching the filter,
+  regardless of C{limit} and C{offset}.
+
   @type query: L{Query}
   @param ctx: Data container, see L{Query.Query}
   @type sort_by_name: boolean
   @param sort_by_name: Whether to sort by name or keep the input data's
     ordering
+  @type limit: None or int
+  @param limit: Maximum number of rows to return
+  @type offset: int
+  @param offset: Number of leading rows to skip
+  @type count_only: boolean
+  @param count_only: Whether to only count the matching items instead of
+    returning their rows
 
   """
-  return objects.QueryResponse(data=query.Query(ctx, sort_by_name=sort_by_name),
+  if limit is not None and limit < 0:
+    raise errors.ParameterError("Query limit must not be negative")
+
+  if offset < 0:
+    raise errors.ParameterError("Query offset must not be negative")
+
+  if count_only:
+    data = []
+    count = query.Count(ctx)
+  else:
+    data = query.Query(ctx, sort_by_name=sort_by_name, limit=limit,
+                       offset=offset)
+
+    if limit is None and not offset:
+      count = len(data)
+    else:
+      count = query.Count(ctx)
+
+  return objects.QueryResponse(data=data, count=count,
                                fields=query.GetFields()).ToDict()
 
 
@@ -1462,11 +1636,12 @@ class InstanceQueryData(object):
     self.groups = groups
     self.networks = networks
 
-    # Used for individual rows
-    self.inst_hvparams = None
-    self.inst_beparams = None
-    self.inst_osparams = None
-    self.inst_nicparams = None
+    # Used for individual rows, parameters are only filled when used
+    self._inst = None
+    self._inst_hvparams = None
+    self._inst_beparams = None
+    self._inst_osparams = None
+    self._inst_nicparams = None
 
   def __iter__(self):
     """Iterate over all instances.
@@ -1476,14 +1651,52 @@ class InstanceQueryData(object):
 
     """
     for inst in self.instances:
-      self.inst_hvparams = self.cluster.FillHV(inst, skip_globals=True)
-      self.inst_beparams = self.cluster.FillBE(inst)
-      self.inst_osparams = self.cluster.SimpleFillOS(inst.os, inst.osparams)
-      self.inst_nicparams = [self.cluster.SimpleFillNIC(nic.nicparams)
-                             for nic in inst.nics]
+      self._inst = inst
+      self._inst_hvparams = None
+      self._inst_beparams = None
+      self._inst_osparams = None
+      self._inst_nicparams = None
 
       yield inst
 
+  @property
+  def inst_hvparams(self):
+    """Filled hypervisor parameters of the current instance.
+
+    """
+    if self._inst_hvparams is None:
+      self._inst_hvparams = self.cluster.FillHV(self._inst, skip_globals=True)
+    return self._inst_hvparams
+
+  @property
+  def inst_beparams(self):
+    """Filled backend parameters of the current instance.
+
+    """
+    if self._inst_beparams is None:
+      self._inst_beparams = self.cluster.FillBE(self._inst)
+    return self._inst_beparams
+
+  @property
+  def inst_osparams(self):
+    """Filled OS parameters of the current instance.
+
+    """
+    if self._inst_osparams is None:
+      self._inst_osparams = self.cluster.SimpleFillOS(self._inst.os,
+                                                      self._inst.osparams)
+    return self._inst_osparams
+
+  @property
+  def inst_nicparams(self):
+    """Filled parameters of the current instance's NICs.
+
+    """
+    if self._inst_nicparams is None:
+      self._inst_nicparams = [self.cluster.SimpleFillNIC(nic.nicparams)
+                              for nic in self._inst.nics]
+    return self._inst_nicparams
+
 
 def _GetInstOperState(ctx, inst):
   """Get instance's operational status.
@@ -2249,11 +2462,16 @@ class LockQueryData(object):
   """Data container for lock data queries.
 
   """
-  def __init__(self, lockdata):
+  def __init__(self, lockdata, profiles=None):
     """Initializes this class.
 
+    @type profiles: dict or None
+    @param profiles: Profiling data (L{locking.LockProfile}) by lock name,
+      C{None} if profiling is disabled
+
     """
     self.lockdata = lockdata
+    self.profiles = profiles
 
   def __iter__(self):
     """Iterate over all locks.
@@ -2287,6 +2505,75 @@ def _GetLockPending(_, data):
   return pending
 
 
+def _GetLockProfile(fn, ctx, data):
+  """Returns a value from the profiling data of a lock.
+
+  @param fn: Function retrieving the value from a L{locking.LockProfile}
+
+  """
+  (name, _, _, _) = data
+
+  if ctx.profiles is None:
+    return _FS_UNAVAIL
+
+  profile = ctx.profiles.get(name, None)
+  if profile is None:
+    # Lock hasn't been used since profiling was enabled
+    return _FS_NODATA
+
+  return fn(profile)
+
+
+def _GetLockProfileOwners(profile):
+  """Returns a sorted list of the per-owner profiling data of a lock.
+
+  """
+  return [[task] + values
+          for (task, values) in sorted(profile.owners.items())]
+
+
+#: Fields for lock profiling data, see L{locking.LockProfiler}
+_LOCK_PROFILE_FIELDS = [
+  ("acquires", "Acquires", QFT_NUMBER,
+   "Number of successful acquires since profiling was enabled",
+   lambda profile: profile.acquires),
+  ("timeouts", "Timeouts", QFT_NUMBER,
+   ("Number of acquires which timed out, each usually causing a job to retry"
+    " with a longer timeout"),
+   lambda profile: profile.timeouts),
+  ("wait_total", "WaitTotal", QFT_OTHER,
+   "Total time spent waiting for the lock (seconds)",
+   lambda profile: profile.wait_total),
+  ("wait_max", "WaitMax", QFT_OTHER,
+   "Longest time spent waiting for the lock (seconds)",
+   lambda profile: profile.wait_max),
+  ("wait_histogram", "WaitHistogram", QFT_OTHER,
+   ("Number of acquires by time spent waiting, with buckets ending at 1ms,"
+    " 10ms, 100ms, 1s, 10s, 1min and 10min, and one for longer waits"),
+   lambda profile: profile.wait_histogram),
+  ("hold_total", "HoldTotal", QFT_OTHER,
+   "Total time the lock was held (seconds)",
+   lambda profile: profile.hold_total),
+  ("hold_max", "HoldMax", QFT_OTHER,
+   "Longest time the lock was held (seconds)",
+   lambda profile: profile.hold_max),
+  ("hold_histogram", "HoldHistogram", QFT_OTHER,
+   ("Number of acquires by time the lock was held, with the same buckets as"
+    " \"wait_histogram\""),
+   lambda profile: profile.hold_histogram),
+  ("acquire_modes", "AcquireModes", QFT_OTHER,
+   "Number of acquires per mode",
+   lambda profile: profile.modes),
+  ("acquire_priorities", "AcquirePriorities", QFT_OTHER,
+   "Number of acquires per priority",
+   lambda profile: sorted(profile.priorities.items())),
+  ("owner_profile", "OwnerProfile", QFT_OTHER,
+   ("Per owner (opcode for jobs): number of acquires, number of timeouts,"
+    " time spent waiting and time the lock was held"),
+   _GetLockProfileOwners),
+  ]
+
+
 def _BuildLockFields():
   """Builds list of fields for lock queries.
 
@@ -2304,6 +2591,11 @@ def _BuildLockFields():
     (_MakeField("pending", "Pending", QFT_OTHER,
                 "Threads waiting for the lock"),
      LQ_PENDING, 0, _GetLockPending),
+    ] + [
+    (_MakeField(name, title, kind,
+                doc + "; requires lock profiling to be enabled"),
+     LQ_PROFILE, 0, compat.partial(_GetLockProfile, fn))
+    for (name, title, kind, doc, fn) in _LOCK_PROFILE_FIELDS
     ], [])
 
 
@@ -2506,6 +2798,30 @@ def _BuildExtStorageFields():
   return _PrepareFieldList(fields, [])
 
 
+class JobQueryData(object):
+  """Data container for job queries.
+
+  """
+  def __init__(self, jobs, class_stats=None):
+    """Initializes this class.
+
+    @type jobs: list of tuples; (int, job object or None)
+    @param jobs: Job IDs and jobs
+    @type class_stats: dict or None
+    @param class_stats: Statistics of the job queue's worker pools, with the
+      concurrency classes as keys (see L{JQ_CLASSES})
+
+    """
+    self.jobs = jobs
+    self.class_stats = class_stats
+
+  def __iter__(self):
+    """Iterate over all jobs.
+
+    """
+    return iter(self.jobs)
+
+
 def _JobUnavailInner(fn, ctx, (job_id, job)): # pylint: disable=W0613
   """Return L{_FS_UNAVAIL} if job is None.
 
@@ -2559,6 +2875,34 @@ def _JobTimestamp(fn):
   return _JobUnavail(compat.partial(_JobTimestampInner, fn))
 
 
+def _GetJobClassStat(name, ctx, (_, job)):
+  """Returns a statistic of the worker pool processing a job.
+
+  @type name: string
+  @param name: Name of the statistic
+
+  """
+  if job is None or ctx.class_stats is None:
+    return _FS_UNAVAIL
+
+  value = ctx.class_stats.get(job.CalcConcurrencyClass(), {}).get(name)
+
+  if value is None:
+    return _FS_UNAVAIL
+
+  return value
+
+
+def _GetOpPhaseTime(phase, op):
+  """Returns the time an opcode spent in an execution phase.
+
+  @type phase: string
+  @param phase: Phase, one of L{constants.OP_PHASES}
+
+  """
+  return optimeline.GetPhaseTime(op.timeline, phase)
+
+
 def _BuildJobFields():
   """Builds list of fields for job queries.
 
@@ -2575,34 +2919,74 @@ def _BuildJobFields():
     (_MakeField("archived", "Archived", QFT_BOOL, "Whether job is archived"),
      JQ_ARCHIVED, 0, lambda _, (job_id, job): job.archived),
     (_MakeField("ops", "OpCodes", QFT_OTHER, "List of all opcodes"),
-     None, 0, _PerJobOp(lambda op: op.input.__getstate__())),
+     JQ_OPCODES, 0, _PerJobOp(lambda op: op.input.__getstate__())),
     (_MakeField("opresult", "OpCode_result", QFT_OTHER,
                 "List of opcodes results"),
-     None, 0, _PerJobOp(operator.attrgetter("result"))),
+     JQ_OPCODES, 0, _PerJobOp(operator.attrgetter("result"))),
     (_MakeField("opstatus", "OpCode_status", QFT_OTHER,
                 "List of opcodes status"),
-     None, 0, _PerJobOp(operator.attrgetter("status"))),
+     JQ_OPCODES, 0, _PerJobOp(operator.attrgetter("status"))),
     (_MakeField("oplog", "OpCode_log", QFT_OTHER,
                 "List of opcode output logs"),
-     None, 0, _PerJobOp(operator.attrgetter("log"))),
+     JQ_OPCODES, 0, _PerJobOp(operator.attrgetter("log"))),
     (_MakeField("opstart", "OpCode_start", QFT_OTHER,
                 "List of opcode start timestamps (before acquiring locks)"),
-     None, 0, _PerJobOp(operator.attrgetter("start_timestamp"))),
+     JQ_OPCODES, 0, _PerJobOp(operator.attrgetter("start_timestamp"))),
     (_MakeField("opexec", "OpCode_exec", QFT_OTHER,
                 "List of opcode execution start timestamps (after acquiring"
                 " locks)"),
-     None, 0, _PerJobOp(operator.attrgetter("exec_timestamp"))),
+     JQ_OPCODES, 0, _PerJobOp(operator.attrgetter("exec_timestamp"))),
     (_MakeField("opend", "OpCode_end", QFT_OTHER,
                 "List of opcode execution end timestamps"),
-     None, 0, _PerJobOp(operator.attrgetter("end_timestamp"))),
+     JQ_OPCODES, 0, _PerJobOp(operator.attrgetter("end_timestamp"))),
     (_MakeField("oppriority", "OpCode_prio", QFT_OTHER,
                 "List of opcode priorities"),
-     None, 0, _PerJobOp(operator.attrgetter("priority"))),
+     JQ_OPCODES, 0, _PerJobOp(operator.attrgetter("priority"))),
+    (_MakeField("optimeline", "OpCode_timeline", QFT_OTHER,
+                "List of opcode timelines, each a list of execution phase"
+                " spans (phase, start timestamp and duration in seconds)"),
+     JQ_OPCODES, 0, _PerJobOp(lambda op: list(op.timeline))),
     (_MakeField("summary", "Summary", QFT_OTHER,
                 "List of per-opcode summaries"),
-     None, 0, _PerJobOp(lambda op: op.input.Summary())),
+     None, 0, _JobUnavail(lambda job: job.GetSummary())),
+    (_MakeField("class", "Class", QFT_TEXT,
+                "Concurrency class, jobs of each class are processed by their"
+                " own workers"),
+     None, 0, _JobUnavail(lambda job: job.CalcConcurrencyClass())),
     ]
 
+  # Statistics of the job's concurrency class
+  for (name, title, kind, desc) in [
+    ("queued", "Queued", QFT_NUMBER, "Number of jobs waiting for a worker"),
+    ("running", "Running", QFT_NUMBER, "Number of jobs being processed"),
+    ("lockwait", "LockWait", QFT_NUMBER,
+     "Number of workers blocked waiting for locks"),
+    ("workers", "Workers", QFT_NUMBER, "Number of workers"),
+    ("latency", "Latency", QFT_OTHER,
+     "Average time in seconds jobs waited for a worker"),
+    ]:
+    fields.append((_MakeField("class_%s" % name, "Class%s" % title, kind,
+                              "%s in the job's concurrency class" % desc),
+                   JQ_CLASSES, 0, compat.partial(_GetJobClassStat, name)))
+
+  # Time spent per execution phase
+  for (phase, title, desc) in [
+    (constants.OP_PHASE_LOCK, "Lock", "waiting for locks"),
+    (constants.OP_PHASE_PREREQ, "Prereq", "checking prerequisites"),
+    (constants.OP_PHASE_HOOKS, "Hooks", "running hooks"),
+    (constants.OP_PHASE_EXEC, "Exec", "executing"),
+    (constants.OP_PHASE_RPC, "Rpc", "making RPC calls"),
+    (constants.OP_PHASE_CONFIG, "Config", "writing the configuration"),
+    (constants.OP_PHASE_REPLICATION, "Replication",
+     "writing and replicating the job file"),
+    ]:
+    fields.append((_MakeField("op%stime" % phase, "OpCode_%sTime" % title,
+                              QFT_OTHER,
+                              "List of opcode times in seconds spent %s" %
+                              desc),
+                   JQ_OPCODES, 0,
+                   _PerJobOp(compat.partial(_GetOpPhaseTime, phase))))
+
   # Timestamp fields
   for (name, attr, title, desc) in [
     ("received_ts", "received_timestamp", "Received",
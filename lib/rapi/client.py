@@ -2425,7 +2425,8 @@ class GanetiRapiClient(object): # pylint: disable=R0904
                              ("/%s/groups/%s/tags" %
                               (GANETI_RAPI_VERSION, group)), query, None)
 
-  def Query(self, what, fields, qfilter=None, reason=None):
+  def Query(self, what, fields, qfilter=None, reason=None, sort_by=None,
+            limit=None, offset=None, count_only=False, max_age=None):
     """Retrieves information about resources.
 
     @type what: string
@@ -2436,6 +2437,16 @@ class GanetiRapiClient(object): # pylint: disable=R0904
     @param qfilter: Query filter
     @type reason: string
     @param reason: the reason for executing this operation
+    @type sort_by: None or list of string
+    @param sort_by: Fields to sort by, prefixed with "-" for descending order
+    @type limit: None or int
+    @param limit: Maximum number of items to return
+    @type offset: None or int
+    @param offset: Number of leading items to skip
+    @type count_only: bool
+    @param count_only: Whether to only count the matching items
+    @type max_age: None or int
+    @param max_age: Maximum age in seconds of cached live data to use
 
     @rtype: string
     @return: job id
@@ -2451,6 +2462,11 @@ class GanetiRapiClient(object): # pylint: disable=R0904
     _SetItemIf(body, qfilter is not None, "qfilter", qfilter)
     # TODO: remove "filter" after 2.7
     _SetItemIf(body, qfilter is not None, "filter", qfilter)
+    _SetItemIf(body, sort_by, "sort_by", sort_by)
+    _SetItemIf(body, limit is not None, "limit", limit)
+    _SetItemIf(body, offset, "offset", offset)
+    _SetItemIf(body, count_only, "count_only", count_only)
+    _SetItemIf(body, max_age is not None, "max_age", max_age)
 
     return self._SendRequest(HTTP_PUT,
                              ("/%s/query/%s" %
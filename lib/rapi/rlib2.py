@@ -1486,8 +1486,12 @@ class R_2_query(baserlib.ResourceBase):
   GET_OPCODE = opcodes.OpQuery
   PUT_OPCODE = opcodes.OpQuery
 
-  def _Query(self, fields, qfilter):
-    return self.GetClient().Query(self.items[0], fields, qfilter).ToDict()
+  def _Query(self, fields, qfilter, sort_by=None, limit=None, offset=0,
+             count_only=False, max_age=None):
+    return self.GetClient().Query(self.items[0], fields, qfilter,
+                                  sort_by=sort_by, limit=limit, offset=offset,
+                                  count_only=count_only,
+                                  max_age=max_age).ToDict()
 
   def GET(self):
     """Returns resource information.
@@ -1495,7 +1499,25 @@ class R_2_query(baserlib.ResourceBase):
     @return: Query result, see L{objects.QueryResponse}
 
     """
-    return self._Query(_GetQueryFields(self.queryargs), None)
+    sort_by = self._checkStringVariable("sort_by")
+    if sort_by is not None:
+      sort_by = _SplitQueryFields(sort_by)
+
+    if "limit" in self.queryargs:
+      limit = self._checkIntVariable("limit")
+    else:
+      limit = None
+
+    if "max_age" in self.queryargs:
+      max_age = self._checkIntVariable("max_age")
+    else:
+      max_age = None
+
+    return self._Query(_GetQueryFields(self.queryargs), None,
+                       sort_by=sort_by, limit=limit,
+                       offset=self._checkIntVariable("offset"),
+                       count_only=bool(self._checkIntVariable("count_only")),
+                       max_age=max_age)
 
   def PUT(self):
     """Submits job querying for resources.
@@ -1517,7 +1539,12 @@ class R_2_query(baserlib.ResourceBase):
     if qfilter is None:
       qfilter = body.get("filter", None)
 
-    return self._Query(fields, qfilter)
+    return self._Query(fields, qfilter,
+                       sort_by=body.get("sort_by", None),
+                       limit=body.get("limit", None),
+                       offset=body.get("offset", 0),
+                       count_only=body.get("count_only", False),
+                       max_age=body.get("max_age", None))
 
 
 class R_2_query_fields(baserlib.ResourceBase):
@@ -48,6 +48,7 @@ import copy
 
 from ganeti import utils
 from ganeti import objects
+from ganeti import optimeline
 from ganeti import http
 from ganeti import serializer
 from ganeti import constants
@@ -75,6 +76,9 @@ _RPC_CLIENT_HEADERS = [
 #: Special value to describe an offline host
 _OFFLINE = object()
 
+#: Module-global pool of cURL handles, see L{Init}
+_curl_pool = None
+
 
 def Init():
   """Initializes the module-global HTTP client manager.
@@ -93,6 +97,10 @@ def Init():
 
   pycurl.global_init(pycurl.GLOBAL_ALL)
 
+  global _curl_pool # pylint: disable=W0603
+  _curl_pool = http.client.CurlHandlePool(constants.RPC_POOL_MAX_IDLE,
+                                          constants.RPC_POOL_IDLE_TIMEOUT)
+
 
 def Shutdown():
   """Stops the module-global HTTP client manager.
@@ -101,6 +109,11 @@ def Shutdown():
   running.
 
   """
+  global _curl_pool # pylint: disable=W0603
+  if _curl_pool is not None:
+    _curl_pool.Clear()
+    _curl_pool = None
+
   pycurl.global_cleanup()
 
 
@@ -170,13 +183,16 @@ class RpcResult(object):
       imply failed=True, in order to allow simpler checking if
       the user doesn't care about the exact failure mode
   @ivar fail_msg: the error message if the call failed
+  @ivar unknown_call: whether the call failed because the node doesn't know
+      the procedure, e.g. because it runs an older version
 
   """
   def __init__(self, data=None, failed=False, offline=False,
-               call=None, node=None):
+               call=None, node=None, unknown_call=False):
     self.offline = offline
     self.call = call
     self.node = node
+    self.unknown_call = unknown_call
 
     if offline:
       self.fail_msg = "Node is marked offline"
@@ -203,7 +219,7 @@ class RpcResult(object):
         self.payload = data[1]
 
     for attr_name in ["call", "data", "fail_msg",
-                      "node", "offline", "payload"]:
+                      "node", "offline", "payload", "unknown_call"]:
       assert hasattr(self, attr_name), "Missing attribute %s" % attr_name
 
   @staticmethod
@@ -417,7 +433,9 @@ class _RpcProcessor:
 
         logging.error("RPC error in %s on node %s: %s", procedure, name, msg)
         host_result = RpcResult(data=msg, failed=True, node=name,
-                                call=procedure)
+                                call=procedure,
+                                unknown_call=(req.resp_status_code ==
+                                              http.HttpNotFound.code))
 
       results[name] = host_result
 
@@ -443,13 +461,19 @@ class _RpcProcessor:
       "Missing RPC read timeout for procedure '%s'" % procedure
 
     if _req_process_fn is None:
-      _req_process_fn = http.client.ProcessRequests
+      _req_process_fn = compat.partial(http.client.ProcessRequests,
+                                       pool=_curl_pool)
 
-    (results, requests) = \
-      self._PrepareRequests(self._resolver(nodes, resolver_opts), self._port,
-                            procedure, body, read_timeout)
+    span = optimeline.StartSpan(constants.OP_PHASE_RPC)
+    try:
+      (results, requests) = \
+        self._PrepareRequests(self._resolver(nodes, resolver_opts),
+                              self._port, procedure, body, read_timeout)
 
-    _req_process_fn(requests.values(), lock_monitor_cb=self._lock_monitor_cb)
+      _req_process_fn(requests.values(),
+                      lock_monitor_cb=self._lock_monitor_cb)
+    finally:
+      span.End()
 
     assert not frozenset(results).intersection(requests)
 
@@ -806,6 +830,7 @@ class RpcRunner(_RpcClientBase,
       rpc_defs.ED_MULTI_DISKS_DICT_DP: self._MultiDiskDictDP,
       rpc_defs.ED_SINGLE_DISK_DICT_DP: self._SingleDiskDictDP,
       rpc_defs.ED_NODE_TO_DISK_DICT_DP: self._EncodeNodeToDiskDictDP,
+      rpc_defs.ED_INST_DISKS_DICT_DP: self._InstDisksDictDP,
 
       # Encoders with special requirements
       rpc_defs.ED_FILE_DETAILS: compat.partial(_PrepareFileUpload, _getents),
@@ -941,6 +966,15 @@ class RpcRunner(_RpcClientBase,
     return dict((name, [self._SingleDiskDictDP(node, disk) for disk in disks])
                 for name, disks in value.items())
 
+  def _InstDisksDictDP(self, node, instance_disks):
+    """Encode a list of (instance, disks, disk indices) tuples.
+
+    """
+    return [(self._InstDict(node, instance),
+             self._DisksDictDP(node, (disks, instance)),
+             indices)
+            for (instance, disks, indices) in instance_disks]
+
   def _EncodeImportExportIO(self, node, (ieio, ieioargs)):
     """Encodes import/export I/O information.
 
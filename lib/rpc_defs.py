@@ -82,7 +82,8 @@ ACCEPT_OFFLINE_NODE = object()
  ED_MULTI_DISKS_DICT_DP,
  ED_SINGLE_DISK_DICT_DP,
  ED_NIC_DICT,
- ED_DEVICE_DICT) = range(1, 17)
+ ED_DEVICE_DICT,
+ ED_INST_DISKS_DICT_DP) = range(1, 18)
 
 
 def _Prepare(calls):
@@ -162,6 +163,28 @@ def _OsGetPostProc(result):
   return result
 
 
+def _DiskWipeStatusPostProc(result):
+  """Post-processor for disk wipe status.
+
+  @rtype: Payload containing list of L{objects.DiskWipeStatus} instances
+  @return: Returns a list of the state of each named disk wipe or None if
+           a status couldn't be retrieved
+
+  """
+  if not result.fail_msg:
+    decoded = []
+
+    for i in result.payload:
+      if i is None:
+        decoded.append(None)
+        continue
+      decoded.append(objects.DiskWipeStatus.FromDict(i))
+
+    result.payload = decoded
+
+  return result
+
+
 def _ImpExpStatusPostProc(result):
   """Post-processor for import/export status.
 
@@ -380,6 +403,17 @@ _BLOCKDEV_CALLS = [
     ("size", None, None),
     ], None, None,
     "Request wipe at given offset with given size of a block device"),
+  ("blockdev_wipe_start", SINGLE, None, constants.RPC_TMO_NORMAL, [
+    ("disks", ED_DISKS_DICT_DP, None),
+    ("offsets", None, "Offsets from which to wipe the disks"),
+    ], None, None,
+    "Starts wiping block devices from the given offsets in the background"),
+  ("blockdev_wipe_status", SINGLE, None, constants.RPC_TMO_FAST, [
+    ("names", None, "Disk wipe names"),
+    ], None, _DiskWipeStatusPostProc, "Gets the status of disk wipes"),
+  ("blockdev_wipe_cleanup", SINGLE, None, constants.RPC_TMO_NORMAL, [
+    ("names", None, "Disk wipe names"),
+    ], None, None, "Cleans up after disk wipes, aborting them if necessary"),
   ("blockdev_remove", SINGLE, None, constants.RPC_TMO_NORMAL, [
     ("bdev", ED_SINGLE_DISK_DICT_DP, None),
     ], None, None, "Request removal of a given block device"),
@@ -393,6 +427,13 @@ _BLOCKDEV_CALLS = [
     ("on_primary", None, None),
     ("idx", None, None),
     ], None, None, "Request assembling of a given block device"),
+  ("blockdev_assemble_multi", SINGLE, None, constants.RPC_TMO_SLOW, [
+    ("instance_disks", ED_INST_DISKS_DICT_DP,
+     "List of (instance, disks, disk indices) tuples"),
+    ("on_primary", None, None),
+    ], None, None,
+   "Request assembling of the block devices of several instances in"
+   " parallel"),
   ("blockdev_shutdown", SINGLE, None, constants.RPC_TMO_NORMAL, [
     ("disk", ED_SINGLE_DISK_DICT_DP, None),
     ], None, None, "Request shutdown of a given block device"),
@@ -581,6 +622,9 @@ CALLS = {
       ("file_name", None, None),
       ("content", ED_COMPRESS, None),
       ], None, None, "Update job queue file"),
+    ("jobqueue_update_multi", MULTI, None, constants.RPC_TMO_URGENT, [
+      ("files", ED_COMPRESS, "Serialized list of (file name, content) pairs"),
+      ], None, None, "Update multiple job queue files"),
     ("jobqueue_purge", SINGLE, None, constants.RPC_TMO_NORMAL, [], None, None,
      "Purge job queue"),
     ("jobqueue_rename", MULTI, None, constants.RPC_TMO_URGENT, [
@@ -634,6 +678,9 @@ CALLS = {
     ("upload_file", MULTI, None, constants.RPC_TMO_NORMAL, [
       ("file_name", ED_FILE_DETAILS, None),
       ], None, None, "Upload a file"),
+    ("upload_config_delta", MULTI, None, constants.RPC_TMO_NORMAL, [
+      ("delta", ED_COMPRESS, None),
+      ], None, None, "Apply a delta to the cluster configuration"),
     ("write_ssconf_files", MULTI, None, constants.RPC_TMO_NORMAL, [
       ("values", None, None),
       ], None, None, "Write ssconf files"),
@@ -61,15 +61,33 @@ def DumpJson(data):
   @return: the string representation of data
 
   """
-  encoded = simplejson.dumps(data)
+  txt = simplejson.dumps(data)
+
+  # Newlines in strings are escaped, so compact output normally doesn't
+  # contain any and the comparatively slow regular expression can be skipped
+  if "\n" in txt:
+    txt = _RE_EOLSP.sub("", txt)
 
-  txt = _RE_EOLSP.sub("", encoded)
   if not txt.endswith("\n"):
     txt += "\n"
 
   return txt
 
 
+def DumpJsonString(value):
+  """Serialize a single string.
+
+  This is considerably faster than L{DumpJson} when serializing many small
+  strings, e.g. the keys of a dictionary serialized member by member.
+
+  @type value: string
+  @param value: the string to serialize
+  @return: the string representation of value
+
+  """
+  return simplejson.encoder.encode_basestring_ascii(value)
+
+
 def LoadJson(txt):
   """Unserialize data from a string.
 
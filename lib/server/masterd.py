@@ -70,6 +70,7 @@ from ganeti import runtime
 from ganeti import pathutils
 from ganeti import ht
 
+from ganeti.masterd import livedata
 from ganeti.utils import version
 
 
@@ -78,6 +79,16 @@ CLIENT_REQUEST_WORKERS = 16
 EXIT_NOTMASTER = constants.EXIT_NOTMASTER
 EXIT_NODESETUP_ERROR = constants.EXIT_NODESETUP_ERROR
 
+#: Options for paging and sorting results of L{luxi.REQ_QUERY} and for using
+#: cached live data
+_TQueryOptions = ht.TStrictDict(False, True, {
+  "sort_by": ht.TMaybeListOf(ht.TNonEmptyString),
+  "limit": ht.TMaybe(ht.TNonNegativeInt),
+  "offset": ht.TNonNegativeInt,
+  "count_only": ht.TBool,
+  "max_age": ht.TMaybe(ht.TNonNegativeInt),
+  })
+
 
 def _LogNewJob(status, info, ops):
   """Log information about a recently submitted job.
@@ -245,8 +256,11 @@ class MasterServer(daemon.AsyncStreamServer):
     # maximum number to avoid breaking for lack of file descriptors or memory.
     MasterClientHandler(self, connected_socket, client_address, self.family)
 
-  def setup_queue(self):
-    self.context = GanetiContext()
+  def setup_queue(self, livedata_ttl=0, lock_profiling=False,
+                  lock_batching=False):
+    self.context = GanetiContext(livedata_ttl=livedata_ttl,
+                                 lock_profiling=lock_profiling,
+                                 lock_batching=lock_batching)
     self.request_workers = workerpool.WorkerPool("ClientReq",
                                                  CLIENT_REQUEST_WORKERS,
                                                  ClientRequestWorker)
@@ -352,18 +366,34 @@ class ClientOps(object):
                                      prev_log_serial, timeout)
 
     elif method == luxi.REQ_QUERY:
-      (what, fields, qfilter) = args
+      # Query options are optional for compatibility with older clients
+      if len(args) > 3:
+        (what, fields, qfilter, options) = args
+      else:
+        (what, fields, qfilter) = args
+        options = {}
+
+      if not _TQueryOptions(options):
+        raise errors.OpPrereqError("Invalid query options %r" % (options, ),
+                                   errors.ECODE_INVAL)
+
+      # Keys are unicode strings after deserialization
+      options = dict((str(key), value) for (key, value) in options.items())
+
+      if what not in constants.QR_VIA_OP:
+        # Only resources queried via opcodes have live data
+        options.pop("max_age", None)
 
       if what in constants.QR_VIA_OP:
         result = self._Query(opcodes.OpQuery(what=what, fields=fields,
-                                             qfilter=qfilter))
+                                             qfilter=qfilter, **options))
       elif what == constants.QR_LOCK:
         if qfilter is not None:
           raise errors.OpPrereqError("Lock queries can't be filtered",
                                      errors.ECODE_INVAL)
-        return context.glm.QueryLocks(fields)
+        return context.glm.QueryLocks(fields, **options)
       elif what == constants.QR_JOB:
-        return queue.QueryJobs(fields, qfilter)
+        return queue.QueryJobs(fields, qfilter, **options)
       elif what in constants.QR_VIA_LUXI:
         raise NotImplementedError
       else:
@@ -495,12 +525,21 @@ class GanetiContext(object):
   # we do want to ensure a singleton here
   _instance = None
 
-  def __init__(self):
+  def __init__(self, livedata_ttl=0, lock_profiling=False,
+               lock_batching=False):
     """Constructs a new GanetiContext object.
 
     There should be only a GanetiContext object at any time, so this
     function raises an error if this is not the case.
 
+    @type livedata_ttl: number
+    @param livedata_ttl: Time to live for cached live data of nodes and
+      instances in seconds, zero disables caching
+    @type lock_profiling: bool
+    @param lock_profiling: Whether to collect profiling data for all locks
+    @type lock_batching: bool
+    @param lock_batching: Whether to grant all locks of a level at once
+
     """
     assert self.__class__._instance is None, "double GanetiContext instance"
 
@@ -512,13 +551,18 @@ class GanetiContext(object):
       self.cfg.GetNodeList(),
       self.cfg.GetNodeGroupList(),
       [inst.name for inst in self.cfg.GetAllInstancesInfo().values()],
-      self.cfg.GetNetworkList())
+      self.cfg.GetNetworkList(),
+      profiling=lock_profiling, batched=lock_batching)
 
     self.cfg.SetContext(self)
 
     # RPC runner
     self.rpc = rpc.RpcRunner(self.cfg, self.glm.AddToLockMonitor)
 
+    # Cache for live data collected by queries
+    self.livedata = livedata.LiveDataCache(livedata_ttl)
+    self.glm.AddToLockMonitor(self.livedata)
+
     # Job queue
     self.jobqueue = jqueue.JobQueue(self)
 
@@ -687,6 +731,10 @@ def CheckMasterd(options, args):
     print >> sys.stderr, ("Usage: %s [-f] [-d]" % sys.argv[0])
     sys.exit(constants.EXIT_FAILURE)
 
+  if options.livedata_ttl < 0:
+    print >> sys.stderr, "The live data TTL must not be negative"
+    sys.exit(constants.EXIT_FAILURE)
+
   ssconf.CheckMaster(options.debug)
 
   try:
@@ -769,10 +817,13 @@ def ExecMasterd(options, args, prep_data): # pylint: disable=W0613
 
   """
   (mainloop, master) = prep_data
+  locking.SetConditionType(options.lock_condition)
   try:
     rpc.Init()
     try:
-      master.setup_queue()
+      master.setup_queue(livedata_ttl=options.livedata_ttl,
+                         lock_profiling=options.lock_profiling,
+                         lock_batching=options.lock_batching)
       try:
         mainloop.Run(shutdown_wait_fn=master.WaitForShutdown)
       finally:
@@ -798,5 +849,28 @@ def Main():
   parser.add_option("--yes-do-it", dest="yes_do_it",
                     help="Override interactive check for --no-voting",
                     default=False, action="store_true")
+  parser.add_option("--live-data-ttl", dest="livedata_ttl",
+                    help=("Time in seconds for which live data of nodes and"
+                          " instances can be cached for queries accepting"
+                          " it (default: 0, disabled)"),
+                    default=0, type="int", metavar="SECONDS")
+  parser.add_option("--lock-profiling", dest="lock_profiling",
+                    help=("Collect waiting and holding times of all locks,"
+                          " see \"gnt-debug locks\" and"
+                          " \"gnt-debug lock-profile\""),
+                    default=False, action="store_true")
+  parser.add_option("--lock-batching", dest="lock_batching",
+                    help=("Grant all node, instance, node group and network"
+                          " locks needed by an opcode at once instead of"
+                          " acquiring them one by one"),
+                    default=False, action="store_true")
+  parser.add_option("--lock-condition", dest="lock_condition",
+                    help=("How waiting lock acquires are notified, using"
+                          " pipes (\"%s\", default) or locks (\"%s\", no"
+                          " file descriptors needed)" %
+                          (locking.CONDITION_PIPE,
+                           locking.CONDITION_THREADING)),
+                    default=locking.CONDITION_PIPE, type="choice",
+                    choices=sorted(locking.CONDITION_TYPES), metavar="TYPE")
   daemon.GenericMain(constants.MASTERD, parser, CheckMasterd, PrepMasterd,
                      ExecMasterd, multithreaded=True)
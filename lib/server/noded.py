@@ -55,6 +55,9 @@ from ganeti import daemon
 from ganeti import http
 from ganeti import utils
 from ganeti.storage import container
+from ganeti.storage import drbd
+from ganeti.storage import lvm_state
+from ganeti.hypervisor import hv_kvm
 from ganeti import serializer
 from ganeti import netutils
 from ganeti import pathutils
@@ -186,6 +189,12 @@ class NodeRequestHandler(http.server.HttpServerHandler):
     if method is None:
       raise http.HttpNotFound()
 
+    # LVM and DRBD information is collected at most once per call, unless
+    # devices are modified; QMP connections to instances are kept for the
+    # duration of the call
+    lvm_state.StartCaching()
+    drbd.StartCaching()
+    hv_kvm.StartQmpPooling()
     try:
       result = (True, method(serializer.LoadJson(req.request_body)))
 
@@ -206,6 +215,19 @@ class NodeRequestHandler(http.server.HttpServerHandler):
       logging.exception("Error in RPC call")
       result = (False, "Error while executing backend function: %s" % str(err))
 
+    (lvm_commands, lvm_lookups) = lvm_state.StopCaching()
+    if lvm_lookups:
+      logging.debug("RPC %s answered %s LVM queries running %s LVM commands",
+                    path, lvm_lookups, lvm_commands)
+    (drbd_reads, drbd_lookups) = drbd.StopCaching()
+    if drbd_lookups:
+      logging.debug("RPC %s answered %s DRBD queries reading DRBD state %s"
+                    " times", path, drbd_lookups, drbd_reads)
+    (qmp_connects, qmp_uses) = hv_kvm.StopQmpPooling()
+    if qmp_uses:
+      logging.debug("RPC %s used QMP connections %s times, connecting %s"
+                    " times", path, qmp_uses, qmp_connects)
+
     return serializer.DumpJson(result)
 
   # the new block devices  --------------------------
@@ -240,6 +262,29 @@ class NodeRequestHandler(http.server.HttpServerHandler):
     bdev = objects.Disk.FromDict(bdev_s)
     return backend.BlockdevWipe(bdev, offset, size)
 
+  @staticmethod
+  def perspective_blockdev_wipe_start(params):
+    """Start wiping block devices in the background.
+
+    """
+    disks_s, offsets = params
+    disks = [objects.Disk.FromDict(bdev_s) for bdev_s in disks_s]
+    return backend.StartDiskWipes(disks, offsets)
+
+  @staticmethod
+  def perspective_blockdev_wipe_status(params):
+    """Retrieves the status of disk wipes.
+
+    """
+    return backend.GetDiskWipeStatus(params[0])
+
+  @staticmethod
+  def perspective_blockdev_wipe_cleanup(params):
+    """Cleans up after disk wipes.
+
+    """
+    return backend.CleanupDiskWipes(params[0])
+
   @staticmethod
   def perspective_blockdev_remove(params):
     """Remove a block device.
@@ -269,6 +314,18 @@ class NodeRequestHandler(http.server.HttpServerHandler):
       raise ValueError("can't unserialize data!")
     return backend.BlockdevAssemble(bdev, instance, on_primary, idx)
 
+  @staticmethod
+  def perspective_blockdev_assemble_multi(params):
+    """Assemble the block devices of several instances in parallel.
+
+    """
+    instance_disks_s, on_primary = params
+    instance_disks = [(objects.Instance.FromDict(idict),
+                       [objects.Disk.FromDict(disk) for disk in disks_s],
+                       indices)
+                      for (idict, disks_s, indices) in instance_disks_s]
+    return backend.BlockdevAssembleMulti(instance_disks, on_primary)
+
   @staticmethod
   def perspective_blockdev_shutdown(params):
     """Shutdown a block device.
@@ -891,6 +948,14 @@ class NodeRequestHandler(http.server.HttpServerHandler):
     """
     return backend.UploadFile(*(params[0]))
 
+  @staticmethod
+  def perspective_upload_config_delta(params):
+    """Apply a delta to the cluster configuration.
+
+    """
+    (delta, ) = params
+    return backend.UploadConfigDelta(delta)
+
   @staticmethod
   def perspective_master_info(params):
     """Query master information.
@@ -1051,6 +1116,15 @@ class NodeRequestHandler(http.server.HttpServerHandler):
     (file_name, content) = params
     return backend.JobQueueUpdate(file_name, content)
 
+  @staticmethod
+  @_RequireJobQueueLock
+  def perspective_jobqueue_update_multi(params):
+    """Update multiple job queue files.
+
+    """
+    (files, ) = params
+    return backend.JobQueueUpdateMulti(files)
+
   @staticmethod
   @_RequireJobQueueLock
   def perspective_jobqueue_purge(params):
@@ -1162,7 +1236,7 @@ class NodeRequestHandler(http.server.HttpServerHandler):
     return backend.CleanupImportExport(params[0])
 
 
-def CheckNoded(_, args):
+def CheckNoded(options, args):
   """Initial checks whether to run or exit with a failure.
 
   """
@@ -1170,6 +1244,9 @@ def CheckNoded(_, args):
     print >> sys.stderr, ("Usage: %s [-f] [-d] [-p port] [-b ADDRESS]" %
                           sys.argv[0])
     sys.exit(constants.EXIT_FAILURE)
+  if options.workers < 1:
+    print >> sys.stderr, "The number of workers must be at least 1"
+    sys.exit(constants.EXIT_FAILURE)
   try:
     codecs.lookup("string-escape")
   except LookupError:
@@ -1213,7 +1290,10 @@ def PrepNoded(options, _):
   server = \
     http.server.HttpServer(mainloop, options.bind_address, options.port,
                            handler, ssl_params=ssl_params, ssl_verify_peer=True,
-                           request_executor_class=request_executor_class)
+                           request_executor_class=request_executor_class,
+                           keepalive_timeout=constants.NODED_KEEPALIVE_TIMEOUT,
+                           serving_mode=options.serving_mode,
+                           num_workers=options.workers)
   server.Start()
 
   return (mainloop, server)
@@ -1242,6 +1322,18 @@ def Main():
   parser.add_option("--no-mlock", dest="mlock",
                     help="Do not mlock the node memory in ram",
                     default=True, action="store_false")
+  parser.add_option("--serving-mode", dest="serving_mode",
+                    help=("How to handle connections, 'fork' to use a new"
+                          " process for each connection or 'prefork' to use"
+                          " long-lived worker processes [%s]" %
+                          http.server.SERVING_MODE_FORK),
+                    default=http.server.SERVING_MODE_FORK,
+                    choices=[http.server.SERVING_MODE_FORK,
+                             http.server.SERVING_MODE_PREFORK])
+  parser.add_option("--workers", dest="workers", type="int",
+                    help=("Number of worker processes in 'prefork' mode"
+                          " [%s]" % http.server.DEFAULT_WORKERS),
+                    default=http.server.DEFAULT_WORKERS)
 
   daemon.GenericMain(constants.NODED, parser, CheckNoded, PrepNoded, ExecNoded,
                      default_ssl_cert=pathutils.NODED_CERT_FILE,
@@ -318,6 +318,10 @@ def CheckRapi(options, args):
                           sys.argv[0])
     sys.exit(constants.EXIT_FAILURE)
 
+  if options.workers < 1:
+    print >> sys.stderr, "The number of workers must be at least 1"
+    sys.exit(constants.EXIT_FAILURE)
+
   ssconf.CheckMaster(options.debug)
 
   # Read SSL certificate (this is a little hackish to read the cert as root)
@@ -344,10 +348,20 @@ def PrepRapi(options, _):
 
   users.Load(pathutils.RAPI_USERS_FILE)
 
+  # Idle persistent connections would occupy one process each when forking
+  # for every connection
+  if options.serving_mode == http.server.SERVING_MODE_FORK:
+    keepalive_timeout = None
+  else:
+    keepalive_timeout = constants.RAPI_KEEPALIVE_TIMEOUT
+
   server = \
     http.server.HttpServer(mainloop, options.bind_address, options.port,
                            handler,
-                           ssl_params=options.ssl_params, ssl_verify_peer=False)
+                           ssl_params=options.ssl_params, ssl_verify_peer=False,
+                           keepalive_timeout=keepalive_timeout,
+                           serving_mode=options.serving_mode,
+                           num_workers=options.workers)
   server.Start()
 
   return (mainloop, server)
@@ -377,6 +391,18 @@ def Main():
                     default=False, action="store_true",
                     help=("Disable anonymous HTTP requests and require"
                           " authentication"))
+  parser.add_option("--serving-mode", dest="serving_mode",
+                    help=("How to handle connections, one of 'fork' (new"
+                          " process for each connection), 'prefork'"
+                          " (long-lived worker processes) or 'threads'"
+                          " [%s]" % http.server.SERVING_MODE_FORK),
+                    default=http.server.SERVING_MODE_FORK,
+                    choices=sorted(http.server.SERVING_MODES))
+  parser.add_option("--workers", dest="workers", type="int",
+                    help=("Number of worker processes or threads in"
+                          " 'prefork' and 'threads' mode [%s]" %
+                          http.server.DEFAULT_WORKERS),
+                    default=http.server.DEFAULT_WORKERS)
 
   daemon.GenericMain(constants.RAPI, parser, CheckRapi, PrepRapi, ExecRapi,
                      default_ssl_cert=pathutils.RAPI_CERT_FILE,
@@ -47,6 +47,7 @@ from ganeti.storage import base
 from ganeti.storage import drbd
 from ganeti.storage import filestorage
 from ganeti.storage import extstorage
+from ganeti.storage import lvm_state
 
 
 class RbdShowmappedJsonError(Exception):
@@ -213,6 +214,7 @@ class LogicalVolume(base.BlockDev):
       result = utils.RunCmd(cmd + ["-i%d" % stripes_arg] + [vg_name] + pvlist)
       if not result.failed:
         break
+    lvm_state.Invalidate()
     if result.failed:
       base.ThrowError("LV create failed (%s): %s",
                       result.fail_reason, result.output)
@@ -222,34 +224,15 @@ class LogicalVolume(base.BlockDev):
   def _GetVolumeInfo(lvm_cmd, fields):
     """Returns LVM Volume infos using lvm_cmd
 
+    The data is taken from the node's LVM state snapshot, see
+    L{lvm_state.GetRows}.
+
     @param lvm_cmd: Should be one of "pvs", "vgs" or "lvs"
     @param fields: Fields to return
-    @return: A list of dicts each with the parsed fields
+    @return: A list of lists each with the values of the fields
 
     """
-    if not fields:
-      raise errors.ProgrammerError("No fields specified")
-
-    sep = "|"
-    cmd = [lvm_cmd, "--noheadings", "--nosuffix", "--units=m", "--unbuffered",
-           "--separator=%s" % sep, "-o%s" % ",".join(fields)]
-
-    result = utils.RunCmd(cmd)
-    if result.failed:
-      raise errors.CommandError("Can't get the volume information: %s - %s" %
-                                (result.fail_reason, result.output))
-
-    data = []
-    for line in result.stdout.splitlines():
-      splitted_fields = line.strip().split(sep)
-
-      if len(fields) != len(splitted_fields):
-        raise errors.CommandError("Can't parse %s output: line '%s'" %
-                                  (lvm_cmd, line))
-
-      data.append(splitted_fields)
-
-    return data
+    return lvm_state.GetRows(lvm_cmd, fields)
 
   @classmethod
   def GetPVInfo(cls, vg_names, filter_allocatable=True, include_lvs=False):
@@ -413,6 +396,7 @@ class LogicalVolume(base.BlockDev):
       return
     result = utils.RunCmd(["lvremove", "-f", "%s/%s" %
                            (self._vg_name, self._lv_name)])
+    lvm_state.Invalidate()
     if result.failed:
       base.ThrowError("Can't lvremove: %s - %s",
                       result.fail_reason, result.output)
@@ -429,6 +413,7 @@ class LogicalVolume(base.BlockDev):
                                    " volume groups (from %s to to %s)" %
                                    (self._vg_name, new_vg))
     result = utils.RunCmd(["lvrename", new_vg, self._lv_name, new_name])
+    lvm_state.Invalidate()
     if result.failed:
       base.ThrowError("Failed to rename the logical volume: %s", result.output)
     self._lv_name = new_name
@@ -439,7 +424,13 @@ class LogicalVolume(base.BlockDev):
     """Parse one line of the lvs output used in L{_GetLvInfo}.
 
     """
-    elems = line.strip().rstrip(sep).split(sep)
+    return cls._ParseLvInfoFields(line.strip().rstrip(sep).split(sep))
+
+  @classmethod
+  def _ParseLvInfoFields(cls, elems):
+    """Parse the fields of one entry of the lvs output used in L{_GetLvInfo}.
+
+    """
     if len(elems) != 6:
       base.ThrowError("Can't parse LVS output, len(%s) != 6", str(elems))
 
@@ -474,31 +465,28 @@ class LogicalVolume(base.BlockDev):
     return (status, major, minor, pe_size, stripes, pv_names)
 
   @classmethod
-  def _GetLvInfo(cls, dev_path, _run_cmd=utils.RunCmd):
+  def _GetLvInfo(cls, dev_path, _get_rows_fn=lvm_state.GetRows):
     """Get info about the given existing LV to be used.
 
     """
-    sep = "|"
-    result = _run_cmd(["lvs", "--noheadings", "--separator=%s" % sep,
-                       "--units=k", "--nosuffix",
-                       "-olv_attr,lv_kernel_major,lv_kernel_minor,"
-                       "vg_extent_size,stripes,devices", dev_path])
-    if result.failed:
-      base.ThrowError("Can't find LV %s: %s, %s",
-                      dev_path, result.fail_reason, result.output)
+    try:
+      rows = _get_rows_fn("lvs", ["lv_attr", "lv_kernel_major",
+                                  "lv_kernel_minor", "vg_extent_size",
+                                  "stripes", "devices"],
+                          names=[dev_path], units="k")
+    except errors.CommandError, err:
+      base.ThrowError("Can't find LV %s: %s", dev_path, err)
     # the output can (and will) have multiple lines for multi-segment
     # LVs, as the 'stripes' parameter is a segment one, so we take
     # only the last entry, which is the one we're interested in; note
     # that with LVM2 anyway the 'stripes' value must be constant
     # across segments, so this is a no-op actually
-    out = result.stdout.splitlines()
-    if not out: # totally empty result? splitlines() returns at least
-                # one line for any non-empty string
-      base.ThrowError("Can't parse LVS output, no lines? Got '%s'", str(out))
+    if not rows:
+      base.ThrowError("Can't parse LVS output, no lines? Got '%s'", str(rows))
     pv_names = set()
-    for line in out:
+    for row in rows:
       (status, major, minor, pe_size, stripes, more_pvs) = \
-        cls._ParseLvInfoLine(line, sep)
+        cls._ParseLvInfoFields(row)
       pv_names.update(more_pvs)
     return (status, major, minor, pe_size, stripes, pv_names)
 
@@ -536,6 +524,7 @@ class LogicalVolume(base.BlockDev):
 
     """
     result = utils.RunCmd(["lvchange", "-ay", self.dev_path])
+    lvm_state.Invalidate()
     if result.failed:
       base.ThrowError("Can't activate lv %s: %s", self.dev_path, result.output)
 
@@ -626,8 +615,10 @@ class LogicalVolume(base.BlockDev):
       base.ThrowError("Not enough free space: required %s,"
                       " available %s", snap_size, free_size)
 
-    _CheckResult(utils.RunCmd(["lvcreate", "-L%dm" % snap_size, "-s",
-                               "-n%s" % snap_name, self.dev_path]))
+    result = utils.RunCmd(["lvcreate", "-L%dm" % snap_size, "-s",
+                           "-n%s" % snap_name, self.dev_path])
+    lvm_state.Invalidate()
+    _CheckResult(result)
 
     return (self._vg_name, snap_name)
 
@@ -635,15 +626,19 @@ class LogicalVolume(base.BlockDev):
     """Try to remove old tags from the lv.
 
     """
-    result = utils.RunCmd(["lvs", "-o", "tags", "--noheadings", "--nosuffix",
-                           self.dev_path])
-    _CheckResult(result)
-
-    raw_tags = result.stdout.strip()
-    if raw_tags:
-      for tag in raw_tags.split(","):
-        _CheckResult(utils.RunCmd(["lvchange", "--deltag",
-                                   tag.strip(), self.dev_path]))
+    try:
+      rows = lvm_state.GetRows("lvs", ["lv_tags"], names=[self.dev_path])
+    except errors.CommandError, err:
+      base.ThrowError("Can't get tags of %s: %s", self.dev_path, err)
+
+    for (raw_tags, ) in rows:
+      raw_tags = raw_tags.strip()
+      if raw_tags:
+        for tag in raw_tags.split(","):
+          result = utils.RunCmd(["lvchange", "--deltag", tag.strip(),
+                                 self.dev_path])
+          lvm_state.Invalidate()
+          _CheckResult(result)
 
   def SetInfo(self, text):
     """Update metadata with info text.
@@ -660,7 +655,9 @@ class LogicalVolume(base.BlockDev):
     # Only up to 128 characters are allowed
     text = text[:128]
 
-    _CheckResult(utils.RunCmd(["lvchange", "--addtag", text, self.dev_path]))
+    result = utils.RunCmd(["lvchange", "--addtag", text, self.dev_path])
+    lvm_state.Invalidate()
+    _CheckResult(result)
 
   def _GetGrowthAvaliabilityExclStor(self):
     """Return how much the disk can grow with exclusive storage.
@@ -715,6 +712,8 @@ class LogicalVolume(base.BlockDev):
     for alloc_policy in "contiguous", "cling", "normal":
       result = utils.RunCmd(cmd + ["--alloc", alloc_policy, self.dev_path] +
                             pvlist)
+      if not dryrun:
+        lvm_state.Invalidate()
       if not result.failed:
         return
     base.ThrowError("Can't grow LV %s: %s", self.dev_path, result.output)
@@ -46,6 +46,7 @@ import logging
 from ganeti import errors
 from ganeti import constants
 from ganeti import utils
+from ganeti.storage import lvm_state
 
 
 def _ParseSize(value):
@@ -181,7 +182,6 @@ class _LvmBase(_Base): # pylint: disable=W0223
       can be an empty list)
 
   """
-  LIST_SEP = "|"
   LIST_COMMAND = None
   LIST_FIELDS = None
 
@@ -194,18 +194,20 @@ class _LvmBase(_Base): # pylint: disable=W0223
     # Get needed LVM fields
     lvm_fields = self._GetLvmFields(self.LIST_FIELDS, wanted_field_names)
 
-    # Build LVM command
-    cmd_args = self._BuildListCommand(self.LIST_COMMAND, self.LIST_SEP,
-                                      lvm_fields, name)
+    # Get LVM data from the node's snapshot
+    if name is None:
+      names = None
+    else:
+      names = [name]
 
-    # Run LVM command
-    cmd_result = self._RunListCommand(cmd_args)
+    try:
+      rows = lvm_state.GetRows(self.LIST_COMMAND, lvm_fields, names=names)
+    except errors.CommandError, err:
+      raise errors.StorageError("Failed to list %r: %s" %
+                                (self.LIST_COMMAND, err))
 
-    # Split and rearrange LVM command output
-    return self._BuildList(self._SplitList(cmd_result, self.LIST_SEP,
-                                           len(lvm_fields)),
-                           self.LIST_FIELDS,
-                           wanted_field_names,
+    # Rearrange LVM data
+    return self._BuildList(rows, self.LIST_FIELDS, wanted_field_names,
                            lvm_fields)
 
   @staticmethod
@@ -286,64 +288,6 @@ class _LvmBase(_Base): # pylint: disable=W0223
 
     return data
 
-  @staticmethod
-  def _BuildListCommand(cmd, sep, options, name):
-    """Builds LVM command line.
-
-    @type cmd: string
-    @param cmd: Command name
-    @type sep: string
-    @param sep: Field separator character
-    @type options: list of strings
-    @param options: Wanted LVM fields
-    @type name: name or None
-    @param name: Name of requested entity
-
-    """
-    args = [cmd,
-            "--noheadings", "--units=m", "--nosuffix",
-            "--separator", sep,
-            "--options", ",".join(options)]
-
-    if name is not None:
-      args.append(name)
-
-    return args
-
-  @staticmethod
-  def _RunListCommand(args):
-    """Run LVM command.
-
-    """
-    result = utils.RunCmd(args)
-
-    if result.failed:
-      raise errors.StorageError("Failed to run %r, command output: %s" %
-                                (args[0], result.output))
-
-    return result.stdout
-
-  @staticmethod
-  def _SplitList(data, sep, fieldcount):
-    """Splits LVM command output into rows and fields.
-
-    @type data: string
-    @param data: LVM command output
-    @type sep: string
-    @param sep: Field separator character
-    @type fieldcount: int
-    @param fieldcount: Expected number of fields
-
-    """
-    for line in data.splitlines():
-      fields = line.strip().split(sep)
-
-      if len(fields) != fieldcount:
-        logging.warning("Invalid line returned from lvm command: %s", line)
-        continue
-
-      yield fields
-
 
 def _LvmPvGetAllocatable(attr):
   """Determines whether LVM PV is allocatable.
@@ -393,6 +337,7 @@ class LvmPvStorage(_LvmBase): # pylint: disable=W0223
     args.append(name)
 
     result = utils.RunCmd(args)
+    lvm_state.Invalidate()
     if result.failed:
       raise errors.StorageError("Failed to modify physical volume,"
                                 " pvchange output: %s" %
@@ -453,6 +398,8 @@ class LvmVgStorage(_LvmBase):
                            "--force", name])
       vgreduce_output += "\n" + result.output
 
+    lvm_state.Invalidate()
+
     result = _runcmd_fn([self.LIST_COMMAND, "--noheadings",
                          "--nosuffix", name])
     # we also need to check the output
@@ -50,6 +50,120 @@ from ganeti.storage import drbd_cmdgen
 _DEVICE_READ_SIZE = 128 * 1024
 
 
+class _DrbdCache(object):
+  """Information about the DRBD devices collected during a single RPC call.
+
+  Multi-disk RPCs otherwise read /proc/drbd and run C{drbdsetup show} once
+  for every disk, and often several times for the same disk.
+
+  @ivar data: Collected information; replaced on invalidation
+  @ivar reads: Number of times information was collected
+  @ivar lookups: Number of queries answered
+
+  """
+  def __init__(self):
+    """Initializes this class.
+
+    """
+    self.data = {}
+    self.reads = 0
+    self.lookups = 0
+
+  def Invalidate(self):
+    """Discards all collected information.
+
+    """
+    self.data = {}
+
+
+_cache = None
+
+
+def StartCaching():
+  """Keeps DRBD information until L{StopCaching} is called.
+
+  """
+  global _cache # pylint: disable=W0603
+
+  _cache = _DrbdCache()
+
+
+def StopCaching():
+  """Discards the cached DRBD information.
+
+  @rtype: tuple; (int, int)
+  @return: The number of times DRBD information was read and the number of
+    lookups answered while caching
+
+  """
+  global _cache # pylint: disable=W0603
+
+  if _cache is None:
+    return (0, 0)
+
+  result = (_cache.reads, _cache.lookups)
+  _cache = None
+
+  return result
+
+
+def Invalidate():
+  """Discards the cached information after DRBD devices have changed.
+
+  Must also be called before re-checking a device's state in a polling loop.
+
+  """
+  if _cache is not None:
+    _cache.Invalidate()
+
+
+def _Cached(key, fn):
+  """Returns cached information, collecting it if necessary.
+
+  Devices can be queried from several threads. New information is stored in
+  the dictionary which was current when the query started, so it is lost if
+  the cache is invalidated while it is collected.
+
+  @param key: the key of the information in the cache
+  @type fn: callable
+  @param fn: function collecting the information, the result is not cached
+    if it returns C{None}
+
+  """
+  if _cache is None:
+    return fn()
+
+  data = _cache.data
+  _cache.lookups += 1
+
+  try:
+    return data[key]
+  except KeyError:
+    pass
+
+  value = fn()
+  _cache.reads += 1
+
+  if value is not None:
+    data[key] = value
+
+  return value
+
+
+def _RunChangingCmd(cmd):
+  """Runs a command modifying DRBD devices and invalidates the cache.
+
+  @type cmd: list of strings
+  @param cmd: the command to run
+  @rtype: L{utils.process.RunResult}
+
+  """
+  try:
+    return utils.RunCmd(cmd)
+  finally:
+    Invalidate()
+
+
 class DRBD8(object):
   """Various methods to deals with the DRBD system as a whole.
 
@@ -88,11 +202,14 @@ class DRBD8(object):
   def GetProcInfo():
     """Reads and parses information from /proc/drbd.
 
+    The result is cached if caching has been enabled using
+    L{StartCaching}.
+
     @rtype: DRBD8Info
     @return: a L{DRBD8Info} instance containing the current /proc/drbd info
 
     """
-    return DRBD8Info.CreateFromFile()
+    return _Cached("proc", DRBD8Info.CreateFromFile)
 
   @staticmethod
   def GetUsedDevs():
@@ -159,7 +276,7 @@ class DRBD8(object):
     cmd_gen = DRBD8.GetCmdGenerator(info)
 
     cmd = cmd_gen.GenDownCmd(minor)
-    result = utils.RunCmd(cmd)
+    result = _RunChangingCmd(cmd)
     if result.failed:
       base.ThrowError("drbd%d: can't shutdown drbd device: %s",
                       minor, result.output)
@@ -305,15 +422,46 @@ class DRBD8Dev(base.BlockDev):
       return None
     return result.stdout
 
+  def _ParseShowData(self, data):
+    """Parses the output of `drbdsetup show`.
+
+    The output is parsed using L{drbd_info.FastShowInfo}, falling back to
+    the complete grammar of the DRBD version in use if that fails.
+
+    @type data: string
+    @param data: the output of `drbdsetup show`
+    @rtype: dict as described in L{drbd_info.BaseShowInfo.GetDevInfo}
+
+    """
+    try:
+      return drbd_info.FastShowInfo.GetDevInfo(data)
+    except errors.BlockDeviceError, err:
+      logging.debug("Can't parse drbdsetup output quickly, using the full"
+                    " parser: %s", err)
+      return self._show_info_cls.GetDevInfo(data)
+
   def _GetShowInfo(self, minor):
     """Return parsed information from `drbdsetup show`.
 
+    The result is cached if caching has been enabled using
+    L{StartCaching}.
+
     @type minor: int
     @param minor: the minor to return information for
     @rtype: dict as described in L{drbd_info.BaseShowInfo.GetDevInfo}
 
     """
-    return self._show_info_cls.GetDevInfo(self._GetShowData(minor))
+    def _Collect():
+      data = self._GetShowData(minor)
+      if data is None:
+        return None
+      return self._ParseShowData(data)
+
+    info = _Cached(("show", minor), _Collect)
+    if info is None:
+      return {}
+
+    return info
 
   def _MatchesLocal(self, info):
     """Test if our local config matches with an existing device.
@@ -392,7 +540,7 @@ class DRBD8Dev(base.BlockDev):
                                           size, self.params)
 
     for cmd in cmds:
-      result = utils.RunCmd(cmd)
+      result = _RunChangingCmd(cmd)
       if result.failed:
         base.ThrowError("drbd%d: can't attach local disk: %s",
                         minor, result.output)
@@ -443,12 +591,13 @@ class DRBD8Dev(base.BlockDev):
                                       rhost, rport, protocol,
                                       dual_pri, hmac, secret, self.params)
 
-    result = utils.RunCmd(cmd)
+    result = _RunChangingCmd(cmd)
     if result.failed:
       base.ThrowError("drbd%d: can't setup network: %s - %s",
                       minor, result.fail_reason, result.output)
 
     def _CheckNetworkConfig():
+      Invalidate()
       info = self._GetShowInfo(minor)
       if not "local_addr" in info or not "remote_addr" in info:
         raise utils.RetryAgain()
@@ -566,7 +715,7 @@ class DRBD8Dev(base.BlockDev):
 
     """
     cmd = self._cmd_gen.GenSyncParamsCmd(minor, params)
-    result = utils.RunCmd(cmd)
+    result = _RunChangingCmd(cmd)
     if result.failed:
       msg = ("Can't change syncer rate: %s - %s" %
              (result.fail_reason, result.output))
@@ -607,7 +756,7 @@ class DRBD8Dev(base.BlockDev):
     else:
       cmd = self._cmd_gen.GenResumeSyncCmd(self.minor)
 
-    result = utils.RunCmd(cmd)
+    result = _RunChangingCmd(cmd)
     if result.failed:
       logging.error("Can't %s: %s - %s", cmd,
                     result.fail_reason, result.output)
@@ -681,7 +830,7 @@ class DRBD8Dev(base.BlockDev):
 
     cmd = self._cmd_gen.GenPrimaryCmd(self.minor, force)
 
-    result = utils.RunCmd(cmd)
+    result = _RunChangingCmd(cmd)
     if result.failed:
       base.ThrowError("drbd%d: can't make drbd device primary: %s", self.minor,
                       result.output)
@@ -695,7 +844,7 @@ class DRBD8Dev(base.BlockDev):
     if self.minor is None and not self.Attach():
       base.ThrowError("drbd%d: can't Attach() in Close()", self._aminor)
     cmd = self._cmd_gen.GenSecondaryCmd(self.minor)
-    result = utils.RunCmd(cmd)
+    result = _RunChangingCmd(cmd)
     if result.failed:
       base.ThrowError("drbd%d: can't switch drbd device to secondary: %s",
                       self.minor, result.output)
@@ -729,6 +878,7 @@ class DRBD8Dev(base.BlockDev):
     dstatus = _DisconnectStatus(base.IgnoreError(self._ShutdownNet, self.minor))
 
     def _WaitForDisconnect():
+      Invalidate()
       if self.GetProcStatus().is_standalone:
         return
 
@@ -933,7 +1083,7 @@ class DRBD8Dev(base.BlockDev):
 
     """
     cmd = self._cmd_gen.GenDetachCmd(minor)
-    result = utils.RunCmd(cmd)
+    result = _RunChangingCmd(cmd)
     if result.failed:
       base.ThrowError("drbd%d: can't detach local disk: %s",
                       minor, result.output)
@@ -951,7 +1101,7 @@ class DRBD8Dev(base.BlockDev):
     cmd = self._cmd_gen.GenDisconnectCmd(minor, family,
                                          self._lhost, self._lport,
                                          self._rhost, self._rport)
-    result = utils.RunCmd(cmd)
+    result = _RunChangingCmd(cmd)
     if result.failed:
       base.ThrowError("drbd%d: can't shutdown network: %s",
                       minor, result.output)
@@ -1000,7 +1150,7 @@ class DRBD8Dev(base.BlockDev):
       # so we'll return here
       return
     cmd = self._cmd_gen.GenResizeCmd(self.minor, self.size + amount)
-    result = utils.RunCmd(cmd)
+    result = _RunChangingCmd(cmd)
     if result.failed:
       base.ThrowError("drbd%d: resize failed: %s", self.minor, result.output)
 
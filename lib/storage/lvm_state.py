@@ -0,0 +1,302 @@
+#
+#
+
+# Copyright (C) 2014 Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Snapshot of the LVM state of a node.
+
+Listing physical volumes, volume groups or logical volumes using the LVM
+tools is expensive, as every invocation scans all physical volumes. Instead
+of running a separate command for every query, all information is collected
+at once and kept in a L{LvmState} snapshot. The node daemon keeps a snapshot
+for the duration of an RPC call (see L{StartCaching}); all code modifying
+LVM objects must call L{Invalidate} afterwards.
+
+"""
+
+import logging
+
+from ganeti import errors
+from ganeti import utils
+
+
+#: Fields reported by "pvs"; one entry is returned for every logical volume
+#: using a physical volume and for its free space
+_PVS_FIELDS = [
+  "pv_name", "pv_attr", "pv_size", "pv_free", "pv_used",
+  "vg_name", "vg_attr", "vg_size", "vg_free",
+  "lv_name",
+  ]
+
+#: Fields reported by "lvs"; one entry is returned for every segment of a
+#: logical volume
+_LVS_FIELDS = [
+  "vg_name", "lv_name", "lv_attr", "lv_size", "lv_tags",
+  "lv_kernel_major", "lv_kernel_minor", "vg_extent_size",
+  "stripes", "devices",
+  ]
+
+#: Fields reported in bytes
+_SIZE_FIELDS = frozenset([
+  "pv_size", "pv_free", "pv_used",
+  "vg_size", "vg_free", "vg_extent_size",
+  "lv_size",
+  ])
+
+#: Listings, consisting of the command used to collect the data, the fields
+#: which can be requested, the fields identifying an entry and the fields
+#: which can have different values for the same entry
+_LISTINGS = {
+  "pvs": ("pvs", _PVS_FIELDS, ["pv_name"], frozenset(["lv_name"])),
+  "vgs": ("pvs", [i for i in _PVS_FIELDS if i.startswith("vg_")],
+          ["vg_name"], frozenset()),
+  "lvs": ("lvs", _LVS_FIELDS, ["vg_name", "lv_name"],
+          frozenset(["stripes", "devices"])),
+  }
+
+#: Divisors for converting sizes into units
+_UNITS = {
+  "b": 1,
+  "k": 1024,
+  "m": 1024 * 1024,
+  }
+
+_SEP = "|"
+
+
+def _FormatValue(entry, field, units):
+  """Formats a field of an entry like the LVM tools do.
+
+  Sizes are collected in bytes and converted to the requested units.
+
+  """
+  value = entry[field]
+
+  if field not in _SIZE_FIELDS or not value or units == "b":
+    return value
+
+  return "%.2f" % (float(value) / _UNITS[units])
+
+
+def _MatchesName(listing, entry, name):
+  """Checks whether an entry is selected by a name given to a listing.
+
+  """
+  if listing == "pvs":
+    return entry["pv_name"] == name
+  elif listing == "vgs":
+    return entry["vg_name"] == name
+  else:
+    full_name = "%s/%s" % (entry["vg_name"], entry["lv_name"])
+    return name in (entry["vg_name"], full_name,
+                    utils.PathJoin("/dev", full_name))
+
+
+class LvmState(object):
+  """Snapshot of physical volumes, volume groups and logical volumes.
+
+  The data is only collected when it's needed for the first time. Queries
+  can be made from several threads.
+
+  @ivar commands: Number of LVM commands run
+  @ivar lookups: Number of queries answered
+
+  """
+  def __init__(self, _run_cmd=utils.RunCmd):
+    """Initializes this class.
+
+    """
+    self._run_cmd = _run_cmd
+    self._data = {}
+    self.commands = 0
+    self.lookups = 0
+
+  def Invalidate(self):
+    """Discards the collected data.
+
+    """
+    self._data = {}
+
+  def _Load(self, cmd):
+    """Runs a LVM command listing all fields of all entries.
+
+    @rtype: list of dicts
+
+    """
+    # New data is stored in the dictionary which was current when the query
+    # started, so it is lost if the snapshot is invalidated in the meantime
+    cache = self._data
+
+    try:
+      return cache[cmd]
+    except KeyError:
+      pass
+
+    if cmd == "pvs":
+      fields = _PVS_FIELDS
+    else:
+      fields = _LVS_FIELDS
+
+    self.commands += 1
+
+    result = self._run_cmd([cmd, "--noheadings", "--nosuffix", "--units=b",
+                            "--unbuffered", "--separator=%s" % _SEP,
+                            "-o%s" % ",".join(fields)])
+    if result.failed:
+      raise errors.CommandError("Can't get the volume information: %s - %s" %
+                                (result.fail_reason, result.output))
+
+    data = []
+    for line in result.stdout.splitlines():
+      values = line.strip().split(_SEP)
+
+      if len(values) != len(fields):
+        raise errors.CommandError("Can't parse %s output: line '%s'" %
+                                  (cmd, line))
+
+      data.append(dict(zip(fields, values)))
+
+    cache[cmd] = data
+
+    return data
+
+  def GetRows(self, listing, fields, names=None, units="m"):
+    """Returns entries in the same format as the LVM tools.
+
+    @type listing: string
+    @param listing: One of "pvs", "vgs" or "lvs"
+    @type fields: list of strings
+    @param fields: Fields to return
+    @type names: list of strings or None
+    @param names: Names of the entries to return, all are returned if empty;
+      logical volumes can be selected by volume group, "vg/lv" or their path
+    @type units: string
+    @param units: Units for sizes, one of "b", "k" or "m"
+    @rtype: list of lists
+    @return: For every entry the values of the requested fields
+    @raise errors.CommandError: if the data can't be collected or one of
+      the names doesn't exist
+
+    """
+    (cmd, valid_fields, key_fields, detail_fields) = _LISTINGS[listing]
+
+    if not fields:
+      raise errors.ProgrammerError("No fields specified")
+
+    unknown = set(fields) - set(valid_fields)
+    if unknown:
+      raise errors.ProgrammerError("Unknown fields for %s: %s" %
+                                   (listing, utils.CommaJoin(unknown)))
+
+    self.lookups += 1
+
+    entries = self._Load(cmd)
+
+    if listing == "vgs":
+      # Physical volumes not belonging to a volume group
+      entries = [i for i in entries if i["vg_name"]]
+
+    if names:
+      missing = [name for name in names
+                 if not [i for i in entries
+                         if _MatchesName(listing, i, name)]]
+      if missing:
+        raise errors.CommandError("Can't find %s: %s" %
+                                  (listing, utils.CommaJoin(missing)))
+
+      entries = [i for i in entries
+                 if [name for name in names
+                     if _MatchesName(listing, i, name)]]
+
+    if not detail_fields.intersection(fields):
+      # Report every entry only once
+      seen = set()
+      unique = []
+      for i in entries:
+        key = tuple(i[j] for j in key_fields)
+        if key not in seen:
+          seen.add(key)
+          unique.append(i)
+      entries = unique
+
+    return [[_FormatValue(i, j, units) for j in fields] for i in entries]
+
+
+#: Snapshot used while caching is enabled
+_cache = None
+
+
+def StartCaching():
+  """Keeps collected data until L{StopCaching} is called.
+
+  """
+  global _cache # pylint: disable=W0603
+
+  _cache = LvmState()
+
+
+def StopCaching():
+  """Discards the cached data.
+
+  @rtype: tuple; (int, int)
+  @return: The number of LVM commands run and queries answered while caching
+
+  """
+  global _cache # pylint: disable=W0603
+
+  if _cache is None:
+    return (0, 0)
+
+  result = (_cache.commands, _cache.lookups)
+  _cache = None
+
+  return result
+
+
+def Invalidate():
+  """Discards the cached data after LVM objects have been modified.
+
+  """
+  if _cache is not None:
+    logging.debug("Invalidating cached LVM data")
+    _cache.Invalidate()
+
+
+def GetRows(listing, fields, names=None, units="m"):
+  """Returns entries in the same format as the LVM tools.
+
+  The cached snapshot is used if caching is enabled, otherwise the data is
+  collected for this query only. See L{LvmState.GetRows}.
+
+  """
+  if _cache is None:
+    state = LvmState()
+  else:
+    state = _cache
+
+  return state.GetRows(listing, fields, names=names, units=units)
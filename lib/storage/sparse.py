@@ -0,0 +1,441 @@
+#
+#
+
+# Copyright (C) 2014 Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Copying of devices skipping zeroed regions.
+
+The sending side only transfers the regions of a device containing data,
+framed with their offset and length. Holes of files are found using
+C{SEEK_DATA}/C{SEEK_HOLE}, all other regions are compared to zeroes block by
+block. The receiving side writes the transferred regions and makes sure the
+regions in between read back as zeroes, writing zeroes only where the
+destination contains other data, so thin volumes and sparse files stay sparse.
+
+Streams which can only be read sequentially, such as the output of OS export
+scripts, are encoded in the same format by L{EncodeStream} by comparing every
+block to zeroes; L{DecodeStream} turns them back into the original stream.
+
+Stream format: the L{MAGIC} line, followed by records consisting of a header
+(offset and length as unsigned 64-bit big-endian integers) and the data. A
+record with a length of zero ends the stream, its offset is the size of the
+device.
+
+"""
+
+import errno
+import logging
+import os
+import stat
+import struct
+
+from ganeti import errors
+
+
+#: First line of a stream
+MAGIC = "ganeti-sparse-1\n"
+
+#: Record header, offset and length
+_HEADER = struct.Struct(">QQ")
+
+#: Granularity at which zeroes are detected
+ZERO_BLOCK_SIZE = 64 * 1024
+
+#: Default amount of data read or written at once
+BUFFER_SIZE = 1024 * 1024
+
+#: Seek to the next data or hole of a file (from C{<unistd.h>}), not provided
+#: by Python 2
+_SEEK_DATA = getattr(os, "SEEK_DATA", 3)
+_SEEK_HOLE = getattr(os, "SEEK_HOLE", 4)
+
+
+class CopyStats(object):
+  """Amount of data handled by a copy.
+
+  @ivar size: Size of the device in bytes
+  @ivar data: Number of bytes transferred
+  @ivar zeroed: Number of bytes zeroes had to be written to (receiving side)
+
+  """
+  def __init__(self, size=0, data=0, zeroed=0):
+    """Initializes this class.
+
+    """
+    self.size = size
+    self.data = data
+    self.zeroed = zeroed
+
+
+def _IsRegularFile(fd):
+  """Checks whether a file descriptor refers to a regular file.
+
+  """
+  return stat.S_ISREG(os.fstat(fd).st_mode)
+
+
+def GetDataExtents(fd, start, end):
+  """Returns the regions of a file which may contain data.
+
+  For regular files the range beyond the end of the file and, provided that
+  the file system supports C{SEEK_DATA}, holes are skipped; for all other
+  files the whole range is returned.
+
+  @type fd: int
+  @param fd: File descriptor
+  @type start: int
+  @param start: Start of the range in bytes
+  @type end: int
+  @param end: End of the range in bytes
+  @rtype: list of tuples; (int, int)
+  @return: Start and end of every region
+
+  """
+  st = os.fstat(fd)
+
+  if stat.S_ISREG(st.st_mode):
+    # Data beyond the end of a file reads back as zeroes
+    end = min(end, st.st_size)
+  elif start < end:
+    return [(start, end)]
+
+  if start >= end:
+    return []
+
+  result = []
+  pos = start
+
+  while pos < end:
+    try:
+      data_start = os.lseek(fd, pos, _SEEK_DATA)
+    except EnvironmentError, err:
+      if err.errno == errno.ENXIO:
+        # No more data
+        break
+      elif err.errno == errno.EINVAL and pos == start:
+        logging.debug("File system doesn't support SEEK_DATA: %s", err)
+        return [(start, end)]
+      raise
+
+    if data_start >= end:
+      break
+
+    data_end = min(end, os.lseek(fd, data_start, _SEEK_HOLE))
+    result.append((data_start, data_end))
+    pos = data_end
+
+  return result
+
+
+def _SplitNonZero(data, offset, zero_block):
+  """Splits data into runs of blocks which aren't zeroes.
+
+  @type data: string
+  @param data: Data, read at C{offset}
+  @type zero_block: string
+  @param zero_block: Zeroes of the size of a block
+  @rtype: list of tuples; (int, int)
+  @return: Start and end of every run, relative to the device
+
+  """
+  block_size = len(zero_block)
+  result = []
+  run_start = None
+
+  for pos in range(0, len(data), block_size):
+    block = data[pos:pos + block_size]
+
+    if block == zero_block[:len(block)]:
+      if run_start is not None:
+        result.append((offset + run_start, offset + pos))
+        run_start = None
+    elif run_start is None:
+      run_start = pos
+
+  if run_start is not None:
+    result.append((offset + run_start, offset + len(data)))
+
+  return result
+
+
+def _ReadAt(fd, offset, length):
+  """Reads exactly C{length} bytes at an offset.
+
+  """
+  os.lseek(fd, offset, os.SEEK_SET)
+
+  parts = []
+  while length > 0:
+    data = os.read(fd, length)
+    if not data:
+      raise errors.GenericError("Unexpected end of file at offset %s" %
+                                (offset, ))
+    parts.append(data)
+    length -= len(data)
+    offset += len(data)
+
+  return "".join(parts)
+
+
+def _WriteAll(fd, data):
+  """Writes all data to a file descriptor.
+
+  """
+  pos = 0
+  while pos < len(data):
+    pos += os.write(fd, buffer(data, pos))
+
+
+def SendDevice(path, size, out_fd, buffer_size=BUFFER_SIZE,
+               block_size=ZERO_BLOCK_SIZE):
+  """Writes the regions of a device containing data to a stream.
+
+  @type path: string
+  @param path: Path to the device
+  @type size: int
+  @param size: Number of bytes to send
+  @type out_fd: int
+  @param out_fd: File descriptor of the stream
+  @rtype: L{CopyStats}
+
+  """
+  assert buffer_size > 0 and buffer_size % block_size == 0
+
+  stats = CopyStats(size=size)
+  zero_block = "\0" * block_size
+
+  _WriteAll(out_fd, MAGIC)
+
+  fd = os.open(path, os.O_RDONLY)
+  try:
+    # End of the data read so far
+    pos = 0
+
+    for (start, end) in GetDataExtents(fd, 0, size):
+      # Read aligned to blocks, unless already read
+      pos = max(pos, start - (start % block_size))
+
+      while pos < end:
+        length = min(buffer_size, end - pos)
+        data = _ReadAt(fd, pos, length)
+
+        for (run_start, run_end) in _SplitNonZero(data, pos, zero_block):
+          _WriteAll(out_fd, _HEADER.pack(run_start, run_end - run_start))
+          _WriteAll(out_fd, buffer(data, run_start - pos, run_end - run_start))
+          stats.data += run_end - run_start
+
+        pos += length
+  finally:
+    os.close(fd)
+
+  _WriteAll(out_fd, _HEADER.pack(size, 0))
+
+  return stats
+
+
+def _ReadExactly(in_file, length):
+  """Reads exactly C{length} bytes from a stream.
+
+  """
+  data = in_file.read(length)
+
+  if len(data) != length:
+    raise errors.GenericError("Stream ended unexpectedly")
+
+  return data
+
+
+def _ZeroRange(fd, start, end, buffer_size, block_size, stats):
+  """Makes sure a range of a device reads back as zeroes.
+
+  Zeroes are only written to blocks containing other data.
+
+  """
+  zero_block = "\0" * block_size
+
+  for (ext_start, ext_end) in GetDataExtents(fd, start, end):
+    pos = ext_start
+    while pos < ext_end:
+      length = min(buffer_size, ext_end - pos)
+      data = _ReadAt(fd, pos, length)
+
+      for (run_start, run_end) in _SplitNonZero(data, pos, zero_block):
+        os.lseek(fd, run_start, os.SEEK_SET)
+        _WriteAll(fd, buffer("\0" * (run_end - run_start)))
+        stats.zeroed += run_end - run_start
+
+      pos += length
+
+
+def ReceiveDevice(in_file, path, buffer_size=BUFFER_SIZE,
+                  block_size=ZERO_BLOCK_SIZE):
+  """Writes a stream produced by L{SendDevice} to a device.
+
+  @type in_file: file-like object
+  @param in_file: The stream
+  @type path: string
+  @param path: Path to the device, which must exist
+  @rtype: L{CopyStats}
+
+  """
+  assert buffer_size > 0
+
+  if _ReadExactly(in_file, len(MAGIC)) != MAGIC:
+    raise errors.GenericError("Stream doesn't start with magic value")
+
+  stats = CopyStats()
+
+  fd = os.open(path, os.O_RDWR)
+  try:
+    # End of the last region written
+    pos = 0
+
+    while True:
+      (offset, length) = _HEADER.unpack(_ReadExactly(in_file, _HEADER.size))
+
+      if offset < pos:
+        raise errors.GenericError("Region at offset %s overlaps previous"
+                                  " region ending at %s" % (offset, pos))
+
+      _ZeroRange(fd, pos, offset, buffer_size, block_size, stats)
+
+      if length == 0:
+        stats.size = offset
+        break
+
+      os.lseek(fd, offset, os.SEEK_SET)
+
+      remaining = length
+      while remaining > 0:
+        data = _ReadExactly(in_file, min(buffer_size, remaining))
+        _WriteAll(fd, data)
+        remaining -= len(data)
+
+      stats.data += length
+      pos = offset + length
+
+    if _IsRegularFile(fd) and os.fstat(fd).st_size < stats.size:
+      os.ftruncate(fd, stats.size)
+
+    os.fsync(fd)
+  finally:
+    os.close(fd)
+
+  return stats
+
+
+def EncodeStream(in_file, out_fd, buffer_size=BUFFER_SIZE,
+                 block_size=ZERO_BLOCK_SIZE):
+  """Writes the blocks of a stream which aren't zeroes to another stream.
+
+  @type in_file: file-like object
+  @param in_file: The input stream, read sequentially
+  @type out_fd: int
+  @param out_fd: File descriptor of the encoded stream
+  @rtype: L{CopyStats}
+
+  """
+  assert buffer_size > 0 and buffer_size % block_size == 0
+
+  stats = CopyStats()
+  zero_block = "\0" * block_size
+
+  _WriteAll(out_fd, MAGIC)
+
+  while True:
+    # Reads less than requested only at the end of the stream, keeping the
+    # blocks aligned
+    data = in_file.read(buffer_size)
+    if not data:
+      break
+
+    for (run_start, run_end) in _SplitNonZero(data, stats.size, zero_block):
+      _WriteAll(out_fd, _HEADER.pack(run_start, run_end - run_start))
+      _WriteAll(out_fd, buffer(data, run_start - stats.size,
+                               run_end - run_start))
+      stats.data += run_end - run_start
+
+    stats.size += len(data)
+
+  _WriteAll(out_fd, _HEADER.pack(stats.size, 0))
+
+  return stats
+
+
+def DecodeStream(in_file, out_fd, buffer_size=BUFFER_SIZE):
+  """Writes the original stream encoded by L{EncodeStream}.
+
+  The skipped regions are written as zeroes.
+
+  @type in_file: file-like object
+  @param in_file: The encoded stream
+  @type out_fd: int
+  @param out_fd: File descriptor of the output stream
+  @rtype: L{CopyStats}
+
+  """
+  assert buffer_size > 0
+
+  if _ReadExactly(in_file, len(MAGIC)) != MAGIC:
+    raise errors.GenericError("Stream doesn't start with magic value")
+
+  stats = CopyStats()
+  zeroes = "\0" * buffer_size
+
+  # End of the last region written
+  pos = 0
+
+  while True:
+    (offset, length) = _HEADER.unpack(_ReadExactly(in_file, _HEADER.size))
+
+    if offset < pos:
+      raise errors.GenericError("Region at offset %s overlaps previous"
+                                " region ending at %s" % (offset, pos))
+
+    remaining = offset - pos
+    while remaining > 0:
+      count = min(buffer_size, remaining)
+      _WriteAll(out_fd, buffer(zeroes, 0, count))
+      remaining -= count
+
+    stats.zeroed += offset - pos
+
+    if length == 0:
+      stats.size = offset
+      break
+
+    remaining = length
+    while remaining > 0:
+      data = _ReadExactly(in_file, min(buffer_size, remaining))
+      _WriteAll(out_fd, data)
+      remaining -= len(data)
+
+    stats.data += length
+    pos = offset + length
+
+  return stats
@@ -0,0 +1,229 @@
+#
+#
+
+# Copyright (C) 2014 Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+
+"""Zeroing of block devices.
+
+Devices are wiped in-process. If the kernel can zero a range of a device
+without transferring the data (C{BLKDISCARD} on devices guaranteeing zeroes
+for discarded blocks, C{BLKZEROOUT} otherwise), that is used. Otherwise
+zeroes are written from a page-aligned buffer using direct I/O.
+
+"""
+
+import errno
+import fcntl
+import logging
+import mmap
+import os
+import stat
+import struct
+
+from ganeti import utils
+
+
+#: Discard a range of a device (from C{<linux/fs.h>})
+_BLKDISCARD = 0x1277
+
+#: Zero a range of a device (from C{<linux/fs.h>})
+_BLKZEROOUT = 0x127f
+
+#: Error numbers signalling that an ioctl is not supported by a device
+_UNSUPPORTED_ERRNOS = frozenset([
+  errno.EINVAL,
+  errno.ENOSYS,
+  errno.ENOTTY,
+  errno.EOPNOTSUPP,
+  ])
+
+_MIB = 1024 * 1024
+
+#: Wiped by discarding blocks
+METHOD_DISCARD = "discard"
+
+#: Wiped by letting the kernel write zeroes
+METHOD_ZEROOUT = "zeroout"
+
+#: Wiped by writing zeroes
+METHOD_WRITE = "write"
+
+
+def _RangeIoctl(fd, request, offset, length):
+  """Calls an ioctl taking a byte range on a device.
+
+  """
+  fcntl.ioctl(fd, request, struct.pack("QQ", offset, length))
+
+
+def _DiscardZeroesData(fd):
+  """Checks whether discarded blocks of a device are read back as zeroes.
+
+  @type fd: int
+  @param fd: File descriptor of the device
+
+  """
+  st = os.fstat(fd)
+
+  if not stat.S_ISBLK(st.st_mode):
+    return False
+
+  path = ("/sys/dev/block/%s:%s/queue/discard_zeroes_data" %
+          (os.major(st.st_rdev), os.minor(st.st_rdev)))
+
+  try:
+    return utils.ReadFile(path).strip() == "1"
+  except EnvironmentError:
+    return False
+
+
+def _ZeroWithIoctls(fd, methods, offset, size, chunk_size, progress_fn,
+                    _ioctl_fn):
+  """Zeroes a range of a device using ioctls.
+
+  @type methods: list of tuples
+  @param methods: Wipe method names and ioctl requests, in order of
+    preference
+  @rtype: tuple; (string or None, int)
+  @return: The last method used and the amount of data zeroed in MiB
+
+  """
+  done = 0
+
+  for (method, request) in methods:
+    try:
+      while done < size:
+        length = min(chunk_size, size - done)
+        _ioctl_fn(fd, request, (offset + done) * _MIB, length * _MIB)
+        done += length
+        progress_fn(method, done)
+    except EnvironmentError, err:
+      if err.errno not in _UNSUPPORTED_ERRNOS:
+        raise
+      logging.debug("Wipe method '%s' not supported: %s", method, err)
+    else:
+      return (method, done)
+
+  return (None, done)
+
+
+def _WriteZeroes(path, offset, size, buffer_size, progress_fn):
+  """Writes zeroes to a range of a device.
+
+  @type offset: int
+  @param offset: Offset in MiB
+  @type size: int
+  @param size: Size in MiB
+  @type buffer_size: int
+  @param buffer_size: Size of the write buffer in MiB
+
+  """
+  try:
+    fd = os.open(path, os.O_WRONLY | os.O_DIRECT)
+  except EnvironmentError, err:
+    if err.errno != errno.EINVAL:
+      raise
+    # Not all file systems support direct I/O
+    logging.debug("Opening '%s' for direct I/O failed: %s", path, err)
+    fd = os.open(path, os.O_WRONLY)
+
+  try:
+    # Anonymous mappings are page-aligned and filled with zeroes, as
+    # required for direct I/O
+    buf = mmap.mmap(-1, buffer_size * _MIB)
+    try:
+      os.lseek(fd, offset * _MIB, os.SEEK_SET)
+
+      done = 0
+      while done < size * _MIB:
+        length = min(buffer_size * _MIB, size * _MIB - done)
+
+        # As the buffer only contains zeroes, a short write can be completed
+        # from its beginning
+        done += os.write(fd, buffer(buf, 0, length))
+
+        progress_fn(METHOD_WRITE, done // _MIB)
+
+      os.fsync(fd)
+    finally:
+      buf.close()
+  finally:
+    os.close(fd)
+
+
+def WipeDevice(path, offset, size, chunk_size, buffer_size, progress_fn,
+               _ioctl_fn=_RangeIoctl, _discard_zeroes_fn=_DiscardZeroesData):
+  """Fills a range of a device with zeroes.
+
+  @type path: string
+  @param path: Path to the device
+  @type offset: int
+  @param offset: Offset in MiB
+  @type size: int
+  @param size: Size in MiB
+  @type chunk_size: int
+  @param chunk_size: Size of the ranges passed to a single ioctl in MiB,
+    determines how often progress is reported
+  @type buffer_size: int
+  @param buffer_size: Size of the write buffer in MiB if zeroes have to be
+    written
+  @type progress_fn: callable
+  @param progress_fn: Called with the wipe method and the amount of data
+    wiped so far in MiB
+  @rtype: string
+  @return: The wipe method used for the last part of the range
+
+  """
+  assert offset >= 0 and size >= 0
+  assert chunk_size > 0 and buffer_size > 0
+
+  fd = os.open(path, os.O_WRONLY)
+  try:
+    methods = []
+
+    if _discard_zeroes_fn(fd):
+      methods.append((METHOD_DISCARD, _BLKDISCARD))
+
+    methods.append((METHOD_ZEROOUT, _BLKZEROOUT))
+
+    (method, done) = _ZeroWithIoctls(fd, methods, offset, size, chunk_size,
+                                     progress_fn, _ioctl_fn)
+  finally:
+    os.close(fd)
+
+  if method is not None:
+    return method
+
+  logging.info("Device '%s' doesn't support zeroing ranges, writing zeroes",
+               path)
+
+  _WriteZeroes(path, offset + done, size - done, buffer_size,
+               lambda method, wiped: progress_fn(method, done + wiped))
+
+  return METHOD_WRITE
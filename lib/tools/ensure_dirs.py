@@ -175,6 +175,8 @@ def GetPaths():
      getent.masterd_uid, getent.daemons_gid),
     (pathutils.JOB_QUEUE_DRAIN_FILE, FILE, 0644,
      getent.masterd_uid, getent.daemons_gid, False),
+    (pathutils.JOB_QUEUE_INDEX_FILE, FILE, constants.JOB_QUEUE_FILES_PERMS,
+     getent.masterd_uid, getent.daemons_gid, False),
     (pathutils.JOB_QUEUE_LOCK_FILE, FILE, constants.JOB_QUEUE_FILES_PERMS,
      getent.masterd_uid, getent.daemons_gid, False),
     (pathutils.JOB_QUEUE_SERIAL_FILE, FILE, constants.JOB_QUEUE_FILES_PERMS,
@@ -202,6 +204,8 @@ def GetPaths():
      getent.noded_uid, getent.masterd_gid),
     (pathutils.IMPORT_EXPORT_DIR, DIR, 0755,
      getent.noded_uid, getent.masterd_gid),
+    (pathutils.DISK_WIPE_DIR, DIR, 0755,
+     getent.noded_uid, getent.masterd_gid),
     (pathutils.LOG_DIR, DIR, 0770, getent.masterd_uid, getent.daemons_gid),
     (masterd_log, FILE, 0600, getent.masterd_uid, getent.masterd_gid, False),
     (confd_log, FILE, 0600, getent.confd_uid, getent.masterd_gid, False),
@@ -0,0 +1,155 @@
+#
+#
+
+# Copyright (C) 2014 Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+
+"""Helper for copying devices without transferring zeroed regions.
+
+The sending side writes the regions of a device containing data to its
+standard output, the receiving side reads them from its standard input and
+writes them to a device. Streams are encoded and decoded the same way when
+passing through the import/export daemon. See L{ganeti.storage.sparse} for
+details.
+
+"""
+
+import os
+import optparse
+import sys
+import logging
+import time
+
+from ganeti import cli
+from ganeti import constants
+from ganeti import utils
+from ganeti.storage import sparse
+
+
+#: Write the data of a device to standard output
+MODE_SEND = "send"
+
+#: Write data read from standard input to a device
+MODE_RECEIVE = "receive"
+
+#: Write the blocks of standard input which aren't zeroes to standard output
+MODE_ENCODE = "encode"
+
+#: Write the original stream encoded using L{MODE_ENCODE} to standard output
+MODE_DECODE = "decode"
+
+
+def ParseOptions():
+  """Parses the options passed to the program.
+
+  @return: Options and arguments
+
+  """
+  parser = optparse.OptionParser(usage=("%%prog {%s <device> <size>|"
+                                        "%s <device>|%s|%s}" %
+                                        (MODE_SEND, MODE_RECEIVE,
+                                         MODE_ENCODE, MODE_DECODE)),
+                                 prog=os.path.basename(sys.argv[0]))
+  parser.add_option(cli.DEBUG_OPT)
+  parser.add_option(cli.VERBOSE_OPT)
+
+  (opts, args) = parser.parse_args()
+
+  return VerifyOptions(parser, opts, args)
+
+
+def VerifyOptions(parser, opts, args):
+  """Verifies options and arguments for correctness.
+
+  """
+  if not args:
+    parser.error("Expected mode")
+
+  mode = args[0]
+
+  if mode == MODE_SEND:
+    if len(args) != 3:
+      parser.error("Expected device and size in bytes")
+
+    try:
+      size = int(args[2])
+    except ValueError:
+      parser.error("Size must be an integer")
+
+    if size < 0:
+      parser.error("Size must not be negative")
+
+  elif mode == MODE_RECEIVE:
+    if len(args) != 2:
+      parser.error("Expected device")
+
+    size = None
+
+  elif mode in (MODE_ENCODE, MODE_DECODE):
+    if len(args) != 1:
+      parser.error("Mode '%s' doesn't take arguments" % mode)
+
+    return (opts, mode, None, None)
+
+  else:
+    parser.error("Invalid mode '%s'" % mode)
+
+  return (opts, mode, args[1], size)
+
+
+def Main():
+  """Main routine.
+
+  """
+  (opts, mode, device, size) = ParseOptions()
+
+  utils.SetupToolLogging(opts.debug, opts.verbose)
+
+  start = time.time()
+
+  if device is None:
+    device = "standard input"
+
+  try:
+    if mode == MODE_SEND:
+      stats = sparse.SendDevice(device, size, sys.stdout.fileno())
+    elif mode == MODE_RECEIVE:
+      stats = sparse.ReceiveDevice(sys.stdin, device)
+    elif mode == MODE_ENCODE:
+      stats = sparse.EncodeStream(sys.stdin, sys.stdout.fileno())
+    else:
+      stats = sparse.DecodeStream(sys.stdin, sys.stdout.fileno())
+  except Exception: # pylint: disable=W0703
+    logging.exception("Copying '%s' failed", device)
+    return constants.EXIT_FAILURE
+
+  logging.info("Copied %s bytes of '%s' transferring %s bytes and writing"
+               " zeroes to %s bytes in %0.1f seconds", stats.size, device,
+               stats.data, stats.zeroed, time.time() - start)
+
+  return constants.EXIT_SUCCESS
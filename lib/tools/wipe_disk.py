@@ -0,0 +1,208 @@
+#
+#
+
+# Copyright (C) 2014 Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+
+"""Helper for wiping a disk in the background.
+
+Started by the node daemon for every disk to be wiped. The progress is
+reported through a status file, which is read by the node daemon when the
+master asks for the status of the wipe.
+
+"""
+
+import os
+import optparse
+import sys
+import logging
+import time
+
+from ganeti import cli
+from ganeti import constants
+from ganeti import objects
+from ganeti import serializer
+from ganeti import utils
+from ganeti.storage import wipe
+
+
+class StatusFile(object):
+  """Status file manager.
+
+  """
+  def __init__(self, path, size, _time_fn=time.time):
+    """Initializes this class.
+
+    @type path: string
+    @param path: Path to status file
+    @type size: int
+    @param size: Amount of data to be wiped in MiB
+
+    """
+    self._path = path
+    self._time_fn = _time_fn
+    self._data = objects.DiskWipeStatus(ctime=_time_fn(), mtime=None,
+                                        size=size, progress_mbytes=0,
+                                        method=None, exit_status=None,
+                                        error_message=None)
+
+  def SetProgress(self, method, mbytes):
+    """Sets how much data has been wiped so far.
+
+    The status file is written if the minimum interval since the last update
+    has passed.
+
+    """
+    self._data.method = method
+    self._data.progress_mbytes = mbytes
+    self.Update(False)
+
+  def SetExitStatus(self, exit_status, error_message):
+    """Sets the exit status and an error message.
+
+    """
+    # Require error message when status isn't 0
+    assert exit_status == 0 or error_message
+
+    self._data.exit_status = exit_status
+    self._data.error_message = error_message
+
+  def GetData(self):
+    """Returns the current status.
+
+    @rtype: L{objects.DiskWipeStatus}
+
+    """
+    return self._data
+
+  def Update(self, force):
+    """Updates the status file.
+
+    @type force: bool
+    @param force: Write status file in any case, not only when minimum interval
+                  is expired
+
+    """
+    now = self._time_fn()
+
+    if not (force or
+            self._data.mtime is None or
+            now > (self._data.mtime + constants.WIPE_STATUS_INTERVAL)):
+      return
+
+    logging.debug("Updating status file %s", self._path)
+
+    self._data.mtime = now
+    utils.WriteFile(self._path,
+                    data=serializer.DumpJson(self._data.ToDict()),
+                    mode=0400)
+
+
+def ParseOptions():
+  """Parses the options passed to the program.
+
+  @return: Options and arguments
+
+  """
+  parser = optparse.OptionParser(usage=("%prog <status-file> <device>"
+                                        " <offset> <size>"),
+                                 prog=os.path.basename(sys.argv[0]))
+  parser.add_option(cli.DEBUG_OPT)
+  parser.add_option(cli.VERBOSE_OPT)
+
+  (opts, args) = parser.parse_args()
+
+  return VerifyOptions(parser, opts, args)
+
+
+def VerifyOptions(parser, opts, args):
+  """Verifies options and arguments for correctness.
+
+  """
+  if len(args) != 4:
+    parser.error("Expected status file, device, offset and size")
+
+  (status_file, device, offset, size) = args
+
+  try:
+    offset = int(offset)
+    size = int(size)
+  except ValueError:
+    parser.error("Offset and size must be integers")
+
+  if offset < 0 or size < 0:
+    parser.error("Offset and size must not be negative")
+
+  return (opts, status_file, device, offset, size)
+
+
+def GetChunkSize(size):
+  """Computes the size of the ranges zeroed at once.
+
+  @type size: int
+  @param size: Amount of data to be wiped in MiB
+
+  """
+  return max(1, int(min(constants.MAX_WIPE_CHUNK,
+                        size / 100.0 * constants.MIN_WIPE_CHUNK_PERCENT)))
+
+
+def Main():
+  """Main routine.
+
+  """
+  (opts, status_file_path, device, offset, size) = ParseOptions()
+
+  utils.SetupToolLogging(opts.debug, opts.verbose)
+
+  status_file = StatusFile(status_file_path, size)
+
+  # Let the node daemon know the wipe has been started
+  status_file.Update(True)
+
+  try:
+    try:
+      start = time.time()
+
+      method = wipe.WipeDevice(device, offset, size, GetChunkSize(size),
+                               constants.WIPE_BUFFER_SIZE,
+                               status_file.SetProgress)
+
+      logging.info("Wiped %s MiB of '%s' at offset %s MiB using method '%s'"
+                   " in %0.1f seconds", size, device, offset, method,
+                   time.time() - start)
+    except Exception, err: # pylint: disable=W0703
+      logging.exception("Wiping '%s' failed", device)
+      status_file.SetExitStatus(constants.EXIT_FAILURE, str(err))
+    else:
+      status_file.SetProgress(method, size)
+      status_file.SetExitStatus(constants.EXIT_SUCCESS, None)
+  finally:
+    status_file.Update(True)
+
+  return status_file.GetData().exit_status
@@ -146,10 +146,11 @@ class Instance(object):
   """Abstraction for a Virtual Machine instance.
 
   """
-  def __init__(self, name, status, disks_active, snodes):
+  def __init__(self, name, status, disks_active, pnode, snodes):
     self.name = name
     self.status = status
     self.disks_active = disks_active
+    self.pnode = pnode
     self.snodes = snodes
 
   def Restart(self, cl):
@@ -159,13 +160,6 @@ class Instance(object):
     op = opcodes.OpInstanceStartup(instance_name=self.name, force=False)
     cli.SubmitOpCode(op, cl=cl)
 
-  def ActivateDisks(self, cl):
-    """Encapsulates the activation of all disks of an instance.
-
-    """
-    op = opcodes.OpInstanceActivateDisks(instance_name=self.name)
-    cli.SubmitOpCode(op, cl=cl)
-
 
 class Node(object):
   """Data container representing cluster node.
@@ -245,8 +239,13 @@ def _CheckDisks(cl, notepad, nodes, instances, started):
 
   if check_nodes:
     # Activate disks for all instances with any of the checked nodes as a
-    # secondary node.
+    # secondary node, with a separate job per node.
+    ops = []
+    activated = set()
+
     for node in check_nodes:
+      instance_names = []
+
       for instance_name in node.secondaries:
         try:
           inst = instances[instance_name]
@@ -267,18 +266,62 @@ def _CheckDisks(cl, notepad, nodes, instances, started):
                         " it was already started", inst.name)
           continue
 
-        try:
-          logging.info("Activating disks for instance '%s'", inst.name)
-          inst.ActivateDisks(cl)
-        except Exception: # pylint: disable=W0703
-          logging.exception("Error while activating disks for instance '%s'",
-                            inst.name)
+        if inst.name in activated:
+          # the instance has several secondary nodes which were restarted
+          continue
+
+        activated.add(inst.name)
+        instance_names.append(inst.name)
+
+      if instance_names:
+        logging.info("Activating disks for instance(s) %s using node '%s'",
+                     utils.CommaJoin(utils.NiceSort(instance_names)),
+                     node.name)
+        ops.append(opcodes.OpNodeActivateDisks(node_name=node.name,
+                                               instances=instance_names))
+
+    if ops:
+      _ActivateDisks(cl, ops)
 
     # Keep changed boot IDs
     for node in check_nodes:
       notepad.SetNodeBootID(node.name, node.bootid)
 
 
+def _ActivateDisks(cl, ops):
+  """Submits jobs activating disks and logs the failed instances.
+
+  Every opcode is submitted as a separate job, so that a failure on one node
+  doesn't prevent disks from being activated on the others.
+
+  @param ops: list of L{opcodes.OpNodeActivateDisks}
+
+  """
+  try:
+    submitted = cl.SubmitManyJobs([[op] for op in ops])
+  except Exception: # pylint: disable=W0703
+    logging.exception("Error while submitting jobs to activate disks")
+    return
+
+  for (op, (status, job_id)) in zip(ops, submitted):
+    if not status:
+      logging.error("Submitting job to activate disks using node '%s'"
+                    " failed: %s", op.node_name, job_id)
+      continue
+
+    try:
+      (op_result, ) = cli.PollJob(job_id, cl=cl, feedback_fn=logging.debug)
+    except Exception: # pylint: disable=W0703
+      logging.exception("Error while activating disks using node '%s'",
+                        op.node_name)
+      continue
+
+    for (name, success, msg) in op_result:
+      if not success:
+        logging.error("Could not activate disks for instance '%s': %s",
+                      name, msg)
+
+
 def _CheckForOfflineNodes(nodes, instance):
   """Checks if given instances has any secondary in offline status.
 
@@ -307,9 +350,9 @@ def _VerifyDisks(cl, uuid, nodes, instances):
   logging.debug("Will activate disks for instance(s) %s",
                 utils.CommaJoin(offline_disk_instances))
 
-  # We submit only one job, and wait for it. Not optimal, but this puts less
-  # load on the job queue.
-  job = []
+  # We submit only one job with one opcode per primary node, and wait for it.
+  # Not optimal, but this puts less load on the job queue and the nodes.
+  node_instances = {}
   for name in offline_disk_instances:
     try:
       inst = instances[name]
@@ -322,15 +365,14 @@ def _VerifyDisks(cl, uuid, nodes, instances):
                    " or has offline secondaries", name)
       continue
 
-    job.append(opcodes.OpInstanceActivateDisks(instance_name=name))
+    node_instances.setdefault(inst.pnode, []).append(name)
 
-  if job:
-    job_id = cli.SendJob(job, cl=cl)
+  ops = [opcodes.OpNodeActivateDisks(node_name=node_name,
+                                     instances=instance_names)
+         for (node_name, instance_names) in sorted(node_instances.items())]
 
-    try:
-      cli.PollJob(job_id, cl=cl, feedback_fn=logging.debug)
-    except Exception: # pylint: disable=W0703
-      logging.exception("Error while activating disks")
+  if ops:
+    _ActivateDisks(cl, ops)
 
 
 def IsRapiResponding(hostname):
@@ -644,8 +686,8 @@ def _GetGroupData(cl, uuid):
   job = [
     # Get all primary instances in group
     opcodes.OpQuery(what=constants.QR_INSTANCE,
-                    fields=["name", "status", "disks_active", "snodes",
-                            "pnode.group.uuid", "snodes.group.uuid"],
+                    fields=["name", "status", "disks_active", "pnode",
+                            "snodes", "pnode.group.uuid", "snodes.group.uuid"],
                     qfilter=[qlang.OP_EQUAL, "pnode.group.uuid", uuid],
                     use_locking=True,
                     priority=constants.OP_PRIO_LOW),
@@ -677,14 +719,14 @@ def _GetGroupData(cl, uuid):
   instances = []
 
   # Load all instances
-  for (name, status, disks_active, snodes, pnode_group_uuid,
+  for (name, status, disks_active, pnode, snodes, pnode_group_uuid,
        snodes_group_uuid) in raw_instances:
     if snodes and set([pnode_group_uuid]) != set(snodes_group_uuid):
       logging.error("Ignoring split instance '%s', primary group %s, secondary"
                     " groups %s", name, pnode_group_uuid,
                     utils.CommaJoin(snodes_group_uuid))
     else:
-      instances.append(Instance(name, status, disks_active, snodes))
+      instances.append(Instance(name, status, disks_active, pnode, snodes))
 
       for node in snodes:
         secondaries.setdefault(node, set()).add(name)
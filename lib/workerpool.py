@@ -274,8 +274,7 @@ class WorkerPool(object):
   def __init__(self, name, num_workers, worker_class):
     """Constructor for worker pool.
 
-    @param num_workers: number of workers to be started
-        (dynamic resizing is not yet implemented)
+    @param num_workers: number of workers to be started, see L{Resize}
     @param worker_class: the class to be instantiated for workers;
         should derive from L{BaseWorker}
 
@@ -303,8 +302,6 @@ class WorkerPool(object):
     # Start workers
     self.Resize(num_workers)
 
-  # TODO: Implement dynamic resizing?
-
   def _WaitWhileQuiescingUnlocked(self):
     """Wait until the worker pool has finished quiescing.
 
@@ -581,25 +578,42 @@ class WorkerPool(object):
 
     current_count = len(self._workers)
 
-    if current_count == num_workers:
-      # Nothing to do
-      pass
+    if current_count > num_workers:
+      # Idle workers are terminated first, busy ones finish their current
+      # task before terminating
+      # pylint: disable=W0212
+      termworkers = \
+        ([worker for worker in self._workers
+          if not worker._HasRunningTaskUnlocked()] +
+         [worker for worker in self._workers
+          if worker._HasRunningTaskUnlocked()])[:current_count - num_workers]
 
-    elif current_count > num_workers:
-      if num_workers == 0:
-        # Create copy of list to iterate over while lock isn't held.
-        termworkers = self._workers[:]
-        del self._workers[:]
-      else:
-        # TODO: Implement partial downsizing
-        raise NotImplementedError()
-        #termworkers = ...
+      for worker in termworkers:
+        self._workers.remove(worker)
 
       self._termworkers += termworkers
 
       # Notify workers that something has changed
       self._pool_to_worker.notifyAll()
 
+    elif current_count < num_workers:
+      # Create (num_workers - current_count) new workers
+      for _ in range(num_workers - current_count):
+        worker = self._worker_class(self, self._NewWorkerIdUnlocked())
+        self._workers.append(worker)
+        worker.start()
+
+    if num_workers > 0:
+      # Forget about workers which terminated after partial downsizing. They
+      # are not waited for as this may be called by a worker itself.
+      self._termworkers = [worker for worker in self._termworkers
+                           if worker.isAlive()]
+
+    elif self._termworkers:
+      # Create copy of list to iterate over while lock isn't held, including
+      # workers still terminating after partial downsizing
+      termworkers = self._termworkers[:]
+
       # Join all terminating workers
       self._lock.release()
       try:
@@ -620,16 +634,13 @@ class WorkerPool(object):
 
       assert not self._termworkers, "Zombie worker detected"
 
-    elif current_count < num_workers:
-      # Create (num_workers - current_count) new workers
-      for _ in range(num_workers - current_count):
-        worker = self._worker_class(self, self._NewWorkerIdUnlocked())
-        self._workers.append(worker)
-        worker.start()
-
   def Resize(self, num_workers):
     """Changes the number of workers in the pool.
 
+    When terminating all workers this waits for them to finish. Otherwise
+    idle workers are terminated first and the function returns without
+    waiting; busy workers terminate after finishing their current task.
+
     @param num_workers: the new number of workers
 
     """
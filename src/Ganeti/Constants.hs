@@ -300,6 +300,34 @@ maxWipeChunk = 1024
 minWipeChunkPercent :: Int
 minWipeChunkPercent = 10
 
+-- | Size of the buffer used if zeroes have to be written (4MB)
+wipeBufferSize :: Int
+wipeBufferSize = 4
+
+-- | Seconds between updates of the status of a disk wipe
+wipeStatusInterval :: Int
+wipeStatusInterval = 2
+
+-- | Seconds between checks of the progress of disk wipes
+wipePollInterval :: Int
+wipePollInterval = 5
+
+-- | Seconds to wait for a disk wipe to report its status for the first time
+wipeStartTimeout :: Int
+wipeStartTimeout = 60
+
+-- | Seconds a running disk wipe may go without reporting progress before it
+-- is considered stuck
+wipeProgressTimeout :: Int
+wipeProgressTimeout = 600
+
+-- * Block device assembly
+
+-- | Maximum number of block devices assembled or opened in parallel by a
+-- node daemon RPC call
+blockdevAssembleWorkers :: Int
+blockdevAssembleWorkers = 8
+
 -- * Directories
 
 runDirsMode :: Int
@@ -571,8 +599,14 @@ iecGzip = "gzip"
 iecNone :: String
 iecNone = "none"
 
+iecZstd :: String
+iecZstd = "zstd"
+
+iecLz4 :: String
+iecLz4 = "lz4"
+
 iecAll :: [String]
-iecAll = [iecGzip, iecNone]
+iecAll = [iecGzip, iecNone, iecZstd, iecLz4]
 
 ieCustomSize :: String
 ieCustomSize = "fd"
@@ -1278,6 +1312,25 @@ rpcTmo_1day = Types.rpcTimeoutToRaw OneDay
 rpcConnectTimeout :: Int
 rpcConnectTimeout = 5
 
+-- | Maximum number of idle connections kept open per node by the RPC
+-- client
+rpcPoolMaxIdle :: Int
+rpcPoolMaxIdle = 4
+
+-- | Time after which idle RPC client connections are closed (seconds)
+rpcPoolIdleTimeout :: Int
+rpcPoolIdleTimeout = 30
+
+-- | Time the node daemon waits for another request on a persistent
+-- connection (seconds); must be longer than 'rpcPoolIdleTimeout'
+nodedKeepaliveTimeout :: Int
+nodedKeepaliveTimeout = 60
+
+-- | Time the RAPI daemon waits for another request on a persistent
+-- connection (seconds), only used with pre-forked or threaded workers
+rapiKeepaliveTimeout :: Int
+rapiKeepaliveTimeout = 15
+
 -- OS
 
 osScriptCreate :: String
@@ -3292,6 +3345,49 @@ opPrioSubmitValid = ConstantUtils.mkSet [opPrioLow, opPrioNormal, opPrioHigh]
 opPrioDefault :: Int
 opPrioDefault = opPrioNormal
 
+-- * OpCode execution phases
+--
+-- Phases recorded in the timeline of an opcode. Spans of different phases
+-- can be nested, e.g. RPCs made while running hooks.
+
+-- | Acquiring locks
+opPhaseLock :: String
+opPhaseLock = "lock"
+
+-- | Checking the prerequisites of a logical unit
+opPhasePrereq :: String
+opPhasePrereq = "prereq"
+
+-- | Running hooks
+opPhaseHooks :: String
+opPhaseHooks = "hooks"
+
+-- | Executing a logical unit
+opPhaseExec :: String
+opPhaseExec = "exec"
+
+-- | Making RPCs to nodes
+opPhaseRpc :: String
+opPhaseRpc = "rpc"
+
+-- | Writing and distributing the configuration
+opPhaseConfig :: String
+opPhaseConfig = "config"
+
+-- | Writing and replicating the job file
+opPhaseReplication :: String
+opPhaseReplication = "replication"
+
+opPhases :: FrozenSet String
+opPhases =
+  ConstantUtils.mkSet [opPhaseLock, opPhasePrereq, opPhaseHooks, opPhaseExec,
+                       opPhaseRpc, opPhaseConfig, opPhaseReplication]
+
+-- | Maximum number of spans in the timeline of an opcode, the durations of
+-- further spans are added to the last span of the same phase
+opTimelineMaxSpans :: Int
+opTimelineMaxSpans = 500
+
 -- * Lock recalculate mode
 
 locksAppend :: String
@@ -236,6 +236,15 @@ opNodeEvacuate :: String
 opNodeEvacuate =
   "Evacuate instances off a number of nodes."
 
+opNodeActivateDisks :: String
+opNodeActivateDisks =
+  "Activate the disks of the instances using a node.\n\
+\\n\
+\  The disks are assembled with one RPC call per node. The result contains\n\
+\  the name of every instance, whether its disks could be activated and an\n\
+\  error message otherwise. Instances which no longer use the node are\n\
+\  skipped."
+
 opInstanceCreate :: String
 opInstanceCreate =
   "Create an instance.\n\
@@ -128,6 +128,8 @@ $(buildObject "QueuedOpCode" "qo"
     simpleField "exec_timestamp"  [t| Timestamp   |]
   , optionalNullSerField $
     simpleField "end_timestamp"   [t| Timestamp   |]
+  , defaultField [| [] |] $
+    simpleField "timeline"        [t| [(String, Double, Double)] |]
   ])
 
 $(buildObject "QueuedJob" "qj"
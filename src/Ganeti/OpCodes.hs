@@ -267,6 +267,11 @@ $(genOpCode "OpCode"
      , pUseLocking
      , pQueryFields
      , pQueryFilter
+     , pQuerySortBy
+     , pQueryLimit
+     , pQueryOffset
+     , pQueryCountOnly
+     , pQueryMaxAge
      ],
      "what")
   , ("OpQueryFields",
@@ -421,6 +426,15 @@ $(genOpCode "OpCode"
      , pEvacMode
      ],
      "node_name")
+  , ("OpNodeActivateDisks",
+     [t| [(NonEmptyString, Bool, String)] |],
+     OpDoc.opNodeActivateDisks,
+     [ pNodeName
+     , pNodeUuid
+     , pInstances
+     , pIgnoreDiskSize
+     ],
+     "node_name")
   , ("OpInstanceCreate",
      [t| [NonEmptyString] |],
      OpDoc.opInstanceCreate,
@@ -459,6 +473,8 @@ $(genOpCode "OpCode"
      , pSrcPath
      , pStartInstance
      , pInstTags
+     , pIeCompress
+     , pIeBufferSize
      ],
      "instance_name")
   , ("OpInstanceMultiAlloc",
@@ -808,6 +824,8 @@ $(genOpCode "OpCode"
      , defaultField [| ExportModeLocal |] pExportMode
      , pX509KeyName
      , pX509DestCA
+     , pIeCompress
+     , pIeBufferSize
      ],
      "instance_name")
   , ("OpBackupRemove",
@@ -984,6 +1002,7 @@ opSummaryVal OpNodeSetParams { opNodeName = s } = Just (fromNonEmpty s)
 opSummaryVal OpNodePowercycle { opNodeName = s } = Just (fromNonEmpty s)
 opSummaryVal OpNodeMigrate { opNodeName = s } = Just (fromNonEmpty s)
 opSummaryVal OpNodeEvacuate { opNodeName = s } = Just (fromNonEmpty s)
+opSummaryVal OpNodeActivateDisks { opNodeName = s } = Just (fromNonEmpty s)
 opSummaryVal OpInstanceCreate { opInstanceName = s } = Just s
 opSummaryVal OpInstanceReinstall { opInstanceName = s } = Just s
 opSummaryVal OpInstanceSnapshot { opInstanceName = s } = Just s
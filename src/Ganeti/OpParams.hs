@@ -149,6 +149,11 @@ module Ganeti.OpParams
   , pUseExternalMipScript
   , pQueryFields
   , pQueryFilter
+  , pQuerySortBy
+  , pQueryLimit
+  , pQueryOffset
+  , pQueryCountOnly
+  , pQueryMaxAge
   , pQueryFieldsFields
   , pOobCommand
   , pOobTimeout
@@ -218,6 +223,8 @@ module Ganeti.OpParams
   , pIgnoreRemoveFailures
   , pX509KeyName
   , pX509DestCA
+  , pIeCompress
+  , pIeBufferSize
   , pTagSearchPattern
   , pRestrictedCommand
   , pReplaceDisksMode
@@ -784,6 +791,34 @@ pQueryFilter =
   withDoc "Query filter" .
   optionalField $ simpleField "qfilter" [t| [JSValue] |]
 
+pQuerySortBy :: Field
+pQuerySortBy =
+  withDoc "Fields to sort the result by; prefix a field with \"-\" to\
+          \ sort in descending order" .
+  optionalField $ simpleField "sort_by" [t| [NonEmptyString] |]
+
+pQueryLimit :: Field
+pQueryLimit =
+  withDoc "Maximum number of items to return" .
+  optionalField $ simpleField "limit" [t| NonNegative Int |]
+
+pQueryOffset :: Field
+pQueryOffset =
+  withDoc "Number of leading items to skip" .
+  defaultField [| forceNonNeg (0::Int) |] $
+  simpleField "offset" [t| NonNegative Int |]
+
+pQueryCountOnly :: Field
+pQueryCountOnly =
+  withDoc "Whether to only count the matching items" $
+  defaultFalse "count_only"
+
+pQueryMaxAge :: Field
+pQueryMaxAge =
+  withDoc "Maximum age in seconds of cached live data to use; if not given,\
+          \ live data is always collected from nodes" .
+  optionalField $ simpleField "max_age" [t| NonNegative Int |]
+
 pQueryFieldsFields :: Field
 pQueryFieldsFields =
   withDoc "Requested fields; if not given, all are returned" .
@@ -1442,6 +1477,17 @@ pX509DestCA =
   withDoc "Destination X509 CA (remote export only)" $
   optionalNEStringField "destination_x509_ca"
 
+pIeCompress :: Field
+pIeCompress =
+  withDoc "Compression method for the disk data transfers (default:\
+          \ none within the cluster, gzip between clusters)" $
+  optionalNEStringField "compress"
+
+pIeBufferSize :: Field
+pIeBufferSize =
+  withDoc "Size of the disk data transfer buffers in bytes" .
+  optionalField $ simpleField "transfer_buffer_size" [t| Positive Int |]
+
 pTagsObject :: Field
 pTagsObject =
   withDoc "Tag kind" $
@@ -93,6 +93,20 @@ opsOptGetter f =
                                          Nothing -> J.JSNull
                                          Just a -> J.showJSON a) . qjOps)
 
+-- | Returns the time an opcode spent in an execution phase.
+opPhaseTime :: String -> QueuedOpCode -> Double
+opPhaseTime phase =
+  sum . map (\(_, _, duration) -> duration) .
+  filter (\(name, _, _) -> name == phase) . qoTimeline
+
+-- | Builds the field for the time spent in an execution phase.
+opPhaseTimeField :: (String, String, String)
+                 -> FieldData JobId RuntimeData
+opPhaseTimeField (phase, title, desc) =
+  (FieldDefinition ("op" ++ phase ++ "time") ("OpCode_" ++ title ++ "Time")
+     QFTOther ("List of opcode times in seconds spent " ++ desc),
+   opsGetter (opPhaseTime phase), QffNormal)
+
 -- | Archived field name.
 archivedField :: String
 archivedField = "archived"
@@ -134,6 +148,10 @@ jobFields =
      opsOptGetter qoEndTimestamp, QffNormal)
   , (FieldDefinition "oppriority" "OpCode_prio" QFTOther
        "List of opcode priorities", opsGetter qoPriority, QffNormal)
+  , (FieldDefinition "optimeline" "OpCode_timeline" QFTOther
+       "List of opcode timelines, each a list of execution phase spans\
+       \ (phase, start timestamp and duration in seconds)",
+     opsGetter qoTimeline, QffNormal)
   , (FieldDefinition "summary" "Summary" QFTOther
        "List of per-opcode summaries",
      opsGetter (extractOpSummary . qoInput), QffNormal)
@@ -146,7 +164,17 @@ jobFields =
   , (FieldDefinition "end_ts" "End" QFTOther
        (tsDoc "Timestamp of job end"),
      FieldRuntime (maybeJobOpt qjEndTimestamp), QffTimestamp)
-  ]
+  ] ++
+  map opPhaseTimeField
+    [ (C.opPhaseLock, "Lock", "waiting for locks")
+    , (C.opPhasePrereq, "Prereq", "checking prerequisites")
+    , (C.opPhaseHooks, "Hooks", "running hooks")
+    , (C.opPhaseExec, "Exec", "executing")
+    , (C.opPhaseRpc, "Rpc", "making RPC calls")
+    , (C.opPhaseConfig, "Config", "writing the configuration")
+    , (C.opPhaseReplication, "Replication",
+       "writing and replicating the job file")
+    ]
 
 -- | The node fields map.
 fieldsMap :: FieldMap JobId RuntimeData
@@ -75,7 +75,7 @@ genQueuedOpCode =
   QueuedOpCode <$> pure (ValidOpCode $ wrapOpCode OpClusterQuery) <*>
     arbitrary <*> pure JSNull <*> pure [] <*>
     choose (C.opPrioLowest, C.opPrioHighest) <*>
-    pure justNoTs <*> pure justNoTs <*> pure justNoTs
+    pure justNoTs <*> pure justNoTs <*> pure justNoTs <*> pure []
 
 -- | Generates an static, empty job.
 emptyJob :: (Monad m) => m QueuedJob
@@ -204,7 +204,8 @@ instance Arbitrary OpCodes.OpCode where
         pure OpCodes.OpClusterDeactivateMasterIp
       "OP_QUERY" ->
         OpCodes.OpQuery <$> arbitrary <*> arbitrary <*> arbitrary <*>
-        pure Nothing
+        pure Nothing <*> genMaybe genFieldsNE <*> arbitrary <*>
+        arbitrary <*> arbitrary <*> arbitrary
       "OP_QUERY_FIELDS" ->
         OpCodes.OpQueryFields <$> arbitrary <*> arbitrary
       "OP_OOB_COMMAND" ->
@@ -246,6 +247,9 @@ instance Arbitrary OpCodes.OpCode where
         OpCodes.OpNodeEvacuate <$> arbitrary <*> genNodeNameNE <*>
           return Nothing <*> genMaybe genNodeNameNE <*> return Nothing <*>
           genMaybe genNameNE <*> arbitrary
+      "OP_NODE_ACTIVATE_DISKS" ->
+        OpCodes.OpNodeActivateDisks <$> genNodeNameNE <*> return Nothing <*>
+          genNodeNamesNE <*> arbitrary
       "OP_INSTANCE_CREATE" ->
         OpCodes.OpInstanceCreate <$> genFQDN <*> arbitrary <*>
           arbitrary <*> arbitrary <*> arbitrary <*> arbitrary <*>
@@ -257,7 +261,8 @@ instance Arbitrary OpCodes.OpCode where
           genMaybe genNodeNameNE <*> return Nothing <*> genMaybe (pure []) <*>
           genMaybe genNodeNameNE <*> arbitrary <*> genMaybe genNodeNameNE <*>
           return Nothing <*> genMaybe genNodeNameNE <*> genMaybe genNameNE <*>
-          arbitrary <*> (genTags >>= mapM mkNonEmpty)
+          arbitrary <*> (genTags >>= mapM mkNonEmpty) <*>
+          genMaybe genNameNE <*> arbitrary
       "OP_INSTANCE_MULTI_ALLOC" ->
         OpCodes.OpInstanceMultiAlloc <$> arbitrary <*> genMaybe genNameNE <*>
         pure []
@@ -348,7 +353,7 @@ instance Arbitrary OpCodes.OpCode where
         OpCodes.OpBackupExport <$> genFQDN <*> return Nothing <*>
           arbitrary <*> arbitrary <*> return Nothing <*> arbitrary <*>
           arbitrary <*> arbitrary <*> arbitrary <*> genMaybe (pure []) <*>
-          genMaybe genNameNE
+          genMaybe genNameNE <*> genMaybe genNameNE <*> arbitrary
       "OP_BACKUP_REMOVE" ->
         OpCodes.OpBackupRemove <$> genFQDN <*> return Nothing
       "OP_TEST_ALLOCATOR" ->
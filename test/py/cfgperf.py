@@ -0,0 +1,190 @@
+#!/usr/bin/python
+#
+
+# Copyright (C) 2014 Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Script for measuring the cost of configuration updates"""
+
+import time
+import zlib
+import base64
+import optparse
+
+from ganeti import config_delta
+from ganeti import serializer
+
+
+def ParseOptions():
+  """Parses the command line options.
+
+  In case of command line errors, it will show the usage and exit the
+  program.
+
+  @return: the options in a tuple
+
+  """
+  parser = optparse.OptionParser()
+  parser.add_option("-n", dest="instance_counts", default="100,1000,10000",
+                    help="Comma-separated list of instance counts",
+                    metavar="LIST")
+  parser.add_option("-u", dest="updates", default=20, type="int",
+                    help="Number of updates per configuration size",
+                    metavar="NUM")
+  parser.add_option("-c", dest="candidates", default=10, type="int",
+                    help="Number of master candidates receiving the"
+                    " configuration", metavar="NUM")
+
+  (opts, args) = parser.parse_args()
+
+  try:
+    opts.instance_counts = [int(i) for i in opts.instance_counts.split(",")]
+  except ValueError:
+    parser.error("Invalid instance counts")
+
+  if opts.updates < 1:
+    parser.error("Number of updates must be at least 1")
+
+  if opts.candidates < 0:
+    parser.error("Number of master candidates must not be negative")
+
+  return (opts, args)
+
+
+def _MakeConfig(instance_count):
+  """Builds a synthetic configuration dictionary.
+
+  """
+  node_count = max(1, instance_count / 20)
+
+  nodes = dict(("node%d-uuid" % i, {
+    "name": "node%d.example.com" % i,
+    "primary_ip": "192.0.2.%d" % (i % 256),
+    "secondary_ip": "198.51.100.%d" % (i % 256),
+    "group": "group-uuid",
+    "master_candidate": i < 10,
+    "ndparams": {},
+    "serial_no": 1,
+    }) for i in range(node_count))
+
+  instances = dict(("inst%d-uuid" % i, {
+    "name": "inst%d.example.com" % i,
+    "primary_node": "node%d-uuid" % (i % node_count),
+    "os": "debootstrap+default",
+    "hypervisor": "kvm",
+    "hvparams": {},
+    "beparams": { "maxmem": 1024, "minmem": 1024, "vcpus": 1, },
+    "osparams": {},
+    "admin_state": "up",
+    "nics": [{ "mac": "aa:00:00:%02x:%02x:%02x" %
+               ((i >> 16) & 0xff, (i >> 8) & 0xff, i & 0xff),
+               "nicparams": {}, }],
+    "disks": [{ "dev_type": "plain", "size": 10240, "mode": "rw",
+                "logical_id": ["xenvg", "inst%d-disk0" % i],
+                "uuid": "inst%d-disk0-uuid" % i, }],
+    "disk_template": "plain",
+    "serial_no": 1,
+    }) for i in range(instance_count))
+
+  return {
+    "version": 2100000,
+    "serial_no": 1,
+    "mtime": time.time(),
+    "cluster": { "cluster_name": "cluster.example.com", },
+    "nodegroups": { "group-uuid": { "name": "default", }, },
+    "nodes": nodes,
+    "instances": instances,
+    "networks": {},
+    }
+
+
+def _Encode(txt, candidates):
+  """Encodes data for all master candidates like the RPC client does.
+
+  """
+  for _ in range(candidates):
+    if len(txt) >= 512:
+      base64.b64encode(zlib.compress(txt, 3))
+
+
+def _Measure(data, updates, candidates):
+  """Measures full and delta-based updates for one configuration.
+
+  """
+  instances = sorted(data["instances"].keys())
+
+  full_time = 0.0
+  full_size = 0
+  delta_time = 0.0
+  delta_size = 0
+
+  (_, parts) = config_delta.SerializeConfig(data)
+
+  for i in range(updates):
+    inst = data["instances"][instances[i % len(instances)]]
+    inst["admin_state"] = ["up", "down"][inst["admin_state"] == "up"]
+    inst["serial_no"] += 1
+    data["serial_no"] += 1
+    data["mtime"] = time.time()
+
+    start = time.time()
+    txt = serializer.DumpJson(data)
+    _Encode(txt, candidates)
+    full_time += time.time() - start
+    full_size += len(txt)
+
+    start = time.time()
+    (_, new_parts) = config_delta.SerializeConfig(data)
+    (delta, _) = config_delta.ComputeDelta(parts, new_parts, data)
+    txt = serializer.DumpJson(delta)
+    _Encode(txt, candidates)
+    delta_size += len(txt)
+    delta_time += time.time() - start
+
+    parts = new_parts
+
+  return (full_time / updates, full_size / updates,
+          delta_time / updates, delta_size / updates)
+
+
+def main():
+  (opts, _) = ParseOptions()
+
+  print ("%10s %14s %14s %14s %14s" %
+         ("Instances", "Full (ms)", "Full (bytes)", "Delta (ms)",
+          "Delta (bytes)"))
+
+  for count in opts.instance_counts:
+    (full_time, full_size, delta_time, delta_size) = \
+      _Measure(_MakeConfig(count), opts.updates, opts.candidates)
+    print ("%10d %14.2f %14d %14.2f %14d" %
+           (count, 1000.0 * full_time, full_size, 1000.0 * delta_time,
+            delta_size))
+
+
+if __name__ == "__main__":
+  main()
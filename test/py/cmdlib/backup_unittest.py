@@ -111,11 +111,12 @@ class TestLUBackupExportBase(CmdlibTestCase):
       self.RpcResultsBuilder() \
         .CreateSuccessfulNodeResult(self.master, True)
 
-    self.rpc.call_blockdev_assemble.return_value = \
+    self.rpc.call_blockdev_assemble_multi.return_value = \
       self.RpcResultsBuilder() \
-        .CreateSuccessfulNodeResult(self.master, ("/dev/mock_path",
-                                                  "/dev/mock_link_name",
-                                                  None))
+        .CreateSuccessfulNodeResult(self.master,
+                                    [[(True, ("/dev/mock_path",
+                                              "/dev/mock_link_name", None),
+                                       [])]])
 
     self.rpc.call_blockdev_shutdown.return_value = \
       self.RpcResultsBuilder() \
@@ -193,6 +194,26 @@ class TestLUBackupExportLocalExport(TestLUBackupExportBase):
     op = self.CopyOpCode(self.op, remove_instance=True)
     self.ExecOpCode(op)
 
+  def testExportCompressed(self):
+    op = self.CopyOpCode(self.op, compress=constants.IEC_ZSTD,
+                         transfer_buffer_size=4 * 1024 * 1024)
+    self.ExecOpCode(op)
+
+    opts = self.rpc.call_import_start.call_args[0][1]
+    self.assertEqual(opts.compress, constants.IEC_ZSTD)
+    self.assertEqual(opts.buffer_size, 4 * 1024 * 1024)
+
+  def testExportUncompressedByDefault(self):
+    self.ExecOpCode(self.op)
+
+    opts = self.rpc.call_import_start.call_args[0][1]
+    self.assertEqual(opts.compress, constants.IEC_NONE)
+    self.assertEqual(opts.buffer_size, None)
+
+  def testInvalidCompression(self):
+    op = self.CopyOpCode(self.op, compress="rar")
+    self.ExecOpCodeExpectOpPrereqError(op, "Invalid compression method")
+
 
 class TestLUBackupExportRemoteExport(TestLUBackupExportBase):
   def setUp(self):
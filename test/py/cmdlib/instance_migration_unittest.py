@@ -135,10 +135,11 @@ class TestLUInstanceFailover(CmdlibTestCase):
     self.rpc.call_blockdev_shutdown.return_value = \
       self.RpcResultsBuilder() \
         .CreateSuccessfulNodeResult(self.master, True)
-    self.rpc.call_blockdev_assemble.return_value = \
+    self.rpc.call_blockdev_assemble_multi.return_value = \
       self.RpcResultsBuilder() \
         .CreateSuccessfulNodeResult(self.snode,
-                                    ("/dev/mock", "/var/mock", None))
+                                    [[(True, ("/dev/mock", "/var/mock", None),
+                                       [])]])
     self.rpc.call_instance_start.return_value = \
       self.RpcResultsBuilder() \
         .CreateSuccessfulNodeResult(self.snode, True)
@@ -1259,21 +1259,95 @@ class _ConfigForDiskWipe:
 
 
 class _RpcForDiskWipe:
-  def __init__(self, exp_node, pause_cb, wipe_cb):
+  def __init__(self, exp_node, pause_cb, wipe_cb, chunk_wipe_cb=None):
     self._exp_node = exp_node
     self._pause_cb = pause_cb
     self._wipe_cb = wipe_cb
+    self._chunk_wipe_cb = chunk_wipe_cb
+    self.cleaned_up = []
 
   def call_blockdev_pause_resume_sync(self, node, disks, pause):
     assert node == self._exp_node
     return rpc.RpcResult(data=self._pause_cb(disks, pause))
 
+  def call_blockdev_wipe_start(self, node, disks, offsets):
+    assert node == self._exp_node
+    if self._chunk_wipe_cb:
+      # Simulate a node running an older version
+      return rpc.RpcResult(data="Not Found", failed=True, unknown_call=True)
+    return rpc.RpcResult(data=self._wipe_cb.Start(disks, offsets))
+
   def call_blockdev_wipe(self, node, bdev, offset, size):
     assert node == self._exp_node
-    return rpc.RpcResult(data=self._wipe_cb(bdev, offset, size))
+    return rpc.RpcResult(data=self._chunk_wipe_cb(bdev, offset, size))
+
+  def call_blockdev_wipe_status(self, node, names):
+    assert node == self._exp_node
+    return rpc.RpcResult(data=self._wipe_cb.GetStatus(names))
+
+  def call_blockdev_wipe_cleanup(self, node, names):
+    assert node == self._exp_node
+    self.cleaned_up.extend(names)
+    return rpc.RpcResult(data=(True, None))
 
 
 class _DiskWipeProgressTracker:
+  """Simulates disk wipes running on a node.
+
+  Every time the status is queried each wipe progresses by one step.
+
+  """
+  def __init__(self, start_offset, fail=None):
+    self._start_offset = start_offset
+    self._fail = fail
+    self._wipes = {}
+    self.progress = {}
+
+  def Start(self, (disks, _), offsets):
+    assert len(disks) == len(offsets)
+
+    names = []
+    for (disk, offset) in zip(disks, offsets):
+      assert isinstance(offset, (long, int))
+      assert offset == self._start_offset
+      assert offset <= disk.size
+      assert disk.logical_id not in self.progress
+
+      name = "wipe-%s" % disk.logical_id
+      self._wipes[name] = disk
+      self.progress[disk.logical_id] = offset
+      names.append(name)
+
+    return (True, names)
+
+  def GetStatus(self, names):
+    result = []
+
+    for name in names:
+      disk = self._wipes[name]
+      size = disk.size - self._start_offset
+      done = self.progress[disk.logical_id] - self._start_offset
+
+      status = {
+        "size": size,
+        "progress_mbytes": done,
+        }
+
+      if disk.logical_id == self._fail:
+        status["exit_status"] = constants.EXIT_FAILURE
+        status["error_message"] = "I/O error"
+      elif done >= size:
+        status["exit_status"] = constants.EXIT_SUCCESS
+      else:
+        self.progress[disk.logical_id] += min(size - done,
+                                              max(1, size / 3))
+
+      result.append(objects.DiskWipeStatus.FromDict(status))
+
+    return (True, result)
+
+
+class _ChunkWipeProgressTracker:
   def __init__(self, start_offset):
     self._start_offset = start_offset
     self.progress = {}
@@ -1291,8 +1365,6 @@ class _DiskWipeProgressTracker:
     assert size <= constants.MAX_WIPE_CHUNK
     assert size <= max_chunk_size
 
-    assert offset == self._start_offset or disk.logical_id in self.progress
-
     # Keep track of progress
     cur_progress = self.progress.setdefault(disk.logical_id, self._start_offset)
 
@@ -1329,19 +1401,16 @@ class TestWipeDisks(unittest.TestCase):
                             disk_template=constants.DT_PLAIN,
                             disks=disks)
 
-    self.assertRaises(errors.OpExecError, instance.WipeDisks, lu, inst)
-
-  def _FailingWipeCb(self, (disk, _), offset, size):
-    # This should only ever be called for the first disk
-    self.assertEqual(disk.logical_id, "disk0")
-    return (False, None)
+    self.assertRaises(errors.OpExecError, instance.WipeDisks, lu, inst,
+                      _sleep_fn=NotImplemented)
 
   def testFailingWipe(self):
     node_uuid = "node13445-uuid"
     pt = _DiskPauseTracker()
+    progresst = _DiskWipeProgressTracker(0, fail="disk1")
 
-    lu = _FakeLU(rpc=_RpcForDiskWipe(node_uuid, pt, self._FailingWipeCb),
-                 cfg=_ConfigForDiskWipe(node_uuid))
+    rpc_runner = _RpcForDiskWipe(node_uuid, pt, progresst)
+    lu = _FakeLU(rpc=rpc_runner, cfg=_ConfigForDiskWipe(node_uuid))
 
     disks = [
       objects.Disk(dev_type=constants.DT_PLAIN, logical_id="disk0",
@@ -1357,12 +1426,16 @@ class TestWipeDisks(unittest.TestCase):
                             disks=disks)
 
     try:
-      instance.WipeDisks(lu, inst)
+      instance.WipeDisks(lu, inst, _sleep_fn=lambda _: None)
     except errors.OpExecError, err:
-      self.assertTrue(str(err), "Could not wipe disk 0 at offset 0 ")
+      self.assertTrue(str(err).startswith("Could not wipe disk 1: I/O error"))
     else:
       self.fail("Did not raise exception")
 
+    # All disk wipes must have been cleaned up
+    self.assertEqual(rpc_runner.cleaned_up,
+                     ["wipe-disk0", "wipe-disk1", "wipe-disk2"])
+
     # Check if all disks were paused and resumed
     self.assertEqual(pt.history, [
       ("disk0", 100 * 1024, True),
@@ -1373,20 +1446,88 @@ class TestWipeDisks(unittest.TestCase):
       ("disk2", 256, False),
       ])
 
+  def testMissingStatus(self):
+    node_uuid = "node20034-uuid"
+
+    class _NeverStarted(_DiskWipeProgressTracker):
+      def GetStatus(self, names):
+        return (True, [None] * len(names))
+
+    rpc_runner = _RpcForDiskWipe(node_uuid, _DiskPauseTracker(),
+                                 _NeverStarted(0))
+    lu = _FakeLU(rpc=rpc_runner, cfg=_ConfigForDiskWipe(node_uuid))
+
+    inst = objects.Instance(name="inst6628",
+                            primary_node=node_uuid,
+                            disk_template=constants.DT_PLAIN,
+                            disks=[
+      objects.Disk(dev_type=constants.DT_PLAIN, logical_id="disk0",
+                   size=1024),
+      ])
+
+    sleeps = []
+
+    def _Sleep(duration):
+      self.assertTrue(len(sleeps) < 1000)
+      sleeps.append(duration)
+
+    # Let the time pass without actually waiting
+    with mock.patch("time.time", side_effect=lambda: sum(sleeps)):
+      self.assertRaises(errors.OpExecError, instance.WipeDisks, lu, inst,
+                        _sleep_fn=_Sleep)
+
+    self.assertTrue(sum(sleeps) > constants.WIPE_START_TIMEOUT)
+    self.assertEqual(rpc_runner.cleaned_up, ["wipe-disk0"])
+
+  def testStalledWipe(self):
+    node_uuid = "node1804-uuid"
+
+    class _Stalled(_DiskWipeProgressTracker):
+      def GetStatus(self, names):
+        return (True, [objects.DiskWipeStatus(size=1024, progress_mbytes=100,
+                                              exit_status=None)
+                       for _ in names])
+
+    rpc_runner = _RpcForDiskWipe(node_uuid, _DiskPauseTracker(),
+                                 _Stalled(0))
+    lu = _FakeLU(rpc=rpc_runner, cfg=_ConfigForDiskWipe(node_uuid))
+
+    inst = objects.Instance(name="inst31187",
+                            primary_node=node_uuid,
+                            disk_template=constants.DT_PLAIN,
+                            disks=[
+      objects.Disk(dev_type=constants.DT_PLAIN, logical_id="disk0",
+                   size=1024),
+      ])
+
+    sleeps = []
+
+    def _Sleep(duration):
+      self.assertTrue(len(sleeps) < 1000)
+      sleeps.append(duration)
+
+    # Let the time pass without actually waiting
+    with mock.patch("time.time", side_effect=lambda: sum(sleeps)):
+      self.assertRaises(errors.OpExecError, instance.WipeDisks, lu, inst,
+                        _sleep_fn=_Sleep)
+
+    self.assertTrue(sum(sleeps) >= constants.WIPE_PROGRESS_TIMEOUT)
+    self.assertEqual(rpc_runner.cleaned_up, ["wipe-disk0"])
+
   def _PrepareWipeTest(self, start_offset, disks):
     node_name = "node-with-offset%s.example.com" % start_offset
     pauset = _DiskPauseTracker()
     progresst = _DiskWipeProgressTracker(start_offset)
 
-    lu = _FakeLU(rpc=_RpcForDiskWipe(node_name, pauset, progresst),
-                 cfg=_ConfigForDiskWipe(node_name))
+    rpc_runner = _RpcForDiskWipe(node_name, pauset, progresst)
+    lu = _FakeLU(rpc=rpc_runner, cfg=_ConfigForDiskWipe(node_name))
 
     instance = objects.Instance(name="inst3560",
                                 primary_node=node_name,
                                 disk_template=constants.DT_PLAIN,
                                 disks=disks)
 
-    return (lu, instance, pauset, progresst)
+    return (lu, instance, pauset, progresst, rpc_runner)
 
   def testNormalWipe(self):
     disks = [
@@ -1398,9 +1539,9 @@ class TestWipeDisks(unittest.TestCase):
                    size=constants.MAX_WIPE_CHUNK),
       ]
 
-    (lu, inst, pauset, progresst) = self._PrepareWipeTest(0, disks)
+    (lu, inst, pauset, progresst, rpc_runner) = self._PrepareWipeTest(0, disks)
 
-    instance.WipeDisks(lu, inst)
+    instance.WipeDisks(lu, inst, _sleep_fn=lambda _: None)
 
     self.assertEqual(pauset.history, [
       ("disk0", 1024, True),
@@ -1417,6 +1558,43 @@ class TestWipeDisks(unittest.TestCase):
     self.assertEqual(progresst.progress,
                      dict((i.logical_id, i.size) for i in disks))
 
+    self.assertEqual(rpc_runner.cleaned_up,
+                     ["wipe-disk0", "wipe-disk1", "wipe-disk2", "wipe-disk3"])
+
+  def testChunkWipeFallback(self):
+    node_uuid = "node7164-uuid"
+    pauset = _DiskPauseTracker()
+    chunkt = _ChunkWipeProgressTracker(0)
+
+    rpc_runner = _RpcForDiskWipe(node_uuid, pauset, NotImplemented,
+                                 chunk_wipe_cb=chunkt)
+    lu = _FakeLU(rpc=rpc_runner, cfg=_ConfigForDiskWipe(node_uuid))
+
+    disks = [
+      objects.Disk(dev_type=constants.DT_PLAIN, logical_id="disk0", size=1024),
+      objects.Disk(dev_type=constants.DT_PLAIN, logical_id="disk1",
+                   size=500 * 1024),
+      ]
+
+    inst = objects.Instance(name="inst19402",
+                            primary_node=node_uuid,
+                            disk_template=constants.DT_PLAIN,
+                            disks=disks)
+
+    instance.WipeDisks(lu, inst, _sleep_fn=NotImplemented)
+
+    # Ensure the complete disks have been wiped in chunks
+    self.assertEqual(chunkt.progress,
+                     dict((i.logical_id, i.size) for i in disks))
+    self.assertEqual(rpc_runner.cleaned_up, [])
+
+    self.assertEqual(pauset.history, [
+      ("disk0", 1024, True),
+      ("disk1", 500 * 1024, True),
+      ("disk0", 1024, False),
+      ("disk1", 500 * 1024, False),
+      ])
+
   def testWipeWithStartOffset(self):
     for start_offset in [0, 280, 8895, 1563204]:
       disks = [
@@ -1426,12 +1604,13 @@ class TestWipeDisks(unittest.TestCase):
                      size=start_offset + (100 * 1024)),
         ]
 
-      (lu, inst, pauset, progresst) = \
+      (lu, inst, pauset, progresst, _) = \
         self._PrepareWipeTest(start_offset, disks)
 
       # Test start offset with only one disk
       instance.WipeDisks(lu, inst,
-                         disks=[(1, disks[1], start_offset)])
+                         disks=[(1, disks[1], start_offset)],
+                         _sleep_fn=lambda _: None)
 
       # Only the second disk may have been paused and wiped
       self.assertEqual(pauset.history, [
@@ -1611,9 +1790,10 @@ class TestLUInstanceRename(CmdlibTestCase):
       op, "Instance .* is already in the cluster")
 
   def testFileInstance(self):
-    self.rpc.call_blockdev_assemble.return_value = \
+    self.rpc.call_blockdev_assemble_multi.return_value = \
       self.RpcResultsBuilder() \
-        .CreateSuccessfulNodeResult(self.master, (None, None, None))
+        .CreateSuccessfulNodeResult(self.master,
+                                    [[(True, (None, None, None), [])]])
     self.rpc.call_blockdev_shutdown.return_value = \
       self.RpcResultsBuilder() \
         .CreateSuccessfulNodeResult(self.master, None)
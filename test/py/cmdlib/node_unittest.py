@@ -39,6 +39,7 @@ from ganeti import constants
 from ganeti import objects
 from ganeti import opcodes
 from ganeti import errors
+from ganeti import rpc
 
 from testsupport import *
 
@@ -254,5 +255,145 @@ class TestLUNodeAdd(CmdlibTestCase):
     self.ExecOpCodeExpectOpPrereqError(op, "Can't get version information from"
                                        " node %s" % self.node_add.name)
 
+
+class TestLUNodeActivateDisks(CmdlibTestCase):
+  def setUp(self):
+    super(TestLUNodeActivateDisks, self).setUp()
+
+    self.snode = self.cfg.AddNewNode()
+    self.inst1 = self.cfg.AddNewInstance(disk_template=constants.DT_DRBD8,
+                                         primary_node=self.master,
+                                         secondary_node=self.snode,
+                                         disks_active=True)
+    self.inst2 = self.cfg.AddNewInstance(disk_template=constants.DT_DRBD8,
+                                         primary_node=self.master,
+                                         secondary_node=self.snode,
+                                         disks_active=True)
+    self.inactive_inst = \
+      self.cfg.AddNewInstance(disk_template=constants.DT_DRBD8,
+                              primary_node=self.master,
+                              secondary_node=self.snode,
+                              disks_active=False)
+    self.other_inst = self.cfg.AddNewInstance(primary_node=self.master,
+                                              disks_active=True)
+
+    self.failing = set()
+    self.old_nodes = set()
+    self.rpc.call_blockdev_assemble_multi.side_effect = self._Assemble
+    self.rpc.call_blockdev_assemble.side_effect = self._AssembleSingle
+
+  def _AssembleSingle(self, node_uuid, (_, inst), instance, as_primary, idx):
+    self.assertEqual(inst, instance)
+    if instance.name in self.failing:
+      return self.RpcResultsBuilder() \
+        .CreateErrorNodeResult(node_uuid, "Mock failure")
+    return self.RpcResultsBuilder() \
+      .CreateSuccessfulNodeResult(node_uuid,
+                                  ("/dev/mock", "/var/mock", None))
+
+  def _Assemble(self, node_uuid, instance_disks, as_primary):
+    if node_uuid in self.old_nodes:
+      return rpc.RpcResult(data="Not Found", failed=True, node=node_uuid,
+                           unknown_call=True)
+
+    result = []
+    for (inst, disks, _) in instance_disks:
+      if inst.name in self.failing:
+        result.append([(False, "Mock failure", [])] * len(disks))
+      else:
+        result.append([(True, ("/dev/mock", "/var/mock", None), [])] *
+                      len(disks))
+    return self.RpcResultsBuilder() \
+      .CreateSuccessfulNodeResult(node_uuid, result)
+
+  def _GetAssembleCalls(self):
+    return [(node_uuid, [inst.name for (inst, _, _) in instance_disks],
+             as_primary)
+            for ((node_uuid, instance_disks, as_primary), _) in
+              self.rpc.call_blockdev_assemble_multi.call_args_list]
+
+  def testAllInstances(self):
+    op = opcodes.OpNodeActivateDisks(node_name=self.snode.name)
+    result = self.ExecOpCode(op)
+
+    self.assertEqual(result, [(self.inst1.name, True, ""),
+                              (self.inst2.name, True, "")])
+
+    # One call per node and pass, independent of the number of instances
+    names = [self.inst1.name, self.inst2.name]
+    self.assertEqual(sorted(self._GetAssembleCalls()),
+                     sorted([(self.master_uuid, names, False),
+                             (self.snode.uuid, names, False),
+                             (self.master_uuid, names, True)]))
+    self.assertFalse(self.cfg.GetInstanceInfo(
+                       self.inactive_inst.uuid).disks_active)
+
+  def testGivenInstances(self):
+    op = opcodes.OpNodeActivateDisks(node_name=self.snode.name,
+                                     instances=[self.inactive_inst.name])
+    result = self.ExecOpCode(op)
+
+    self.assertEqual(result, [(self.inactive_inst.name, True, "")])
+    self.assertEqual(self.rpc.call_blockdev_assemble_multi.call_count, 3)
+    self.assertTrue(self.cfg.GetInstanceInfo(
+                      self.inactive_inst.uuid).disks_active)
+
+  def testFailingInstance(self):
+    self.failing.add(self.inst2.name)
+
+    op = opcodes.OpNodeActivateDisks(node_name=self.snode.name)
+    result = self.ExecOpCode(op)
+
+    self.assertEqual(result, [(self.inst1.name, True, ""),
+                              (self.inst2.name, False,
+                               "Cannot activate block devices")])
+    self.assertTrue(self.cfg.GetInstanceInfo(self.inst1.uuid).disks_active)
+    self.assertFalse(self.cfg.GetInstanceInfo(self.inst2.uuid).disks_active)
+    self.assertLogContainsRegex("Mock failure")
+
+  def testOldNode(self):
+    self.old_nodes.add(self.snode.uuid)
+    self.failing.add(self.inst2.name)
+
+    op = opcodes.OpNodeActivateDisks(node_name=self.snode.name)
+    result = self.ExecOpCode(op)
+
+    self.assertEqual(result, [(self.inst1.name, True, ""),
+                              (self.inst2.name, False,
+                               "Cannot activate block devices")])
+
+    # The node not knowing the call gets one call per disk instead
+    single_nodes = set(node_uuid for ((node_uuid, _, _, _, _), _) in
+                       self.rpc.call_blockdev_assemble.call_args_list)
+    self.assertEqual(single_nodes, set([self.snode.uuid]))
+    self.assertEqual(self.rpc.call_blockdev_assemble.call_count,
+                     len(self.inst1.disks) + len(self.inst2.disks))
+    self.assertLogContainsRegex("Mock failure")
+
+  def testInstanceNotOnNode(self):
+    op = opcodes.OpNodeActivateDisks(node_name=self.snode.name,
+                                     instances=[self.other_inst.name,
+                                                self.inst1.name])
+    result = self.ExecOpCode(op)
+
+    # Instances not using the node are skipped
+    self.assertEqual(result, [(self.inst1.name, True, "")])
+    self.assertLogContainsRegex("Skipping instance '%s', it doesn't use node" %
+                                self.other_inst.name)
+
+  def testOfflineNode(self):
+    self.snode.offline = True
+
+    op = opcodes.OpNodeActivateDisks(node_name=self.snode.name)
+    self.ExecOpCodeExpectOpPrereqError(op, "offline")
+
+  def testNoInstances(self):
+    node = self.cfg.AddNewNode()
+
+    op = opcodes.OpNodeActivateDisks(node_name=node.name)
+    self.assertEqual(self.ExecOpCode(op), [])
+    self.assertFalse(self.rpc.call_blockdev_assemble_multi.called)
+
+
 if __name__ == "__main__":
   testutils.GanetiTestProgram()
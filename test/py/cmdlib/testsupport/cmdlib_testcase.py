@@ -52,6 +52,7 @@ from ganeti import locking
 from ganeti import objects
 from ganeti import opcodes
 from ganeti import runtime
+from ganeti.masterd import livedata
 
 import testutils
 
@@ -66,6 +67,7 @@ class GanetiContextMock(object):
 
   def __init__(self, test_case):
     self._test_case = test_case
+    self.livedata = livedata.LiveDataCache(0)
 
   def AddNode(self, node, ec_id):
     self._test_case.cfg.AddNode(node, ec_id)
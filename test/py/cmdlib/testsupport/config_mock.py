@@ -609,7 +609,7 @@ class ConfigMock(config.ConfigWriter):
   def _WriteConfig(self, destination=None, feedback_fn=None):
     pass
 
-  def _DistributeConfig(self, feedback_fn):
+  def _DistributeConfig(self, feedback_fn, delta=None):
     pass
 
   def _GetRpc(self, address_list):
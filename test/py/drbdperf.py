@@ -0,0 +1,108 @@
+#!/usr/bin/python
+#
+
+# Copyright (C) 2014 Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+
+"""Script for measuring the cost of parsing `drbdsetup show` output"""
+
+import time
+import optparse
+
+from ganeti.storage import drbd_info
+
+import testutils
+
+
+#: Test data files and the full parser for the DRBD version they come from
+_TEST_DATA = [
+  ("bdev-drbd-8.0.txt", drbd_info.DRBD83ShowInfo),
+  ("bdev-drbd-8.3.txt", drbd_info.DRBD83ShowInfo),
+  ("bdev-drbd-8.4.txt", drbd_info.DRBD84ShowInfo),
+  ("bdev-drbd-8.4-no-disk-params.txt", drbd_info.DRBD84ShowInfo),
+  ("bdev-drbd-net-ip4.txt", drbd_info.DRBD83ShowInfo),
+  ("bdev-drbd-net-ip6.txt", drbd_info.DRBD83ShowInfo),
+  ("bdev-drbd-disk.txt", drbd_info.DRBD83ShowInfo),
+  ]
+
+
+def ParseOptions():
+  """Parses the command line options.
+
+  In case of command line errors, it will show the usage and exit the
+  program.
+
+  @return: the options in a tuple
+
+  """
+  parser = optparse.OptionParser()
+  parser.add_option("-r", dest="repeat", default=1000, type="int",
+                    help="Number of times every file is parsed", metavar="NUM")
+
+  (opts, args) = parser.parse_args()
+
+  if opts.repeat < 1:
+    parser.error("Number of runs must be at least 1")
+
+  return (opts, args)
+
+
+def _Measure(parser, data, repeat):
+  """Measures the average duration of parsing the given data.
+
+  """
+  start = time.time()
+  for _ in range(repeat):
+    result = parser.GetDevInfo(data)
+  duration = time.time() - start
+
+  return (duration / repeat, result)
+
+
+def main():
+  (opts, _) = ParseOptions()
+
+  print "%-34s %14s %14s" % ("File", "Full (ms)", "Fast (ms)")
+
+  for (name, parser) in _TEST_DATA:
+    data = testutils.ReadTestData(name)
+
+    # Build the pyparsing grammar before measuring
+    parser.GetDevInfo(data)
+
+    (full_time, full_result) = _Measure(parser, data, opts.repeat)
+    (fast_time, fast_result) = _Measure(drbd_info.FastShowInfo, data,
+                                        opts.repeat)
+    assert full_result == fast_result
+
+    print ("%-34s %14.3f %14.3f" %
+           (name, 1000.0 * full_time, 1000.0 * fast_time))
+
+
+if __name__ == "__main__":
+  main()
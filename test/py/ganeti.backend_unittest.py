@@ -38,10 +38,14 @@ import testutils
 import unittest
 
 from ganeti import backend
+from ganeti import compat
+from ganeti import config_delta
 from ganeti import constants
 from ganeti import errors
 from ganeti import hypervisor
 from ganeti import netutils
+from ganeti import objects
+from ganeti import serializer
 from ganeti import utils
 
 
@@ -559,6 +563,110 @@ class TestSetWatcherPause(unittest.TestCase):
       self.assertEqual(os.stat(self.filename).st_mode & 0777, 0644)
 
 
+class TestGetDiskWipeStatus(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.fds = []
+
+  def tearDown(self):
+    for fd in self.fds:
+      os.close(fd)
+    shutil.rmtree(self.tmpdir)
+
+  def _PrepareWipe(self, name, exit_status, running):
+    status_dir = utils.PathJoin(self.tmpdir, name)
+    os.mkdir(status_dir)
+
+    pid_file = utils.PathJoin(status_dir, "pid")
+    if running:
+      # Keep the PID file locked like a running process
+      self.fds.append(utils.WritePidFile(pid_file))
+    else:
+      utils.WriteFile(pid_file, data="%s\n" % os.getpid())
+
+    if exit_status != NotImplemented:
+      status = objects.DiskWipeStatus(size=1024, progress_mbytes=512,
+                                      method=None, exit_status=exit_status,
+                                      error_message=None)
+      utils.WriteFile(utils.PathJoin(status_dir, "status"),
+                      data=serializer.DumpJson(status.ToDict()))
+
+  def _GetStatus(self, names):
+    return [status and objects.DiskWipeStatus.FromDict(status)
+            for status in backend.GetDiskWipeStatus(names,
+                                                    _wipe_dir=self.tmpdir)]
+
+  def testStatus(self):
+    self._PrepareWipe("starting", NotImplemented, True)
+    self._PrepareWipe("running", None, True)
+    self._PrepareWipe("done", constants.EXIT_SUCCESS, False)
+
+    (starting, running, done, missing) = \
+      self._GetStatus(["starting", "running", "done", "missing"])
+
+    self.assertTrue(starting is None)
+    self.assertTrue(missing is None)
+    self.assertTrue(running.exit_status is None)
+    self.assertEqual(running.progress_mbytes, 512)
+    self.assertEqual(done.exit_status, constants.EXIT_SUCCESS)
+    self.assertTrue(done.error_message is None)
+
+  def testTerminated(self):
+    self._PrepareWipe("killed", None, False)
+
+    (status, ) = self._GetStatus(["killed"])
+    self.assertEqual(status.exit_status, constants.EXIT_FAILURE)
+    self.assertTrue("terminated unexpectedly" in status.error_message)
+    self.assertEqual(status.progress_mbytes, 512)
+
+
+class TestUploadConfigDelta(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.filename = utils.PathJoin(self.tmpdir, "config.data")
+    self.old = {
+      "serial_no": 5,
+      "cluster": { "cluster_name": "cluster.example.com", },
+      "nodes": {
+        "node-uuid": { "name": "node1.example.com", },
+        },
+      "instances": {},
+      }
+    utils.WriteFile(self.filename, data=serializer.DumpJson(self.old),
+                    mode=0640)
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def _Upload(self, new):
+    (_, old_parts) = config_delta.SerializeConfig(self.old)
+    (_, new_parts) = config_delta.SerializeConfig(new)
+    (delta, _) = config_delta.ComputeDelta(old_parts, new_parts, new)
+    backend.UploadConfigDelta((constants.RPC_ENCODING_NONE,
+                               serializer.DumpJson(delta)),
+                              _cfg_file=self.filename)
+
+  def test(self):
+    new = {
+      "serial_no": 6,
+      "cluster": { "cluster_name": "cluster.example.com", },
+      "nodes": {},
+      "instances": {
+        "inst-uuid": { "name": "inst1.example.com", },
+        },
+      }
+    self._Upload(new)
+    self.assertEqual(serializer.LoadJson(utils.ReadFile(self.filename)), new)
+    self.assertEqual(os.stat(self.filename).st_mode & 0777, 0640)
+
+  def testWrongBase(self):
+    self.old["serial_no"] = 4
+    self.assertRaises(backend.RPCFail, self._Upload,
+                      dict(self.old, serial_no=7))
+    self.assertEqual(serializer.LoadJson(utils.ReadFile(self.filename))
+                     ["serial_no"], 5)
+
+
 class TestGetBlockDevSymlinkPath(unittest.TestCase):
   def setUp(self):
     self.tmpdir = tempfile.mkdtemp()
@@ -577,6 +685,174 @@ class TestGetBlockDevSymlinkPath(unittest.TestCase):
       self._Test("inst1.example.com", idx)
 
 
+class TestDiskAssembler(unittest.TestCase):
+  def setUp(self):
+    self.assembled = []
+    self.failing = set()
+
+    self.lv_data = objects.Disk(dev_type=constants.DT_PLAIN, iv_name="data",
+                                logical_id=("xenvg", "data"), size=1024)
+    self.lv_meta = objects.Disk(dev_type=constants.DT_PLAIN, iv_name="meta",
+                                logical_id=("xenvg", "meta"), size=128)
+    self.drbd = objects.Disk(dev_type=constants.DT_DRBD8, iv_name="disk/0",
+                             children=[self.lv_data, self.lv_meta], size=1024)
+    self.plain = objects.Disk(dev_type=constants.DT_PLAIN, iv_name="disk/1",
+                              logical_id=("xenvg", "plain"), size=1024)
+
+  def _Assemble(self, disk, children):
+    if disk.iv_name in self.failing:
+      raise errors.BlockDeviceError("Can't assemble %s" % disk.iv_name)
+
+    for child in children:
+      # Children must have been assembled before their parents
+      self.assertTrue(child is None or child.dev_path in self.assembled)
+
+    dev = mock.Mock(spec=backend.BlockDev)
+    dev.dev_path = "/dev/%s" % disk.iv_name
+    dev.children = children
+    self.assembled.append(dev.dev_path)
+
+    return dev
+
+  def _Run(self, disks, as_primary=True, owners=None):
+    if owners is None:
+      owners = ["inst1.example.com"] * len(disks)
+    assembler = backend._DiskAssembler(as_primary, _num_workers=4,
+                                       _assemble_fn=self._Assemble)
+    return assembler(zip(disks, owners))
+
+  @testutils.patch_object(backend.DevCacheManager, "UpdateCache")
+  def test(self, update_cache_fn):
+    (drbd_node, plain_node) = self._Run([self.drbd, self.plain])
+
+    self.assertEqual(sorted(self.assembled),
+                     ["/dev/data", "/dev/disk/0", "/dev/disk/1", "/dev/meta"])
+    self.assertEqual(update_cache_fn.call_count, 4)
+
+    self.assertEqual(drbd_node.error, None)
+    self.assertEqual(drbd_node.result.dev_path, "/dev/disk/0")
+    self.assertEqual([child.dev_path for child in drbd_node.result.children],
+                     ["/dev/data", "/dev/meta"])
+    self.assertTrue(drbd_node.result.Open.called)
+
+    timings = drbd_node.GetTimings()
+    self.assertEqual([(dev_type, dev_path)
+                      for (dev_type, dev_path, _) in timings],
+                     [(constants.DT_PLAIN, "/dev/data"),
+                      (constants.DT_PLAIN, "/dev/meta"),
+                      (constants.DT_DRBD8, "/dev/disk/0")])
+    self.assertTrue(compat.all(duration >= 0 for (_, _, duration) in timings))
+
+    self.assertEqual(plain_node.error, None)
+    self.assertEqual(plain_node.result.dev_path, "/dev/disk/1")
+    self.assertEqual(len(plain_node.GetTimings()), 1)
+
+  @testutils.patch_object(backend.DevCacheManager, "UpdateCache")
+  def testSecondary(self, _):
+    (drbd_node,) = self._Run([self.drbd], as_primary=False)
+
+    self.assertEqual(drbd_node.error, None)
+    self.assertFalse(drbd_node.result.Open.called)
+    self.assertTrue(compat.all(child.Open.called
+                               for child in drbd_node.result.children))
+
+  @testutils.patch_object(backend.DevCacheManager, "UpdateCache")
+  def testFailingChild(self, _):
+    self.failing.add("meta")
+
+    (drbd_node, plain_node) = self._Run([self.drbd, self.plain])
+
+    # DRBD devices can be assembled without local storage
+    self.assertEqual(drbd_node.error, None)
+    self.assertEqual([child and child.dev_path
+                      for child in drbd_node.result.children],
+                     ["/dev/data", None])
+    self.assertEqual(drbd_node.GetTimings()[1][:2], (constants.DT_PLAIN, None))
+    self.assertEqual(plain_node.error, None)
+
+  @testutils.patch_object(backend.DevCacheManager, "UpdateCache")
+  def testFailingDisk(self, _):
+    self.failing.add("disk/0")
+
+    (drbd_node, plain_node) = self._Run([self.drbd, self.plain])
+
+    self.assertTrue(isinstance(drbd_node.error, errors.BlockDeviceError))
+    self.assertEqual(drbd_node.result, None)
+    self.assertEqual(plain_node.error, None)
+    self.assertEqual(plain_node.result.dev_path, "/dev/disk/1")
+
+  @testutils.patch_object(backend.DevCacheManager, "UpdateCache")
+  def testSeveralInstances(self, update_cache_fn):
+    (drbd_node, plain_node) = \
+      self._Run([self.drbd, self.plain],
+                owners=["inst1.example.com", "inst2.example.com"])
+
+    self.assertEqual(drbd_node.error, None)
+    self.assertEqual(plain_node.error, None)
+    self.assertEqual(sorted((args[0], args[1])
+                            for (args, _) in update_cache_fn.call_args_list),
+                     [("/dev/data", "inst1.example.com"),
+                      ("/dev/disk/0", "inst1.example.com"),
+                      ("/dev/disk/1", "inst2.example.com"),
+                      ("/dev/meta", "inst1.example.com")])
+
+  def testNoDisks(self):
+    self.assertEqual(self._Run([]), [])
+
+  @testutils.patch_object(backend, "_CalculateDeviceURI")
+  @testutils.patch_object(backend, "_SymlinkBlockDev")
+  @testutils.patch_object(backend.DevCacheManager, "UpdateCache")
+  def testMultiUnexpectedError(self, _, symlink_fn, uri_fn):
+    symlink_fn.side_effect = lambda name, path, idx: "/link/%s/%s" % (name, idx)
+    uri_fn.return_value = None
+
+    def _Assemble(disk, children):
+      if disk.iv_name == "disk/0":
+        raise errors.CommandError("Unexpected failure")
+      return self._Assemble(disk, children)
+
+    inst1 = objects.Instance(name="inst1.example.com")
+    inst2 = objects.Instance(name="inst2.example.com")
+
+    result = backend.BlockdevAssembleMulti([
+      (inst1, [self.drbd], [0]),
+      (inst2, [self.plain], [1]),
+      ], True, _assemble_fn=_Assemble)
+
+    # Only the failing disk is affected
+    ((inst1_res, ), (inst2_res, )) = result
+    (status, payload, _) = inst1_res
+    self.assertFalse(status)
+    self.assertTrue("Unexpected failure" in payload)
+
+    (status, payload, timings) = inst2_res
+    self.assertTrue(status)
+    self.assertEqual(payload, ("/dev/disk/1", "/link/inst2.example.com/1",
+                               None))
+    self.assertEqual(len(timings), 1)
+
+
+class TestRunInParallel(unittest.TestCase):
+  def test(self):
+    self.assertEqual(backend._RunInParallel(lambda x, y: x * y,
+                                            [(i, 2) for i in range(20)],
+                                            _num_workers=3),
+                     range(0, 40, 2))
+
+  def testSingle(self):
+    self.assertEqual(backend._RunInParallel(str, [(1,)]), ["1"])
+    self.assertEqual(backend._RunInParallel(str, []), [])
+
+  def testFailure(self):
+    def _Fn(value):
+      if value % 5 == 3:
+        raise errors.BlockDeviceError("Failed for %s" % value)
+      return value
+
+    self.assertRaises(errors.BlockDeviceError, backend._RunInParallel, _Fn,
+                      [(i,) for i in range(10)], _num_workers=4)
+
+
 class TestGetInstanceList(unittest.TestCase):
 
   def setUp(self):
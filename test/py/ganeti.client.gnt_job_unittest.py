@@ -161,5 +161,112 @@ class TestCancelJob(unittest.TestCase):
     self.assertEqual(result, constants.EXIT_CONFIRMATION)
 
 
+class _ClientForProfileJobs:
+  def __init__(self, test, data, qfilter, limit):
+    self._test = test
+    self._data = data
+    self._qfilter = qfilter
+    self._limit = limit
+
+  def Query(self, kind, selected, qfilter, sort_by=None, limit=None):
+    self._test.assertEqual(kind, constants.QR_JOB)
+    self._test.assertEqual(qfilter, self._qfilter)
+    self._test.assertEqual(sort_by, ["-id"])
+    self._test.assertEqual(limit, self._limit)
+
+    fields = query.GetAllFields(query._GetQueryFields(query.JOB_FIELDS,
+                                                      selected))
+
+    return objects.QueryResponse(data=self._data, fields=fields)
+
+
+class TestProfileJobs(unittest.TestCase):
+  def setUp(self):
+    unittest.TestCase.setUp(self)
+    self.stdout = []
+
+  def _ToStdout(self, line):
+    self.stdout.append(line)
+
+  @staticmethod
+  def _Row(summaries, starts, ends, timelines):
+    return [(constants.RS_NORMAL, value)
+            for value in [summaries, starts, ends, timelines]]
+
+  def _GetData(self):
+    return [
+      self._Row(["INSTANCE_STARTUP(inst1)"], [(100, 0)], [(103, 500000)],
+                [[[constants.OP_PHASE_LOCK, 100.0, 1.0],
+                  [constants.OP_PHASE_RPC, 101.0, 2.0]]]),
+      self._Row(["TAGS_GET(cluster)", "INSTANCE_STARTUP(inst2)"],
+                [(200, 0), (201, 0)], [(200, 250000), (202, 500000)],
+                [[],
+                 [[constants.OP_PHASE_LOCK, 201.0, 0.5],
+                  [constants.OP_PHASE_RPC, 201.5, 1.0],
+                  [constants.OP_PHASE_CONFIG, 202.0, 0.5]]]),
+      # Opcode was never executed
+      self._Row(["TAGS_GET(cluster)"], [None], [None], [[]]),
+      # Job vanished
+      [(constants.RS_UNAVAIL, None)] * 4,
+      ]
+
+  def testAggregate(self):
+    result = gnt_job._AggregateProfile(self._GetData())
+
+    self.assertEqual([(optype, count, total)
+                      for (optype, count, total, _) in result],
+                     [("INSTANCE_STARTUP", 2, 5.0), ("TAGS_GET", 1, 0.25)])
+
+    phases = result[0][3]
+    self.assertEqual(phases[constants.OP_PHASE_LOCK], 1.5)
+    self.assertEqual(phases[constants.OP_PHASE_RPC], 3.0)
+    self.assertEqual(phases[constants.OP_PHASE_CONFIG], 0.5)
+    self.assertEqual(phases[constants.OP_PHASE_HOOKS], 0.0)
+    self.assertFalse(compat.any(result[1][3].values()))
+
+  def testAggregateUnknownPhase(self):
+    data = [
+      self._Row(["INSTANCE_STARTUP(inst1)"], [(100, 0)], [(103, 0)],
+                [[[constants.OP_PHASE_LOCK, 100.0, 1.0],
+                  ["future-phase", 101.0, 1.5],
+                  ["future-phase", 102.5, 0.5]]]),
+      ]
+
+    result = gnt_job._AggregateProfile(data)
+
+    self.assertEqual(len(result), 1)
+    phases = result[0][3]
+    self.assertEqual(phases[constants.OP_PHASE_LOCK], 1.0)
+    self.assertEqual(phases["future-phase"], 2.0)
+
+  def testProfile(self):
+    opts = optparse.Values(dict(limit=None, separator="|", no_headers=True))
+    qfilter = qlang.MakeSimpleFilter("status", constants.JOBS_FINALIZED)
+    cl = _ClientForProfileJobs(self, self._GetData(), qfilter,
+                               gnt_job._PROFILE_DEF_JOBS)
+
+    result = gnt_job.ProfileJobs(opts, [], cl=cl, _stdout_fn=self._ToStdout)
+    self.assertEqual(result, constants.EXIT_SUCCESS)
+    self.assertEqual(self.stdout, [
+      "INSTANCE_STARTUP|2|5.000|2.500|0.750|0.000|0.000|0.000|1.500|0.250|"
+      "0.000",
+      "TAGS_GET|1|0.250|0.250|0.000|0.000|0.000|0.000|0.000|0.000|0.000",
+      ])
+
+  def testProfileJobIds(self):
+    opts = optparse.Values(dict(limit=10, separator=None, no_headers=False))
+    qfilter = [qlang.OP_AND,
+               qlang.MakeSimpleFilter("status", constants.JOBS_FINALIZED),
+               [qlang.OP_OR, [qlang.OP_EQUAL, "id", 4582],
+                [qlang.OP_EQUAL, "id", 19]]]
+    cl = _ClientForProfileJobs(self, [], qfilter, 10)
+
+    result = gnt_job.ProfileJobs(opts, ["4582", "19"], cl=cl,
+                                 _stdout_fn=self._ToStdout)
+    self.assertEqual(result, constants.EXIT_SUCCESS)
+    self.assertEqual(len(self.stdout), 1)
+    self.assertTrue(self.stdout[0].startswith("OpCode "))
+
+
 if __name__ == "__main__":
   testutils.GanetiTestProgram()
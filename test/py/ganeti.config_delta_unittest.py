@@ -0,0 +1,160 @@
+#!/usr/bin/python
+#
+
+# Copyright (C) 2014 Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Script for unittesting the config_delta module"""
+
+
+import copy
+import unittest
+
+from ganeti import config_delta
+from ganeti import errors
+from ganeti import serializer
+
+import testutils
+
+
+def _MakeConfig():
+  return {
+    "version": 2100000,
+    "serial_no": 10,
+    "mtime": 1234.5,
+    "cluster": {
+      "cluster_name": "cluster.example.com",
+      "tcpudp_port_pool": [],
+      },
+    "nodes": {
+      "node1-uuid": { "name": "node1.example.com", "serial_no": 1, },
+      "node2-uuid": { "name": "node2.example.com", "serial_no": 3, },
+      },
+    "instances": {
+      "inst1-uuid": {
+        "name": "inst1.example.com",
+        "disks": [{ "logical_id": ("xenvg", "disk0"), }],
+        },
+      },
+    "nodegroups": {
+      "group-uuid": { "name": "default", },
+      },
+    "networks": {},
+    }
+
+
+class TestSerializeConfig(unittest.TestCase):
+  def test(self):
+    data = _MakeConfig()
+    (txt, parts) = config_delta.SerializeConfig(data)
+
+    self.assertTrue(txt.endswith("\n"))
+    self.assertEqual(serializer.LoadJson(txt),
+                     serializer.LoadJson(serializer.DumpJson(data)))
+
+    self.assertEqual(sorted(parts.keys()), sorted([
+      ("version", None),
+      ("serial_no", None),
+      ("mtime", None),
+      ("cluster", None),
+      ("nodes", "node1-uuid"),
+      ("nodes", "node2-uuid"),
+      ("instances", "inst1-uuid"),
+      ("nodegroups", "group-uuid"),
+      ]))
+
+    for (path, part) in parts.items():
+      (key, uuid) = path
+      if uuid is None:
+        value = data[key]
+      else:
+        value = data[key][uuid]
+      self.assertEqual(serializer.LoadJson(part),
+                       serializer.LoadJson(serializer.DumpJson(value)))
+
+
+class TestDelta(unittest.TestCase):
+  def _Compute(self, old, new):
+    (_, old_parts) = config_delta.SerializeConfig(old)
+    (_, new_parts) = config_delta.SerializeConfig(new)
+    (delta, size) = config_delta.ComputeDelta(old_parts, new_parts, new)
+
+    # Deltas are sent over RPC
+    delta = serializer.LoadJson(serializer.DumpJson(delta))
+
+    result = serializer.LoadJson(serializer.DumpJson(old))
+    config_delta.ApplyDelta(result, delta)
+    self.assertEqual(result, serializer.LoadJson(serializer.DumpJson(new)))
+
+    return (delta, size)
+
+  def testOnlySerial(self):
+    old = _MakeConfig()
+    new = copy.deepcopy(old)
+    new["serial_no"] += 1
+    new["mtime"] += 10
+
+    (delta, size) = self._Compute(old, new)
+    self.assertEqual(delta["base"], 10)
+    self.assertEqual(delta["serial"], 11)
+    self.assertEqual(sorted((key, uuid) for (key, uuid, _) in delta["update"]),
+                     [("mtime", None), ("serial_no", None)])
+    self.assertEqual(delta["remove"], [])
+    self.assertTrue(size > 0)
+
+  def testObjects(self):
+    old = _MakeConfig()
+    new = copy.deepcopy(old)
+    new["serial_no"] += 1
+    # Renaming an instance doesn't change its serial number
+    new["instances"]["inst1-uuid"]["name"] = "inst2.example.com"
+    new["instances"]["inst1-uuid"]["disks"][0]["logical_id"] = \
+      ["xenvg", "disk1"]
+    del new["nodes"]["node2-uuid"]
+    new["networks"]["net-uuid"] = { "name": "net1", }
+
+    (delta, _) = self._Compute(old, new)
+    self.assertEqual(sorted((key, uuid) for (key, uuid, _) in delta["update"]),
+                     [("instances", "inst1-uuid"), ("networks", "net-uuid"),
+                      ("serial_no", None)])
+    self.assertEqual(delta["remove"], [["nodes", "node2-uuid"]])
+
+  def testWrongBase(self):
+    old = _MakeConfig()
+    new = copy.deepcopy(old)
+    new["serial_no"] += 1
+
+    (_, old_parts) = config_delta.SerializeConfig(old)
+    (_, new_parts) = config_delta.SerializeConfig(new)
+    (delta, _) = config_delta.ComputeDelta(old_parts, new_parts, new)
+
+    self.assertRaises(errors.ConfigurationError, config_delta.ApplyDelta,
+                      new, delta)
+
+
+if __name__ == "__main__":
+  testutils.GanetiTestProgram()
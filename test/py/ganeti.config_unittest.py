@@ -605,6 +605,113 @@ class TestConfigRunner(unittest.TestCase):
     nodegroup.ipolicy = cluster.SimpleFillIPolicy(nodegroup.ipolicy)
     self._TestVerifyConfigIPolicy(nodegroup.ipolicy, nodegroup.name, cfg, True)
 
+  def testIndexes(self):
+    cfg = self._get_object()
+    master_uuid = cfg.GetMasterNode()
+    default_group = cfg.LookupNodeGroup(None)
+
+    def _VerifyIndexes():
+      self.assertFalse(_IsErrorInList("lookup index", cfg.VerifyConfig()))
+
+    grp = objects.NodeGroup(name="grp1", members=[], uuid="grp1-uuid")
+    cfg.AddNodeGroup(grp, "job")
+    node = objects.Node(name="node1.example.com", group=grp.uuid, ndparams={},
+                        uuid="node1-uuid")
+    cfg.AddNode(node, "job")
+
+    inst = self._create_instance()
+    inst.disks = [
+      objects.Disk(dev_type=constants.DT_DRBD8, size=128,
+                   logical_id=(master_uuid, node.uuid, 12300, 0, 3, "secret"),
+                   children=[], iv_name="disk/0", mode=constants.DISK_RDWR),
+      ]
+    inst.disk_template = constants.DT_DRBD8
+    cfg.AddInstance(inst, "job")
+
+    self.assertEqual(cfg.GetNodeInfoByName(node.name), node)
+    self.assertEqual(cfg.GetInstanceInfoByName(inst.name), inst)
+    self.assertEqual(cfg.GetInstanceInfoByName("missing.example.com"), None)
+    self.assertEqual(cfg.ExpandInstanceName("test"), (inst.uuid, inst.name))
+    self.assertEqual(cfg.ExpandNodeName("node1"), (node.uuid, node.name))
+    self.assertEqual(cfg.LookupNodeGroup("grp1"), grp.uuid)
+    self.assertEqual(cfg.GetNodeInstances(master_uuid), ([inst.uuid], []))
+    self.assertEqual(cfg.GetNodeInstances(node.uuid), ([], [inst.uuid]))
+    self.assertEqual(cfg.GetNodeGroupInstances(grp.uuid), set([inst.uuid]))
+    self.assertFalse(cfg.GetNodeGroupInstances(grp.uuid, primary_only=True))
+    self.assertEqual(cfg.GetNodeGroupInstances(default_group,
+                                               primary_only=True),
+                     set([inst.uuid]))
+    self.assertEqual(cfg.ComputeDRBDMap(), {
+      master_uuid: { 0: inst.uuid, },
+      node.uuid: { 3: inst.uuid, },
+      })
+    _VerifyIndexes()
+
+    # Renames and updates
+    cfg.RenameInstance(inst.uuid, "test2.example.com")
+    self.assertEqual(cfg.GetInstanceInfoByName("test.example.com"), None)
+    self.assertEqual(cfg.GetInstanceInfoByName("test2.example.com"), inst)
+
+    grp.name = "grp2"
+    cfg.Update(grp, None)
+    self.assertEqual(cfg.LookupNodeGroup("grp2"), grp.uuid)
+    self.assertRaises(errors.OpPrereqError, cfg.LookupNodeGroup, "grp1")
+
+    inst.primary_node = node.uuid
+    inst.disks[0].logical_id = (node.uuid, master_uuid, 12300, 3, 0, "secret")
+    cfg.Update(inst, None)
+    self.assertEqual(cfg.GetNodeInstances(master_uuid), ([], [inst.uuid]))
+    self.assertEqual(cfg.GetNodeInstances(node.uuid), ([inst.uuid], []))
+    self.assertEqual(cfg.GetNodeGroupInstances(grp.uuid, primary_only=True),
+                     set([inst.uuid]))
+
+    cfg.AssignGroupNodes([(node.uuid, default_group)])
+    self.assertFalse(cfg.GetNodeGroupInstances(grp.uuid))
+    _VerifyIndexes()
+
+    # Modifications without updating the configuration are detected
+    inst.name = "test3.example.com"
+    errs = cfg.VerifyConfig()
+    self.assertTrue(_IsErrorInList("lookup index 'instance_names'", errs))
+    self.assertEqual(cfg.GetInstanceInfoByName("test3.example.com"), inst)
+    _VerifyIndexes()
+
+    # Removals
+    cfg.RemoveInstance(inst.uuid)
+    self.assertEqual(cfg.GetInstanceInfoByName(inst.name), None)
+    self.assertEqual(cfg.GetNodeInstances(node.uuid), ([], []))
+    self.assertEqual(cfg.ComputeDRBDMap(), {
+      master_uuid: {},
+      node.uuid: {},
+      })
+    cfg.RemoveNode(node.uuid)
+    self.assertEqual(cfg.GetNodeInfoByName(node.name), None)
+    self.assertEqual(cfg.ExpandNodeName("node1"), (None, None))
+    cfg.RemoveNodeGroup(grp.uuid)
+    self.assertRaises(errors.OpPrereqError, cfg.LookupNodeGroup, "grp2")
+    _VerifyIndexes()
+
+  def testDuplicateDRBDMinors(self):
+    cfg = self._get_object()
+    master_uuid = cfg.GetMasterNode()
+
+    for idx in range(2):
+      disk = objects.Disk(dev_type=constants.DT_DRBD8, size=128,
+                          logical_id=(master_uuid, master_uuid, 12300 + idx,
+                                      5, 6, "secret"),
+                          children=[], iv_name="disk/0",
+                          mode=constants.DISK_RDWR)
+      inst = objects.Instance(name="inst%s.example.com" % idx,
+                              uuid="inst%s-uuid" % idx, disks=[disk], nics=[],
+                              disk_template=constants.DT_DRBD8,
+                              primary_node=master_uuid)
+      cfg.AddInstance(inst, "job")
+
+    errs = cfg.VerifyConfig()
+    self.assertTrue(_IsErrorInList("DRBD minor 5 on node", errs))
+    self.assertTrue(_IsErrorInList("DRBD minor 6 on node", errs))
+    self.assertRaises(errors.ConfigurationError, cfg.ComputeDRBDMap)
+
   # Tests for Ssconf helper functions
   def testUnlockedGetHvparamsString(self):
     hvparams = {"a": "A", "b": "B", "c": "C"}
@@ -32,6 +32,7 @@
 
 
 import os
+import socket
 import unittest
 import time
 import tempfile
@@ -42,6 +43,7 @@ from cStringIO import StringIO
 
 from ganeti import http
 from ganeti import compat
+from ganeti import query
 
 import ganeti.http.server
 import ganeti.http.client
@@ -407,6 +409,11 @@ class _FakeCurl:
   def __init__(self):
     self.opts = {}
     self.info = NotImplemented
+    self.closed = False
+
+  def close(self):
+    assert not self.closed
+    self.closed = True
 
   def setopt(self, opt, value):
     assert opt not in self.opts, "Option set more than once"
@@ -746,6 +753,57 @@ class TestProcessRequests(unittest.TestCase):
 
     self.assertEqual(len(requests), requests_count)
 
+  def testPool(self):
+    pool = http.client.CurlHandlePool(10, 60, _curl=_FakeCurl)
+
+    def _Process(multi, handles):
+      for curl in handles:
+        curl.info = {
+          pycurl.RESPONSE_CODE: http.HTTP_OK,
+          }
+
+        yield (curl, None)
+
+        # Allow options to be set again when the handle is reused
+        curl.opts.clear()
+
+    def _MakeRequests():
+      return [http.client.HttpClientRequest("localhost", port, "POST", "/x")
+              for port in [4815, 16234]]
+
+    handles = set()
+    def _CollectHandles(multi, curls):
+      handles.update(curls)
+      return _Process(multi, curls)
+
+    http.client.ProcessRequests(_MakeRequests(), pool=pool,
+                                _curl_multi=self._DummyCurlMulti,
+                                _curl_process=_CollectHandles)
+    self.assertEqual(len(handles), 2)
+    self.assertEqual(pool.GetStats(), {
+      "hits": 0,
+      "misses": 2,
+      "evictions": 0,
+      "idle": 2,
+      })
+
+    # Second round must reuse the same handles
+    reused = set()
+    def _CheckReuse(multi, curls):
+      reused.update(curls)
+      return _Process(multi, curls)
+
+    http.client.ProcessRequests(_MakeRequests(), pool=pool,
+                                _curl_multi=self._DummyCurlMulti,
+                                _curl_process=_CheckReuse)
+    self.assertEqual(reused, handles)
+    self.assertEqual(pool.GetStats()["hits"], 2)
+    self.assertFalse(compat.any(curl.closed for curl in handles))
+
+    pool.Clear()
+    self.assertTrue(compat.all(curl.closed for curl in handles))
+    self.assertEqual(pool.GetStats()["idle"], 0)
+
   def testBadRequest(self):
     bad_request = http.client.HttpClientRequest("localhost", 27784,
                                                 "POST", "/version")
@@ -756,5 +814,182 @@ class TestProcessRequests(unittest.TestCase):
                       _curl_multi=NotImplemented, _curl_process=NotImplemented)
 
 
+class TestCurlHandlePool(unittest.TestCase):
+  def setUp(self):
+    self.now = 1000.0
+    self.pool = http.client.CurlHandlePool(2, 30, _curl=_FakeCurl,
+                                           _time_fn=lambda: self.now)
+
+  def _Request(self, port=1234):
+    return http.client.HttpClientRequest("node1", port, "POST", "/x")
+
+  def testReuse(self):
+    req = self._Request()
+    curl = self.pool.Get(req)
+    self.assertTrue(isinstance(curl, _FakeCurl))
+    self.pool.Put(req, curl, True)
+    self.assertEqual(self.pool.Get(req), curl)
+    self.assertEqual(self.pool.GetStats(), {
+      "hits": 1,
+      "misses": 1,
+      "evictions": 0,
+      "idle": 0,
+      })
+
+  def testDifferentPort(self):
+    curl = self.pool.Get(self._Request())
+    self.pool.Put(self._Request(), curl, True)
+    self.assertNotEqual(self.pool.Get(self._Request(port=1235)), curl)
+    self.assertEqual(self.pool.Get(self._Request()), curl)
+
+  def testNotReusable(self):
+    req = self._Request()
+    curl = self.pool.Get(req)
+    self.pool.Put(req, curl, False)
+    self.assertTrue(curl.closed)
+    self.assertNotEqual(self.pool.Get(req), curl)
+
+  def testMaxIdle(self):
+    req = self._Request()
+    handles = [self.pool.Get(req) for _ in range(3)]
+    for curl in handles:
+      self.pool.Put(req, curl, True)
+    self.assertTrue(handles[0].closed)
+    self.assertFalse(handles[1].closed or handles[2].closed)
+    self.assertEqual(self.pool.GetStats()["idle"], 2)
+    self.assertEqual(self.pool.GetStats()["evictions"], 1)
+
+    # Most recently used handle is returned first
+    self.assertEqual(self.pool.Get(req), handles[2])
+
+  def testIdleTimeout(self):
+    req = self._Request()
+    curl = self.pool.Get(req)
+    self.pool.Put(req, curl, True)
+    self.now += 31
+    self.assertNotEqual(self.pool.Get(req), curl)
+    self.assertTrue(curl.closed)
+    self.assertEqual(self.pool.GetStats()["evictions"], 1)
+
+  def testLockInfo(self):
+    req = self._Request()
+    self.pool.Put(req, self.pool.Get(req), True)
+    self.assertEqual(self.pool.GetLockInfo(set([query.LQ_MODE])),
+                     [("rpc-pool/node1:1234", "idle=1 hits=0 misses=1",
+                       None, None)])
+
+  def testRegisterWithMonitor(self):
+    registered = []
+    self.pool.RegisterWithMonitor(registered.append)
+    self.pool.RegisterWithMonitor(registered.append)
+    self.assertEqual(registered, [self.pool])
+
+
+class TestPersistentResponse(unittest.TestCase):
+  class _Handler(http.server.HttpServerHandler):
+    @staticmethod
+    def HandleRequest(req):
+      return ""
+
+  class _FakeReader:
+    def __init__(self, peer_will_close):
+      self.peer_will_close = peer_will_close
+
+  def _Test(self, keepalive, peer_will_close):
+    request_msg = http.HttpMessage()
+    request_msg.start_line = \
+      http.HttpClientToServerStartLine("POST", "/", http.HTTP_1_1)
+    request_msg.headers = {
+      http.HTTP_HOST: "localhost",
+      }
+    request_msg.body = ""
+
+    responder = http.server.HttpResponder(self._Handler())
+    (_, _, force_close, response_msg) = \
+      responder(lambda: (request_msg, self._FakeReader(peer_will_close)),
+                keepalive=keepalive)
+    self.assertFalse(force_close)
+    return response_msg
+
+  def testClose(self):
+    for (keepalive, peer_will_close) in [(False, False), (False, True),
+                                         (True, True)]:
+      msg = self._Test(keepalive, peer_will_close)
+      self.assertEqual(msg.headers[http.HTTP_CONNECTION], "close")
+      self.assertFalse(http.server._IsPersistent(msg))
+
+  def testKeepAlive(self):
+    msg = self._Test(True, False)
+    self.assertEqual(msg.headers[http.HTTP_CONNECTION], "keep-alive")
+    self.assertEqual(msg.headers[http.HTTP_CONTENT_LENGTH], 0)
+    self.assertTrue(http.server._IsPersistent(msg))
+
+
+class _PathHandler(http.server.HttpServerHandler):
+  @staticmethod
+  def HandleRequest(req):
+    return req.request_path
+
+
+class _FakeMainloop:
+  def RegisterSignal(self, owner):
+    pass
+
+
+class TestServingModes(unittest.TestCase):
+  def _CreateServer(self, serving_mode):
+    return http.server.HttpServer(_FakeMainloop(), "127.0.0.1", 0,
+                                  _PathHandler(), keepalive_timeout=10,
+                                  serving_mode=serving_mode, num_workers=2)
+
+  def testInvalidMode(self):
+    self.assertRaises(AssertionError, self._CreateServer, "unknown")
+
+  def testReadable(self):
+    for (serving_mode, readable) in [
+      (http.server.SERVING_MODE_FORK, True),
+      (http.server.SERVING_MODE_PREFORK, False),
+      (http.server.SERVING_MODE_THREADS, True),
+      ]:
+      server = self._CreateServer(serving_mode)
+      try:
+        self.assertEqual(server.readable(), readable)
+      finally:
+        server.socket.close()
+
+  @staticmethod
+  def _ReadResponse(sock):
+    buf = ""
+    while "\r\n\r\n" not in buf:
+      buf += sock.recv(4096)
+
+    (head, body) = buf.split("\r\n\r\n", 1)
+    headers = dict(line.split(": ", 1) for line in head.split("\r\n")[1:])
+
+    while len(body) < int(headers[http.HTTP_CONTENT_LENGTH]):
+      body += sock.recv(4096)
+
+    return (headers, body)
+
+  def testThreadsKeepAlive(self):
+    server = self._CreateServer(http.server.SERVING_MODE_THREADS)
+    server.Start()
+    try:
+      sock = socket.create_connection(server.socket.getsockname())
+      try:
+        server.handle_accept()
+
+        for path in ["/first", "/second", "/third"]:
+          sock.sendall("POST %s HTTP/1.1\r\nHost: localhost\r\n"
+                       "Content-Length: 0\r\n\r\n" % path)
+          (headers, body) = self._ReadResponse(sock)
+          self.assertEqual(headers[http.HTTP_CONNECTION], "keep-alive")
+          self.assertEqual(body, path)
+      finally:
+        sock.close()
+    finally:
+      server.Stop()
+
+
 if __name__ == "__main__":
   testutils.GanetiTestProgram()
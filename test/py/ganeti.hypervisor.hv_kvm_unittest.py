@@ -35,6 +35,7 @@ import tempfile
 import unittest
 import socket
 import os
+import shutil
 import struct
 import re
 
@@ -243,6 +244,127 @@ class TestQmp(testutils.GanetiTestCase):
         self.assertEqual(response, expected_response)
 
 
+class _FakeQmpConnection(object):
+  def __init__(self, filename):
+    self.filename = filename
+    self.commands = []
+    self.connected = False
+    self.fail = None
+
+  def connect(self):
+    assert not self.connected
+    self.connected = True
+
+  def close(self):
+    assert self.connected
+    self.connected = False
+
+  def Execute(self, command, arguments=None):
+    assert self.connected
+    self.commands.append(command)
+    if self.fail:
+      raise self.fail
+    return command
+
+
+class TestQmpConnectionPool(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.filename = utils.PathJoin(self.tmpdir, "qmp")
+    utils.WriteFile(self.filename, data="")
+    self.connections = []
+    self.now = 100.0
+    self.pool = monitor.QmpConnectionPool(_connection_cls=self._NewConnection,
+                                          _time_fn=lambda: self.now)
+
+  def tearDown(self):
+    utils.RemoveFile(self.filename)
+    os.rmdir(self.tmpdir)
+
+  def _NewConnection(self, filename):
+    self.assertEqual(filename, self.filename)
+    conn = _FakeQmpConnection(filename)
+    self.connections.append(conn)
+    return conn
+
+  def _Execute(self, command):
+    return self.pool.Call(self.filename, lambda qmp: qmp.Execute(command))
+
+  def testNotKeeping(self):
+    self.assertEqual(self._Execute("query-name"), "query-name")
+    self.assertEqual(self._Execute("query-kvm"), "query-kvm")
+    self.assertEqual(len(self.connections), 2)
+    self.assertFalse(compat.any(conn.connected for conn in self.connections))
+
+  def testKeeping(self):
+    self.pool.Start()
+    self._Execute("query-name")
+    self._Execute("query-kvm")
+    self.assertEqual(len(self.connections), 1)
+    self.assertTrue(self.connections[0].connected)
+    self.assertEqual(self.pool.Stop(), (1, 2))
+    self.assertFalse(self.connections[0].connected)
+    self.assertEqual(self.connections[0].commands, ["query-name", "query-kvm"])
+
+  def testNested(self):
+    def _Outer(qmp):
+      self.assertEqual(self._Execute("query-kvm"), "query-kvm")
+      return qmp.Execute("query-name")
+
+    self.assertEqual(self.pool.Call(self.filename, _Outer), "query-name")
+    self.assertEqual(len(self.connections), 1)
+    self.assertEqual(self.connections[0].commands, ["query-kvm", "query-name"])
+    self.assertFalse(self.connections[0].connected)
+
+  def testIdleCheck(self):
+    self.pool.Start()
+    self._Execute("query-name")
+    self.now += 1
+    self._Execute("query-name")
+    self.now += 60
+    self._Execute("query-kvm")
+    self.assertEqual(len(self.connections), 1)
+    self.assertEqual(self.connections[0].commands,
+                     ["query-name", "query-name", "query-status", "query-kvm"])
+
+    self.now += 60
+    self.connections[0].fail = errors.HypervisorError("broken")
+    self.assertEqual(self._Execute("query-kvm"), "query-kvm")
+    self.assertEqual(len(self.connections), 2)
+    self.assertFalse(self.connections[0].connected)
+    self.assertEqual(self.pool.Stop(), (2, 4))
+
+  def testSocketReplaced(self):
+    self.pool.Start()
+    self._Execute("query-name")
+    # Create the new file before the old one is gone to get another inode
+    utils.WriteFile(self.filename + ".new", data="")
+    os.rename(self.filename + ".new", self.filename)
+    self._Execute("query-name")
+    self.pool.Stop()
+    self.assertEqual(len(self.connections), 2)
+    self.assertFalse(self.connections[0].connected)
+
+  def testErrors(self):
+    self.pool.Start()
+    self._Execute("query-name")
+    conn = self.connections[0]
+
+    for err in [monitor.QmpCommandError("error"),
+                monitor.QmpCommandNotSupported("unsupported")]:
+      conn.fail = err
+      self.assertRaises(err.__class__, self._Execute, "query-name")
+      self.assertTrue(conn.connected)
+
+    conn.fail = errors.HypervisorError("Timeout")
+    self.assertRaises(errors.HypervisorError, self._Execute, "query-name")
+    self.assertFalse(conn.connected)
+
+    self._Execute("query-name")
+    self.assertEqual(len(self.connections), 2)
+    self.pool.Stop()
+
+
 class TestConsole(unittest.TestCase):
   def _Test(self, instance, node, hvparams):
     cons = hv_kvm.KVMHypervisor.GetInstanceConsole(instance, node, hvparams, {})
@@ -355,6 +477,76 @@ class TestSpiceParameterList(unittest.TestCase):
     self.assertEqual(hv_kvm._SPICE_ADDITIONAL_PARAMS, params)
 
 
+class TestKVMOutputCache(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.kvm_path = utils.PathJoin(self.tmpdir, "kvm")
+    self.counter = utils.PathJoin(self.tmpdir, "counter")
+    self._WriteKvm("QEMU emulator version 1.1.2")
+
+    class _Hypervisor(hv_kvm.KVMHypervisor):
+      _CAPS_DIR = utils.PathJoin(self.tmpdir, "caps")
+      _KVM_OUTPUT_CACHE = {}
+
+    self.hv = _Hypervisor
+    os.mkdir(self.hv._CAPS_DIR)
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def _WriteKvm(self, output):
+    utils.WriteFile(self.kvm_path, mode=0700,
+                    data=("#!/bin/sh\necho x >> %s\necho '%s' \"$@\"\n" %
+                          (self.counter, output)))
+
+  def _GetRuns(self):
+    try:
+      return len(utils.ReadFile(self.counter).splitlines())
+    except EnvironmentError:
+      return 0
+
+  def test(self):
+    help_opt = hv_kvm.KVMHypervisor._KVMOPT_HELP
+    mlist_opt = hv_kvm.KVMHypervisor._KVMOPT_MLIST
+
+    for _ in range(3):
+      self.assertEqual(self.hv._GetKVMOutput(self.kvm_path, help_opt),
+                       "QEMU emulator version 1.1.2 --help\n")
+    self.assertEqual(self._GetRuns(), 1)
+    self.assertEqual(self.hv._GetKVMOutput(self.kvm_path, mlist_opt),
+                     "QEMU emulator version 1.1.2 -M ?\n")
+    self.assertEqual(self._GetRuns(), 2)
+
+    # Another process uses the cache on disk
+    self.hv._KVM_OUTPUT_CACHE.clear()
+    self.assertEqual(self.hv._GetKVMOutput(self.kvm_path, help_opt),
+                     "QEMU emulator version 1.1.2 --help\n")
+    self.assertEqual(self.hv._GetKVMOutput(self.kvm_path, mlist_opt),
+                     "QEMU emulator version 1.1.2 -M ?\n")
+    self.assertEqual(self._GetRuns(), 2)
+
+    # The executable is upgraded
+    self._WriteKvm("QEMU emulator version 2.1.0")
+    self.assertEqual(self.hv._GetKVMOutput(self.kvm_path, help_opt),
+                     "QEMU emulator version 2.1.0 --help\n")
+    self.assertEqual(self._GetRuns(), 3)
+    self.assertEqual(self.hv._GetKVMVersion(self.kvm_path)[1:], (2, 1, 0))
+    self.assertEqual(self._GetRuns(), 3)
+
+  def testMissingCacheDir(self):
+    os.rmdir(self.hv._CAPS_DIR)
+    for _ in range(2):
+      self.assertEqual(self.hv._GetKVMOutput(self.kvm_path,
+                                             hv_kvm.KVMHypervisor._KVMOPT_HELP),
+                       "QEMU emulator version 1.1.2 --help\n")
+    self.assertEqual(self._GetRuns(), 1)
+
+  def testMissingExecutable(self):
+    self.assertRaises(errors.HypervisorError, self.hv._GetKVMOutput,
+                      utils.PathJoin(self.tmpdir, "missing"),
+                      hv_kvm.KVMHypervisor._KVMOPT_HELP)
+
+
 class TestHelpRegexps(testutils.GanetiTestCase):
   def testBootRe(self):
     """Check _BOOT_RE
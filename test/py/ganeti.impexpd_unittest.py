@@ -62,6 +62,8 @@ class CmdBuilderConfig(objects.ConfigObject):
     "connect_retries",
     "cmd_prefix",
     "cmd_suffix",
+    "buffer_size",
+    "sparse",
     ]
 
 
@@ -130,6 +132,39 @@ class TestCommandBuilder(unittest.TestCase):
 
                 self.assert_("verify=1" in ssl_addr)
 
+  def testSparse(self):
+    for mode in [constants.IEM_IMPORT, constants.IEM_EXPORT]:
+      if mode == constants.IEM_IMPORT:
+        sparse_mode = "decode"
+      elif mode == constants.IEM_EXPORT:
+        sparse_mode = "encode"
+
+      for compress in [constants.IEC_NONE, constants.IEC_GZIP]:
+        for sparse in [False, True]:
+          opts = CmdBuilderConfig(host="localhost", port=1234,
+                                  compress=compress, sparse=sparse)
+          builder = impexpd.CommandBuilder(mode, opts, 1, 2, 3)
+
+          transport_cmd = builder._GetTransportCommand()[-1]
+          parts = transport_cmd.split(" | ")
+
+          if not sparse:
+            self.assertFalse(builder._GetSparseCommand())
+            self.assertFalse(compat.any(sparse_mode in i for i in parts))
+            continue
+
+          self.assertTrue(sparse_mode in builder._GetSparseCommand())
+
+          pos = [idx for (idx, part) in enumerate(parts)
+                 if sparse_mode in part]
+          self.assertEqual(len(pos), 1)
+
+          # Zeroed blocks are skipped next to dd, before compression
+          dd_pos = [idx for (idx, part) in enumerate(parts)
+                    if " dd " in part]
+          self.assertEqual(len(dd_pos), 1)
+          self.assertEqual(abs(pos[0] - dd_pos[0]), 1)
+
   def testIPv6(self):
     for mode in [constants.IEM_IMPORT, constants.IEM_EXPORT]:
       opts = CmdBuilderConfig(host="localhost", port=6789,
@@ -185,6 +220,62 @@ class TestCommandBuilder(unittest.TestCase):
       builder = impexpd.CommandBuilder(constants.IEM_EXPORT, opts, 1, 2, 3)
       self.assertRaises(errors.GenericError, builder.GetCommand)
 
+  def testCompression(self):
+    for (mode, cmds) in [(constants.IEM_IMPORT, impexpd.DECOMPRESS_CMDS),
+                         (constants.IEM_EXPORT, impexpd.COMPRESS_CMDS)]:
+      opts = CmdBuilderConfig(host="localhost", port=1234,
+                              compress=constants.IEC_NONE)
+      builder = impexpd.CommandBuilder(mode, opts, 1, 2, 3)
+      self.assertTrue(builder._GetCompressionCommand() is None)
+
+      for compress in [constants.IEC_NONE, constants.IEC_GZIP]:
+        if compress == constants.IEC_NONE:
+          continue
+
+        opts = CmdBuilderConfig(host="localhost", port=1234, compress=compress)
+        builder = impexpd.CommandBuilder(mode, opts, 1, 2, 3)
+        compr_cmd = builder._GetCompressionCommand()
+
+        # All alternatives are used, the last one unconditionally
+        for args in cmds[compress]:
+          self.assertTrue(utils.ShellQuoteArgs(args) in compr_cmd)
+        self.assertTrue(compat.any(compr_cmd in i
+                                   for i in builder.GetCommand()))
+
+    self.assertEqual(frozenset(impexpd.COMPRESS_CMDS.keys()),
+                     frozenset(impexpd.DECOMPRESS_CMDS.keys()))
+    self.assertEqual(frozenset(impexpd.COMPRESS_CMDS.keys()),
+                     frozenset(constants.IEC_ALL) -
+                     frozenset([constants.IEC_NONE]))
+
+  def testCompressionFallback(self):
+    data = "Hello World\n" * 100
+
+    opts = CmdBuilderConfig(host="localhost", port=1234,
+                            compress=constants.IEC_GZIP)
+    compr_cmd = impexpd.CommandBuilder(constants.IEM_EXPORT, opts, 1, 2, 3) \
+      ._GetCompressionCommand()
+    decompr_cmd = impexpd.CommandBuilder(constants.IEM_IMPORT, opts, 1, 2, 3) \
+      ._GetCompressionCommand()
+
+    # Whichever of pigz or gzip is installed
+    result = utils.RunCmd(impexpd.CommandBuilder.GetBashCommand(
+      "echo -n %s | %s | %s" % (utils.ShellQuote(data), compr_cmd,
+                                decompr_cmd)))
+    self.assertFalse(result.failed, msg=result.output)
+    self.assertEqual(result.stdout, data)
+
+  def testBufferSize(self):
+    for mode in [constants.IEM_IMPORT, constants.IEM_EXPORT]:
+      for (buffer_size, expected) in [(None, impexpd.BUFSIZE),
+                                      (4 * 1024 * 1024, 4 * 1024 * 1024)]:
+        opts = CmdBuilderConfig(host="localhost", port=1234,
+                                compress=constants.IEC_NONE,
+                                buffer_size=buffer_size)
+        builder = impexpd.CommandBuilder(mode, opts, 1, 2, 3)
+        self.assertTrue("-b%s" % expected in builder._GetSocatCommand())
+        self.assertTrue(("dd bs=%s " % expected) in builder._GetDdCommand())
+
   def testModeError(self):
     mode = "foobarbaz"
 
@@ -39,6 +39,8 @@ import errno
 import itertools
 import random
 import operator
+import threading
+import time
 
 try:
   # pylint: disable=E0611
@@ -51,9 +53,13 @@ from ganeti import utils
 from ganeti import errors
 from ganeti import jqueue
 from ganeti import opcodes
+from ganeti import optimeline
 from ganeti import compat
 from ganeti import mcpu
 from ganeti import query
+from ganeti import qlang
+from ganeti import rpc
+from ganeti import serializer
 from ganeti import workerpool
 
 import testutils
@@ -313,6 +319,7 @@ class TestQueuedOpCode(unittest.TestCase):
       self.assert_(op.start_timestamp is None)
       self.assert_(op.exec_timestamp is None)
       self.assert_(op.end_timestamp is None)
+      self.assertEqual(op.timeline, [])
       self.assert_(op.result is None)
       self.assertEqual(op.status, constants.OP_STATUS_QUEUED)
 
@@ -906,6 +913,42 @@ class TestJobProcessor(unittest.TestCase, _JobProcessorTestUtils):
                        jqueue._JobProcessor.FINISHED)
       self.assertRaises(IndexError, queue.GetNextUpdate)
 
+  def testTimeline(self):
+    queue = _FakeQueueForProc()
+
+    ops = [opcodes.OpTestDummy(result="Res%s" % i, fail=False)
+           for i in range(3)]
+    job = self._CreateJob(queue, 8126, ops)
+
+    def _AfterStart(op, cbs):
+      (qop, ) = [i for i in job.ops if i.input is op]
+      self.assertTrue(optimeline.GetTimeline() is qop.timeline)
+      optimeline.AddSpan(qop.timeline, constants.OP_PHASE_LOCK, 100.0, 0.5)
+      optimeline.AddSpan(qop.timeline, constants.OP_PHASE_RPC, 101.0, 2.0)
+      optimeline.AddSpan(qop.timeline, constants.OP_PHASE_RPC, 104.0, 1.0)
+
+    opexec = _FakeExecOpCodeForProc(queue, None, _AfterStart)
+
+    for _ in range(len(ops)):
+      jqueue._JobProcessor(queue, opexec, job)()
+      self.assertTrue(optimeline.GetTimeline() is None)
+
+    self.assertEqual(job.CalcStatus(), constants.JOB_STATUS_SUCCESS)
+
+    timeline = [
+      [constants.OP_PHASE_LOCK, 100.0, 0.5],
+      [constants.OP_PHASE_RPC, 101.0, 2.0],
+      [constants.OP_PHASE_RPC, 104.0, 1.0],
+      ]
+    fields = ["optimeline", "oplocktime", "oprpctime", "opconfigtime"]
+    expected = [len(ops) * [timeline], len(ops) * [0.5], len(ops) * [3.0],
+                len(ops) * [0]]
+
+    self.assertEqual(job.GetInfo(fields), expected)
+
+    newjob = jqueue._QueuedJob.Restore(queue, job.Serialize(), True, False)
+    self.assertEqual(newjob.GetInfo(fields), expected)
+
   def testOpcodeError(self):
     queue = _FakeQueueForProc()
 
@@ -2758,5 +2801,564 @@ class TestJobDependencyManager(unittest.TestCase):
     self.assertFalse(jdm.GetLockInfo([query.LQ_PENDING]))
 
 
+class TestIndexedJob(unittest.TestCase):
+  _FIELDS = ["id", "status", "priority", "archived", "summary",
+             "received_ts", "start_ts", "end_ts", "class"]
+
+  def _Check(self, job):
+    data = serializer.LoadJson(serializer.DumpJson(
+      jqueue._GetJobIndexData(job)))
+    indexed_job = jqueue._IndexedJob(job.id, job.archived, data)
+
+    jq = jqueue._SimpleJobQuery(self._FIELDS)
+    self.assertEqual(jq(indexed_job), jq(job))
+
+  def test(self):
+    ops = [opcodes.OpTestDelay(duration=1), opcodes.OpTestDelay(duration=2)]
+    job = jqueue._QueuedJob(None, 9061, ops, True)
+    self._Check(job)
+
+    job.ops[0].status = constants.OP_STATUS_SUCCESS
+    job.start_timestamp = jqueue.TimeStampNow()
+    self._Check(job)
+
+    job.ops[1].status = constants.OP_STATUS_ERROR
+    job.end_timestamp = jqueue.TimeStampNow()
+    self._Check(job)
+
+    job = jqueue._QueuedJob.Restore(None, job.Serialize(), False, True)
+    self._Check(job)
+
+  def testRequestedData(self):
+    qobj = query.Query(query.JOB_FIELDS, self._FIELDS)
+    self.assertFalse(query.JQ_OPCODES in qobj.RequestedData())
+
+    for field in ["ops", "opresult", "oplog", "opend"]:
+      qobj = query.Query(query.JOB_FIELDS, ["id"],
+                         qfilter=[qlang.OP_TRUE, field], namefield="id")
+      self.assertTrue(query.JQ_OPCODES in qobj.RequestedData())
+
+
+class TestConcurrencyClass(unittest.TestCase):
+  def test(self):
+    for (op_ids, job_class) in [
+      ([], jqueue.JOB_CLASS_NORMAL),
+      ([opcodes.OpTestDelay.OP_ID], jqueue.JOB_CLASS_NORMAL),
+      ([opcodes.OpTagsGet.OP_ID], jqueue.JOB_CLASS_SHORT),
+      ([opcodes.OpTagsGet.OP_ID, opcodes.OpTestDelay.OP_ID],
+       jqueue.JOB_CLASS_NORMAL),
+      ([opcodes.OpTagsSet.OP_ID, opcodes.OpInstanceMigrate.OP_ID,
+        opcodes.OpTestDelay.OP_ID], jqueue.JOB_CLASS_LONG),
+      ]:
+      self.assertEqual(jqueue._GetConcurrencyClass(op_ids), job_class)
+
+  def testJob(self):
+    ops = [opcodes.OpTagsGet(kind=constants.TAG_CLUSTER),
+           opcodes.OpTagsSearch(pattern="tag")]
+    job = jqueue._QueuedJob(None, 29358, ops, True)
+    self.assertEqual(job.CalcConcurrencyClass(), jqueue.JOB_CLASS_SHORT)
+
+    indexed_job = jqueue._IndexedJob(job.id, False,
+                                     jqueue._GetJobIndexData(job))
+    self.assertEqual(indexed_job.CalcConcurrencyClass(),
+                     jqueue.JOB_CLASS_SHORT)
+
+  def testStatsFields(self):
+    ops = [opcodes.OpTestDelay(duration=1)]
+    job = jqueue._QueuedJob(None, 1934, ops, True)
+    fields = ["class", "class_queued", "class_running", "class_lockwait",
+              "class_workers", "class_latency"]
+
+    qobj = query.Query(query.JOB_FIELDS, fields)
+    self.assertTrue(query.JQ_CLASSES in qobj.RequestedData())
+
+    stats = {
+      jqueue.JOB_CLASS_NORMAL: {
+        "queued": 3,
+        "running": 2,
+        "lockwait": 1,
+        "workers": 16,
+        "latency": None,
+        },
+      }
+    ctx = query.JobQueryData([(job.id, job), (1935, None)],
+                             class_stats=stats)
+    self.assertEqual(qobj.Query(ctx), [
+      [(constants.RS_NORMAL, jqueue.JOB_CLASS_NORMAL),
+       (constants.RS_NORMAL, 3),
+       (constants.RS_NORMAL, 2),
+       (constants.RS_NORMAL, 1),
+       (constants.RS_NORMAL, 16),
+       (constants.RS_UNAVAIL, None)],
+      [(constants.RS_UNAVAIL, None)] * len(fields),
+      ])
+
+    # Without statistics
+    self.assertEqual(qobj.OldStyleQuery(query.JobQueryData([(job.id, job)])),
+                     [[jqueue.JOB_CLASS_NORMAL, None, None, None, None,
+                       None]])
+
+
+class _FakeLockWaitOp:
+  def __init__(self):
+    self.status = constants.OP_STATUS_WAITING
+    self.start_timestamp = None
+
+
+class _FakePoolJob:
+  def __init__(self, job_id, time_fn):
+    self.id = job_id
+    self.ops = [_FakeLockWaitOp()]
+    self.time_fn = time_fn
+    self.started = threading.Event()
+    self.release = threading.Event()
+    self.defer_fn = None
+
+
+class _BlockingJobWorker(jqueue._JobQueueWorker):
+  def RunTask(self, job): # pylint: disable=W0221
+    if job.defer_fn:
+      (defer_fn, job.defer_fn) = (job.defer_fn, None)
+      defer_fn()
+      raise workerpool.DeferTask()
+
+    # Start waiting for locks
+    job.ops[0].start_timestamp = utils.SplitTime(job.time_fn())
+    job.started.set()
+    job.release.wait()
+
+
+class TestJobQueueWorkerPool(unittest.TestCase):
+  def setUp(self):
+    self.now = 1000.0
+    self.jobs = []
+    # Periodic adjustments would make the results depend on timing
+    self.wp = self._CreatePool(3600.0)
+
+  def tearDown(self):
+    for job in self.jobs:
+      job.release.set()
+    self.wp.TerminateWorkers()
+
+  def _CreatePool(self, adjust_interval, max_workers=3):
+    return jqueue._JobQueueWorkerPool(NotImplemented,
+                                      jqueue.JOB_CLASS_NORMAL, 1, max_workers,
+                                      _time_fn=self._GetTime,
+                                      _worker_cls=_BlockingJobWorker,
+                                      _adjust_interval=adjust_interval)
+
+  def _GetTime(self):
+    return self.now
+
+  def _NewJob(self):
+    job = _FakePoolJob(len(self.jobs), self._GetTime)
+    self.jobs.append(job)
+    return job
+
+  def _AddJob(self):
+    job = self._NewJob()
+    self.wp.AddTask((job, ), task_id=job.id)
+    return job
+
+  def _CheckStats(self, **kwargs):
+    stats = self.wp.GetStats()
+    for (name, value) in kwargs.items():
+      self.assertEqual(stats[name], value, msg=name)
+
+  def test(self):
+    self._CheckStats(queued=0, running=0, lockwait=0, workers=1, latency=None)
+
+    job1 = self._AddJob()
+    job1.started.wait()
+    self._CheckStats(queued=0, running=1, lockwait=0, workers=1, latency=0.0)
+
+    # The only worker is busy and not blocked
+    self._AddJob()
+    self._CheckStats(queued=1, running=1, lockwait=0, workers=1)
+
+    # The first job has been waiting for locks long enough, another worker is
+    # started for the next job
+    self.now += 10.0
+    self._CheckStats(lockwait=1, workers=1)
+
+    job3 = self._AddJob()
+    self._CheckStats(workers=2)
+    self.jobs[1].started.wait()
+    self._CheckStats(queued=1, running=2, lockwait=1, workers=2)
+    self.assertTrue(self.wp.GetStats()["latency"] > 0.0)
+
+    # No more workers than blocked ones are started
+    self._AddJob()
+    self._CheckStats(queued=2, running=2, lockwait=1, workers=2)
+
+    # Both running jobs are blocked now, the maximum number of workers is used
+    self.now += 10.0
+    self._AddJob()
+    self._CheckStats(workers=3)
+    job3.started.wait()
+    self._CheckStats(queued=2, running=3, lockwait=2, workers=3)
+
+    self.now += 10.0
+    self._AddJob()
+    self._CheckStats(queued=3, running=3, lockwait=3, workers=3)
+
+    for job in self.jobs:
+      job.release.set()
+
+    self.wp.Quiesce()
+
+    # Without blocked workers the pool shrinks to its minimum size
+    job = self._AddJob()
+    self._CheckStats(workers=1)
+    job.started.wait()
+    job.release.set()
+    self.wp.Quiesce()
+
+  def testLatencyDeferredTask(self):
+    self.wp.TerminateWorkers()
+    self.wp = self._CreatePool(3600.0, max_workers=1)
+
+    def _Defer():
+      self.now += 10.0
+
+    job1 = self._NewJob()
+    job1.defer_fn = _Defer
+    job1.release.set()
+    job2 = self._NewJob()
+    self.wp.AddManyTasks([(job1, ), (job2, )],
+                         task_id=[job1.id, job2.id])
+
+    # The first job is deferred and queued again behind the second job
+    job2.started.wait()
+    self.now += 10.0
+    job2.release.set()
+    job1.started.wait()
+    self.wp.Quiesce()
+
+    # Only the first start of the deferred job counts towards the latency
+    self.assertAlmostEqual(self.wp.GetStats()["latency"],
+                           jqueue._LATENCY_WEIGHT * 10.0)
+
+  def _WaitForWorkers(self, count):
+    for _ in range(500):
+      if self.wp.GetStats()["workers"] == count:
+        break
+      time.sleep(0.01)
+    self._CheckStats(workers=count)
+
+  def testGrowWithoutNewJob(self):
+    self.wp.TerminateWorkers()
+    self.wp = self._CreatePool(0.01)
+
+    job1 = self._AddJob()
+    job1.started.wait()
+    job2 = self._AddJob()
+    self._CheckStats(queued=1, running=1, lockwait=0, workers=1)
+
+    # The running job becomes blocked while no further job is added
+    self.now += 10.0
+    self._WaitForWorkers(2)
+    job2.started.wait()
+    self._CheckStats(queued=0, running=2, lockwait=1, workers=2)
+
+    # Nothing is queued, so no more workers are started
+    self.now += 10.0
+    time.sleep(0.05)
+    self._CheckStats(queued=0, running=2, lockwait=2, workers=2)
+
+    # Once a job is queued again the pool grows to its maximum
+    self._AddJob()
+    self._CheckStats(workers=3)
+
+    # The pool shrinks again after the blocked jobs are done
+    for job in self.jobs:
+      job.release.set()
+    self.wp.Quiesce()
+    self._AddJob().release.set()
+    self.wp.Quiesce()
+    self._CheckStats(queued=0, running=0, workers=1)
+
+
+class _FakeWorkerPool:
+  def __init__(self, queue, job_class, min_workers, max_workers):
+    self.queue = queue
+    self.job_class = job_class
+    self.size = (min_workers, max_workers)
+    self.tasks = []
+    self.terminated = False
+
+  def AddManyTasks(self, tasks, priority=None, task_id=None):
+    self.tasks.extend(zip(tasks, priority, task_id))
+
+  def TerminateWorkers(self):
+    self.terminated = True
+
+
+class TestJobQueueWorkerPools(unittest.TestCase):
+  def test(self):
+    queue = object()
+    wpools = jqueue._JobQueueWorkerPools(queue, _pool_cls=_FakeWorkerPool)
+    pools = wpools._pools
+
+    self.assertEqual(sorted(pools.keys()), sorted(jqueue.JOB_CLASS_WORKERS))
+    for (job_class, pool) in pools.items():
+      self.assertTrue(pool.queue is queue)
+      self.assertEqual(pool.job_class, job_class)
+      self.assertEqual(pool.size, jqueue.JOB_CLASS_WORKERS[job_class])
+
+    jobs = [
+      jqueue._QueuedJob(None, 3816, [opcodes.OpTestDelay(duration=1)], True),
+      jqueue._QueuedJob(None, 3817, [opcodes.OpTagsSearch(pattern="x")],
+                        True),
+      jqueue._QueuedJob(None, 3818, [opcodes.OpTestDelay(duration=1)], True),
+      ]
+    jobs[2].ops[0].priority = constants.OP_PRIO_HIGH
+
+    wpools.AddJobs(jobs)
+
+    self.assertEqual(pools[jqueue.JOB_CLASS_NORMAL].tasks, [
+      ((jobs[0], ), constants.OP_PRIO_DEFAULT, 3816),
+      ((jobs[2], ), constants.OP_PRIO_HIGH, 3818),
+      ])
+    self.assertEqual(pools[jqueue.JOB_CLASS_SHORT].tasks, [
+      ((jobs[1], ), constants.OP_PRIO_DEFAULT, 3817),
+      ])
+    self.assertFalse(pools[jqueue.JOB_CLASS_LONG].tasks)
+
+    wpools.TerminateWorkers()
+    self.assertTrue(compat.all(pool.terminated for pool in pools.values()))
+
+
+class TestFinalizedJobCache(unittest.TestCase):
+  def _NewJob(self, job_id):
+    return _FakeJob(job_id, constants.JOB_STATUS_SUCCESS)
+
+  def testGetAndAdd(self):
+    cache = jqueue._FinalizedJobCache(10, 1000)
+    self.assertTrue(cache.Get(1) is None)
+
+    job = self._NewJob(1)
+    cache.Add(job, 100, cache.GetGeneration())
+    self.assertTrue(cache.Get(1) is job)
+    self.assertEqual(cache.GetStats(), {
+      "jobs": 1,
+      "size": 100,
+      "hits": 1,
+      "misses": 1,
+      "evictions": 0,
+      })
+
+    cache.Remove(1)
+    self.assertTrue(cache.Get(1) is None)
+    self.assertEqual(cache.GetStats()["size"], 0)
+
+  def testRemovedWhileLoading(self):
+    cache = jqueue._FinalizedJobCache(10, 1000)
+    generation = cache.GetGeneration()
+    cache.Remove(2)
+    cache.Add(self._NewJob(2), 100, generation)
+    self.assertTrue(cache.Get(2) is None)
+
+  def testEvictByCount(self):
+    cache = jqueue._FinalizedJobCache(3, 1000)
+
+    for job_id in range(1, 4):
+      cache.Add(self._NewJob(job_id), 10, cache.GetGeneration())
+
+    # Use job 1, so that job 2 is the least recently used one
+    self.assertTrue(cache.Get(1))
+    cache.Add(self._NewJob(4), 10, cache.GetGeneration())
+
+    self.assertTrue(cache.Get(2) is None)
+    for job_id in [1, 3, 4]:
+      self.assertTrue(cache.Get(job_id))
+    self.assertEqual(cache.GetStats()["evictions"], 1)
+
+  def testEvictBySize(self):
+    cache = jqueue._FinalizedJobCache(100, 1000)
+
+    for job_id in range(10):
+      cache.Add(self._NewJob(job_id), 300, cache.GetGeneration())
+
+    self.assertEqual(cache.GetStats()["jobs"], 3)
+    self.assertEqual(cache.GetStats()["size"], 900)
+    for job_id in [7, 8, 9]:
+      self.assertTrue(cache.Get(job_id))
+
+    # Too large for the cache
+    cache.Add(self._NewJob(20), 1001, cache.GetGeneration())
+    self.assertTrue(cache.Get(20) is None)
+    self.assertEqual(cache.GetStats()["jobs"], 3)
+
+  def testManyUses(self):
+    cache = jqueue._FinalizedJobCache(2, 1000)
+    cache.Add(self._NewJob(1), 1, cache.GetGeneration())
+    cache.Add(self._NewJob(2), 1, cache.GetGeneration())
+
+    for _ in range(1000):
+      self.assertTrue(cache.Get(1))
+
+    self.assertTrue(len(cache._uses) < 200)
+
+    cache.Add(self._NewJob(3), 1, cache.GetGeneration())
+    self.assertTrue(cache.Get(1))
+    self.assertTrue(cache.Get(2) is None)
+
+  def testLockInfo(self):
+    cache = jqueue._FinalizedJobCache(2, 1000)
+    cache.Add(self._NewJob(1), 123, cache.GetGeneration())
+    cache.Get(1)
+    self.assertEqual(cache.GetLockInfo(set([query.LQ_MODE])), [
+      ("jqueue-cache", "jobs=1 size=123 hits=1 misses=0 evictions=0",
+       None, None),
+      ])
+
+
+class TestJobFileReplicator(unittest.TestCase):
+  def setUp(self):
+    self.sent = []
+
+  def _Send(self, files):
+    self.sent.append(files)
+
+  def testSingle(self):
+    repl = jqueue._JobFileReplicator(self._Send, 0)
+    repl.Replicate("file1", "data1", False)
+    repl.Replicate("file2", "data2", True)
+    self.assertEqual(self.sent, [[("file1", "data1")], [("file2", "data2")]])
+    self.assertEqual(repl.GetStats(), {
+      "window": 0,
+      "updates": 2,
+      "coalesced": 0,
+      "batches": 2,
+      "forced": 1,
+      })
+
+  def testForceEndsWindow(self):
+    repl = jqueue._JobFileReplicator(self._Send, 3600)
+    repl.Replicate("file1", "data1", True)
+    self.assertEqual(self.sent, [[("file1", "data1")]])
+
+  def testBatching(self):
+    sending = threading.Event()
+    release = threading.Event()
+
+    def _Send(files):
+      self.sent.append(files)
+      if len(self.sent) == 1:
+        sending.set()
+        release.wait()
+
+    repl = jqueue._JobFileReplicator(_Send, 0)
+
+    threads = [threading.Thread(target=repl.Replicate,
+                                args=("file1", "data1", False))]
+    threads[0].start()
+    sending.wait()
+
+    # Collected while the first batch is being sent
+    for (name, data) in [("file2", "data2"), ("file3", "data3"),
+                         ("file2", "data2b")]:
+      thread = threading.Thread(target=repl.Replicate,
+                                args=(name, data, False))
+      thread.start()
+      threads.append(thread)
+
+    while repl.GetStats()["updates"] < 4:
+      time.sleep(0.01)
+
+    release.set()
+
+    for thread in threads:
+      thread.join()
+
+    self.assertEqual(self.sent, [
+      [("file1", "data1")],
+      [("file2", "data2b"), ("file3", "data3")],
+      ])
+    self.assertEqual(repl.GetStats()["coalesced"], 1)
+    self.assertEqual(repl.GetStats()["batches"], 2)
+
+  def testSendError(self):
+    def _Send(files):
+      self.sent.append(files)
+      raise errors.GenericError("Error")
+
+    repl = jqueue._JobFileReplicator(_Send, 0)
+    self.assertRaises(errors.GenericError, repl.Replicate, "file1", "x", True)
+    self.assertRaises(errors.GenericError, repl.Replicate, "file2", "y", True)
+    self.assertEqual(self.sent, [[("file1", "x")], [("file2", "y")]])
+
+  def testLockInfo(self):
+    repl = jqueue._JobFileReplicator(self._Send, 0.5)
+    repl.Replicate("file1", "data1", True)
+    self.assertEqual(repl.GetLockInfo(set([query.LQ_MODE])), [
+      ("jqueue-replication",
+       "window=0.5 updates=1 coalesced=0 batches=1 forced=1", None, None),
+      ])
+    self.assertEqual(repl.GetLockInfo(set()),
+                     [("jqueue-replication", None, None, None)])
+
+
+class _FakeJqUpdateRpc:
+  def __init__(self, old_nodes, failing_nodes):
+    self._old_nodes = old_nodes
+    self._failing_nodes = failing_nodes
+    self.calls = []
+
+  def call_jobqueue_update_multi(self, names, data):
+    self.calls.append(("multi", names, serializer.LoadJson(data)))
+    return dict((name, rpc.RpcResult(data="Not Found", failed=True,
+                                     unknown_call=True))
+                if name in self._old_nodes
+                else (name, rpc.RpcResult(data=(True, None)))
+                for name in names)
+
+  def call_jobqueue_update(self, names, file_name, content):
+    self.calls.append(("single", names, file_name, content))
+    return dict((name, rpc.RpcResult(data=(name not in self._failing_nodes,
+                                           "Error")))
+                for name in names)
+
+
+class TestCallJqUpdateMulti(unittest.TestCase):
+  def setUp(self):
+    self.files = [
+      ("/var/lib/ganeti/queue/job-1", "data1"),
+      ("/var/lib/ganeti/queue/job-2", "data2"),
+      ]
+
+  def test(self):
+    runner = _FakeJqUpdateRpc([], [])
+    result = jqueue._CallJqUpdateMulti(runner, ["node1", "node2"], self.files)
+    self.assertEqual(sorted(result.keys()), ["node1", "node2"])
+    self.assertFalse(compat.any(r.fail_msg for r in result.values()))
+    self.assertEqual(runner.calls, [
+      ("multi", ["node1", "node2"], map(list, self.files)),
+      ])
+
+  def testFallback(self):
+    runner = _FakeJqUpdateRpc(["node2"], [])
+    result = jqueue._CallJqUpdateMulti(runner, ["node1", "node2"], self.files)
+    self.assertFalse(compat.any(r.fail_msg for r in result.values()))
+    self.assertEqual(runner.calls, [
+      ("multi", ["node1", "node2"], map(list, self.files)),
+      ("single", ["node2"], "/var/lib/ganeti/queue/job-1", "data1"),
+      ("single", ["node2"], "/var/lib/ganeti/queue/job-2", "data2"),
+      ])
+
+  def testFallbackFails(self):
+    runner = _FakeJqUpdateRpc(["node2"], ["node2"])
+    result = jqueue._CallJqUpdateMulti(runner, ["node1", "node2"], self.files)
+    self.assertFalse(result["node1"].fail_msg)
+    self.assertTrue(result["node2"].fail_msg)
+    self.assertFalse(result["node2"].unknown_call)
+
+    # No more files are sent after the first failure
+    self.assertEqual(runner.calls[1:], [
+      ("single", ["node2"], "/var/lib/ganeti/queue/job-1", "data1"),
+      ])
+
+
 if __name__ == "__main__":
   testutils.GanetiTestProgram()
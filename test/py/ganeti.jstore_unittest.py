@@ -30,9 +30,12 @@
 
 """Script for testing ganeti.jstore"""
 
+import os
 import re
 import unittest
 import random
+import shutil
+import tempfile
 
 from ganeti import constants
 from ganeti import utils
@@ -41,6 +44,7 @@ from ganeti import errors
 from ganeti import jstore
 
 import testutils
+import mocks
 
 
 class TestFormatJobID(testutils.GanetiTestCase):
@@ -106,5 +110,104 @@ class TestReadNumericFile(testutils.GanetiTestCase):
     self.assertRaises(errors.JobQueueError, jstore._ReadNumericFile, tmpfile)
 
 
+class TestJobIndex(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.filename = utils.PathJoin(self.tmpdir, "index")
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def _NewIndex(self):
+    return jstore.JobIndex(self.filename,
+                           _getents=mocks.FakeGetentResolver)
+
+  def testMissing(self):
+    index = self._NewIndex()
+    self.assertFalse(index.Load())
+    self.assertEqual(index.GetJobIds(True), [])
+    self.assertFalse(os.path.exists(self.filename))
+
+  def testInvalidHeader(self):
+    utils.WriteFile(self.filename, data="[1, false, null]\n")
+    self.assertFalse(self._NewIndex().Load())
+
+  def testSetAndReload(self):
+    index = self._NewIndex()
+    index.Replace({})
+    index.Set(3, False, ["queued"])
+    index.Set(1, False, ["running"])
+    index.Set(1, True, ["success"])
+    index.Set(2, False, ["queued"])
+    index.Remove(2)
+    index.Remove(9)
+
+    self.assertEqual(index.GetJobIds(False), [3])
+    self.assertEqual(index.GetJobIds(True), [1, 3])
+    self.assertEqual(index.Get(1), (True, ["success"]))
+    self.assertEqual(index.Get(2), None)
+    index.Close()
+
+    for _ in range(2):
+      index = self._NewIndex()
+      self.assertTrue(index.Load())
+      self.assertEqual(index.GetJobIds(True), [1, 3])
+      self.assertEqual(index.Get(1), (True, ["success"]))
+      self.assertEqual(index.Get(3), (False, ["queued"]))
+      index.Close()
+
+  def testUnchanged(self):
+    index = self._NewIndex()
+    index.Replace({})
+    index.Set(1, False, ["running", [1, 2]])
+    size = os.path.getsize(self.filename)
+    index.Set(1, False, ["running", [1, 2]])
+    self.assertEqual(os.path.getsize(self.filename), size)
+    index.Close()
+
+  def testIncompleteLine(self):
+    index = self._NewIndex()
+    index.Replace({1: (False, ["running"])})
+    index.Set(2, False, ["queued"])
+    index.Close()
+
+    # Simulate a partially written update
+    fd = open(self.filename, "a")
+    try:
+      fd.write("[2, true, [\"succ")
+    finally:
+      fd.close()
+
+    index = self._NewIndex()
+    self.assertTrue(index.Load())
+    self.assertEqual(index.Get(2), (False, ["queued"]))
+
+    # The file is rewritten before appending
+    index.Set(3, False, ["queued"])
+    index.Close()
+
+    index = self._NewIndex()
+    self.assertTrue(index.Load())
+    self.assertEqual(index.GetJobIds(True), [1, 2, 3])
+    index.Close()
+
+  def testRewrite(self):
+    index = self._NewIndex()
+    index.Replace({})
+
+    for i in range(index._MIN_OUTDATED + 10):
+      index.Set(1, False, [i])
+
+    lines = utils.ReadFile(self.filename).splitlines()
+    self.assertTrue(len(lines) < index._MIN_OUTDATED)
+    self.assertEqual(index.Get(1), (False, [index._MIN_OUTDATED + 9]))
+    index.Close()
+
+    index = self._NewIndex()
+    self.assertTrue(index.Load())
+    self.assertEqual(index.Get(1), (False, [index._MIN_OUTDATED + 9]))
+    index.Close()
+
+
 if __name__ == "__main__":
   testutils.GanetiTestProgram()
@@ -274,6 +274,149 @@ class TestPipeCondition(_ConditionTestCase):
     self.assertRaises(Queue.Empty, self.done.get_nowait)
 
 
+class TestSingleNotifyThreadingCondition(TestSingleNotifyPipeCondition):
+  """SingleNotifyThreadingCondition tests"""
+
+  def setUp(self):
+    _ConditionTestCase.setUp(self, locking.SingleNotifyThreadingCondition)
+
+  def testNoFileDescriptors(self):
+    self.cond.acquire()
+    self.cond.wait(0.01)
+    self.assertFalse(hasattr(self.cond, "_read_fd"))
+    self.assertEqual(self.cond._waiters, [])
+    self.cond.release()
+
+
+class TestThreadingCondition(TestPipeCondition):
+  """ThreadingCondition tests"""
+
+  def setUp(self):
+    _ConditionTestCase.setUp(self, locking.ThreadingCondition)
+
+
+class TestWaiterTimer(unittest.TestCase):
+  def setUp(self):
+    self.now = 100.0
+    self.timer = locking._WaiterTimer(max_sleep=0.005,
+                                      _time_fn=lambda: self.now)
+
+  def _WaitForTimer(self):
+    # Expired deadlines are handled while holding the lock
+    self.timer._lock.acquire()
+    self.timer._lock.release()
+
+  def testWake(self):
+    waiter = self.timer.NewWaiter()
+    self.assertTrue(waiter.locked())
+    self.timer.Wake(waiter)
+    self.assertFalse(waiter.locked())
+    # Waking up twice must not fail
+    self.timer.Wake(waiter)
+    self.assertFalse(waiter.locked())
+
+  def testExpire(self):
+    waiters = [self.timer.NewWaiter() for _ in range(3)]
+
+    # Thread is started, but can't expire anything as time doesn't change
+    self.timer.AddTimeout(waiters[0], 10.0)
+    self.timer.AddTimeout(waiters[1], 20.0)
+    self.timer.AddTimeout(waiters[2], 5.0)
+    self.assertTrue(compat.all(waiter.locked() for waiter in waiters))
+
+    self.now = 112.0
+    waiters[2].acquire()
+    self._WaitForTimer()
+    self.assertFalse(waiters[0].locked())
+    self.assertTrue(waiters[1].locked())
+
+    self.timer.Wake(waiters[1])
+    self.assertFalse(waiters[1].locked())
+
+    waiters[0].acquire()
+    waiters[1].acquire()
+
+    waiter = self.timer.NewWaiter()
+    self.timer.AddTimeout(waiter, 50.0)
+    self.now = 200.0
+    waiter.acquire()
+
+    # All deadlines expired, timer thread is idle
+    self._WaitForTimer()
+    self.assertFalse(self.timer._deadlines)
+    self.assertTrue(self.timer._pending.locked())
+
+    waiter = self.timer.NewWaiter()
+    self.timer.AddTimeout(waiter, 1.0)
+    self.now = 201.0
+    waiter.acquire()
+
+  def _WaitForIdle(self):
+    for _ in range(1000):
+      self._WaitForTimer()
+      if self.timer._pending.locked():
+        return
+      time.sleep(0.01)
+    self.fail("Timer thread didn't become idle")
+
+  def testWokenUpEarly(self):
+    waiters = [self.timer.NewWaiter() for _ in range(2)]
+
+    self.timer.AddTimeout(waiters[0], 10.0)
+    self.timer.AddTimeout(waiters[1], 1000.0)
+
+    self.timer.Wake(waiters[1])
+    self.assertEqual(len(self.timer._deadlines), 2)
+
+    # Deadlines of waiters woken up early are discarded once the others
+    # expired
+    self.now = 110.0
+    waiters[0].acquire()
+    self._WaitForIdle()
+    self.assertFalse(self.timer._deadlines)
+
+    waiter = self.timer.NewWaiter()
+    self.timer.AddTimeout(waiter, 1000.0)
+    self.timer.Wake(waiter)
+
+    # Time doesn't change, but the thread doesn't wait for the stale deadline
+    self._WaitForIdle()
+    self.assertFalse(self.timer._deadlines)
+    self.assertFalse(self.timer._timed)
+
+
+class TestWaiterTimerSleep(unittest.TestCase):
+  def setUp(self):
+    self.calls = 0
+    self.timer = locking._WaiterTimer(max_sleep=60.0, _time_fn=self._Time)
+
+  def _Time(self):
+    self.calls += 1
+    return time.time()
+
+  def testSleepUntilDeadline(self):
+    waiter = self.timer.NewWaiter()
+    self.timer.AddTimeout(waiter, 0.5)
+    waiter.acquire()
+
+    # Not polled at a fixed interval until the deadline
+    self.assertTrue(self.calls < 10)
+
+  def testEarlierDeadline(self):
+    waiters = [self.timer.NewWaiter() for _ in range(2)]
+
+    start = time.time()
+    self.timer.AddTimeout(waiters[0], 30.0)
+    self.timer.AddTimeout(waiters[1], 0.1)
+
+    # The thread is woken up for the earlier deadline
+    waiters[1].acquire()
+    self.assertTrue(time.time() - start < 20.0)
+    self.assertTrue(waiters[0].locked())
+
+    self.timer.Wake(waiters[0])
+
+
 class TestSharedLock(_ThreadedTestCase):
   """SharedLock tests"""
 
@@ -1048,6 +1191,66 @@ class TestSharedLock(_ThreadedTestCase):
     self.assertRaises(Queue.Empty, self.done.get_nowait)
 
 
+class TestSharedLockThreadingCondition(TestSharedLock):
+  """SharedLock tests using L{locking.CONDITION_THREADING}"""
+
+  def setUp(self):
+    locking.SetConditionType(locking.CONDITION_THREADING)
+    TestSharedLock.setUp(self)
+
+  def tearDown(self):
+    locking.SetConditionType(locking.CONDITION_PIPE)
+
+  def testConditionType(self):
+    self.assertRaises(errors.ProgrammerError, locking.SetConditionType,
+                      "unknown")
+
+    self.sl.acquire()
+
+    def _Acquire():
+      self.done.put(self.sl.acquire(shared=1, timeout=0.1))
+
+    self._addThread(target=_Acquire)
+    self._waitThreads()
+    self.assertFalse(self.done.get_nowait())
+    self.sl.release()
+
+
+class TestConditionContention(_ThreadedTestCase):
+  """Contended acquires and releases with all condition types"""
+
+  def _Run(self, condition_type, timeout):
+    lock = locking.SharedLock("TestLock", condition_type=condition_type)
+    verify = [0 for _ in range(10)]
+    counts = [0 for _ in range(10)]
+
+    def _Counter(me):
+      while sum(counts) < 2000:
+        if not lock.acquire(timeout=timeout):
+          continue
+        try:
+          verify[me] = 1
+          if sum(verify) != 1:
+            self.done.put("Inconsistent state")
+          counts[me] += 1
+          verify[me] = 0
+        finally:
+          lock.release()
+
+    for i in range(len(counts)):
+      self._addThread(target=_Counter, args=(i, ))
+
+    self._waitThreads()
+
+    self.assertTrue(sum(counts) >= 2000)
+    self.assertRaises(Queue.Empty, self.done.get_nowait)
+
+  def test(self):
+    for condition_type in locking.CONDITION_TYPES:
+      for timeout in [None, 0.001, 10.0]:
+        self._Run(condition_type, timeout)
+
+
 class TestSharedLockInCondition(_ThreadedTestCase):
   """SharedLock as a condition lock tests"""
 
@@ -1079,6 +1282,13 @@ class TestSharedLockInPipeCondition(TestSharedLockInCondition):
     self.cond = locking.PipeCondition(self.sl)
 
 
+class TestSharedLockInThreadingCondition(TestSharedLockInCondition):
+  """SharedLock as a threading condition lock tests"""
+
+  def setCondition(self):
+    self.cond = locking.ThreadingCondition(self.sl)
+
+
 class TestSSynchronizedDecorator(_ThreadedTestCase):
   """Shared Lock Synchronized decorator test"""
 
@@ -1979,6 +2189,204 @@ class TestLockSet(_ThreadedTestCase):
     self.assertRaises(Queue.Empty, self.done.get_nowait)
 
 
+class TestBatchedLockSet(TestLockSet):
+  """LockSet tests with batched acquires"""
+
+  def _setUpLS(self):
+    self.resources = ["one", "two", "three"]
+    self.ls = locking.LockSet(self.resources, "TestLockSet", batched=True)
+
+  def _AcquireInThread(self, names, shared=0, timeout=None, priority=None,
+                       queued=None):
+    def fn():
+      if queued is None:
+        test_notify = None
+      else:
+        test_notify = lambda _: queued.set()
+
+      result = self.ls.acquire(names, shared=shared, timeout=timeout,
+                               priority=priority, test_notify=test_notify)
+      if result is None:
+        self.done.put("timeout")
+      else:
+        self.done.put(sorted(result))
+        self.ls.release()
+
+    return self._addThread(target=fn)
+
+  def testAllOrNothing(self):
+    self.ls.acquire("two")
+
+    queued = threading.Event()
+    self._AcquireInThread(["one", "two"], queued=queued)
+    queued.wait()
+
+    # While waiting for "two" the thread doesn't hold "one"; opportunistic
+    # acquires don't queue and could get it
+    released = Queue.Queue()
+    def fn():
+      released.put(self.ls.acquire("one", opportunistic=True))
+      self.ls.release()
+    self._addThread(target=fn).join()
+    self.assertEqual(released.get_nowait(), set(["one"]))
+
+    self.assertRaises(Queue.Empty, self.done.get_nowait)
+    self.ls.release()
+    self._waitThreads()
+    self.assertEqual(self.done.get_nowait(), ["one", "two"])
+
+  def testTimeout(self):
+    self.ls.acquire("three")
+    self._AcquireInThread(["one", "three"], timeout=0.1)
+    self._waitThreads()
+    self.assertEqual(self.done.get_nowait(), "timeout")
+    self.ls.release()
+
+    # Nothing is held after the timeout
+    self.assertEqual(self.ls.acquire(["one", "three"], timeout=0),
+                     set(["one", "three"]))
+    self.ls.release()
+
+  def testNoOvertaking(self):
+    self.ls.acquire("one")
+
+    queued = threading.Event()
+    self._AcquireInThread(["one", "two", "three"], queued=queued)
+    queued.wait()
+
+    # "two" is free, but needed by the request ahead
+    self._AcquireInThread(["two"], timeout=0.1)
+    self.assertEqual(self.done.get(True, 10), "timeout")
+
+    self.ls.release()
+    self._waitThreads()
+    self.assertEqual(self.done.get_nowait(), ["one", "three", "two"])
+
+  def testPriorityOrder(self):
+    self.ls.acquire("one")
+
+    for (names, priority) in [(["one", "two"], 5), (["two"], 1),
+                              (["one", "three"], 0)]:
+      queued = threading.Event()
+      self._AcquireInThread(names, priority=priority, queued=queued)
+      queued.wait()
+
+    self.ls.release()
+    self._waitThreads()
+
+    self.assertEqual(self.done.get_nowait(), ["two"])
+    self.assertEqual(self.done.get_nowait(), ["one", "three"])
+    self.assertEqual(self.done.get_nowait(), ["one", "two"])
+
+  def testSharedRequests(self):
+    self.ls.acquire("two", shared=1)
+
+    # Shared requests don't block each other
+    self._AcquireInThread(["one", "two"], shared=1, timeout=0.1)
+    self._waitThreads()
+    self.assertEqual(self.done.get_nowait(), ["one", "two"])
+
+    queued = threading.Event()
+    self._AcquireInThread(["two", "three"], queued=queued)
+    queued.wait()
+    self._AcquireInThread(["three"], shared=1, timeout=0.1)
+    self.assertEqual(self.done.get(True, 10), "timeout")
+
+    self.ls.release()
+    self._waitThreads()
+    self.assertEqual(self.done.get_nowait(), ["three", "two"])
+
+  def testRemoveWhileQueued(self):
+    self.ls.acquire(["one", "two"])
+
+    queued = threading.Event()
+    def fn():
+      self.assertRaises(errors.LockError, self.ls.acquire, ["two", "three"],
+                        test_notify=lambda _: queued.set())
+      self.done.put("error")
+    self._addThread(target=fn)
+    queued.wait()
+
+    self.assertEqual(self.ls.remove("two"), ["two"])
+    self.ls.release()
+    self._waitThreads()
+    self.assertEqual(self.done.get_nowait(), "error")
+    self.assertEqual(self.ls._names(), set(["one", "three"]))
+
+
+class _FakeBatchCondition(object):
+  def __init__(self, lock):
+    self.notified = 0
+
+  def notifyAll(self): # pylint: disable=C0103
+    self.notified += 1
+
+
+class TestBatchGrantQueue(unittest.TestCase):
+  def setUp(self):
+    self.queue = locking._BatchGrantQueue("test")
+    self.seq = itertools.count()
+
+  def _Queue(self, names, shared=0, priority=0):
+    request = locking._BatchGrantRequest([(name, None) for name in names],
+                                         shared, _FakeBatchCondition(None))
+    entry = (priority, self.seq.next(), request)
+    self.queue._Add(entry)
+    return entry
+
+  @staticmethod
+  def _GetNotified(entries):
+    return [request.cond.notified for (_, _, request) in entries]
+
+  def testNotify(self):
+    entries = [
+      self._Queue(["one", "two"]),
+      self._Queue(["two"], shared=1),
+      self._Queue(["three"]),
+      ]
+
+    # Only requests needing a released lock are woken up
+    self.queue.Notify(["two", "four"])
+    self.assertEqual(self._GetNotified(entries), [1, 1, 0])
+
+    self.queue.Notify(["one"])
+    self.assertEqual(self._GetNotified(entries), [2, 1, 0])
+
+    self.queue._Remove(entries[0])
+    self.queue.Notify(["one", "three"])
+    self.assertEqual(self._GetNotified(entries), [2, 1, 1])
+    self.assertEqual(sorted(self.queue._by_name.keys()), ["three", "two"])
+
+  def testBlockers(self):
+    first = self._Queue(["one", "two"])
+    second = self._Queue(["two", "three"], shared=1)
+    third = self._Queue(["three"], shared=1)
+
+    self.assertEqual(self.queue._GetBlockers(first), set())
+    self.assertEqual(self.queue._GetBlockers(second), set(["two"]))
+    # Shared requests don't conflict with each other
+    self.assertEqual(self.queue._GetBlockers(third), set())
+
+    # Requests with a higher priority are ahead
+    urgent = self._Queue(["one", "three"], priority=-1)
+    self.assertEqual(self.queue._GetBlockers(urgent), set())
+    self.assertEqual(self.queue._GetBlockers(first), set(["one"]))
+    self.assertEqual(self.queue._GetBlockers(third), set(["three"]))
+
+  def testGetPending(self):
+    self._Queue(["one", "two"], shared=1, priority=5)
+    self._Queue(["two"])
+
+    name = threading.currentThread().getName()
+
+    self.assertEqual(self.queue.GetPending("two"), [
+      ("exclusive", [name]),
+      ("shared", [name]),
+      ])
+    self.assertEqual(self.queue.GetPending("one"), [("shared", [name])])
+    self.assertEqual(self.queue.GetPending("three"), [])
+
+
 class TestGetLsAcquireModeAndTimeouts(unittest.TestCase):
   def setUp(self):
     self.fn = locking._GetLsAcquireModeAndTimeouts
@@ -2537,6 +2945,38 @@ class TestLockMonitor(_ThreadedTestCase):
 
       self.assertEqual(len(self.lm._locks), 1)
 
+  def testBatchedPending(self):
+    ls = locking.LockSet(["one", "two"], "TestSet", monitor=self.lm,
+                         batched=True)
+    ls.acquire("two")
+
+    queued = threading.Event()
+    def _Acquire():
+      ls.acquire(["one", "two"], test_notify=lambda _: queued.set())
+      ls.release()
+    thread = self._addThread(target=_Acquire)
+    queued.wait()
+
+    def _GetLocks():
+      result = self.lm.QueryLocks(["name", "mode", "owner", "pending"])
+      return dict((row[0][1], [value for (_, value) in row[1:]])
+                  for row in objects.QueryResponse.FromDict(result).data)
+
+    # The batched acquire waits for both locks without holding any of them
+    pending = [("exclusive", [thread.getName()])]
+    locks = _GetLocks()
+    self.assertEqual(locks["TestSet/one"], [None, None, pending])
+    self.assertEqual(locks["TestSet/two"],
+                     ["exclusive", [threading.currentThread().getName()],
+                      pending])
+
+    ls.release()
+    self._waitThreads()
+
+    locks = _GetLocks()
+    self.assertEqual(locks["TestSet/one"], [None, None, []])
+    self.assertEqual(locks["TestSet/two"], [None, None, []])
+
   def testDeleteAndRecreate(self):
     lname = "TestLock101923193"
 
@@ -2694,5 +3134,180 @@ class TestLockMonitor(_ThreadedTestCase):
           self.assertEqual(i.CountPending(), 0)
 
 
+class TestLockProfiling(unittest.TestCase):
+  def setUp(self):
+    self.lm = locking.LockMonitor()
+    self.lm.SetProfiling(True)
+    self.now = 1000.0
+
+  def _GetTime(self):
+    return self.now
+
+  def _QueryProfile(self, fields):
+    result = self.lm.QueryLocks(["name"] + fields)
+    return objects.QueryResponse.FromDict(result).data
+
+  def testGetOwnerTask(self):
+    self.assertEqual(locking._GetOwnerTask("Jq7/Job123/I_CREATE"), "I_CREATE")
+    self.assertEqual(locking._GetOwnerTask("Jq7/Job123"), "Jq7/Job123")
+    self.assertEqual(locking._GetOwnerTask("ClientReq3"), "ClientReq3")
+
+  def testDisabled(self):
+    self.lm.SetProfiling(False)
+    self.assertTrue(self.lm.profiler is None)
+
+    lock = locking.SharedLock("lock1", monitor=self.lm)
+    lock.acquire()
+    lock.release()
+
+    self.assertEqual(self._QueryProfile(["acquires", "owner_profile"]), [
+      [(constants.RS_NORMAL, "lock1"), (constants.RS_UNAVAIL, None),
+       (constants.RS_UNAVAIL, None)],
+      ])
+
+  def testAcquireRelease(self):
+    lock = locking.SharedLock("lock1", monitor=self.lm, _time_fn=self._GetTime)
+
+    lock.acquire(shared=1, priority=3)
+    self.now += 2.5
+    lock.release()
+
+    lock.acquire()
+    self.now += 0.005
+    lock.release()
+
+    profile = self.lm.profiler.GetProfiles()["lock1"]
+    self.assertEqual(profile.acquires, 2)
+    self.assertEqual(profile.timeouts, 0)
+    self.assertEqual(profile.modes, { "shared": 1, "exclusive": 1, })
+    self.assertEqual(profile.priorities, { 0: 1, 3: 1, })
+    self.assertEqual(profile.wait_total, 0.0)
+    self.assertEqual(profile.wait_histogram, [2, 0, 0, 0, 0, 0, 0, 0])
+    self.assertAlmostEqual(profile.hold_total, 2.505)
+    self.assertEqual(profile.hold_max, 2.5)
+    self.assertEqual(profile.hold_histogram, [0, 1, 0, 0, 1, 0, 0, 0])
+
+    task = threading.currentThread().getName()
+    self.assertEqual(profile.owners.keys(), [task])
+    (acquires, timeouts, wait, hold) = profile.owners[task]
+    self.assertEqual((acquires, timeouts, wait), (2, 0, 0.0))
+    self.assertAlmostEqual(hold, 2.505)
+
+  def testTimeout(self):
+    lock = locking.SharedLock("lock1", monitor=self.lm)
+    lock.acquire()
+
+    def _Acquire():
+      self.assertFalse(lock.acquire(timeout=0.01))
+
+    thread = threading.Thread(target=_Acquire, name="Jq1/Job15/I_STARTUP")
+    thread.start()
+    thread.join()
+
+    lock.release()
+
+    profile = self.lm.profiler.GetProfiles()["lock1"]
+    self.assertEqual(profile.acquires, 1)
+    self.assertEqual(profile.timeouts, 1)
+    self.assertTrue(profile.wait_max >= 0.01)
+    self.assertEqual(profile.owners["I_STARTUP"][:2], [0, 1])
+    self.assertTrue(profile.owners["I_STARTUP"][2] >= 0.01)
+
+  def testBatchedTimeout(self):
+    ls = locking.LockSet(["one", "two"], "TestSet", monitor=self.lm,
+                         batched=True)
+    ls.acquire("two")
+
+    def _Acquire():
+      self.assertTrue(ls.acquire(["one", "two"], timeout=0.1) is None)
+
+    thread = threading.Thread(target=_Acquire, name="Jq1/Job15/I_STARTUP")
+    thread.start()
+    thread.join()
+
+    ls.release()
+
+    profiles = self.lm.profiler.GetProfiles()
+
+    # The timeout is accounted to the lock the acquire waited for
+    profile = profiles["TestSet/two"]
+    self.assertEqual(profile.acquires, 1)
+    self.assertEqual(profile.timeouts, 1)
+    self.assertTrue(profile.wait_max >= 0.1)
+    self.assertEqual(profile.owners["I_STARTUP"][:2], [0, 1])
+    self.assertTrue(profile.owners["I_STARTUP"][2] >= 0.1)
+
+    # Attempts to acquire the other lock while waiting aren't recorded
+    self.assertFalse("TestSet/one" in profiles)
+
+  def testBatchedWait(self):
+    ls = locking.LockSet(["one", "two"], "TestSet", monitor=self.lm,
+                         batched=True)
+    ls.acquire("two")
+
+    queued = threading.Event()
+    def _Acquire():
+      ls.acquire(["one", "two"], test_notify=lambda _: queued.set())
+      ls.release()
+
+    thread = threading.Thread(target=_Acquire, name="Jq1/Job16/I_STARTUP")
+    thread.start()
+    queued.wait()
+    time.sleep(0.05)
+    ls.release()
+    thread.join()
+
+    profiles = self.lm.profiler.GetProfiles()
+
+    # Every lock of the request records the whole waiting time once
+    for name in ["TestSet/one", "TestSet/two"]:
+      owner = profiles[name].owners["I_STARTUP"]
+      self.assertEqual(owner[:2], [1, 0])
+      self.assertTrue(owner[2] >= 0.05)
+      self.assertEqual(profiles[name].timeouts, 0)
+
+  def testAcquiredBeforeEnabled(self):
+    self.lm.SetProfiling(False)
+
+    lock = locking.SharedLock("lock1", monitor=self.lm)
+    lock.acquire()
+
+    self.lm.SetProfiling(True)
+    lock.release()
+
+    self.assertEqual(self.lm.profiler.GetProfiles(), {})
+
+  def testDelete(self):
+    lock = locking.SharedLock("lock1", monitor=self.lm, _time_fn=self._GetTime)
+    lock.acquire()
+    self.now += 20
+    lock.delete()
+
+    profile = self.lm.profiler.GetProfiles()["lock1"]
+    self.assertEqual(profile.hold_total, 20)
+    self.assertEqual(profile.hold_histogram, [0, 0, 0, 0, 0, 1, 0, 0])
+
+  def testQuery(self):
+    locks = [locking.SharedLock(name, monitor=self.lm, _time_fn=self._GetTime)
+             for name in ["lock1", "lock2"]]
+
+    locks[0].acquire(shared=1)
+    self.now += 1
+    locks[0].release()
+
+    task = threading.currentThread().getName()
+
+    self.assertEqual(self._QueryProfile(["acquires", "timeouts", "hold_total",
+                                         "acquire_modes", "owner_profile"]), [
+      [(constants.RS_NORMAL, "lock1"), (constants.RS_NORMAL, 1),
+       (constants.RS_NORMAL, 0), (constants.RS_NORMAL, 1.0),
+       (constants.RS_NORMAL, { "shared": 1, }),
+       (constants.RS_NORMAL, [[task, 1, 0, 0.0, 1.0]])],
+      [(constants.RS_NORMAL, "lock2"), (constants.RS_NODATA, None),
+       (constants.RS_NODATA, None), (constants.RS_NODATA, None),
+       (constants.RS_NODATA, None), (constants.RS_NODATA, None)],
+      ])
+
+
 if __name__ == "__main__":
   testutils.GanetiTestProgram()
@@ -0,0 +1,181 @@
+#!/usr/bin/python
+#
+
+# Copyright (C) 2012 Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+
+"""Script for testing ganeti.masterd.livedata"""
+
+import unittest
+
+from ganeti import query
+from ganeti.masterd import livedata
+
+import testutils
+
+
+class _FakeResult(object):
+  def __init__(self, payload, fail_msg=None, offline=False):
+    self.payload = payload
+    self.fail_msg = fail_msg
+    self.offline = offline
+
+
+class _FakeRpc(object):
+  def __init__(self, results):
+    self.results = results
+    self.calls = []
+
+  def __call__(self, node_uuids):
+    self.calls.append(list(node_uuids))
+    return dict((uuid, self.results[uuid]) for uuid in node_uuids)
+
+
+class TestLiveDataCache(unittest.TestCase):
+  def setUp(self):
+    self.now = 1000.0
+    self.results = {
+      "node1": _FakeResult({"inst1": {}, "inst2": {}}),
+      "node2": _FakeResult({"inst3": {}}),
+      "node3": _FakeResult(None, fail_msg="unreachable"),
+      }
+    self.rpc = _FakeRpc(self.results)
+
+  def _TimeFn(self):
+    return self.now
+
+  def _Call(self, cache, node_uuids, max_age, key="key",
+            kind=livedata.KIND_INSTANCES):
+    return cache.Call(kind, key, node_uuids, max_age, self.rpc)
+
+  def testDisabled(self):
+    cache = livedata.LiveDataCache(0, _time_fn=self._TimeFn)
+    for _ in range(3):
+      result = self._Call(cache, ["node1", "node2"], 100)
+      self.assertEqual(sorted(result.keys()), ["node1", "node2"])
+    self.assertEqual(len(self.rpc.calls), 3)
+    self.assertEqual(cache.GetStats()["entries"], 0)
+
+  def testNoMaxAge(self):
+    cache = livedata.LiveDataCache(60, _time_fn=self._TimeFn)
+    self._Call(cache, ["node1", "node2"], None)
+    self._Call(cache, ["node1", "node2"], None)
+    self.assertEqual(self.rpc.calls, [["node1", "node2"], ["node1", "node2"]])
+
+    # Results are stored nevertheless
+    self._Call(cache, ["node1", "node2"], 10)
+    self.assertEqual(len(self.rpc.calls), 2)
+
+  def testHitAndExpiry(self):
+    cache = livedata.LiveDataCache(60, _time_fn=self._TimeFn)
+    self._Call(cache, ["node1"], 30)
+    self.now += 10
+    result = self._Call(cache, ["node1", "node2"], 30)
+    self.assertEqual(self.rpc.calls, [["node1"], ["node2"]])
+    self.assertTrue(result["node1"] is self.results["node1"])
+
+    # Too old for the query
+    self.now += 25
+    self._Call(cache, ["node1", "node2"], 30)
+    self.assertEqual(self.rpc.calls[-1], ["node1"])
+
+    # Too old for the cache
+    self.now += 61
+    self._Call(cache, ["node1", "node2"], 1000)
+    self.assertEqual(self.rpc.calls[-1], ["node1", "node2"])
+
+    stats = cache.GetStats()
+    self.assertEqual(stats["hits"], 2)
+    self.assertEqual(stats["misses"], 5)
+
+  def testKeyAndKind(self):
+    cache = livedata.LiveDataCache(60, _time_fn=self._TimeFn)
+    self._Call(cache, ["node1"], 30, key=("xen-pvm", ))
+    self._Call(cache, ["node1"], 30, key=("kvm", ))
+    self._Call(cache, ["node1"], 30, key=("kvm", ),
+               kind=livedata.KIND_NODE)
+    self.assertEqual(len(self.rpc.calls), 3)
+    self._Call(cache, ["node1"], 30, key=("kvm", ))
+    self.assertEqual(len(self.rpc.calls), 3)
+
+  def testFailedNotStored(self):
+    cache = livedata.LiveDataCache(60, _time_fn=self._TimeFn)
+    result = self._Call(cache, ["node1", "node3"], 30)
+    self.assertEqual(result["node3"].fail_msg, "unreachable")
+    self._Call(cache, ["node1", "node3"], 30)
+    self.assertEqual(self.rpc.calls, [["node1", "node3"], ["node3"]])
+
+  def testInvalidateNodes(self):
+    cache = livedata.LiveDataCache(60, _time_fn=self._TimeFn)
+    self._Call(cache, ["node1", "node2"], 30)
+    cache.Invalidate(node_uuids=["node2"])
+    self._Call(cache, ["node1", "node2"], 30)
+    self.assertEqual(self.rpc.calls[-1], ["node2"])
+
+  def testInvalidateInstances(self):
+    cache = livedata.LiveDataCache(60, _time_fn=self._TimeFn)
+    self._Call(cache, ["node1", "node2"], 30)
+    self._Call(cache, ["node1", "node2"], 30, kind=livedata.KIND_NODE)
+    self.assertEqual(len(self.rpc.calls), 2)
+
+    cache.Invalidate(instance_names=["inst2"])
+    self._Call(cache, ["node1", "node2"], 30)
+    self.assertEqual(self.rpc.calls[-1], ["node1"])
+
+    # Node data is not affected
+    self._Call(cache, ["node1", "node2"], 30, kind=livedata.KIND_NODE)
+    self.assertEqual(len(self.rpc.calls), 3)
+
+  def testInvalidateAll(self):
+    cache = livedata.LiveDataCache(60, _time_fn=self._TimeFn)
+    self._Call(cache, ["node1", "node2"], 30)
+    cache.Invalidate()
+    self.assertEqual(cache.GetStats()["entries"], 0)
+    self.assertEqual(cache.GetStats()["invalidations"], 1)
+
+  def testInvalidatedDuringCall(self):
+    cache = livedata.LiveDataCache(60, _time_fn=self._TimeFn)
+
+    def _Fn(node_uuids):
+      cache.Invalidate(node_uuids=["other"])
+      return self.rpc(node_uuids)
+
+    cache.Call(livedata.KIND_INSTANCES, "key", ["node1"], 30, _Fn)
+    self.assertEqual(cache.GetStats()["entries"], 0)
+
+  def testLockInfo(self):
+    cache = livedata.LiveDataCache(60, _time_fn=self._TimeFn)
+    self.assertEqual(cache.GetLockInfo(set()),
+                     [("livedata-cache", None, None, None)])
+    ((name, mode, _, _), ) = cache.GetLockInfo(set([query.LQ_MODE]))
+    self.assertEqual(name, "livedata-cache")
+    self.assertTrue(mode.startswith("ttl=60 "))
+
+
+if __name__ == "__main__":
+  testutils.GanetiTestProgram()
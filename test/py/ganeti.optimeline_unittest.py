@@ -0,0 +1,167 @@
+#!/usr/bin/python
+#
+
+# Copyright (C) 2014 Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Script for unittesting the optimeline module"""
+
+
+import threading
+import unittest
+
+from ganeti import constants
+from ganeti import optimeline
+
+import testutils
+
+
+class _FakeTime:
+  def __init__(self, values):
+    self._values = list(values)
+
+  def __call__(self):
+    return self._values.pop(0)
+
+
+class TestSpans(unittest.TestCase):
+  def tearDown(self):
+    optimeline.SetTimeline(None)
+
+  def testNoTimeline(self):
+    self.assertTrue(optimeline.GetTimeline() is None)
+    span = optimeline.StartSpan(constants.OP_PHASE_LOCK,
+                                _time_fn=NotImplemented)
+    span.End()
+
+  def testRecord(self):
+    timeline = []
+    optimeline.SetTimeline(timeline)
+    self.assertTrue(optimeline.GetTimeline() is timeline)
+
+    span = optimeline.StartSpan(constants.OP_PHASE_LOCK,
+                                _time_fn=_FakeTime([10.0, 12.5]))
+    self.assertEqual(timeline, [])
+    span.End()
+    self.assertEqual(timeline, [[constants.OP_PHASE_LOCK, 10.0, 2.5]])
+
+    span = optimeline.StartSpan(constants.OP_PHASE_RPC,
+                                _time_fn=_FakeTime([13.0, 13.25]))
+    span.End()
+    self.assertEqual(timeline, [
+      [constants.OP_PHASE_LOCK, 10.0, 2.5],
+      [constants.OP_PHASE_RPC, 13.0, 0.25],
+      ])
+
+    optimeline.SetTimeline(None)
+    optimeline.StartSpan(constants.OP_PHASE_RPC,
+                         _time_fn=NotImplemented).End()
+    self.assertEqual(len(timeline), 2)
+
+  def testPerThread(self):
+    timeline = []
+    optimeline.SetTimeline(timeline)
+
+    result = []
+
+    def _Run():
+      result.append(optimeline.GetTimeline())
+
+    thread = threading.Thread(target=_Run)
+    thread.start()
+    thread.join()
+
+    self.assertEqual(result, [None])
+    self.assertTrue(optimeline.GetTimeline() is timeline)
+
+
+class TestAddSpan(unittest.TestCase):
+  def testMaxSpans(self):
+    timeline = []
+
+    for i in range(3):
+      optimeline.AddSpan(timeline, constants.OP_PHASE_CONFIG, i, 1.0,
+                         _max_spans=4)
+    optimeline.AddSpan(timeline, constants.OP_PHASE_HOOKS, 3, 2.0,
+                       _max_spans=4)
+    self.assertEqual(len(timeline), 4)
+
+    # Added to the last span of the same phase
+    optimeline.AddSpan(timeline, constants.OP_PHASE_CONFIG, 4, 0.5,
+                       _max_spans=4)
+    optimeline.AddSpan(timeline, constants.OP_PHASE_HOOKS, 5, 1.0,
+                       _max_spans=4)
+    self.assertEqual(timeline, [
+      [constants.OP_PHASE_CONFIG, 0, 1.0],
+      [constants.OP_PHASE_CONFIG, 1, 1.0],
+      [constants.OP_PHASE_CONFIG, 2, 1.5],
+      [constants.OP_PHASE_HOOKS, 3, 3.0],
+      ])
+
+    # Phase not in timeline yet, the most recent spans of a phase are merged
+    optimeline.AddSpan(timeline, constants.OP_PHASE_LOCK, 6, 4.0,
+                       _max_spans=4)
+    self.assertEqual(timeline, [
+      [constants.OP_PHASE_CONFIG, 0, 1.0],
+      [constants.OP_PHASE_CONFIG, 1, 2.5],
+      [constants.OP_PHASE_HOOKS, 3, 3.0],
+      [constants.OP_PHASE_LOCK, 6, 4.0],
+      ])
+
+  def testMaxSpansNothingToMerge(self):
+    timeline = []
+
+    optimeline.AddSpan(timeline, constants.OP_PHASE_CONFIG, 0, 1.0,
+                       _max_spans=2)
+    optimeline.AddSpan(timeline, constants.OP_PHASE_HOOKS, 1, 2.0,
+                       _max_spans=2)
+    optimeline.AddSpan(timeline, constants.OP_PHASE_LOCK, 3, 4.0,
+                       _max_spans=2)
+    self.assertEqual(timeline, [
+      [constants.OP_PHASE_CONFIG, 0, 1.0],
+      [constants.OP_PHASE_HOOKS, 1, 2.0],
+      ])
+
+  def testPhaseTime(self):
+    timeline = []
+    self.assertEqual(optimeline.GetPhaseTime(timeline,
+                                             constants.OP_PHASE_RPC), 0)
+
+    optimeline.AddSpan(timeline, constants.OP_PHASE_RPC, 1, 0.5)
+    optimeline.AddSpan(timeline, constants.OP_PHASE_EXEC, 1, 3.0)
+    optimeline.AddSpan(timeline, constants.OP_PHASE_RPC, 2, 1.25)
+
+    self.assertEqual(optimeline.GetPhaseTime(timeline,
+                                             constants.OP_PHASE_RPC), 1.75)
+    self.assertEqual(optimeline.GetPhaseTime(timeline,
+                                             constants.OP_PHASE_EXEC), 3.0)
+    self.assertEqual(optimeline.GetPhaseTime(timeline,
+                                             constants.OP_PHASE_LOCK), 0)
+
+
+if __name__ == "__main__":
+  testutils.GanetiTestProgram()
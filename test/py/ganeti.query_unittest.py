@@ -304,6 +304,177 @@ class TestQuery(unittest.TestCase):
     self.assertEqual(len(fdefs), 3)
     self.assertEqual(fdefs["b"][1:], fdefs["c"][1:])
 
+  def _PrepareLimitTest(self):
+    computed = []
+
+    def _GetValue(ctx, item):
+      computed.append(item)
+      return item * 10
+
+    fielddef = query._PrepareFieldList([
+      (query._MakeField("name", "Name", constants.QFT_TEXT, "Name"),
+       None, 0, lambda ctx, item: "node%s" % item),
+      (query._MakeField("value", "Value", constants.QFT_NUMBER, "Value"),
+       None, 0, _GetValue),
+      ], [])
+
+    return (fielddef, computed)
+
+  def testLimitSorted(self):
+    (fielddef, computed) = self._PrepareLimitTest()
+    q = query.Query(fielddef, ["name", "value"], namefield="name")
+    data = [5, 12, 1, 8, 3, 20, 2, 7]
+
+    self.assertEqual(q.Query(_QueryData(data)),
+                     [[(constants.RS_NORMAL, "node%s" % i),
+                       (constants.RS_NORMAL, i * 10)]
+                      for i in sorted(data)])
+    self.assertEqual(len(computed), len(data))
+    self.assertEqual(q.OldStyleQuery(_QueryData(data)),
+                     [["node%s" % i, i * 10] for i in sorted(data)])
+
+    for limit in range(len(data) + 2):
+      self.assertEqual(q.Query(_QueryData(data), limit=limit),
+                       q.Query(_QueryData(data))[:limit])
+
+    # Rows are not computed for items which can't be in the result
+    del computed[:]
+    self.assertEqual(q.Query(_QueryData(data), limit=2),
+                     [[(constants.RS_NORMAL, "node1"),
+                       (constants.RS_NORMAL, 10)],
+                      [(constants.RS_NORMAL, "node2"),
+                       (constants.RS_NORMAL, 20)]])
+    self.assertEqual(computed, [5, 12, 1, 3, 2])
+
+  def testLimitUnsorted(self):
+    (fielddef, computed) = self._PrepareLimitTest()
+    q = query.Query(fielddef, ["value"], namefield="name",
+                    qfilter=[">", "value", 20])
+    data = [5, 1, 8, 3, 20, 2, 7]
+
+    self.assertEqual(q.Query(_QueryData(data), sort_by_name=False, limit=3),
+                     [[(constants.RS_NORMAL, 50)],
+                      [(constants.RS_NORMAL, 80)],
+                      [(constants.RS_NORMAL, 30)]])
+    self.assertEqual(q.Query(_QueryData(data), sort_by_name=False, limit=0),
+                     [])
+
+    # Iterating stops once enough rows have been returned
+    del computed[:]
+    rows = q.IterQuery(_QueryData(data), sort_by_name=False, limit=2)
+    self.assertEqual(rows.next(), [(constants.RS_NORMAL, 50)])
+    self.assertEqual(computed, [5, 5])
+    self.assertEqual(list(rows), [[(constants.RS_NORMAL, 80)]])
+    self.assertEqual(computed, [5, 5, 1, 8, 8])
+
+  def testOffset(self):
+    (fielddef, _) = self._PrepareLimitTest()
+    q = query.Query(fielddef, ["name"], namefield="name")
+    data = [5, 12, 1, 8, 3, 20, 2, 7]
+    rows = q.Query(_QueryData(data))
+
+    for offset in range(len(data) + 2):
+      self.assertEqual(q.Query(_QueryData(data), offset=offset),
+                       rows[offset:])
+      self.assertEqual(q.Query(_QueryData(data), sort_by_name=False,
+                               offset=offset),
+                       [[(constants.RS_NORMAL, "node%s" % i)]
+                        for i in data[offset:]])
+
+      for limit in range(len(data) + 2):
+        self.assertEqual(q.Query(_QueryData(data), offset=offset,
+                                 limit=limit),
+                         rows[offset:offset + limit])
+
+  def testSortBy(self):
+    fielddef = query._PrepareFieldList([
+      (query._MakeField("name", "Name", constants.QFT_TEXT, "Name"),
+       None, 0, lambda ctx, (name, _, __): name),
+      (query._MakeField("size", "Size", constants.QFT_NUMBER, "Size"),
+       None, 0, lambda ctx, (_, size, __): size),
+      (query._MakeField("group", "Group", constants.QFT_TEXT, "Group"),
+       None, 0, lambda ctx, (_, __, group): group),
+      ], [])
+    data = [
+      ("node3", 10, "group2"),
+      ("node10", 30, "group10"),
+      ("node2", query._FS_UNAVAIL, "group1"),
+      ("node1", 30, "group2"),
+      ("node4", 20, "group10"),
+      ]
+
+    def _Names(**kwargs):
+      return [row[0][1]
+              for row in q.Query(_QueryData(data), **kwargs)]
+
+    q = query.Query(fielddef, ["name"], namefield="name", sort_by=["size"])
+    self.assertEqual(_Names(),
+                     ["node3", "node4", "node1", "node10", "node2"])
+    self.assertEqual(_Names(limit=2), ["node3", "node4"])
+    self.assertEqual(_Names(offset=3), ["node10", "node2"])
+
+    # Without sorting by name, ties keep the input data's ordering
+    self.assertEqual(_Names(sort_by_name=False),
+                     ["node3", "node4", "node10", "node1", "node2"])
+
+    # Items without a value are sorted last in descending order too
+    q = query.Query(fielddef, ["name"], namefield="name", sort_by=["-size"])
+    self.assertEqual(_Names(),
+                     ["node1", "node10", "node4", "node3", "node2"])
+    self.assertEqual(_Names(limit=3), ["node1", "node10", "node4"])
+
+    q = query.Query(fielddef, ["name"], namefield="name",
+                    sort_by=["-group", "size"])
+    self.assertEqual(_Names(),
+                     ["node4", "node10", "node3", "node1", "node2"])
+
+    q = query.Query(fielddef, ["name"], sort_by=["group", "-name"])
+    self.assertEqual(_Names(),
+                     ["node2", "node3", "node1", "node10", "node4"])
+
+    self.assertRaises(errors.ParameterError, query.Query, fielddef, ["name"],
+                      sort_by=["-unknown"])
+
+  def testCount(self):
+    (fielddef, computed) = self._PrepareLimitTest()
+    data = [5, 12, 1, 8, 3, 20, 2, 7]
+
+    q = query.Query(fielddef, ["name", "value"], namefield="name")
+    self.assertEqual(q.Count(_QueryData(data)), len(data))
+    self.assertEqual(computed, [])
+
+    q = query.Query(fielddef, ["name", "value"], namefield="name",
+                    qfilter=["<", "value", 50])
+    self.assertEqual(q.Count(_QueryData(data)), 3)
+
+  def testGetQueryResponse(self):
+    (fielddef, _) = self._PrepareLimitTest()
+    q = query.Query(fielddef, ["name"], namefield="name",
+                    qfilter=["<", "value", 100])
+    data = [5, 12, 1, 8, 3, 20, 2, 7]
+
+    response = objects.QueryResponse.FromDict(
+      query.GetQueryResponse(q, _QueryData(data)))
+    self.assertEqual(response.count, 6)
+    self.assertEqual(len(response.data), 6)
+    self.assertEqual([fdef.name for fdef in response.fields], ["name"])
+
+    response = objects.QueryResponse.FromDict(
+      query.GetQueryResponse(q, _QueryData(data), limit=2, offset=1))
+    self.assertEqual(response.count, 6)
+    self.assertEqual(response.data, [[(constants.RS_NORMAL, "node2")],
+                                     [(constants.RS_NORMAL, "node3")]])
+
+    response = objects.QueryResponse.FromDict(
+      query.GetQueryResponse(q, _QueryData(data), count_only=True))
+    self.assertEqual(response.count, 6)
+    self.assertEqual(response.data, [])
+
+    self.assertRaises(errors.ParameterError, query.GetQueryResponse, q,
+                      _QueryData(data), limit=-1)
+    self.assertRaises(errors.ParameterError, query.GetQueryResponse, q,
+                      _QueryData(data), offset=-1)
+
 
 class TestGetNodeRole(unittest.TestCase):
   def test(self):
@@ -1412,6 +1412,27 @@ class GanetiRapiClientTests(testutils.GanetiTestCase):
           self.assertEqual(data["qfilter"], qfilter)
         self.assertEqual(self.rapi.CountPending(), 0)
 
+  def testQueryPaging(self):
+    self.rapi.AddResponse("1")
+    self.assertEqual(self.client.Query(constants.QR_NODE, ["name"],
+                                       sort_by=["-name"], limit=10, offset=5),
+                     1)
+    self.assertHandler(rlib2.R_2_query)
+    data = serializer.LoadJson(self.rapi.GetLastRequestData())
+    self.assertEqual(data["sort_by"], ["-name"])
+    self.assertEqual(data["limit"], 10)
+    self.assertEqual(data["offset"], 5)
+    self.assertFalse("count_only" in data)
+
+    self.rapi.AddResponse("2")
+    self.assertEqual(self.client.Query(constants.QR_NODE, ["name"],
+                                       count_only=True),
+                     2)
+    data = serializer.LoadJson(self.rapi.GetLastRequestData())
+    self.assertTrue(data["count_only"])
+    self.assertFalse(set(["sort_by", "limit", "offset"]) & set(data))
+    self.assertEqual(self.rapi.CountPending(), 0)
+
   def testQueryFields(self):
     exp_result = objects.QueryFieldsResponse(fields=[
       objects.QueryFieldDefinition(name="pnode", title="PNode",
@@ -264,13 +264,16 @@ class TestRpcProcessor(unittest.TestCase):
 
       if name in httperrnodes:
         self.assert_(lhresp.fail_msg)
+        self.assertFalse(lhresp.unknown_call)
         self.assertRaises(errors.OpExecError, lhresp.Raise, "failed")
       elif name in failnodes:
         self.assert_(lhresp.fail_msg)
+        self.assertTrue(lhresp.unknown_call)
         self.assertRaises(errors.OpPrereqError, lhresp.Raise, "failed",
                           prereq=True, ecode=errors.ECODE_INVAL)
       else:
         self.assertFalse(lhresp.fail_msg)
+        self.assertFalse(lhresp.unknown_call)
         self.assertEqual(lhresp.payload, hash(name))
         lhresp.Raise("should not raise")
 
@@ -78,6 +78,12 @@ class TestSerializer(testutils.GanetiTestCase):
   def testSignedJson(self):
     self._TestSigned(serializer.DumpSignedJson, serializer.LoadSignedJson)
 
+  def testJsonString(self):
+    for value in ["", "test", "quote\"", "new\nline", u"\u00fcml\u00e4ut"]:
+      txt = serializer.DumpJsonString(value)
+      self.assertEqual(txt, serializer.DumpJson(value).rstrip("\n"))
+      self.assertEqual(serializer.LoadJson(txt), value)
+
   def _TestSigned(self, dump_fn, load_fn):
     for data in self._TESTDATA:
       self.assertEqualValues(load_fn(dump_fn(data, "mykey"), "mykey"),
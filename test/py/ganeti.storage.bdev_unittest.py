@@ -39,7 +39,6 @@ from ganeti import compat
 from ganeti import constants
 from ganeti import errors
 from ganeti import objects
-from ganeti import utils
 from ganeti.storage import bdev
 
 import testutils
@@ -229,39 +228,42 @@ class TestLogicalVolume(unittest.TestCase):
         self.assertEqual(parsed, exp)
 
   @staticmethod
-  def _FakeRunCmd(success, stdout):
-    if success:
-      exit_code = 0
-    else:
-      exit_code = 1
-    return lambda cmd: utils.RunResult(exit_code, None, stdout, "", cmd,
-                                       utils.process._TIMEOUT_NONE, 5)
+  def _FakeGetRows(success, stdout):
+    def fn(listing, fields, names=None, units="m"):
+      assert listing == "lvs"
+      assert names == ["fake_path"]
+      assert units == "k"
+      if not success:
+        raise errors.CommandError("Fake error msg")
+      return [line.strip().split("|") for line in stdout.splitlines()]
+    return fn
 
   def testGetLvInfo(self):
     """Tests for LogicalVolume._GetLvInfo."""
     self.assertRaises(errors.BlockDeviceError, bdev.LogicalVolume._GetLvInfo,
                       "fake_path",
-                      _run_cmd=self._FakeRunCmd(False, "Fake error msg"))
+                      _get_rows_fn=self._FakeGetRows(False, "Fake error msg"))
     self.assertRaises(errors.BlockDeviceError, bdev.LogicalVolume._GetLvInfo,
-                      "fake_path", _run_cmd=self._FakeRunCmd(True, ""))
+                      "fake_path", _get_rows_fn=self._FakeGetRows(True, ""))
     self.assertRaises(errors.BlockDeviceError, bdev.LogicalVolume._GetLvInfo,
-                      "fake_path", _run_cmd=self._FakeRunCmd(True, "BadStdOut"))
+                      "fake_path",
+                      _get_rows_fn=self._FakeGetRows(True, "BadStdOut"))
     good_line = "  -wi-ao|253|3|4096.00|2|/dev/abc(20)"
-    fake_cmd = self._FakeRunCmd(True, good_line)
-    good_res = bdev.LogicalVolume._GetLvInfo("fake_path", _run_cmd=fake_cmd)
+    fake_fn = self._FakeGetRows(True, good_line)
+    good_res = bdev.LogicalVolume._GetLvInfo("fake_path", _get_rows_fn=fake_fn)
     # If the same line is repeated, the result should be the same
     for lines in [
       [good_line] * 2,
       [good_line] * 3,
       ]:
-      fake_cmd = self._FakeRunCmd(True, "\n".join(lines))
-      same_res = bdev.LogicalVolume._GetLvInfo("fake_path", fake_cmd)
+      fake_fn = self._FakeGetRows(True, "\n".join(lines))
+      same_res = bdev.LogicalVolume._GetLvInfo("fake_path", fake_fn)
       self.assertEqual(same_res, good_res)
 
     # Complex multi-line examples
     one_line = "  -wi-ao|253|3|4096.00|2|/dev/sda(20),/dev/sdb(50),/dev/sdc(0)"
-    fake_cmd = self._FakeRunCmd(True, one_line)
-    one_res = bdev.LogicalVolume._GetLvInfo("fake_path", _run_cmd=fake_cmd)
+    fake_fn = self._FakeGetRows(True, one_line)
+    one_res = bdev.LogicalVolume._GetLvInfo("fake_path", _get_rows_fn=fake_fn)
     # These should give the same results
     for multi_lines in [
       ("  -wi-ao|253|3|4096.00|2|/dev/sda(30),/dev/sdb(50)\n"
@@ -272,8 +274,9 @@ class TestLogicalVolume(unittest.TestCase):
       ("  -wi-ao|253|3|4096.00|2|/dev/sda(20)\n"
        "  -wi-ao|253|3|4096.00|2|/dev/sdb(50),/dev/sdc(0)"),
       ]:
-      fake_cmd = self._FakeRunCmd(True, multi_lines)
-      multi_res = bdev.LogicalVolume._GetLvInfo("fake_path", _run_cmd=fake_cmd)
+      fake_fn = self._FakeGetRows(True, multi_lines)
+      multi_res = bdev.LogicalVolume._GetLvInfo("fake_path",
+                                                _get_rows_fn=fake_fn)
       self.assertEqual(multi_res, one_res)
 
 
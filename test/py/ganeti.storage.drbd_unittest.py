@@ -32,9 +32,11 @@
 
 
 import os
+import mock
 
 from ganeti import constants
 from ganeti import errors
+from ganeti import utils
 from ganeti.storage import drbd
 from ganeti.storage import drbd_info
 from ganeti.storage import drbd_cmdgen
@@ -284,6 +286,49 @@ class TestDRBD8Runner(testutils.GanetiTestCase):
                         8, 3, 11, option, True)
 
 
+class TestFastShowInfo(testutils.GanetiTestCase):
+  """Testing case for drbd_info.FastShowInfo"""
+
+  _TEST_DATA = [
+    ("bdev-drbd-8.0.txt", drbd_info.DRBD83ShowInfo),
+    ("bdev-drbd-8.3.txt", drbd_info.DRBD83ShowInfo),
+    ("bdev-drbd-8.4.txt", drbd_info.DRBD84ShowInfo),
+    ("bdev-drbd-8.4-no-disk-params.txt", drbd_info.DRBD84ShowInfo),
+    ("bdev-drbd-net-ip4.txt", drbd_info.DRBD83ShowInfo),
+    ("bdev-drbd-net-ip6.txt", drbd_info.DRBD83ShowInfo),
+    ("bdev-drbd-disk.txt", drbd_info.DRBD83ShowInfo),
+    ]
+
+  def testSameResult(self):
+    for (name, parser) in self._TEST_DATA:
+      data = testutils.ReadTestData(name)
+      self.assertEqual(drbd_info.FastShowInfo.GetDevInfo(data),
+                       parser.GetDevInfo(data), msg=name)
+
+  def testEmpty(self):
+    self.assertEqual(drbd_info.FastShowInfo.GetDevInfo(""), {})
+    self.assertEqual(drbd_info.FastShowInfo.GetDevInfo(None), {})
+
+  def testComments(self):
+    data = "\n".join([
+      "# resource r0 on node1: not ignored, not stacked",
+      "_this_host { # comment",
+      "  address ipv4 192.0.2.1:11000; # another comment",
+      "}",
+      ])
+    self.assertEqual(drbd_info.FastShowInfo.GetDevInfo(data), {
+      "local_addr": ("192.0.2.1", 11000),
+      })
+
+  def testInvalid(self):
+    for data in ["_this_host {", "_this_host { disk /dev/a; } }",
+                 "_this_host { disk /dev/a }", "_this_host { address x:y; }",
+                 "_this_host { meta-disk /dev/a [b]; }",
+                 "_this_host { disk \"/dev/a; }"]:
+      self.assertRaises(errors.BlockDeviceError,
+                        drbd_info.FastShowInfo.GetDevInfo, data)
+
+
 class TestDRBD8Status(testutils.GanetiTestCase):
   """Testing case for DRBD8Dev /proc status"""
 
@@ -469,5 +514,77 @@ class TestDRBD8Construction(testutils.GanetiTestCase):
     self.assertTrue(isinstance(inst._cmd_gen, drbd_cmdgen.DRBD84CmdGenerator))
 
 
+class TestDRBD8Cache(testutils.GanetiTestCase):
+  def setUp(self):
+    testutils.GanetiTestCase.setUp(self)
+    self.proc_info = \
+      drbd_info.DRBD8Info.CreateFromFile(
+        filename=testutils.TestDataFilename("proc_drbd84.txt"))
+    self.show_data = testutils.ReadTestData("bdev-drbd-8.4.txt")
+
+    self.test_unique_id = ("hosta.com", 123, "host2.com", 123, 0, "secret")
+    self.test_dyn_params = {
+      constants.DDP_LOCAL_IP: "192.0.2.1",
+      constants.DDP_LOCAL_MINOR: 0,
+      constants.DDP_REMOTE_IP: "192.0.2.2",
+      constants.DDP_REMOTE_MINOR: 0,
+    }
+
+    drbd.StartCaching()
+
+  def tearDown(self):
+    drbd.StopCaching()
+    testutils.GanetiTestCase.tearDown(self)
+
+  @testutils.patch_object(drbd.DRBD8Info, "CreateFromFile")
+  def testProcInfo(self, create_fn):
+    create_fn.return_value = self.proc_info
+
+    self.assertEqual(drbd.DRBD8.GetProcInfo(), self.proc_info)
+    self.assertEqual(drbd.DRBD8.GetUsedDevs(), [0, 1, 4, 6, 8])
+    self.assertEqual(create_fn.call_count, 1)
+
+    drbd.Invalidate()
+    drbd.DRBD8.GetProcInfo()
+    self.assertEqual(create_fn.call_count, 2)
+
+    self.assertEqual(drbd.StopCaching(), (2, 3))
+
+    drbd.DRBD8.GetProcInfo()
+    drbd.DRBD8.GetProcInfo()
+    self.assertEqual(create_fn.call_count, 4)
+    self.assertEqual(drbd.StopCaching(), (0, 0))
+
+  @testutils.patch_object(utils, "RunCmd")
+  @testutils.patch_object(drbd.DRBD8, "GetProcInfo")
+  def testShowInfo(self, proc_info_fn, run_fn):
+    proc_info_fn.return_value = self.proc_info
+    run_fn.return_value = mock.Mock(failed=False, stdout=self.show_data)
+
+    inst = drbd.DRBD8Dev(self.test_unique_id, [], 123, {}, self.test_dyn_params)
+    info = inst._GetShowInfo(0)
+    self.assertEqual(info["local_dev"], "/dev/xenvg/test.data")
+    self.assertEqual(inst._GetShowInfo(0), info)
+    self.assertEqual(run_fn.call_count, 1)
+
+    # Commands changing devices invalidate the cached data
+    drbd._RunChangingCmd(["drbdsetup", "0", "secondary"])
+    self.assertEqual(run_fn.call_count, 2)
+    self.assertEqual(inst._GetShowInfo(0), info)
+    self.assertEqual(run_fn.call_count, 3)
+
+  @testutils.patch_object(utils, "RunCmd")
+  @testutils.patch_object(drbd.DRBD8, "GetProcInfo")
+  def testShowDataFailure(self, proc_info_fn, run_fn):
+    proc_info_fn.return_value = self.proc_info
+    run_fn.return_value = mock.Mock(failed=True, fail_reason="exited",
+                                    output="error")
+
+    inst = drbd.DRBD8Dev(self.test_unique_id, [], 123, {}, self.test_dyn_params)
+    self.assertEqual(inst._GetShowInfo(0), {})
+    self.assertEqual(inst._GetShowInfo(0), {})
+    self.assertEqual(run_fn.call_count, 2)
+
+
 if __name__ == "__main__":
   testutils.GanetiTestProgram()
@@ -0,0 +1,218 @@
+#!/usr/bin/python
+#
+
+# Copyright (C) 2014 Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Script for unittesting the ganeti.storage.lvm_state module"""
+
+import unittest
+
+from ganeti import errors
+from ganeti import utils
+from ganeti.storage import lvm_state
+
+import testutils
+
+
+_MIB = 1024 * 1024
+
+# pv_name, pv_attr, pv_size, pv_free, pv_used, vg_name, vg_attr, vg_size,
+# vg_free, lv_name
+_PVS_OUTPUT = "\n".join([
+  "  /dev/sda|a--|%d|%d|%d|xenvg|wz--n-|%d|%d|lv1" %
+  (100 * _MIB, 20 * _MIB, 80 * _MIB, 300 * _MIB, 120 * _MIB),
+  "  /dev/sda|a--|%d|%d|%d|xenvg|wz--n-|%d|%d|lv2" %
+  (100 * _MIB, 20 * _MIB, 80 * _MIB, 300 * _MIB, 120 * _MIB),
+  "  /dev/sda|a--|%d|%d|%d|xenvg|wz--n-|%d|%d|" %
+  (100 * _MIB, 20 * _MIB, 80 * _MIB, 300 * _MIB, 120 * _MIB),
+  "  /dev/sdb|a--|%d|%d|0|xenvg|wz--n-|%d|%d|" %
+  (200 * _MIB, 100 * _MIB, 300 * _MIB, 120 * _MIB),
+  "  /dev/sdc|---|%d|%d|0|||||" % (50 * _MIB, 50 * _MIB),
+  ])
+
+# vg_name, lv_name, lv_attr, lv_size, lv_tags, lv_kernel_major,
+# lv_kernel_minor, vg_extent_size, stripes, devices
+_LVS_OUTPUT = "\n".join([
+  "  xenvg|lv1|-wi-ao|%d|tag1,tag2|253|0|%d|1|/dev/sda(0)" %
+  (60 * _MIB + 512 * 1024, 4 * _MIB),
+  "  xenvg|lv1|-wi-ao|%d|tag1,tag2|253|0|%d|1|/dev/sdb(0)" %
+  (60 * _MIB + 512 * 1024, 4 * _MIB),
+  "  xenvg|lv2|-wi-a-|%d||253|1|%d|1|/dev/sda(10)" %
+  (40 * _MIB, 4 * _MIB),
+  ])
+
+
+class _FakeRunCmd:
+  def __init__(self, success=True):
+    self._success = success
+    self.commands = []
+
+  def __call__(self, cmd):
+    self.commands.append(cmd[0])
+
+    if cmd[0] == "pvs":
+      stdout = _PVS_OUTPUT
+    elif cmd[0] == "lvs":
+      stdout = _LVS_OUTPUT
+    else:
+      raise AssertionError("Unexpected command %s" % cmd)
+
+    if self._success:
+      exit_code = 0
+    else:
+      exit_code = 1
+      stdout = ""
+
+    return utils.RunResult(exit_code, None, stdout, "", cmd,
+                           utils.process._TIMEOUT_NONE, 5)
+
+
+class TestLvmState(unittest.TestCase):
+  def setUp(self):
+    self.run_cmd = _FakeRunCmd()
+    self.state = lvm_state.LvmState(_run_cmd=self.run_cmd)
+
+  def testPvs(self):
+    self.assertEqual(self.state.GetRows("pvs", ["pv_name", "pv_size",
+                                                "pv_free", "vg_name"]), [
+      ["/dev/sda", "100.00", "20.00", "xenvg"],
+      ["/dev/sdb", "200.00", "100.00", "xenvg"],
+      ["/dev/sdc", "50.00", "50.00", ""],
+      ])
+
+    self.assertEqual(self.state.GetRows("pvs", ["pv_name", "lv_name"],
+                                        names=["/dev/sda"]), [
+      ["/dev/sda", "lv1"],
+      ["/dev/sda", "lv2"],
+      ["/dev/sda", ""],
+      ])
+
+  def testVgs(self):
+    self.assertEqual(self.state.GetRows("vgs", ["vg_name", "vg_size",
+                                                "vg_free"], units="b"), [
+      ["xenvg", str(300 * _MIB), str(120 * _MIB)],
+      ])
+
+  def testLvs(self):
+    self.assertEqual(self.state.GetRows("lvs", ["vg_name", "lv_name",
+                                                "lv_size", "lv_tags"]), [
+      ["xenvg", "lv1", "60.50", "tag1,tag2"],
+      ["xenvg", "lv2", "40.00", ""],
+      ])
+
+    self.assertEqual(self.state.GetRows("lvs", ["vg_extent_size", "devices"],
+                                        names=["/dev/xenvg/lv1"],
+                                        units="k"), [
+      ["4096.00", "/dev/sda(0)"],
+      ["4096.00", "/dev/sdb(0)"],
+      ])
+
+    for name in ["xenvg/lv2", "/dev/xenvg/lv2"]:
+      self.assertEqual(self.state.GetRows("lvs", ["lv_attr"], names=[name]),
+                       [["-wi-a-"]])
+
+    self.assertEqual(len(self.state.GetRows("lvs", ["lv_name"],
+                                            names=["xenvg"])), 2)
+
+  def testMissingName(self):
+    self.assertRaises(errors.CommandError, self.state.GetRows, "lvs",
+                      ["lv_name"], names=["/dev/xenvg/missing"])
+    self.assertRaises(errors.CommandError, self.state.GetRows, "vgs",
+                      ["vg_name"], names=["othervg"])
+    self.assertRaises(errors.CommandError, self.state.GetRows, "pvs",
+                      ["pv_name"], names=["/dev/sda", "/dev/sdx"])
+
+  def testInvalidFields(self):
+    self.assertRaises(errors.ProgrammerError, self.state.GetRows, "lvs", [])
+    self.assertRaises(errors.ProgrammerError, self.state.GetRows, "vgs",
+                      ["pv_name"])
+    self.assertRaises(errors.ProgrammerError, self.state.GetRows, "lvs",
+                      ["lv_name", "unknown_field"])
+    self.assertEqual(self.run_cmd.commands, [])
+
+  def testCaching(self):
+    self.state.GetRows("vgs", ["vg_name"])
+    self.state.GetRows("pvs", ["pv_name"])
+    self.state.GetRows("lvs", ["lv_name"])
+    self.state.GetRows("lvs", ["lv_size"], names=["xenvg/lv1"])
+    self.assertEqual(self.run_cmd.commands, ["pvs", "lvs"])
+    self.assertEqual((self.state.commands, self.state.lookups), (2, 4))
+
+    self.state.Invalidate()
+    self.state.GetRows("lvs", ["lv_name"])
+    self.assertEqual(self.run_cmd.commands, ["pvs", "lvs", "lvs"])
+    self.assertEqual((self.state.commands, self.state.lookups), (3, 5))
+
+  def testInvalidateWhileLoading(self):
+    run_cmd = _FakeRunCmd()
+
+    def _RunCmd(cmd):
+      # Another thread modifies a logical volume while the command runs
+      state.Invalidate()
+      return run_cmd(cmd)
+
+    state = lvm_state.LvmState(_run_cmd=_RunCmd)
+    state.GetRows("lvs", ["lv_name"])
+    state.GetRows("lvs", ["lv_name"])
+    self.assertEqual(run_cmd.commands, ["lvs", "lvs"])
+
+  def testCommandFailure(self):
+    state = lvm_state.LvmState(_run_cmd=_FakeRunCmd(success=False))
+    self.assertRaises(errors.CommandError, state.GetRows, "pvs", ["pv_name"])
+
+  def testInvalidOutput(self):
+    def _RunCmd(cmd):
+      return utils.RunResult(0, None, "a|b|c\n", "", cmd,
+                             utils.process._TIMEOUT_NONE, 5)
+
+    state = lvm_state.LvmState(_run_cmd=_RunCmd)
+    self.assertRaises(errors.CommandError, state.GetRows, "lvs", ["lv_name"])
+
+
+class TestCaching(unittest.TestCase):
+  def tearDown(self):
+    lvm_state.StopCaching()
+
+  def test(self):
+    self.assertEqual(lvm_state.StopCaching(), (0, 0))
+
+    lvm_state.StartCaching()
+    self.assertTrue(lvm_state._cache is not None)
+    lvm_state._cache = lvm_state.LvmState(_run_cmd=_FakeRunCmd())
+
+    lvm_state.GetRows("lvs", ["lv_name"])
+    lvm_state.GetRows("lvs", ["lv_attr"], names=["xenvg/lv1"])
+    lvm_state.Invalidate()
+    lvm_state.GetRows("lvs", ["lv_name"])
+
+    self.assertEqual(lvm_state.StopCaching(), (2, 3))
+    self.assertTrue(lvm_state._cache is None)
+
+
+if __name__ == "__main__":
+  testutils.GanetiTestProgram()
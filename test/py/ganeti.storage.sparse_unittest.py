@@ -0,0 +1,308 @@
+#!/usr/bin/python
+#
+
+# Copyright (C) 2014 Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Script for unittesting the ganeti.storage.sparse module"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from cStringIO import StringIO
+
+from ganeti import compat
+from ganeti import errors
+from ganeti import utils
+from ganeti.storage import sparse
+
+import testutils
+
+
+_KIB = 1024
+_MIB = 1024 * 1024
+
+
+def _WriteAt(path, offset, data):
+  fd = os.open(path, os.O_WRONLY)
+  try:
+    os.lseek(fd, offset, os.SEEK_SET)
+    os.write(fd, data)
+  finally:
+    os.close(fd)
+
+
+def _CreateSparseFile(path, size, regions):
+  fh = open(path, "w")
+  try:
+    fh.truncate(size)
+  finally:
+    fh.close()
+
+  for (offset, data) in regions:
+    _WriteAt(path, offset, data)
+
+
+class TestSplitNonZero(unittest.TestCase):
+  def test(self):
+    zero = "\0" * 4
+    fn = sparse._SplitNonZero
+    self.assertEqual(fn("", 0, zero), [])
+    self.assertEqual(fn("\0" * 16, 100, zero), [])
+    self.assertEqual(fn("\0" * 4 + "x" + "\0" * 11, 100, zero), [(104, 108)])
+    self.assertEqual(fn("x" + "\0" * 7 + "y" + "\0" * 3 + "zz", 0, zero),
+                     [(0, 4), (8, 14)])
+    self.assertEqual(fn("xxxxyyyy\0\0", 8, zero), [(8, 16)])
+
+
+class TestCopy(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.src = utils.PathJoin(self.tmpdir, "src")
+    self.dest = utils.PathJoin(self.tmpdir, "dest")
+    self.stream = utils.PathJoin(self.tmpdir, "stream")
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def _Copy(self, size, **kwargs):
+    fd = os.open(self.stream, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600)
+    try:
+      send_stats = sparse.SendDevice(self.src, size, fd, **kwargs)
+    finally:
+      os.close(fd)
+
+    stream = utils.ReadFile(self.stream)
+    recv_stats = sparse.ReceiveDevice(StringIO(stream), self.dest, **kwargs)
+
+    self.assertEqual(send_stats.size, size)
+    self.assertEqual(recv_stats.size, size)
+    self.assertEqual(send_stats.data, recv_stats.data)
+
+    return (stream, recv_stats)
+
+  def testSparse(self):
+    size = 8 * _MIB
+    regions = [
+      (0, "boot sector"),
+      (3 * _MIB + 100, "x" * (200 * _KIB)),
+      (size - 10, "end" * 3),
+      ]
+    _CreateSparseFile(self.src, size, regions)
+
+    # Destination with stale data everywhere
+    utils.WriteFile(self.dest, data="\xaa" * size)
+
+    (stream, stats) = self._Copy(size)
+
+    self.assertEqual(utils.ReadFile(self.dest), utils.ReadFile(self.src))
+    self.assertTrue(len(stream) < 512 * _KIB)
+    self.assertTrue(stats.data < 512 * _KIB)
+    self.assertEqual(stats.data + stats.zeroed, size)
+
+  def testZeroesNotWritten(self):
+    size = 4 * _MIB
+    # Zeroes in the middle of data, as on a block device
+    utils.WriteFile(self.src, data=("a" * _MIB + "\0" * (2 * _MIB) +
+                                    "b" * _MIB))
+    utils.WriteFile(self.dest, data=("\0" * size))
+
+    (stream, stats) = self._Copy(size)
+
+    self.assertEqual(utils.ReadFile(self.dest), utils.ReadFile(self.src))
+    self.assertEqual(stats.data, 2 * _MIB)
+    self.assertEqual(stats.zeroed, 0)
+    self.assertTrue(len(stream) < 2 * _MIB + 100)
+
+  def testEmpty(self):
+    _CreateSparseFile(self.src, 2 * _MIB, [])
+    utils.WriteFile(self.dest, data=("x" + "\0" * (2 * _MIB - 2) + "y"))
+
+    (stream, stats) = self._Copy(2 * _MIB)
+
+    self.assertEqual(utils.ReadFile(self.dest), "\0" * (2 * _MIB))
+    self.assertEqual(stats.data, 0)
+    self.assertEqual(stats.zeroed, 2 * sparse.ZERO_BLOCK_SIZE)
+    self.assertEqual(len(stream), len(sparse.MAGIC) + sparse._HEADER.size)
+
+  def testShortDestinationFile(self):
+    size = 3 * _MIB
+    utils.WriteFile(self.src, data=("\0" * (2 * _MIB) + "x" * _MIB))
+    utils.WriteFile(self.dest, data="")
+
+    self._Copy(size)
+
+    self.assertEqual(utils.ReadFile(self.dest), utils.ReadFile(self.src))
+
+  def testSmallBuffers(self):
+    size = 1 * _MIB
+    data = "".join(chr(i % 256) * (i % 3) * 1000 for i in range(700))
+    data = (data + "\0" * size)[:size]
+    utils.WriteFile(self.src, data=data)
+    utils.WriteFile(self.dest, data=("\x01" * size))
+
+    self._Copy(size, buffer_size=16 * _KIB, block_size=4 * _KIB)
+
+    self.assertEqual(utils.ReadFile(self.dest), data)
+
+  def testShortSourceFile(self):
+    # Data beyond the end of a file reads back as zeroes
+    utils.WriteFile(self.src, data="x" * _MIB)
+    utils.WriteFile(self.dest, data="y" * (2 * _MIB))
+
+    (_, stats) = self._Copy(2 * _MIB)
+
+    self.assertEqual(utils.ReadFile(self.dest), "x" * _MIB + "\0" * _MIB)
+    self.assertEqual(stats.data, _MIB)
+
+  def testInvalidStreams(self):
+    utils.WriteFile(self.dest, data="")
+
+    for stream in ["", "foo bar\n", sparse.MAGIC,
+                   sparse.MAGIC + sparse._HEADER.pack(0, 100) + "short",
+                   sparse.MAGIC + sparse._HEADER.pack(100, 10) + "x" * 10 +
+                   sparse._HEADER.pack(50, 10) + "y" * 10]:
+      self.assertRaises(errors.GenericError, sparse.ReceiveDevice,
+                        StringIO(stream), self.dest)
+
+
+class TestStream(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.encoded = utils.PathJoin(self.tmpdir, "encoded")
+    self.decoded = utils.PathJoin(self.tmpdir, "decoded")
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def _Transfer(self, data, buffer_size=sparse.BUFFER_SIZE,
+                block_size=sparse.ZERO_BLOCK_SIZE):
+    fd = os.open(self.encoded, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600)
+    try:
+      enc_stats = sparse.EncodeStream(StringIO(data), fd,
+                                      buffer_size=buffer_size,
+                                      block_size=block_size)
+    finally:
+      os.close(fd)
+
+    encoded = utils.ReadFile(self.encoded)
+
+    fd = os.open(self.decoded, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600)
+    try:
+      dec_stats = sparse.DecodeStream(StringIO(encoded), fd,
+                                      buffer_size=buffer_size)
+    finally:
+      os.close(fd)
+
+    self.assertEqual(utils.ReadFile(self.decoded), data)
+    self.assertEqual(enc_stats.size, len(data))
+    self.assertEqual(dec_stats.size, len(data))
+    self.assertEqual(enc_stats.data, dec_stats.data)
+    self.assertEqual(dec_stats.data + dec_stats.zeroed, len(data))
+
+    return (encoded, dec_stats)
+
+  def test(self):
+    data = ("boot sector" + "\0" * (3 * _MIB) + "x" * (200 * _KIB) +
+            "\0" * (2 * _MIB) + "end")
+
+    (encoded, stats) = self._Transfer(data)
+
+    self.assertTrue(len(encoded) < 512 * _KIB)
+    self.assertTrue(stats.data < 512 * _KIB)
+
+  def testEmpty(self):
+    (encoded, stats) = self._Transfer("")
+    self.assertEqual(encoded, sparse.MAGIC + sparse._HEADER.pack(0, 0))
+    self.assertEqual(stats.data, 0)
+
+  def testOnlyZeroes(self):
+    (encoded, stats) = self._Transfer("\0" * (5 * _MIB + 123))
+    self.assertEqual(encoded,
+                     sparse.MAGIC + sparse._HEADER.pack(5 * _MIB + 123, 0))
+    self.assertEqual(stats.data, 0)
+
+  def testSmallBuffers(self):
+    data = "".join(("\0" * 3000 + chr(i) * 100) for i in range(1, 50))
+    self._Transfer(data, buffer_size=1024, block_size=256)
+
+  def testInvalidStreams(self):
+    for stream in ["", "foo bar\n", sparse.MAGIC,
+                   sparse.MAGIC + sparse._HEADER.pack(0, 100) + "short",
+                   sparse.MAGIC + sparse._HEADER.pack(100, 10) + "x" * 10 +
+                   sparse._HEADER.pack(50, 10) + "y" * 10]:
+      fd = os.open(self.decoded, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600)
+      try:
+        self.assertRaises(errors.GenericError, sparse.DecodeStream,
+                          StringIO(stream), fd)
+      finally:
+        os.close(fd)
+
+
+class TestGetDataExtents(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.path = utils.PathJoin(self.tmpdir, "file")
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def _GetExtents(self, start, end):
+    fd = os.open(self.path, os.O_RDONLY)
+    try:
+      return sparse.GetDataExtents(fd, start, end)
+    finally:
+      os.close(fd)
+
+  def test(self):
+    size = 16 * _MIB
+    _CreateSparseFile(self.path, size, [(4 * _MIB, "x" * _MIB)])
+
+    extents = self._GetExtents(0, size)
+
+    # File systems without support for holes report the whole file
+    self.assertTrue(extents)
+    for (start, end) in extents:
+      self.assertTrue(0 <= start < end <= size)
+    self.assertTrue(compat.any(start <= 4 * _MIB and end >= 5 * _MIB
+                               for (start, end) in extents))
+
+    self.assertEqual(self._GetExtents(size, size), [])
+    self.assertEqual(self._GetExtents(size, size + 100), [])
+
+  def testPipe(self):
+    (read_fd, write_fd) = os.pipe()
+    try:
+      self.assertEqual(sparse.GetDataExtents(read_fd, 10, 100), [(10, 100)])
+    finally:
+      os.close(read_fd)
+      os.close(write_fd)
+
+
+if __name__ == "__main__":
+  testutils.GanetiTestProgram()
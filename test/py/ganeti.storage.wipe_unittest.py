@@ -0,0 +1,199 @@
+#!/usr/bin/python
+#
+
+# Copyright (C) 2014 Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Script for unittesting the ganeti.storage.wipe module"""
+
+import errno
+import os
+import shutil
+import tempfile
+import unittest
+
+from ganeti import utils
+from ganeti.storage import wipe
+
+import testutils
+
+
+_MIB = 1024 * 1024
+
+
+class _FakeIoctl:
+  def __init__(self, unsupported=None, fail_after=None):
+    self._unsupported = frozenset(unsupported or [])
+    self._fail_after = fail_after
+    self.calls = []
+
+  def __call__(self, fd, request, offset, length):
+    assert isinstance(fd, int)
+
+    if request in self._unsupported:
+      raise EnvironmentError(errno.EOPNOTSUPP, "Operation not supported")
+
+    if self._fail_after is not None and len(self.calls) >= self._fail_after:
+      raise EnvironmentError(errno.ENOTTY, "Inappropriate ioctl")
+
+    self.calls.append((request, offset, length))
+
+
+class _ProgressTracker:
+  def __init__(self):
+    self.history = []
+
+  def __call__(self, method, mbytes):
+    if self.history:
+      assert mbytes >= self.history[-1][1]
+    self.history.append((method, mbytes))
+
+
+class TestWipeDevice(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.path = utils.PathJoin(self.tmpdir, "device")
+    utils.WriteFile(self.path, data=("\xff" * (10 * _MIB)))
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def testDiscard(self):
+    ioctl = _FakeIoctl()
+    progress = _ProgressTracker()
+
+    method = wipe.WipeDevice(self.path, 2, 7, 3, 1, progress,
+                             _ioctl_fn=ioctl,
+                             _discard_zeroes_fn=lambda _: True)
+
+    self.assertEqual(method, wipe.METHOD_DISCARD)
+    self.assertEqual(ioctl.calls, [
+      (wipe._BLKDISCARD, 2 * _MIB, 3 * _MIB),
+      (wipe._BLKDISCARD, 5 * _MIB, 3 * _MIB),
+      (wipe._BLKDISCARD, 8 * _MIB, 1 * _MIB),
+      ])
+    self.assertEqual(progress.history, [
+      (wipe.METHOD_DISCARD, 3),
+      (wipe.METHOD_DISCARD, 6),
+      (wipe.METHOD_DISCARD, 7),
+      ])
+
+    # Data must not have been written
+    self.assertEqual(utils.ReadFile(self.path), "\xff" * (10 * _MIB))
+
+  def testZeroOut(self):
+    for discard_zeroes in [False, True]:
+      ioctl = _FakeIoctl(unsupported=[wipe._BLKDISCARD])
+      progress = _ProgressTracker()
+
+      method = wipe.WipeDevice(self.path, 0, 10, 5, 1, progress,
+                               _ioctl_fn=ioctl,
+                               _discard_zeroes_fn=lambda _: discard_zeroes)
+
+      self.assertEqual(method, wipe.METHOD_ZEROOUT)
+      self.assertEqual(ioctl.calls, [
+        (wipe._BLKZEROOUT, 0, 5 * _MIB),
+        (wipe._BLKZEROOUT, 5 * _MIB, 5 * _MIB),
+        ])
+      self.assertEqual(progress.history[-1], (wipe.METHOD_ZEROOUT, 10))
+
+  def testWriteZeroes(self):
+    ioctl = _FakeIoctl(unsupported=[wipe._BLKDISCARD, wipe._BLKZEROOUT])
+    progress = _ProgressTracker()
+
+    method = wipe.WipeDevice(self.path, 3, 5, 2, 2, progress,
+                             _ioctl_fn=ioctl,
+                             _discard_zeroes_fn=lambda _: True)
+
+    self.assertEqual(method, wipe.METHOD_WRITE)
+    self.assertEqual(ioctl.calls, [])
+    self.assertEqual(progress.history, [
+      (wipe.METHOD_WRITE, 2),
+      (wipe.METHOD_WRITE, 4),
+      (wipe.METHOD_WRITE, 5),
+      ])
+    self.assertEqual(utils.ReadFile(self.path),
+                     ("\xff" * (3 * _MIB)) + ("\0" * (5 * _MIB)) +
+                     ("\xff" * (2 * _MIB)))
+
+  def testFallbackAfterPartialZeroOut(self):
+    ioctl = _FakeIoctl(fail_after=2)
+    progress = _ProgressTracker()
+
+    method = wipe.WipeDevice(self.path, 1, 8, 2, 4, progress,
+                             _ioctl_fn=ioctl,
+                             _discard_zeroes_fn=lambda _: False)
+
+    self.assertEqual(method, wipe.METHOD_WRITE)
+    self.assertEqual(ioctl.calls, [
+      (wipe._BLKZEROOUT, 1 * _MIB, 2 * _MIB),
+      (wipe._BLKZEROOUT, 3 * _MIB, 2 * _MIB),
+      ])
+    self.assertEqual(progress.history, [
+      (wipe.METHOD_ZEROOUT, 2),
+      (wipe.METHOD_ZEROOUT, 4),
+      (wipe.METHOD_WRITE, 8),
+      ])
+
+    # Only the range not handled by the ioctl has been written
+    self.assertEqual(utils.ReadFile(self.path),
+                     ("\xff" * (5 * _MIB)) + ("\0" * (4 * _MIB)) +
+                     ("\xff" * (1 * _MIB)))
+
+  def testIoctlError(self):
+    def _FailingIoctl(fd, request, offset, length):
+      raise EnvironmentError(errno.EIO, "I/O error")
+
+    self.assertRaises(EnvironmentError, wipe.WipeDevice, self.path, 0, 10,
+                      1, 1, NotImplemented, _ioctl_fn=_FailingIoctl,
+                      _discard_zeroes_fn=lambda _: False)
+
+  def testEmptyRange(self):
+    ioctl = _FakeIoctl()
+    progress = _ProgressTracker()
+
+    method = wipe.WipeDevice(self.path, 10, 0, 1, 1, progress,
+                             _ioctl_fn=ioctl,
+                             _discard_zeroes_fn=lambda _: False)
+
+    self.assertEqual(method, wipe.METHOD_ZEROOUT)
+    self.assertEqual(ioctl.calls, [])
+    self.assertEqual(progress.history, [])
+
+
+class TestDiscardZeroesData(unittest.TestCase):
+  def testRegularFile(self):
+    (fd, path) = tempfile.mkstemp()
+    try:
+      self.assertFalse(wipe._DiscardZeroesData(fd))
+    finally:
+      os.close(fd)
+      os.unlink(path)
+
+
+if __name__ == "__main__":
+  testutils.GanetiTestProgram()
@@ -0,0 +1,134 @@
+#!/usr/bin/python
+#
+
+# Copyright (C) 2014 Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Script for testing ganeti.tools.wipe_disk"""
+
+import optparse
+import shutil
+import tempfile
+import unittest
+
+from ganeti import constants
+from ganeti import errors
+from ganeti import objects
+from ganeti import serializer
+from ganeti import utils
+from ganeti.tools import wipe_disk
+
+import testutils
+
+
+class _FakeTime:
+  def __init__(self):
+    self.now = 1000.0
+
+  def __call__(self):
+    return self.now
+
+
+class TestStatusFile(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.path = utils.PathJoin(self.tmpdir, "status")
+    self.time_fn = _FakeTime()
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def _Read(self):
+    return objects.DiskWipeStatus.FromDict(
+      serializer.LoadJson(utils.ReadFile(self.path)))
+
+  def test(self):
+    sf = wipe_disk.StatusFile(self.path, 1024, _time_fn=self.time_fn)
+
+    sf.Update(True)
+    status = self._Read()
+    self.assertEqual(status.size, 1024)
+    self.assertEqual(status.progress_mbytes, 0)
+    self.assertTrue(status.method is None)
+    self.assertTrue(status.exit_status is None)
+
+    # Within the minimum interval the file is not updated
+    self.time_fn.now += constants.WIPE_STATUS_INTERVAL / 2.0
+    sf.SetProgress("zeroout", 100)
+    self.assertEqual(self._Read().progress_mbytes, 0)
+
+    self.time_fn.now += constants.WIPE_STATUS_INTERVAL + 1
+    sf.SetProgress("zeroout", 200)
+    status = self._Read()
+    self.assertEqual(status.progress_mbytes, 200)
+    self.assertEqual(status.method, "zeroout")
+    self.assertEqual(status.mtime, self.time_fn.now)
+
+    sf.SetExitStatus(constants.EXIT_FAILURE, "I/O error")
+    sf.Update(True)
+    status = self._Read()
+    self.assertEqual(status.exit_status, constants.EXIT_FAILURE)
+    self.assertEqual(status.error_message, "I/O error")
+    self.assertEqual(sf.GetData().ToDict(), status.ToDict())
+
+
+class TestVerifyOptions(unittest.TestCase):
+  def setUp(self):
+    self.parser = optparse.OptionParser()
+    self.parser.error = self._Error
+
+  @staticmethod
+  def _Error(msg):
+    raise errors.GenericError(msg)
+
+  def test(self):
+    self.assertEqual(wipe_disk.VerifyOptions(self.parser, NotImplemented,
+                                             ["/tmp/status", "/dev/sda",
+                                              "0", "2048"]),
+                     (NotImplemented, "/tmp/status", "/dev/sda", 0, 2048))
+
+  def testInvalid(self):
+    for args in [[], ["/tmp/status", "/dev/sda", "0"],
+                 ["/tmp/status", "/dev/sda", "x", "1"],
+                 ["/tmp/status", "/dev/sda", "0", "-1"],
+                 ["/tmp/status", "/dev/sda", "0", "1", "2"]]:
+      self.assertRaises(errors.GenericError, wipe_disk.VerifyOptions,
+                        self.parser, NotImplemented, args)
+
+
+class TestGetChunkSize(unittest.TestCase):
+  def test(self):
+    self.assertEqual(wipe_disk.GetChunkSize(0), 1)
+    self.assertEqual(wipe_disk.GetChunkSize(5), 1)
+    self.assertEqual(wipe_disk.GetChunkSize(1000),
+                     1000 * constants.MIN_WIPE_CHUNK_PERCENT / 100)
+    self.assertEqual(wipe_disk.GetChunkSize(2 * 1024 * 1024),
+                     constants.MAX_WIPE_CHUNK)
+
+
+if __name__ == "__main__":
+  testutils.GanetiTestProgram()
@@ -166,6 +166,18 @@ class NotImplementedWorker(workerpool.BaseWorker):
     raise NotImplementedError
 
 
+class BlockingContext:
+  def __init__(self):
+    self.started = threading.Semaphore(0)
+    self.release = threading.Event()
+
+
+class BlockingWorker(workerpool.BaseWorker):
+  def RunTask(self, ctx):
+    ctx.started.release()
+    ctx.release.wait()
+
+
 class TestWorkerpool(unittest.TestCase):
   """Workerpool tests"""
 
@@ -735,6 +747,84 @@ class TestWorkerpool(unittest.TestCase):
       wp.TerminateWorkers()
       self._CheckWorkerCount(wp, 0)
 
+  def testResize(self):
+    ctx = BlockingContext()
+    wp = workerpool.WorkerPool("TestResize", 3, BlockingWorker)
+    try:
+      self._CheckWorkerCount(wp, 3)
+
+      wp.Resize(5)
+      self._CheckWorkerCount(wp, 5)
+
+      # Keep two workers busy
+      for _ in range(2):
+        wp.AddTask((ctx, ))
+
+      for _ in range(2):
+        ctx.started.acquire()
+
+      wp._lock.acquire()
+      try:
+        busy = [worker for worker in wp._workers
+                if worker._HasRunningTaskUnlocked()]
+      finally:
+        wp._lock.release()
+
+      self.assertEqual(len(busy), 2)
+
+      # Partial downsizing terminates idle workers first and doesn't wait for
+      # busy workers
+      wp.Resize(1)
+      self._CheckWorkerCount(wp, 1)
+
+      wp._lock.acquire()
+      try:
+        self.assertTrue(wp._workers[0] in busy)
+        self.assertEqual(len(wp._termworkers), 4)
+        termworkers = wp._termworkers[:]
+      finally:
+        wp._lock.release()
+
+      # Let the busy workers finish, one of them terminates afterwards
+      ctx.release.set()
+      wp.Quiesce()
+
+      for worker in termworkers:
+        worker.join()
+
+      self.assertTrue(busy[0].isAlive() != busy[1].isAlive())
+
+      # Terminated workers are forgotten
+      wp.Resize(2)
+      self._CheckWorkerCount(wp, 2)
+      self.assertFalse(wp._termworkers)
+    finally:
+      ctx.release.set()
+      wp.TerminateWorkers()
+      self._CheckWorkerCount(wp, 0)
+
+  def testResizeTerminateAll(self):
+    ctx = BlockingContext()
+    wp = workerpool.WorkerPool("TestResize", 2, BlockingWorker)
+    try:
+      for _ in range(2):
+        wp.AddTask((ctx, ))
+
+      for _ in range(2):
+        ctx.started.acquire()
+
+      # One of the busy workers terminates after its task
+      wp.Resize(1)
+      self._CheckWorkerCount(wp, 1)
+      self.assertEqual(len(wp._termworkers), 1)
+    finally:
+      ctx.release.set()
+
+      # Waits for all workers, including those already terminating
+      wp.TerminateWorkers()
+      self._CheckWorkerCount(wp, 0)
+      self.assertFalse(wp._termworkers)
+
 
 if __name__ == "__main__":
   testutils.GanetiTestProgram()
@@ -54,6 +54,13 @@ def ParseOptions():
                     help="Number of threads", metavar="NUM")
   parser.add_option("-d", dest="duration", default=5, type="float",
                     help="Duration", metavar="SECS")
+  parser.add_option("-c", dest="condition_type",
+                    default=locking.CONDITION_PIPE, type="choice",
+                    choices=sorted(locking.CONDITION_TYPES),
+                    help="Condition used by waiting acquires", metavar="TYPE")
+  parser.add_option("-w", dest="timeout", default=None, type="float",
+                    help="Timeout for acquires (default: none)",
+                    metavar="SECS")
 
   (opts, args) = parser.parse_args()
 
@@ -70,10 +77,11 @@ class State(object):
     """
     self.verify = [0 for _ in range(thread_count)]
     self.counts = [0 for _ in range(thread_count)]
+    self.timeouts = [0 for _ in range(thread_count)]
     self.total_count = 0
 
 
-def _Counter(lock, state, me):
+def _Counter(lock, state, me, timeout):
   """Thread function for acquiring locks.
 
   """
@@ -81,7 +89,10 @@ def _Counter(lock, state, me):
   verify = state.verify
 
   while True:
-    lock.acquire()
+    if not lock.acquire(timeout=timeout):
+      state.timeouts[me] += 1
+      continue
+
     try:
       verify[me] = 1
 
@@ -105,14 +116,15 @@ def _Counter(lock, state, me):
 def main():
   (opts, _) = ParseOptions()
 
-  lock = locking.SharedLock("TestLock")
+  lock = locking.SharedLock("TestLock", condition_type=opts.condition_type)
 
   state = State(opts.thread_count)
 
   lock.acquire(shared=0)
   try:
     for i in range(opts.thread_count):
-      t = threading.Thread(target=_Counter, args=(lock, state, i))
+      t = threading.Thread(target=_Counter, args=(lock, state, i,
+                                                       opts.timeout))
       t.setDaemon(True)
       t.start()
 
@@ -138,6 +150,7 @@ def main():
     print ("  Thread %s: %d (%0.1f%%)" %
            (i, count, (100.0 * count / state.total_count)))
 
+  print "Acquisitions timed out: %s" % sum(state.timeouts)
   print "Benchmark CPU time: %0.3fs" % lock_cputime
   print ("Average time per lock acquisition: %0.5fms" %
          (1000.0 * lock_cputime / state.total_count))
@@ -0,0 +1,207 @@
+#!/usr/bin/python
+#
+
+# Copyright (C) 2014 Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+
+"""Script for measuring lock set performance with a contended job mix.
+
+Worker threads, standing in for job queue workers, repeatedly run jobs
+acquiring instance locks with the timeouts used by the job queue, hold them
+for a while and release them. Most jobs need few locks, some need many.
+Jobs failing to acquire their locks within a timeout retry, which makes jobs
+needing many locks lose against jobs needing few unless the locks are
+granted all at once (C{-b}).
+
+"""
+
+import sys
+import time
+import random
+import optparse
+import threading
+
+from ganeti import locking
+from ganeti import mcpu
+
+
+def ParseOptions():
+  """Parses the command line options.
+
+  In case of command line errors, it will show the usage and exit the
+  program.
+
+  @return: the options in a tuple
+
+  """
+  parser = optparse.OptionParser()
+  parser.add_option("-t", dest="thread_count", default=25, type="int",
+                    help="Number of job workers", metavar="NUM")
+  parser.add_option("-d", dest="duration", default=30, type="float",
+                    help="Duration", metavar="SECS")
+  parser.add_option("-n", dest="lock_count", default=1000, type="int",
+                    help="Number of instance locks", metavar="NUM")
+  parser.add_option("-l", dest="large_count", default=500, type="int",
+                    help="Number of locks needed by large jobs", metavar="NUM")
+  parser.add_option("-s", dest="small_count", default=3, type="int",
+                    help="Maximum number of locks needed by small jobs",
+                    metavar="NUM")
+  parser.add_option("-f", dest="large_fraction", default=0.05, type="float",
+                    help="Fraction of large jobs", metavar="FRACTION")
+  parser.add_option("-H", dest="hold_time", default=0.05, type="float",
+                    help="Time locks are held by a job", metavar="SECS")
+  parser.add_option("-T", dest="timeout_scale", default=0.01, type="float",
+                    help=("Factor for the timeouts used by the job queue,"
+                          " which are between 1 and 15 seconds"),
+                    metavar="FACTOR")
+  parser.add_option("-b", dest="batched", default=False, action="store_true",
+                    help="Grant all locks of a job at once")
+  parser.add_option("-r", dest="seed", default=None, type="int",
+                    help="Seed for random number generator", metavar="NUM")
+
+  (opts, args) = parser.parse_args()
+
+  if opts.thread_count < 1:
+    parser.error("Number of threads must be at least 1")
+
+  if not 0 < opts.small_count <= opts.large_count <= opts.lock_count:
+    parser.error("Lock counts must be increasing")
+
+  return (opts, args)
+
+
+class _JobStats(object):
+  def __init__(self):
+    """Initializes this class.
+
+    """
+    self.lock = threading.Lock()
+    self.count = 0
+    self.attempts = 0
+    self.wait_total = 0.0
+    self.wait_max = 0.0
+
+  def Add(self, attempts, wait):
+    """Records a finished job.
+
+    """
+    self.lock.acquire()
+    try:
+      self.count += 1
+      self.attempts += attempts
+      self.wait_total += wait
+      self.wait_max = max(self.wait_max, wait)
+    finally:
+      self.lock.release()
+
+
+def _AcquireLocks(lockset, names, timeout_scale):
+  """Acquires locks like the job queue, retrying with increasing timeouts.
+
+  @return: Number of attempts
+
+  """
+  strategy = mcpu.LockAttemptTimeoutStrategy()
+  attempts = 0
+
+  while True:
+    attempts += 1
+
+    timeout = strategy.NextAttempt()
+    if timeout is not None:
+      timeout *= timeout_scale
+
+    if lockset.acquire(names, timeout=timeout) is not None:
+      return attempts
+
+
+def _Worker(opts, lockset, lock_names, stats, stop, rnd):
+  """Thread function running jobs.
+
+  """
+  while not stop.isSet():
+    if rnd.random() < opts.large_fraction:
+      (kind, count) = ("large", opts.large_count)
+    else:
+      (kind, count) = ("small", rnd.randint(1, opts.small_count))
+
+    names = rnd.sample(lock_names, count)
+
+    start = time.time()
+    attempts = _AcquireLocks(lockset, names, opts.timeout_scale)
+    stats[kind].Add(attempts, time.time() - start)
+
+    try:
+      time.sleep(opts.hold_time)
+    finally:
+      lockset.release()
+
+
+def main():
+  (opts, _) = ParseOptions()
+
+  lock_names = ["inst%05d.example.com" % i for i in range(opts.lock_count)]
+  lockset = locking.LockSet(lock_names, "instance", batched=opts.batched)
+  stats = {
+    "small": _JobStats(),
+    "large": _JobStats(),
+    }
+  stop = threading.Event()
+  rnd = random.Random(opts.seed)
+
+  threads = []
+  for _ in range(opts.thread_count):
+    t = threading.Thread(target=_Worker,
+                         args=(opts, lockset, lock_names, stats, stop,
+                               random.Random(rnd.random())))
+    t.setDaemon(True)
+    t.start()
+    threads.append(t)
+
+  time.sleep(opts.duration)
+
+  stop.set()
+  for t in threads:
+    t.join()
+
+  print "Lock grant: %s" % (opts.batched and "batched" or "one by one")
+  for kind in ["small", "large"]:
+    s = stats[kind]
+    if s.count:
+      print ("%s jobs: %d finished, %0.2f attempts on average, waited"
+             " %0.3fs on average and at most %0.3fs for locks" %
+             (kind.capitalize(), s.count, float(s.attempts) / s.count,
+              s.wait_total / s.count, s.wait_max))
+    else:
+      print "%s jobs: none finished" % kind.capitalize()
+
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,188 @@
+#!/usr/bin/python
+#
+
+# Copyright (C) 2014 Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Script for measuring the cost of instance queries"""
+
+import time
+import optparse
+
+from ganeti import constants
+from ganeti import objects
+from ganeti import query
+
+
+def ParseOptions():
+  """Parses the command line options.
+
+  In case of command line errors, it will show the usage and exit the
+  program.
+
+  @return: the options in a tuple
+
+  """
+  parser = optparse.OptionParser()
+  parser.add_option("-n", dest="instance_count", default=10000, type="int",
+                    help="Number of synthetic instances", metavar="NUM")
+  parser.add_option("-r", dest="repeat", default=5, type="int",
+                    help="Number of times every query is run", metavar="NUM")
+  parser.add_option("-l", dest="limit", default=20, type="int",
+                    help="Number of rows for limited queries", metavar="NUM")
+
+  (opts, args) = parser.parse_args()
+
+  if opts.instance_count < 1:
+    parser.error("Number of instances must be at least 1")
+
+  if opts.repeat < 1:
+    parser.error("Number of runs must be at least 1")
+
+  if opts.limit < 1:
+    parser.error("Limit must be at least 1")
+
+  return (opts, args)
+
+
+class _EagerInstanceQueryData(query.InstanceQueryData):
+  """Instance query data filling all parameters for every instance.
+
+  This is how instance parameters were computed before they were filled on
+  first use.
+
+  """
+  def __iter__(self):
+    for inst in self.instances:
+      self._inst = inst
+      self._inst_hvparams = self.cluster.FillHV(inst, skip_globals=True)
+      self._inst_beparams = self.cluster.FillBE(inst)
+      self._inst_osparams = self.cluster.SimpleFillOS(inst.os, inst.osparams)
+      self._inst_nicparams = [self.cluster.SimpleFillNIC(nic.nicparams)
+                              for nic in inst.nics]
+
+      yield inst
+
+
+def _MakeData(instance_count):
+  """Builds a synthetic cluster.
+
+  @return: tuple of cluster object, list of instances and dictionary of nodes
+
+  """
+  cluster = objects.Cluster(cluster_name="cluster.example.com",
+    hvparams=constants.HVC_DEFAULTS,
+    beparams={
+      constants.PP_DEFAULT: constants.BEC_DEFAULTS,
+      },
+    nicparams={
+      constants.PP_DEFAULT: constants.NICC_DEFAULTS,
+      },
+    os_hvp={},
+    osparams={})
+
+  node_count = max(1, instance_count / 20)
+
+  nodes = dict(("node%d-uuid" % i,
+                objects.Node(name="node%d.example.com" % i,
+                             uuid="node%d-uuid" % i, group="group-uuid"))
+               for i in range(node_count))
+
+  instances = [
+    objects.Instance(name="inst%d.example.com" % i, uuid="inst%d-uuid" % i,
+                     primary_node="node%d-uuid" % (i % node_count),
+                     os=["debian", "ubuntu", "centos", "arch", "gentoo",
+                         "fedora", "suse", "alpine", "mint", "slack"][i % 10],
+                     hypervisor=constants.HT_KVM, hvparams={},
+                     beparams={ constants.BE_MAXMEM: 128 * (1 + i % 8), },
+                     osparams={}, admin_state=constants.ADMINST_UP,
+                     disk_template=constants.DT_PLAIN, disks=[],
+                     nics=[objects.NIC(mac="aa:00:00:%02x:%02x:%02x" %
+                                       ((i >> 16) & 0xff, (i >> 8) & 0xff,
+                                        i & 0xff), nicparams={})])
+    # Instances are usually not sorted by name in the configuration
+    for i in reversed(range(instance_count))]
+
+  return (cluster, instances, nodes)
+
+
+def _Measure(qobj, ctx_cls, data, repeat, limit):
+  """Measures the average duration of a query.
+
+  """
+  (cluster, instances, nodes) = data
+
+  duration = 0.0
+
+  for _ in range(repeat):
+    ctx = ctx_cls(instances, cluster, None, [], [], {}, set(), {}, nodes,
+                  None, None)
+
+    start = time.time()
+    if ctx_cls is _EagerInstanceQueryData:
+      # All rows are computed and sorted before the limit is applied
+      rows = qobj.Query(ctx)
+      if limit is not None:
+        rows = rows[:limit]
+    else:
+      rows = qobj.Query(ctx, limit=limit)
+    duration += time.time() - start
+
+  return (duration / repeat, len(rows))
+
+
+def main():
+  (opts, _) = ParseOptions()
+
+  data = _MakeData(opts.instance_count)
+
+  queries = [
+    ("names", ["name", "os", "admin_state"], None),
+    ("parameters", ["name", "be/maxmem", "be/vcpus", "nic.mode/0"], None),
+    ("filtered", ["name", "be/maxmem"], ["=", "os", "debian"]),
+    ]
+
+  print ("%-12s %8s %14s %14s %8s" %
+         ("Query", "Limit", "Old (ms)", "New (ms)", "Rows"))
+
+  for (title, fields, qfilter) in queries:
+    qobj = query.Query(query.INSTANCE_FIELDS, fields, qfilter=qfilter,
+                       namefield="name")
+
+    for limit in [None, opts.limit]:
+      (old_time, old_rows) = _Measure(qobj, _EagerInstanceQueryData, data,
+                                      opts.repeat, limit)
+      (new_time, new_rows) = _Measure(qobj, query.InstanceQueryData, data,
+                                      opts.repeat, limit)
+      assert old_rows == new_rows
+
+      print ("%-12s %8s %14.2f %14.2f %8d" %
+             (title, limit, 1000.0 * old_time, 1000.0 * new_time, new_rows))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,223 @@
+#!/usr/bin/python
+#
+
+# Copyright (C) 2014 Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+# IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED
+# TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+# PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+# CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+# EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+
+"""Script for measuring the performance of sparse device copies.
+
+A synthetic image with the given amount of data, spread over the whole
+image, is copied once in full, like dd(1) does, and once with
+L{ganeti.storage.sparse}. The image is a sparse file, so both the holes of
+the file and zeroes within data (as on a block device) are exercised.
+
+"""
+
+import os
+import sys
+import time
+import random
+import optparse
+import tempfile
+import shutil
+
+from ganeti import utils
+from ganeti.storage import sparse
+
+
+_MIB = 1024 * 1024
+
+
+def ParseOptions():
+  """Parses the command line options.
+
+  In case of command line errors, it will show the usage and exit the
+  program.
+
+  @return: the options in a tuple
+
+  """
+  parser = optparse.OptionParser()
+  parser.add_option("-s", dest="size", default=1024, type="int",
+                    help="Size of the image", metavar="MIB")
+  parser.add_option("-d", dest="data_percent", default=10, type="float",
+                    help="Percentage of the image containing data",
+                    metavar="PERCENT")
+  parser.add_option("-z", dest="zero_percent", default=10, type="float",
+                    help="Percentage of the image explicitly filled with"
+                    " zeroes", metavar="PERCENT")
+  parser.add_option("--tmpdir", dest="tmpdir", default=None,
+                    help="Directory for the images", metavar="DIR")
+
+  (opts, args) = parser.parse_args()
+
+  if opts.size < 1:
+    parser.error("Size must be at least 1 MiB")
+
+  if (opts.data_percent < 0 or opts.zero_percent < 0 or
+      opts.data_percent + opts.zero_percent > 100):
+    parser.error("Invalid percentages")
+
+  return (opts, args)
+
+
+def _CreateImage(path, size, data_percent, zero_percent):
+  """Creates a sparse image with random data in random MiB-sized chunks.
+
+  """
+  chunks = range(size)
+  random.shuffle(chunks)
+
+  data_count = int(size * data_percent / 100)
+  zero_count = int(size * zero_percent / 100)
+
+  fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600)
+  try:
+    os.ftruncate(fd, size * _MIB)
+
+    for (idx, chunk) in enumerate(chunks[:data_count + zero_count]):
+      os.lseek(fd, chunk * _MIB, os.SEEK_SET)
+      if idx < data_count:
+        os.write(fd, os.urandom(_MIB))
+      else:
+        os.write(fd, "\0" * _MIB)
+
+    os.fsync(fd)
+  finally:
+    os.close(fd)
+
+  return data_count
+
+
+def _FullCopy(src, dest, size):
+  """Copies a device like C{dd bs=1M}, writing the data to a pipe.
+
+  @return: Number of bytes transferred
+
+  """
+  (read_fd, write_fd) = os.pipe()
+
+  # Consume the pipe in a separate process, like ssh or socat would
+  pid = os.fork()
+  if pid == 0:
+    os.close(write_fd)
+    out_fd = os.open(dest, os.O_WRONLY)
+    while True:
+      data = os.read(read_fd, _MIB)
+      if not data:
+        break
+      os.write(out_fd, data)
+    os.fsync(out_fd)
+    os._exit(0) # pylint: disable=W0212
+
+  os.close(read_fd)
+  in_fd = os.open(src, os.O_RDONLY)
+  try:
+    for _ in range(size):
+      os.write(write_fd, os.read(in_fd, _MIB))
+  finally:
+    os.close(in_fd)
+    os.close(write_fd)
+
+  os.waitpid(pid, 0)
+
+  return size * _MIB
+
+
+def _SparseCopy(src, dest, size):
+  """Copies a device using L{sparse}, writing the stream to a pipe.
+
+  @return: Number of bytes transferred
+
+  """
+  (read_fd, write_fd) = os.pipe()
+
+  pid = os.fork()
+  if pid == 0:
+    os.close(write_fd)
+    sparse.ReceiveDevice(os.fdopen(read_fd, "rb"), dest)
+    os._exit(0) # pylint: disable=W0212
+
+  os.close(read_fd)
+  try:
+    stats = sparse.SendDevice(src, size * _MIB, write_fd)
+  finally:
+    os.close(write_fd)
+
+  os.waitpid(pid, 0)
+
+  return stats.data
+
+
+def _Measure(name, fn, src, dest, size):
+  """Runs and reports a copy method.
+
+  """
+  # Destination with stale data
+  utils.WriteFile(dest, data="")
+  fd = os.open(dest, os.O_WRONLY)
+  try:
+    for _ in range(size):
+      os.write(fd, "\xaa" * _MIB)
+  finally:
+    os.close(fd)
+
+  start = time.time()
+  transferred = fn(src, dest, size)
+  duration = time.time() - start
+
+  if utils.ReadFile(src) != utils.ReadFile(dest):
+    print "%s: copy differs from source!" % name
+    sys.exit(1)
+
+  print ("%-8s %8.1f MiB transferred in %6.2fs (%8.1f MiB/s of image)" %
+         (name, float(transferred) / _MIB, duration,
+          size / max(duration, 0.001)))
+
+
+def main():
+  (opts, _) = ParseOptions()
+
+  tmpdir = tempfile.mkdtemp(dir=opts.tmpdir)
+  try:
+    src = utils.PathJoin(tmpdir, "image")
+    dest = utils.PathJoin(tmpdir, "copy")
+
+    data_count = _CreateImage(src, opts.size, opts.data_percent,
+                              opts.zero_percent)
+
+    print ("Image of %s MiB with %s MiB of data" % (opts.size, data_count))
+
+    _Measure("full", _FullCopy, src, dest, opts.size)
+    _Measure("sparse", _SparseCopy, src, dest, opts.size)
+  finally:
+    shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+  main()